@@ -1,14 +1,19 @@
 from .regions.gregion import GRegion
 from .regions.gregions import GRegions
 from .regions.gregions_intervaltree import GRegionsTree
+from .regions.gregions_array import GRegionsArray
 from .regions.gregions_set import GRegionsSet
+from .regions.gregions_indexed import IndexedGRegions
 from .sequences.gsequence import GSequence
 from .sequences.gsequences import GSequences
 from .annotation.gannotation import GAnnotation
 from .alignments.galignments import GAlignments
+from .coverages.rle import RLECoverage
 from .coverages.gcoverages import GCoverages
 from .coverages.gcoverages_set import GCoveragesSet
+from .coverages.store import CoverageStore
 from .variants.gvariant import GVariant
 from .variants.gvariants import GVariants
+from .progress import set_progress
 
 __version__ = "0.2.10"
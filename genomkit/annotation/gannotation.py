@@ -1,5 +1,5 @@
 import gzip
-from tqdm import tqdm
+from ..progress import progress, progress_enabled
 
 
 class GAnnotation:
@@ -26,9 +26,12 @@ class GAnnotation:
     def load_data(self):
         """Load the file."""
         open_func = gzip.open if self.file_path.endswith('.gz') else open
-        total_lines = sum(1 for _ in open_func(self.file_path, 'rt'))
+        total_lines = None
+        if progress_enabled():
+            with open_func(self.file_path, 'rt') as f:
+                total_lines = sum(1 for _ in f)
         with open_func(self.file_path, 'rt') as f:
-            for line in tqdm(f, total=total_lines, desc="Loading GTF"):
+            for line in progress(f, total=total_lines, desc="Loading GTF"):
                 if line.startswith('#'):
                     continue
                 fields = line.strip().split('\t')
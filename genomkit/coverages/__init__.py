@@ -4,4 +4,10 @@ Genomic Coverages Modules
 These modules contain functions and classes for working with genomic
 coverages. It provides utilities for handling and extracting genomic
 coverages from BigWig or BAM files.
+
+- **GCoverages** is a collection of coverages of windows or whole sequences.
+- **GCoveragesSet** is a set of many GCoverages.
+- **RLECoverage** is a run-length encoded coverage of a whole sequence.
+- **CoverageStore** is a memory-mapped directory of the coverages of many
+  samples, queried by region.
 """
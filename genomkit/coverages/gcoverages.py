@@ -2,10 +2,227 @@ import pyBigWig
 import numpy as np
 import pandas as pd
 import pysam
-from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from ..progress import progress
+from ..regions.arrays import encode_strands, overlap_indices, \
+    regions_to_arrays
+from ..regions.parallel import effective_jobs
+from .rle import RLECoverage
 from genomkit import GRegions, GRegion
 import os
 
+# Number of windows fetched by one task when loading a bigWig file
+BIGWIG_BLOCK_SIZE = 1 << 10
+# bigWig file opened by every worker process of the pool
+_bigwig = None
+# Reads skipped by default as by samtools depth: unmapped, secondary,
+# QC failed and duplicates
+BAM_EXCLUDE_FLAGS = 0x4 | 0x100 | 0x200 | 0x400
+# BAM file opened by every worker process of the pool
+_bam = None
+
+
+def bin_means(values, bin_size: int):
+    """Return the mean of every bin of bin_size values along the last axis;
+    the last bin holds the remaining values if the length is not a multiple
+    of bin_size.
+
+    :param values: Values of one window or a matrix of windows
+    :type values: numpy.ndarray
+    :param bin_size: Number of values per bin
+    :type bin_size: int
+    :return: Mean per bin
+    :rtype: numpy.ndarray
+    """
+    if bin_size <= 1:
+        return values
+    length = values.shape[-1]
+    n = length // bin_size * bin_size
+    res = values[..., :n].reshape(values.shape[:-1] +
+                                  (n // bin_size, bin_size)).mean(axis=-1)
+    if n < length:
+        res = np.concatenate([res, values[..., n:].mean(axis=-1,
+                                                        keepdims=True)],
+                             axis=-1)
+    return res.astype(values.dtype, copy=False)
+
+
+def _open_bigwig(filename):
+    global _bigwig
+    _bigwig = pyBigWig.open(filename)
+
+
+def _bigwig_runs(loci, bin_size):
+    # Run-length encoded values of the windows, missing between intervals
+    res = []
+    for sequence, start, end in loci:
+        intervals = np.array(_bigwig.intervals(sequence, start, end) or [],
+                             dtype=np.float64).reshape(-1, 3)
+        res.append(RLECoverage.from_intervals(
+            np.maximum(intervals[:, 0], start) - start,
+            np.minimum(intervals[:, 1], end) - start,
+            intervals[:, 2].astype(np.float32), end - start).binned(bin_size))
+    return res
+
+
+def _bigwig_values(loci, bin_size):
+    # Binned float32 values of the windows
+    return [bin_means(_bigwig.values(sequence, start, end,
+                                     numpy=True).astype(np.float32,
+                                                        copy=False),
+                      bin_size)
+            for sequence, start, end in loci]
+
+
+def read_intervals(reads, extend: int = 0, paired: bool = False,
+                   strand: str = None, min_mapq: int = 0,
+                   exclude_flags: int = BAM_EXCLUDE_FLAGS,
+                   include_flags: int = 0):
+    """Return the intervals covered by the reads passing the filters, as
+    two arrays of starts and ends. Without extension these are the aligned
+    blocks of the reads, so that deletions, reference skips and clipped
+    bases are not covered, as by samtools depth.
+
+    :param reads: Aligned reads such as from pysam.AlignmentFile.fetch
+    :type reads: iterable
+    :param extend: Length of the fragments the reads are extended to from
+                   their 5' end, defaults to 0 (no extension)
+    :type extend: int, optional
+    :param paired: Count the fragment between properly paired mates once
+                   instead of the reads, defaults to False
+    :type paired: bool, optional
+    :param strand: Count only the reads on this strand, "+" or "-",
+                   defaults to None (both)
+    :type strand: str, optional
+    :param min_mapq: Minimum mapping quality, defaults to 0
+    :type min_mapq: int, optional
+    :param exclude_flags: Skip the reads with any of these flags, defaults
+                          to BAM_EXCLUDE_FLAGS
+    :type exclude_flags: int, optional
+    :param include_flags: Skip the reads without all of these flags,
+                          defaults to 0
+    :type include_flags: int, optional
+    :return: Starts and ends
+    :rtype: tuple of numpy.ndarray
+    """
+    if strand not in (None, "+", "-"):
+        raise ValueError("strand should be None, '+' or '-'")
+    reverse = strand == "-"
+    starts = []
+    ends = []
+    for read in reads:
+        flag = read.flag
+        if flag & exclude_flags or flag & include_flags != include_flags \
+                or read.mapping_quality < min_mapq:
+            continue
+        if strand is not None and read.is_reverse != reverse:
+            continue
+        if paired and read.is_proper_pair:
+            # The leftmost mate stands for the fragment
+            if read.template_length > 0:
+                starts.append(read.reference_start)
+                ends.append(read.reference_start + read.template_length)
+        elif extend > 0:
+            if read.is_reverse:
+                starts.append(max(read.reference_end - extend, 0))
+                ends.append(read.reference_end)
+            else:
+                starts.append(read.reference_start)
+                ends.append(read.reference_start + extend)
+        else:
+            for start, end in read.get_blocks():
+                starts.append(start)
+                ends.append(end)
+    return np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
+
+
+def interval_runs(starts, ends, start: int, end: int):
+    """Return the depth of intervals in a window as runs. The depth only
+    changes at the interval boundaries, so it is computed once per segment
+    between them from the sorted boundaries.
+
+    :param starts: Starts of the intervals
+    :type starts: numpy.ndarray
+    :param ends: Ends of the intervals
+    :type ends: numpy.ndarray
+    :param start: Start of the window
+    :type start: int
+    :param end: End of the window
+    :type end: int
+    :return: Segment boundaries from start to end, and the depth of every
+             segment
+    :rtype: tuple of numpy.ndarray
+    """
+    starts = np.sort(starts)
+    ends = np.sort(ends)
+    breaks = np.concatenate(([start], starts, ends, [end]))
+    breaks = np.unique(breaks[(breaks >= start) & (breaks <= end)])
+    depth = np.searchsorted(starts, breaks[:-1], side="right") - \
+        np.searchsorted(ends, breaks[:-1], side="right")
+    return breaks, depth.astype(np.int32)
+
+
+def interval_depth(starts, ends, start: int, end: int):
+    """Return the depth of intervals at every position of a window.
+
+    :param starts: Starts of the intervals
+    :type starts: numpy.ndarray
+    :param ends: Ends of the intervals
+    :type ends: numpy.ndarray
+    :param start: Start of the window
+    :type start: int
+    :param end: End of the window
+    :type end: int
+    :return: Depth per position
+    :rtype: numpy.ndarray of int32
+    """
+    breaks, depth = interval_runs(starts, ends, start, end)
+    return np.repeat(depth, np.diff(breaks))
+
+
+def _open_bam(filename):
+    global _bam
+    _bam = pysam.AlignmentFile(filename, "rb")
+
+
+def _bam_depths(loci, bin_size, filters, rle=False):
+    # Depths of the windows, binned as float32
+    res = []
+    for sequence, start, end in loci:
+        starts, ends = read_intervals(_bam.fetch(sequence, start, end),
+                                      **filters)
+        if rle:
+            breaks, depth = interval_runs(starts, ends, start, end)
+            res.append(RLECoverage(breaks[1:] - start,
+                                   depth).binned(bin_size))
+            continue
+        depth = interval_depth(starts, ends, start, end)
+        if bin_size > 1:
+            depth = bin_means(depth.astype(np.float32), bin_size)
+        res.append(depth)
+    return res
+
+
+def _pooled(task, blocks, n_jobs, initializer, filename):
+    # Results of the task on every block, computed in a pool of processes
+    # holding their own handle of the file
+    if n_jobs > 1:
+        with ProcessPoolExecutor(n_jobs, initializer=initializer,
+                                 initargs=(filename,)) as pool:
+            yield from pool.map(task, blocks)
+        return
+    global _bigwig, _bam
+    initializer(filename)
+    try:
+        for block in blocks:
+            yield task(block)
+    finally:
+        for handle in (_bigwig, _bam):
+            if handle is not None:
+                handle.close()
+        _bigwig = _bam = None
+
 
 class GCoverages:
     """
@@ -15,156 +232,212 @@ class GCoverages:
     genomic coverages. It provides utilities for handling and analyzing the
     interactions of many genomic coverages.
     """
-    def __init__(self, bin_size: int = 1, load: str = "", windows=None):
+    def __init__(self, bin_size: int = 1, load: str = "", windows=None,
+                 n_jobs: int = 1, rle: bool = False):
         """Initialize GCoverages object.
 
         :param bin_size: Size of the bin for coverage calculation.
                          Defaults to 1 (single nucleotide resolution).
         :type bin_size: str
+        :param n_jobs: Number of processes reading a bigWig or BAM file,
+                       defaults to 1
+        :type n_jobs: int, optional
+        :param rle: Keep the coverages of whole sequences from a bigWig or
+                    BAM file as RLECoverage, defaults to False
+        :type rle: bool, optional
         """
         self.coverage = {}
+        self.matrix = None
+        # Row of self.matrix of every window
+        self._rows = {}
         self.bin_size = bin_size
         if load.lower().endswith(".bw") or load.lower().endswith(".bigwig"):
-            self.load_coverage_from_bigwig(load, windows=windows)
+            self.load_coverage_from_bigwig(load, windows=windows,
+                                           n_jobs=n_jobs, rle=rle)
         elif load.lower().endswith(".bam"):
-            self.calculate_coverage_from_bam(load, windows=windows)
+            self.calculate_coverage_from_bam(load, windows=windows,
+                                             n_jobs=n_jobs, rle=rle)
         elif load.lower().endswith(".bed") or \
                 load.lower().endswith(".bedgraph"):
             regions = GRegions(name=os.path.basename(load), load=load)
             self.calculate_coverage_GRegions2(windows=windows,
                                               scores=regions)
 
-    def load_coverage_from_bigwig(self, filename: str, windows=None):
+    def _load_windows(self, filename, windows, task, initializer, n_jobs,
+                      dtype, stack):
+        # Run the task on blocks of windows in a pool and store the results,
+        # as rows of one matrix if stack and the windows have the same length
+        self.coverage = {}
+        self.matrix = None
+        self._rows = {}
+        lengths = {len(w) for w in windows}
+        if stack and len(lengths) == 1:
+            self.matrix = np.empty((len(windows),
+                                    -(-lengths.pop() //
+                                      max(self.bin_size, 1))),
+                                   dtype=dtype)
+        loci = [(w.sequence, w.start, w.end) for w in windows]
+        n_jobs = min(effective_jobs(n_jobs), max(len(loci), 1))
+        # Spread a few long windows such as whole chromosomes over the pool
+        size = max(min(BIGWIG_BLOCK_SIZE, -(-len(loci) // n_jobs)), 1)
+        blocks = [loci[i:i + size] for i in range(0, len(loci), size)]
+        i = 0
+        with progress(desc=os.path.basename(filename), total=len(loci)) \
+                as bar:
+            for block in _pooled(task, blocks, n_jobs, initializer,
+                                 filename):
+                for coverage in block:
+                    if self.matrix is not None:
+                        self.matrix[i] = coverage
+                        coverage = self.matrix[i]
+                        self._rows[windows[i]] = i
+                    self.coverage[windows[i]] = coverage
+                    i += 1
+                bar.update(len(block))
+
+    def load_coverage_from_bigwig(self, filename: str, windows=None,
+                                  n_jobs: int = 1, rle: bool = False):
         """Load coverage data from a bigwig file.
 
+        The values of every window are fetched as one float32 array and
+        binned by a reshape and mean. If all the windows have the same
+        length, the coverages are the rows of one preallocated float32
+        matrix, self.matrix, in the order of the windows. The windows are
+        fetched in blocks which run in a pool of n_jobs processes, each
+        holding its own handle of the file. With rle, the coverages of the
+        whole sequences are built from the intervals of the file as
+        RLECoverage, missing between the intervals, without dense arrays.
+
         :param filename: Path to the bigwig file.
         :type filename: str
         :param windows: GRegions for extracting the coverage profile
         :type windows: GRegions
+        :param n_jobs: Number of processes, defaults to 1
+        :type n_jobs: int, optional
+        :param rle: Keep the coverages of the whole sequences as
+                    RLECoverage, defaults to False
+        :type rle: bool, optional
         """
-        bw = pyBigWig.open(filename)
         if not windows:
             # Get the coverage on the whole genome
-            chrom_regions = GRegions(name="chromosomes")
-            chromosomes = bw.chroms()
-            for chrom, chrom_length in chromosomes.items():
-                chrom_regions.add(GRegion(sequence=chrom,
-                                          start=0,
-                                          end=int(chrom_length)))
-            for r in tqdm(chrom_regions,
-                          desc=os.path.basename(filename),
-                          total=len(chrom_regions)):
-                coverage = bw.values(r.sequence, r.start, r.end, numpy=True)
-                if self.bin_size > 1:
-                    coverage = [np.mean(coverage[i:i+self.bin_size])
-                                if i+self.bin_size <= len(coverage)
-                                else np.mean(coverage[i:])
-                                for i in range(0, len(coverage),
-                                               self.bin_size)]
-                self.coverage[r] = coverage
+            bw = pyBigWig.open(filename)
+            windows = GRegions(name="chromosomes")
+            for chrom, chrom_length in bw.chroms().items():
+                windows.add(GRegion(sequence=chrom, start=0,
+                                    end=int(chrom_length)))
+            bw.close()
+            stack = False
         else:
             # Get only the coverage on the defined regions
             assert isinstance(windows, GRegions)
-            self.coverage = {}
-            for window in tqdm(windows,
-                               desc=os.path.basename(filename),
-                               total=len(windows)):
-                coverage = bw.values(window.sequence,
-                                     window.start,
-                                     window.end,
-                                     numpy=True)
-                if self.bin_size > 1:
-                    coverage = [np.mean(coverage[i:i+self.bin_size])
-                                if i+self.bin_size <= len(coverage)
-                                else np.mean(coverage[i:])
-                                for i in range(0, len(coverage),
-                                               self.bin_size)]
-                self.coverage[window] = coverage
-        bw.close()
-
-    def calculate_coverage_from_bam(self, filename: str, windows=None):
+            stack = True
+            rle = False
+        self._load_windows(filename, windows,
+                           partial(_bigwig_runs if rle else _bigwig_values,
+                                   bin_size=self.bin_size),
+                           _open_bigwig, n_jobs, np.float32, stack)
+
+    def calculate_coverage_from_bam(self, filename: str, windows=None,
+                                    extend: int = 0, paired: bool = False,
+                                    strand: str = None, min_mapq: int = 0,
+                                    exclude_flags: int = BAM_EXCLUDE_FLAGS,
+                                    include_flags: int = 0,
+                                    n_jobs: int = 1, rle: bool = False):
         """Calculate coverage from a BAM file.
 
+        The read depth is the same as by samtools depth: the aligned blocks
+        of the reads passing the filters are counted, without deletions and
+        reference skips. The boundaries of the blocks are collected per
+        window and turned into the depth at every position, as int32 arrays,
+        or as float32 means with bins. Without windows, the depth is
+        calculated on the whole sequences with mapped reads, and kept as
+        RLECoverage with rle. The windows are processed in a pool of n_jobs
+        processes, each holding its own handle of the file; the BAM file
+        needs an index.
+
         :param filename: Path to the BAM file.
         :type filename: str
         :param windows: GRegions for extracting the coverage profile
         :type windows: GRegions
+        :param extend: Length of the fragments the reads are extended to from
+                       their 5' end, defaults to 0 (no extension)
+        :type extend: int, optional
+        :param paired: Count the fragment between properly paired mates once
+                       instead of the reads, defaults to False
+        :type paired: bool, optional
+        :param strand: Count only the reads on this strand, "+" or "-",
+                       defaults to None (both)
+        :type strand: str, optional
+        :param min_mapq: Minimum mapping quality, defaults to 0
+        :type min_mapq: int, optional
+        :param exclude_flags: Skip the reads with any of these flags,
+                              defaults to unmapped, secondary, QC failed and
+                              duplicate reads
+        :type exclude_flags: int, optional
+        :param include_flags: Skip the reads without all of these flags,
+                              defaults to 0
+        :type include_flags: int, optional
+        :param n_jobs: Number of processes, defaults to 1
+        :type n_jobs: int, optional
+        :param rle: Keep the coverages of the whole sequences as
+                    RLECoverage, defaults to False
+        :type rle: bool, optional
         """
-        bam = pysam.AlignmentFile(filename, "rb")
+        if strand not in (None, "+", "-"):
+            raise ValueError("strand should be None, '+' or '-'")
         if not windows:
             # Get the coverage of the whole genome
-            for pileupcolumn in bam.pileup():
-                chrom = bam.get_reference_name(pileupcolumn.reference_id)
-                chrom_len = bam.get_reference_length(chrom)
-                r = GRegion(sequence=chrom, start=0, end=chrom_len)
-                if chrom not in [r.sequence for r in self.coverage.keys()]:
-                    self.coverage[r] = [0] * chrom_len
-                self.coverage[r][pileupcolumn.reference_pos] += 1
-        if windows:
-            for w in windows:
-                self.coverage[w] = [0] * len(w)
-                for pileupcolumn in bam.pileup(w.sequence, w.start, w.end):
-                    self.coverage[w][pileupcolumn.reference_pos-w.start] += 1
-        bam.close()
-        # Adjust for bin size
-        for r in self.coverage.keys():
-            if self.bin_size > 1:
-                self.coverage[r] = [sum(self.coverage[r][i:i+self.bin_size]) /
-                                    self.bin_size
-                                    for i in range(0,
-                                                   len(self.coverage[r]),
-                                                   self.bin_size)]
+            with pysam.AlignmentFile(filename, "rb") as bam:
+                windows = GRegions(name="chromosomes")
+                for stats in bam.get_index_statistics():
+                    if stats.mapped:
+                        windows.add(GRegion(
+                            sequence=stats.contig, start=0,
+                            end=bam.get_reference_length(stats.contig)))
+            stack = False
+        else:
+            assert isinstance(windows, GRegions)
+            stack = True
+            rle = False
+        filters = {"extend": extend, "paired": paired, "strand": strand,
+                   "min_mapq": min_mapq, "exclude_flags": exclude_flags,
+                   "include_flags": include_flags}
+        self._load_windows(filename, windows,
+                           partial(_bam_depths, bin_size=self.bin_size,
+                                   filters=filters, rle=rle),
+                           _open_bam, n_jobs,
+                           np.int32 if self.bin_size <= 1 else np.float32,
+                           stack)
 
     def calculate_coverage_GRegions2(self, scores, windows=None,
                                      strandness: bool = False):
         """Calculate the coverage from two GRegions. `windows` defines the loci
         for the coverage `scores` contains the scores loaded into the coverage.
+        Same as calculate_coverage_GRegions.
 
         :param windows: Define the windows and the length of the coverage
         :type windows: GRegions
         :param scores: Provide the scores for calculating the coverage
         :type scores: GRegions
         :param strandness: Make this operation strandness specific, defaults
-                        to False
+                           to False
         :type strandness: bool, optional
         """
-        from genomkit import GRegions
-        assert isinstance(windows, GRegions)
-        assert isinstance(scores, GRegions)
-        print("1")
-        filtered_scores = scores.intersect(target=windows, mode="ORIGINAL")
-        print("2")
-        # Preallocate coverage arrays
-        # num_windows = len(windows)
-        num_bins = len(windows[0]) // self.bin_size
-        self.coverage = {region: np.zeros(shape=num_bins)
-                         for region in windows}
-        for target in tqdm(filtered_scores, desc=scores.name,
-                           total=len(filtered_scores)):
-            overlap_regions = [region for region in windows
-                               if region.overlap(target,
-                                                 strandness=strandness)]
-            start_inds = np.maximum(0,
-                                    target.start -
-                                    np.array([region.start
-                                              for region in overlap_regions]))
-            start_inds = start_inds // self.bin_size
-            end_inds = np.minimum([len(region)
-                                   for region in overlap_regions],
-                                  target.end -
-                                  np.array([region.start
-                                            for region in overlap_regions]))
-            end_inds = end_inds // self.bin_size
-            for region, start_ind, end_ind in zip(overlap_regions,
-                                                  start_inds,
-                                                  end_inds):
-                self.coverage[region][start_ind:end_ind] += target.score
+        self.calculate_coverage_GRegions(scores=scores, windows=windows,
+                                         strandness=strandness)
 
     def calculate_coverage_GRegions(self, scores, windows=None,
                                     strandness: bool = False):
         """Calculate the coverage from two GRegions. `windows` defines the loci
         for the coverage `scores` contains the scores loaded into the coverage.
 
+        The overlapping pairs of windows and scores are found at once on the
+        windows sorted per sequence, and every score is added to its range of
+        bins through one difference array over all windows, so that the time
+        grows linearly with the numbers of windows, scores and overlaps. If
+        all the windows have the same length, the coverages are the rows of
+        self.matrix.
+
         :param windows: Define the windows and the length of the coverage
         :type windows: GRegions
         :param scores: Provide the scores for calculating the coverage
@@ -176,30 +449,68 @@ class GCoverages:
         from genomkit import GRegions
         assert isinstance(windows, GRegions)
         assert isinstance(scores, GRegions)
-        filtered_scores = scores.intersect(target=windows,
-                                           mode="ORIGINAL")
-        for region in tqdm(windows, desc=scores.name, total=len(windows)):
-            self.coverage[region] = np.zeros(shape=len(region) //
-                                             self.bin_size)
-            for target in filtered_scores:
-                if region.overlap(target, strandness=strandness):
-                    start_ind = (max(0, target.start - region.start))
-                    start_ind = start_ind // self.bin_size
-                    end_ind = (min(len(region), target.end - region.start))
-                    end_ind = end_ind // self.bin_size
-                    for i in range(start_ind, end_ind):
-                        self.coverage[region][i] += target.score
+        w_codes, w_starts, w_ends, vocabulary = \
+            regions_to_arrays(windows.elements)
+        s_codes, s_starts, s_ends, _ = regions_to_arrays(scores.elements,
+                                                         list(vocabulary))
+        wi, si = overlap_indices(w_codes, w_starts, w_ends,
+                                 s_codes, s_starts, s_ends)
+        if strandness:
+            same = encode_strands(r.orientation for r in windows)[wi] == \
+                encode_strands(r.orientation for r in scores)[si]
+            wi, si = wi[same], si[same]
+        values = np.fromiter((r.score for r in scores.elements),
+                             dtype=np.float64, count=len(scores))[si]
+        # Every window has its bins and one more slot where its differences
+        # end
+        num_bins = (w_ends - w_starts) // self.bin_size
+        offsets = np.concatenate(([0], np.cumsum(num_bins + 1)))
+        first = np.maximum(0, s_starts[si] - w_starts[wi]) // self.bin_size
+        last = np.minimum(w_ends[wi] - w_starts[wi],
+                          s_ends[si] - w_starts[wi]) // self.bin_size
+        diff = np.zeros(offsets[-1], dtype=np.float64)
+        np.add.at(diff, offsets[wi] + first, values)
+        np.add.at(diff, offsets[wi] + last, -values)
+        depth = np.cumsum(diff)
+        # Remove the rounding left over from the previous windows
+        depth -= np.repeat(np.concatenate(([0], depth[offsets[1:] - 1]))
+                           [:len(windows)], num_bins + 1)
+        self.coverage = {}
+        self.matrix = None
+        self._rows = {}
+        if len(windows) and np.all(num_bins == num_bins[0]):
+            self.matrix = np.ascontiguousarray(
+                depth.reshape(len(windows), -1)[:, :-1])
+            for i, region in enumerate(windows):
+                self.coverage[region] = self.matrix[i]
+                self._rows[region] = i
+        else:
+            for i, region in enumerate(windows):
+                self.coverage[region] = \
+                    depth[offsets[i]:offsets[i] + num_bins[i]]
 
     def get_coverage(self, gregion: str):
         """Get coverage data for a specific sequence by name. This sequence
-        can be a chromosome or a genomic region.
+        can be a chromosome or a genomic region. A region within a sequence
+        kept as RLECoverage is returned as the dense values of its bins.
 
         :param seq_name: sequence name.
         :type seq_name: str
         :return: Coverage data for the specified sequence.
         :rtype: numpy array
         """
-        return self.coverage.get(gregion, [])
+        if gregion in self.coverage:
+            return self.coverage[gregion]
+        for region, cov in self.coverage.items():
+            if isinstance(cov, RLECoverage) and \
+                    region.sequence == gregion.sequence and \
+                    region.start <= gregion.start and \
+                    gregion.end <= region.end:
+                bin_size = max(self.bin_size, 1)
+                return cov.to_array(
+                    (gregion.start - region.start) // bin_size,
+                    -(-(gregion.end - region.start) // bin_size))
+        return []
 
     def filter_regions_coverage(self, regions):
         """Filter regions for their coverages.
@@ -210,17 +521,27 @@ class GCoverages:
                  coverage lists.
         :rtype: dict
         """
+        regions = list(regions)
+        keys = list(self.coverage.keys())
+        q_codes, q_starts, q_ends, vocabulary = regions_to_arrays(regions)
+        t_codes, t_starts, t_ends, _ = regions_to_arrays(keys,
+                                                         list(vocabulary))
+        qi, ti = overlap_indices(q_codes, q_starts, q_ends,
+                                 t_codes, t_starts, t_ends)
+        # The last overlapping coverage of every region is kept
+        match = np.full(len(regions), -1, dtype=np.int64)
+        np.maximum.at(match, qi, ti)
         filtered_coverages = {}
-        for r in regions:
-            for w in self.coverage.keys():
-                if r.overlap(w):
-                    offset1 = max(r.start - w.start, 0)
-                    offset2 = min(r.end - w.start, w.end - w.start)
-                    if self.bin_size > 1:
-                        offset1 = offset1 // self.bin_size
-                        offset2 = offset2 // self.bin_size
-                    coverage = self.coverage[w][offset1:offset2]
-                    filtered_coverages[r] = coverage
+        for r, w in zip(regions, match.tolist()):
+            if w < 0:
+                continue
+            w = keys[w]
+            offset1 = max(r.start - w.start, 0)
+            offset2 = min(r.end - w.start, w.end - w.start)
+            if self.bin_size > 1:
+                offset1 = offset1 // self.bin_size
+                offset2 = offset2 // self.bin_size
+            filtered_coverages[r] = self.coverage[w][offset1:offset2]
         return filtered_coverages
 
     def total_sequencing_depth(self):
@@ -231,16 +552,30 @@ class GCoverages:
         """
         total_depth = 0
         for chrom, cov in self.coverage.items():
-            total_depth += np.nansum(cov)
+            if isinstance(cov, RLECoverage):
+                total_depth += cov.nansum()
+            else:
+                total_depth += np.nansum(cov)
         return total_depth
 
     def scale_coverage(self, coefficient):
-        """Scale the coverages by a coefficient.
+        """Scale the coverages by a coefficient. Missing values become 0.
+        The coverages stay the rows of self.matrix if it is set.
 
         :param coefficient: Coefficient to scale the coverages.
         :type coefficient: float
         """
+        if self.matrix is not None:
+            matrix = np.where(np.isnan(self.matrix), 0, self.matrix)
+            self.matrix = matrix * coefficient
+            for region, row in self._rows.items():
+                self.coverage[region] = self.matrix[row]
+            return
         for chrom in self.coverage:
+            if isinstance(self.coverage[chrom], RLECoverage):
+                self.coverage[chrom] = \
+                    self.coverage[chrom].fillna(0) * coefficient
+                continue
             # Replace NaN values with 0 before scaling
             self.coverage[chrom][np.isnan(self.coverage[chrom])] = 0
             # Scale the non-NaN values
@@ -249,8 +584,13 @@ class GCoverages:
     def flip_negative_regions(self):
         """Flip the coverage arrays which are on the negative strands. If the
         coverage arrays are calculated by the whole chromosomes, it won't
-        work.
+        work. The rows of self.matrix are flipped in place if it is set.
         """
+        if self.matrix is not None:
+            rows = [row for region, row in self._rows.items()
+                    if region.orientation == "-"]
+            self.matrix[rows] = self.matrix[rows, ::-1]
+            return
         for region, cov in self.coverage.items():
             if region.orientation == "-":
                 self.coverage[region] = cov[::-1]
@@ -1,5 +1,6 @@
 from genomkit import GCoverages
 from collections import OrderedDict
+from .store import CoverageStore, build_store, store_is_current
 
 
 class GCoveragesSet:
@@ -11,7 +12,8 @@ class GCoveragesSet:
     analyzing the interactions of many genomic coverages.
     """
 
-    def __init__(self, name: str = "", load_dict=None, windows=None):
+    def __init__(self, name: str = "", load_dict=None, windows=None,
+                 n_jobs: int = 1, store: str = None, bin_size: int = 1):
         """Initiate a GCoveragesSet object which can contain multiple
         GCoverages.
 
@@ -21,13 +23,37 @@ class GCoveragesSet:
                           dictionary with names as keys and values as file
                           paths, defaults to None
         :type load_dict: dict, optional
+        :param n_jobs: Number of processes reading every bigWig or BAM file,
+                       defaults to 1
+        :type n_jobs: int, optional
+        :param store: Path to a coverage store of the whole genome coverages
+                      of load_dict, which is built if it is missing or out of
+                      date. The files are then not loaded as GCoverages, so
+                      the collection stays empty and the coverages are read
+                      by query; windows cannot be given. Defaults to None
+        :type store: str, optional
+        :param bin_size: Size of the bins of the loaded GCoverages or of the
+                         store, defaults to 1
+        :type bin_size: int, optional
         """
         self.name = name
         self.collection = OrderedDict()
-        if load_dict:
+        self.store = None
+        if store:
+            if windows is not None:
+                raise ValueError("windows cannot be given with a store; "
+                                 "query the store by region instead.")
+            if load_dict and not store_is_current(store, load_dict,
+                                                  bin_size):
+                self.store = build_store(store, load_dict, bin_size=bin_size,
+                                         n_jobs=n_jobs)
+            else:
+                self.store = CoverageStore(store)
+        elif load_dict:
             for name, filename in load_dict.items():
                 self.add(name=name,
-                         gcov=GCoverages(windows=windows, load=filename))
+                         gcov=GCoverages(bin_size=bin_size, windows=windows,
+                                         load=filename, n_jobs=n_jobs))
 
     def add(self, name, gcov):
         """Add a GCoverages into GCoveragesSet.
@@ -70,6 +96,21 @@ class GCoveragesSet:
         """
         return list(self.collection.keys())
 
+    def query(self, region):
+        """Return the coverages of all samples of the store on the bins
+        overlapping a region, as a samples x bins view of the store without
+        copy. The rows follow self.store.samples.
+
+        :param region: A GRegion, a string such as "chr1:100-200" or "chr1",
+                       or a tuple (sequence, start, end)
+        :type region: GRegion, str or tuple
+        :return: Coverages with a row per sample
+        :rtype: numpy.memmap
+        """
+        if self.store is None:
+            raise ValueError("This GCoveragesSet has no coverage store.")
+        return self.store.query(region)
+
     def flip_negative_regions(self):
         """Flip the coverage arrays which are on the negative strands. If the
         coverage arrays are calculated by the whole chromosomes, it won't
@@ -0,0 +1,258 @@
+"""
+Run-length encoded coverages
+
+A coverage along a whole sequence is mostly made of long runs of the same
+value, such as zeros between the reads or the intervals of a bedGraph file.
+RLECoverage stores only the end and the value of every run, so that a
+genome-wide track takes memory in proportion to its number of runs rather
+than to the genome size. Sums, scaling and arithmetic between tracks work on
+the runs; dense arrays are only built for the windows which are requested.
+"""
+import numbers
+import numpy as np
+
+
+class RLECoverage:
+    """
+    RLECoverage module
+
+    This module contains a run-length encoded coverage of one sequence. The
+    run i covers the positions from ends[i - 1] (or 0) to ends[i] with the
+    value values[i]. Missing values are NaN.
+    """
+    def __init__(self, ends, values):
+        """Create a coverage from its runs; adjacent runs of the same value
+        are joined.
+
+        :param ends: Increasing ends of the runs
+        :type ends: numpy.ndarray
+        :param values: Value of every run
+        :type values: numpy.ndarray
+        """
+        ends = np.asarray(ends, dtype=np.int64)
+        values = np.asarray(values)
+        if len(ends) != len(values):
+            raise ValueError("ends and values should have the same length.")
+        if len(ends) > 1:
+            same = values[1:] == values[:-1]
+            if values.dtype.kind == "f":
+                same |= np.isnan(values[1:]) & np.isnan(values[:-1])
+            if same.any():
+                keep = np.append(~same, True)
+                ends = ends[keep]
+                values = values[keep]
+        self.ends = ends
+        self.values = values
+
+    @classmethod
+    def from_array(cls, array):
+        """Encode a dense array.
+
+        :param array: Values at every position
+        :type array: numpy.ndarray
+        :return: Coverage
+        :rtype: RLECoverage
+        """
+        array = np.asarray(array)
+        if len(array) == 0:
+            return cls([], array)
+        change = array[1:] != array[:-1]
+        if array.dtype.kind == "f":
+            change &= ~(np.isnan(array[1:]) & np.isnan(array[:-1]))
+        ends = np.append(np.flatnonzero(change) + 1, len(array))
+        return cls(ends, array[ends - 1])
+
+    @classmethod
+    def from_intervals(cls, starts, ends, values, length: int,
+                       fill=np.nan):
+        """Encode sorted and disjoint intervals with values, such as the
+        rows of a bedGraph file or the intervals of a bigWig file. The gaps
+        between them take the fill value.
+
+        :param starts: Starts of the intervals
+        :type starts: numpy.ndarray
+        :param ends: Ends of the intervals
+        :type ends: numpy.ndarray
+        :param values: Values of the intervals
+        :type values: numpy.ndarray
+        :param length: Length of the sequence
+        :type length: int
+        :param fill: Value of the gaps, defaults to NaN
+        :type fill: float, optional
+        :return: Coverage
+        :rtype: RLECoverage
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        values = np.asarray(values)
+        if len(starts) and np.any(starts[1:] < ends[:-1]):
+            raise ValueError("The intervals should be sorted and disjoint.")
+        # Every interval is preceded by a gap, which is empty if it follows
+        # the previous interval directly
+        run_ends = np.empty(2 * len(starts) + 1, dtype=np.int64)
+        run_ends[0:-1:2] = starts
+        run_ends[1:-1:2] = ends
+        run_ends[-1] = length
+        dtype = np.result_type(values.dtype, np.min_scalar_type(fill))
+        run_values = np.full(len(run_ends), fill, dtype=dtype)
+        run_values[1:-1:2] = values
+        lengths = np.diff(run_ends, prepend=0)
+        keep = lengths > 0
+        return cls(run_ends[keep], run_values[keep])
+
+    def __len__(self):
+        return int(self.ends[-1]) if len(self.ends) else 0
+
+    def __repr__(self):
+        return f"RLECoverage(length={len(self)}, runs={len(self.ends)})"
+
+    @property
+    def starts(self):
+        """Starts of the runs."""
+        return np.concatenate(([0], self.ends[:-1])).astype(np.int64)
+
+    @property
+    def lengths(self):
+        """Lengths of the runs."""
+        return np.diff(self.ends, prepend=0)
+
+    @property
+    def dtype(self):
+        """Type of the values."""
+        return self.values.dtype
+
+    def to_array(self, start: int = 0, end: int = None):
+        """Return the dense values of a window.
+
+        :param start: Start of the window, defaults to 0
+        :type start: int, optional
+        :param end: End of the window, defaults to the length
+        :type end: int, optional
+        :return: Values at every position of the window
+        :rtype: numpy.ndarray
+        """
+        end = len(self) if end is None else min(end, len(self))
+        start = max(start, 0)
+        if start >= end:
+            return np.empty(0, dtype=self.values.dtype)
+        first = np.searchsorted(self.ends, start, side="right")
+        last = np.searchsorted(self.ends, end, side="left")
+        run_ends = np.minimum(self.ends[first:last + 1], end)
+        lengths = np.diff(run_ends, prepend=start)
+        return np.repeat(self.values[first:last + 1], lengths)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step > 0:
+                return self.to_array(start, stop)[::step]
+            return self.to_array(stop + 1, start + 1)[::-1][::-step]
+        if isinstance(key, numbers.Integral):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError("index out of range")
+            return self.values[np.searchsorted(self.ends, key,
+                                               side="right")]
+        raise TypeError("RLECoverage indices should be integers or slices.")
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.to_array()
+        return array if dtype is None else array.astype(dtype)
+
+    def sum(self):
+        """Return the sum of the values over all positions.
+
+        :return: Sum
+        :rtype: float
+        """
+        return np.sum(self.values * self.lengths)
+
+    def nansum(self):
+        """Return the sum of the values over all positions, ignoring the
+        missing values.
+
+        :return: Sum
+        :rtype: float
+        """
+        return np.nansum(self.values * self.lengths)
+
+    def fillna(self, value=0):
+        """Return the coverage with the missing values replaced.
+
+        :param value: Value for the missing values, defaults to 0
+        :type value: float, optional
+        :return: Coverage
+        :rtype: RLECoverage
+        """
+        if self.values.dtype.kind != "f":
+            return self
+        return RLECoverage(self.ends, np.where(np.isnan(self.values), value,
+                                               self.values))
+
+    def binned(self, bin_size: int):
+        """Return the mean of every bin of bin_size positions, computed from
+        the runs; the last bin holds the remaining positions. Bins with a
+        missing value are missing.
+
+        :param bin_size: Number of positions per bin
+        :type bin_size: int
+        :return: Coverage of the bins
+        :rtype: RLECoverage
+        """
+        length = len(self)
+        if bin_size <= 1 or length == 0:
+            return self
+        bounds = np.append(np.arange(0, length, bin_size), length)
+        values = self.values.astype(np.float64)
+        missing = np.isnan(values)
+        sums = self._integral(bounds, np.where(missing, 0, values))
+        nans = self._integral(bounds, missing.astype(np.float64))
+        means = (np.diff(sums) / np.diff(bounds)).astype(np.float32)
+        means[np.diff(nans) > 0] = np.nan
+        return RLECoverage.from_array(means)
+
+    def _integral(self, positions, values):
+        # Sum of the values before every position
+        cumulative = np.concatenate(([0], np.cumsum(values * self.lengths)))
+        runs = np.searchsorted(self.ends, positions, side="right")
+        runs = np.minimum(runs, len(self.ends) - 1)
+        return cumulative[runs] + values[runs] * (positions -
+                                                  self.starts[runs])
+
+    def _apply(self, other, operation):
+        if isinstance(other, RLECoverage):
+            if len(other) != len(self):
+                raise ValueError("The coverages should have the same "
+                                 "length.")
+            ends = np.union1d(self.ends, other.ends)
+            return RLECoverage(ends, operation(
+                self.values[np.searchsorted(self.ends, ends)],
+                other.values[np.searchsorted(other.ends, ends)]))
+        if isinstance(other, numbers.Number):
+            return RLECoverage(self.ends, operation(self.values, other))
+        return NotImplemented
+
+    def __add__(self, other):
+        return self._apply(other, np.add)
+
+    def __radd__(self, other):
+        return self._apply(other, np.add)
+
+    def __sub__(self, other):
+        return self._apply(other, np.subtract)
+
+    def __rsub__(self, other):
+        return self._apply(other, lambda a, b: np.subtract(b, a))
+
+    def __mul__(self, other):
+        return self._apply(other, np.multiply)
+
+    def __rmul__(self, other):
+        return self._apply(other, np.multiply)
+
+    def __truediv__(self, other):
+        return self._apply(other, np.true_divide)
+
+    def __neg__(self):
+        return RLECoverage(self.ends, -self.values)
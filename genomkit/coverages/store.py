@@ -0,0 +1,265 @@
+"""
+On-disk coverage store
+
+A coverage store is a directory holding the binned coverages of many
+samples on the whole genome: one .npy file per sequence with a row per
+sample, and a meta.json with the samples, the sequences and the stamps of
+the source files. The files are memory-mapped when the store is opened, so
+that a query on a region returns a samples x bins view of the files without
+reading the other samples, sequences or positions, and the bigWig or BAM
+files are only parsed once when the store is built.
+"""
+import json
+import os
+import shutil
+import numpy as np
+import pyBigWig
+import pysam
+from genomkit import GRegion
+from ..regions.io import source_stamp
+from .gcoverages import GCoverages
+
+STORE_VERSION = 1
+# Number of bins written at once per sample and sequence
+STORE_CHUNK_SIZE = 1 << 22
+
+
+def is_store(path: str):
+    """Return whether the path is a directory written by build_store."""
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+
+def read_store_meta(path: str):
+    """Return the metadata of a coverage store or None if it is missing or
+    written by another format version."""
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != STORE_VERSION:
+        return None
+    return meta
+
+
+def sequence_lengths(filename: str):
+    """Return the lengths of the sequences of a bigWig file, or of the
+    sequences with mapped reads of an indexed BAM file, from its header.
+
+    :param filename: Path to the bigWig or BAM file
+    :type filename: str
+    :return: Lengths by sequence name
+    :rtype: dict
+    """
+    if filename.lower().endswith((".bw", ".bigwig")):
+        bw = pyBigWig.open(filename)
+        lengths = {chrom: int(length) for chrom, length
+                   in bw.chroms().items()}
+        bw.close()
+        return lengths
+    if filename.lower().endswith(".bam"):
+        with pysam.AlignmentFile(filename, "rb") as bam:
+            return {stats.contig: bam.get_reference_length(stats.contig)
+                    for stats in bam.get_index_statistics() if stats.mapped}
+    raise ValueError("Coverage stores are built from bigWig or BAM files.")
+
+
+def build_store(path: str, load_dict: dict, bin_size: int = 1,
+                dtype: str = "float32", n_jobs: int = 1):
+    """Build a coverage store from bigWig or BAM files. Every file is read
+    once as run-length encoded coverages, which are written into the rows of
+    the memory-mapped sequence files chunk by chunk, so that no dense
+    coverage of a whole sequence is held in memory. Positions without data
+    are NaN. The directory is written aside and moved into place, so that
+    readers never see a partial store. An existing store at path is
+    replaced, but any other existing file or directory is not.
+
+    :param path: Path to the store directory
+    :type path: str
+    :param load_dict: File paths by sample name
+    :type load_dict: dict
+    :param bin_size: Size of the bins, defaults to 1
+    :type bin_size: int, optional
+    :param dtype: Type of the stored values, defaults to "float32"
+    :type dtype: str, optional
+    :param n_jobs: Number of processes reading every file, defaults to 1
+    :type n_jobs: int, optional
+    :return: The opened store
+    :rtype: CoverageStore
+    """
+    if os.path.exists(path) and not is_store(path):
+        raise ValueError(f"'{path}' exists and is not a coverage store.")
+    bin_size = max(bin_size, 1)
+    lengths = {}
+    for filename in load_dict.values():
+        for sequence, length in sequence_lengths(filename).items():
+            lengths[sequence] = max(length, lengths.get(sequence, 0))
+    sequences = list(lengths)
+    index = {sequence: i for i, sequence in enumerate(sequences)}
+    fill = np.nan if np.dtype(dtype).kind == "f" else 0
+    tmp = path + ".tmp" + str(os.getpid())
+    os.makedirs(tmp)
+    try:
+        arrays = [np.lib.format.open_memmap(
+            os.path.join(tmp, str(i) + ".npy"), mode="w+", dtype=dtype,
+            shape=(len(load_dict), -(-lengths[sequence] // bin_size)))
+            for i, sequence in enumerate(sequences)]
+        for row, filename in enumerate(load_dict.values()):
+            cov = GCoverages(bin_size=bin_size, load=filename, rle=True,
+                             n_jobs=n_jobs)
+            written = dict.fromkeys(sequences, 0)
+            for region, values in cov.coverage.items():
+                array = arrays[index[region.sequence]]
+                for start in range(0, len(values), STORE_CHUNK_SIZE):
+                    end = min(start + STORE_CHUNK_SIZE, len(values))
+                    array[row, start:end] = values.to_array(start, end)
+                written[region.sequence] = len(values)
+            # Sequences missing or shorter in this file
+            for sequence, array in zip(sequences, arrays):
+                array[row, written[sequence]:] = fill
+        for array in arrays:
+            array.flush()
+        del arrays
+        meta = {"version": STORE_VERSION,
+                "bin_size": bin_size,
+                "dtype": dtype,
+                "samples": list(load_dict),
+                "sequences": sequences,
+                "lengths": [lengths[sequence] for sequence in sequences],
+                "sources": [{"filename": os.path.abspath(filename),
+                             **source_stamp(filename)}
+                            for filename in load_dict.values()]}
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        if os.path.exists(path):
+            if not is_store(path):
+                raise ValueError(f"'{path}' exists and is not a coverage "
+                                 "store.")
+            shutil.rmtree(path)
+        os.rename(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return CoverageStore(path)
+
+
+def store_is_current(path: str, load_dict: dict, bin_size: int = 1):
+    """Return whether a coverage store was built from the same files, still
+    unchanged, with the same samples and bin size.
+
+    :param path: Path to the store directory
+    :type path: str
+    :param load_dict: File paths by sample name
+    :type load_dict: dict
+    :param bin_size: Size of the bins, defaults to 1
+    :type bin_size: int, optional
+    :return: True if the store can be reused
+    :rtype: bool
+    """
+    meta = read_store_meta(path)
+    if meta is None or meta["bin_size"] != max(bin_size, 1) or \
+            meta["samples"] != list(load_dict):
+        return False
+    for source, filename in zip(meta["sources"], load_dict.values()):
+        if not os.path.exists(filename) or \
+                source["filename"] != os.path.abspath(filename) or \
+                {key: source[key] for key in ("size", "mtime_ns")} != \
+                source_stamp(filename):
+            return False
+    return True
+
+
+class CoverageStore:
+    """
+    CoverageStore module
+
+    This module contains a read-only collection of the binned coverages of
+    many samples on the whole genome, memory-mapped from a directory built
+    by build_store.
+    """
+    def __init__(self, path: str):
+        """Open a coverage store.
+
+        :param path: Path to the store directory
+        :type path: str
+        """
+        meta = read_store_meta(path)
+        if meta is None:
+            raise ValueError(f"'{path}' is not a coverage store.")
+        self.path = path
+        self.bin_size = meta["bin_size"]
+        self.samples = meta["samples"]
+        self.lengths = dict(zip(meta["sequences"], meta["lengths"]))
+        self._files = {sequence: os.path.join(path, str(i) + ".npy")
+                       for i, sequence in enumerate(meta["sequences"])}
+        self._arrays = {}
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __repr__(self):
+        return f"CoverageStore('{self.path}', {len(self)} samples)"
+
+    def get_sequences(self):
+        """Return the names of the sequences in the store.
+
+        :return: Sequence names
+        :rtype: list
+        """
+        return list(self.lengths)
+
+    def array(self, sequence: str):
+        """Return the memory-mapped samples x bins array of a sequence.
+
+        :param sequence: Sequence name such as chr1
+        :type sequence: str
+        :return: Coverages of all samples on the sequence
+        :rtype: numpy.memmap
+        """
+        if sequence not in self._files:
+            raise ValueError(f"The sequence '{sequence}' is not in the "
+                             "store.")
+        if sequence not in self._arrays:
+            self._arrays[sequence] = np.load(self._files[sequence],
+                                             mmap_mode="r")
+        return self._arrays[sequence]
+
+    def query(self, region):
+        """Return the coverages of all samples on the bins overlapping a
+        region, as a samples x bins view of the store without copy.
+
+        :param region: A GRegion, a string such as "chr1:100-200" or "chr1",
+                       or a tuple (sequence, start, end)
+        :type region: GRegion, str or tuple
+        :return: Coverages with a row per sample
+        :rtype: numpy.memmap
+        """
+        if isinstance(region, GRegion):
+            sequence, start, end = region.sequence, region.start, region.end
+        elif isinstance(region, str):
+            sequence, _, span = region.replace(",", "").partition(":")
+            if span:
+                start, _, end = span.partition("-")
+                start, end = int(start), int(end)
+            else:
+                start, end = 0, None
+        else:
+            sequence, start, end = region
+        array = self.array(sequence)
+        if end is None:
+            return array
+        return array[:, max(start, 0) // self.bin_size:
+                     -(-end // self.bin_size)]
+
+    def get_sample(self, sample: str, region):
+        """Return the coverage of one sample on the bins overlapping a
+        region.
+
+        :param sample: Sample name
+        :type sample: str
+        :param region: A region as for query
+        :type region: GRegion, str or tuple
+        :return: Coverage
+        :rtype: numpy.memmap
+        """
+        return self.query(region)[self.samples.index(sample)]
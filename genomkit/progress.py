@@ -0,0 +1,48 @@
+"""
+Progress reporting
+
+All the progress bars of GenomKit are created by progress(), a thin wrapper of
+tqdm. They can be switched off globally with set_progress(False) or by setting
+the environment variable GENOMKIT_PROGRESS=0. The bars refresh at most every
+MIN_INTERVAL seconds, so the bookkeeping per iteration stays negligible.
+"""
+import os
+from tqdm import tqdm
+
+# Minimal number of seconds between two refreshes of a progress bar
+MIN_INTERVAL = 0.5
+_enabled = os.environ.get("GENOMKIT_PROGRESS", "1").lower() not in \
+    ("0", "false", "no", "off")
+
+
+def set_progress(enabled: bool):
+    """Turn all the progress bars of GenomKit on or off.
+
+    :param enabled: Show progress bars
+    :type enabled: bool
+    """
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def progress_enabled():
+    """Return whether progress bars are shown.
+
+    :return: True if progress bars are shown
+    :rtype: bool
+    """
+    return _enabled
+
+
+def progress(iterable=None, **kwargs):
+    """Return a tqdm progress bar which respects the global switch. The
+    arguments are passed to tqdm.
+
+    :param iterable: Iterable to decorate, defaults to None
+    :type iterable: iterable, optional
+    :return: A tqdm object
+    :rtype: tqdm
+    """
+    kwargs.setdefault("disable", not _enabled)
+    kwargs.setdefault("mininterval", MIN_INTERVAL)
+    return tqdm(iterable, **kwargs)
@@ -8,5 +8,15 @@ operations.
 
 - **GRegion** is a single region.
 - **GRegions** is a collection of many GRegion objects.
+- **GRegionsArray** is a collection of regions stored in typed arrays.
+- **GRegionsTree** is a collection of regions indexed per sequence by an
+  IntervalIndex for fast overlap queries.
+- **IndexedGRegions** is a lazy collection of the regions in a large BED or
+  bedGraph file, queried through its tabix index.
 - **GRegionsSet** is a set of many GRegions which represent different genomic elements.
+- **external_sort** and **merge_sorted_files** sort BED files which are larger
+  than the memory.
+- **stream** intersects, merges, subtracts and finds the closest regions of
+  sorted BED files without loading them.
 """
+from .external import external_sort, merge_sorted_files  # noqa: F401
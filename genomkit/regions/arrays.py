@@ -0,0 +1,1034 @@
+"""
+Array kernels for genomic regions
+
+These functions work on plain NumPy arrays of sequence codes, starts and ends.
+They are shared by GRegions and GRegionsArray so that the set operations can
+be computed per chromosome on sorted coordinates instead of walking GRegion
+objects one by one.
+"""
+import re
+import numpy as np
+from .parallel import effective_jobs, map_sequences
+
+
+STRANDS = np.array([".", "+", "-"])
+STRAND_CODES = {".": 0, "+": 1, "-": 2}
+# Maximal number of candidate pairs evaluated at once in overlap_pairs
+PAIR_BLOCK_SIZE = 1 << 22
+# Chromosome orders which are recognised by name
+SEQUENCE_ORDERS = ("lexicographic", "natural")
+
+
+###########################################################################
+# Encoding
+###########################################################################
+def encode_strands(orientations):
+    """Return the int8 codes of the given orientations ("." for unknown).
+
+    :param orientations: Orientations such as "+", "-" or "."
+    :type orientations: iterable
+    :return: Strand codes
+    :rtype: numpy.ndarray
+    """
+    get = STRAND_CODES.get
+    return np.fromiter((get(o, 0) for o in orientations), dtype=np.int8)
+
+
+def encode_sequences(sequences, vocabulary=None):
+    """Return the int32 codes of the given sequence names together with the
+    vocabulary (code -> name). New names are appended to the vocabulary.
+
+    :param sequences: Sequence names such as chr1
+    :type sequences: iterable
+    :param vocabulary: Existing vocabulary to extend, defaults to None
+    :type vocabulary: list, optional
+    :return: Sequence codes and vocabulary
+    :rtype: tuple
+    """
+    vocabulary = [] if vocabulary is None else vocabulary
+    lookup = {seq: i for i, seq in enumerate(vocabulary)}
+
+    def code(seq):
+        c = lookup.get(seq)
+        if c is None:
+            c = lookup[seq] = len(vocabulary)
+            vocabulary.append(seq)
+        return c
+    codes = np.fromiter((code(s) for s in sequences), dtype=np.int32)
+    return codes, vocabulary
+
+
+def natural_key(sequence: str):
+    """Return a sorting key which orders the numbers within sequence names
+    by value, so that chr2 comes before chr10.
+
+    :param sequence: Sequence name such as chr10
+    :type sequence: str
+    :return: Sorting key
+    :rtype: tuple
+    """
+    return tuple((0, int(part), "") if part.isdigit() else (1, 0, part)
+                 for part in re.split(r"(\d+)", str(sequence)) if part)
+
+
+def sequence_ranks(vocabulary, order=None):
+    """Return the rank of every entry of the vocabulary in a chromosome
+    order. The default lexicographic order is the one used by GRegion
+    comparisons; "natural" sorts the numbers by value (chr1, chr2, ...,
+    chr10) and a list gives a custom order, in which the sequences not
+    listed come last in lexicographic order.
+
+    :param vocabulary: Sequence names indexed by code
+    :type vocabulary: list
+    :param order: "lexicographic", "natural" or a list of sequence names,
+                  defaults to "lexicographic"
+    :type order: str or list, optional
+    :return: Rank per code
+    :rtype: numpy.ndarray
+    """
+    names = np.array(vocabulary, dtype=str)
+    if order is None or order == "lexicographic":
+        indices = np.argsort(names, kind="stable")
+    elif order == "natural":
+        indices = sorted(range(len(names)),
+                         key=lambda i: natural_key(names[i]))
+    elif isinstance(order, str):
+        raise ValueError("order should be lexicographic, natural or a list "
+                         "of sequence names")
+    else:
+        lookup = {seq: i for i, seq in enumerate(order)}
+        listed = np.array([lookup.get(seq, len(lookup)) for seq in names],
+                          dtype=np.int64)
+        indices = np.lexsort((names, listed))
+    ranks = np.empty(len(vocabulary), dtype=np.int32)
+    ranks[indices] = np.arange(len(vocabulary), dtype=np.int32)
+    return ranks
+
+
+def sequence_key(order=None):
+    """Return a function giving the sorting key of a sequence name in a
+    chromosome order, for the code which compares regions one by one. The
+    keys sort like sequence_ranks.
+
+    :param order: "lexicographic", "natural" or a list of sequence names,
+                  defaults to "lexicographic"
+    :type order: str or list, optional
+    :return: Key function
+    :rtype: function
+    """
+    if order is None or order == "lexicographic":
+        return str
+    elif order == "natural":
+        cache = {}
+
+        def key(seq):
+            res = cache.get(seq)
+            if res is None:
+                res = cache[seq] = natural_key(seq)
+            return res
+        return key
+    elif isinstance(order, str):
+        raise ValueError("order should be lexicographic, natural or a list "
+                         "of sequence names")
+    lookup = {seq: i for i, seq in enumerate(order)}
+
+    def key(seq):
+        return lookup.get(seq, len(lookup)), seq
+    return key
+
+
+class SortCheck:
+    """Incremental check of the order of regions which arrive in chunks,
+    such as the chunks of a BED file. The regions are sorted if every
+    sequence forms one block sorted by start and end; the order of the
+    blocks tells the chromosome order.
+    """
+    def __init__(self):
+        self.in_order = True
+        self.blocks = []
+        self.last = None
+
+    def update(self, codes, starts, ends, vocabulary):
+        """Add the next chunk of regions.
+
+        :param codes: Sequence codes
+        :type codes: numpy.ndarray
+        :param starts: Start positions
+        :type starts: numpy.ndarray
+        :param ends: End positions
+        :type ends: numpy.ndarray
+        :param vocabulary: Sequence names indexed by code
+        :type vocabulary: list
+        """
+        if len(codes) == 0 or not self.in_order:
+            return
+        new_block = codes[1:] != codes[:-1]
+        back = (starts[1:] < starts[:-1]) | \
+            ((starts[1:] == starts[:-1]) & (ends[1:] < ends[:-1]))
+        if (back & ~new_block).any():
+            self.in_order = False
+            return
+        firsts = np.concatenate(([0], np.flatnonzero(new_block) + 1))
+        blocks = [vocabulary[c] for c in codes[firsts].tolist()]
+        if self.last is not None and self.last[0] == blocks[0]:
+            if self.last[1:] > (int(starts[0]), int(ends[0])):
+                self.in_order = False
+                return
+            blocks = blocks[1:]
+        self.blocks.extend(blocks)
+        self.last = (vocabulary[codes[-1]], int(starts[-1]), int(ends[-1]))
+
+    def result(self, orders=SEQUENCE_ORDERS):
+        """Return whether the regions are sorted and the first of the given
+        chromosome orders followed by the blocks, or None if the regions
+        are only sorted per sequence.
+
+        :param orders: Chromosome orders to test, see sequence_ranks,
+                       defaults to SEQUENCE_ORDERS
+        :type orders: tuple, optional
+        :return: Sortedness and chromosome order
+        :rtype: tuple
+        """
+        if not self.in_order or len(set(self.blocks)) < len(self.blocks):
+            return False, None
+        for order in orders:
+            if (np.diff(sequence_ranks(self.blocks, order)) > 0).all():
+                return True, order
+        return True, None
+
+
+def sort_state(codes, starts, ends, vocabulary, orders=SEQUENCE_ORDERS):
+    """Return whether the regions are sorted and their chromosome order, as
+    SortCheck.result.
+
+    :param codes: Sequence codes
+    :type codes: numpy.ndarray
+    :param starts: Start positions
+    :type starts: numpy.ndarray
+    :param ends: End positions
+    :type ends: numpy.ndarray
+    :param vocabulary: Sequence names indexed by code
+    :type vocabulary: list
+    :param orders: Chromosome orders to test, defaults to SEQUENCE_ORDERS
+    :type orders: tuple, optional
+    :return: Sortedness and chromosome order
+    :rtype: tuple
+    """
+    check = SortCheck()
+    check.update(codes, starts, ends, vocabulary)
+    return check.result(orders)
+
+
+def object_array(values):
+    """Return a one-dimensional object array holding the given values, even
+    if the values are sequences of equal length.
+
+    :param values: Values such as lists of extra BED columns
+    :type values: iterable
+    :return: Object array
+    :rtype: numpy.ndarray
+    """
+    values = list(values)
+    res = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        res[i] = value
+    return res
+
+
+def regions_to_arrays(regions, vocabulary=None):
+    """Extract the sequence codes, starts and ends of GRegion objects.
+
+    :param regions: GRegion objects
+    :type regions: iterable
+    :param vocabulary: Existing vocabulary to extend, defaults to None
+    :type vocabulary: list, optional
+    :return: Codes, starts, ends and vocabulary
+    :rtype: tuple
+    """
+    regions = list(regions)
+    codes, vocabulary = encode_sequences((r.sequence for r in regions),
+                                         vocabulary)
+    starts = np.fromiter((r.start for r in regions), dtype=np.int64,
+                         count=len(regions))
+    ends = np.fromiter((r.end for r in regions), dtype=np.int64,
+                       count=len(regions))
+    return codes, starts, ends, vocabulary
+
+
+###########################################################################
+# Sorting and grouping
+###########################################################################
+def sort_order(codes, starts, ends, ranks=None, keys=()):
+    """Return the indices which sort the regions by sequence, start and end.
+    Additional keys are compared after the end.
+
+    :param codes: Sequence codes
+    :type codes: numpy.ndarray
+    :param starts: Start positions
+    :type starts: numpy.ndarray
+    :param ends: End positions
+    :type ends: numpy.ndarray
+    :param ranks: Order of the sequence codes, defaults to the codes
+    :type ranks: numpy.ndarray, optional
+    :param keys: Further sorting keys, defaults to ()
+    :type keys: tuple, optional
+    :return: Sorting indices
+    :rtype: numpy.ndarray
+    """
+    seq_key = codes if ranks is None else ranks[codes]
+    return np.lexsort(tuple(reversed(keys)) + (ends, starts, seq_key))
+
+
+def group_bounds(keys):
+    """Return the boundaries of the runs of equal values in sorted keys.
+
+    :param keys: Sorted keys
+    :type keys: numpy.ndarray
+    :return: Start indices of the runs followed by len(keys)
+    :rtype: numpy.ndarray
+    """
+    if len(keys) == 0:
+        return np.zeros(1, dtype=np.int64)
+    breaks = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    return np.concatenate(([0], breaks, [len(keys)]))
+
+
+def sequence_slices(codes, order):
+    """Return a dictionary mapping each sequence code to the indices of its
+    regions in sorted order.
+
+    :param codes: Sequence codes
+    :type codes: numpy.ndarray
+    :param order: Sorting indices grouping the regions by sequence
+    :type order: numpy.ndarray
+    :return: Code -> indices
+    :rtype: dict
+    """
+    sorted_codes = codes[order]
+    bounds = group_bounds(sorted_codes)
+    return {int(sorted_codes[lo]): order[lo:hi]
+            for lo, hi in zip(bounds[:-1], bounds[1:])}
+
+
+def duplicated(*columns):
+    """Return a mask of the rows which repeat the previous row in all the
+    given (sorted) columns.
+
+    :return: Boolean mask
+    :rtype: numpy.ndarray
+    """
+    n = len(columns[0])
+    mask = np.zeros(n, dtype=bool)
+    if n > 1:
+        same = np.ones(n - 1, dtype=bool)
+        for col in columns:
+            same &= col[1:] == col[:-1]
+        mask[1:] = same
+    return mask
+
+
+###########################################################################
+# Interval kernels (one sequence, sorted by start)
+###########################################################################
+def merge_intervals(starts, ends, distance: int = 0):
+    """Cluster the intervals sorted by start. A new cluster begins whenever
+    an interval starts at or after the furthest end seen so far plus the
+    distance.
+
+    :param starts: Sorted start positions
+    :type starts: numpy.ndarray
+    :param ends: End positions
+    :type ends: numpy.ndarray
+    :param distance: Maximal gap for joining intervals, defaults to 0
+    :type distance: int, optional
+    :return: Merged starts, merged ends and the first index of each cluster
+    :rtype: tuple
+    """
+    if len(starts) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    reach = np.maximum.accumulate(ends)
+    breaks = np.flatnonzero(starts[1:] - distance >= reach[:-1]) + 1
+    firsts = np.concatenate(([0], breaks))
+    return starts[firsts], np.maximum.reduceat(ends, firsts), firsts
+
+
+def candidate_pairs(lo, hi):
+    """Yield the pairs (query, target) for the candidate target ranges
+    [lo, hi) of every query, in blocks of at most PAIR_BLOCK_SIZE pairs.
+
+    :param lo: First candidate target per query
+    :type lo: numpy.ndarray
+    :param hi: End of the candidate targets per query
+    :type hi: numpy.ndarray
+    :return: Generator of query indices and target indices
+    :rtype: generator
+    """
+    counts = np.maximum(hi - lo, 0)
+    cum = np.cumsum(counts)
+    first = 0
+    while first < len(counts):
+        # Cut the queries into blocks of bounded candidate numbers
+        base = cum[first] - counts[first]
+        last = int(np.searchsorted(cum, base + PAIR_BLOCK_SIZE,
+                                   side="right"))
+        last = max(last, first + 1)
+        block = counts[first:last]
+        qi = np.repeat(np.arange(first, last), block)
+        ti = np.repeat(lo[first:last] - (cum[first:last] - block - base),
+                       block) + np.arange(block.sum())
+        yield qi, ti
+        first = last
+
+
+def start_reach(starts, ends):
+    """Return the running maximum of the ends of intervals sorted by start.
+    Zero-length intervals reach one base for the start comparison.
+
+    :param starts: Sorted start positions
+    :type starts: numpy.ndarray
+    :param ends: End positions
+    :type ends: numpy.ndarray
+    :return: Furthest reach up to every interval
+    :rtype: numpy.ndarray
+    """
+    if len(starts) == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.maximum.accumulate(np.maximum(ends, starts + 1))
+
+
+def overlap_pairs(q_starts, q_ends, t_starts, t_ends, reach=None):
+    """Return all the pairs (query, target) which overlap according to
+    GRegion.overlap. The targets must be sorted by start; the queries can be
+    in any order.
+
+    :param q_starts: Query start positions
+    :type q_starts: numpy.ndarray
+    :param q_ends: Query end positions
+    :type q_ends: numpy.ndarray
+    :param t_starts: Target start positions (sorted)
+    :type t_starts: numpy.ndarray
+    :param t_ends: Target end positions
+    :type t_ends: numpy.ndarray
+    :param reach: Precomputed start_reach of the targets, defaults to None
+    :type reach: numpy.ndarray, optional
+    :return: Query indices and target indices
+    :rtype: tuple
+    """
+    if len(q_starts) == 0 or len(t_starts) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    # A target cannot overlap a query starting at or after its furthest
+    # reach.
+    if reach is None:
+        reach = start_reach(t_starts, t_ends)
+    lo = np.searchsorted(reach, q_starts, side="right")
+    hi = np.searchsorted(t_starts, q_ends, side="left")
+    res_q, res_t = [np.empty(0, dtype=np.int64)], [np.empty(0,
+                                                            dtype=np.int64)]
+    for qi, ti in candidate_pairs(lo, hi):
+        ts, te = t_starts[ti], t_ends[ti]
+        qs, qe = q_starts[qi], q_ends[qi]
+        keep = ((ts >= qs) & (ts < qe)) | ((ts < qs) & (te > qs))
+        res_q.append(qi[keep])
+        res_t.append(ti[keep])
+    return np.concatenate(res_q), np.concatenate(res_t)
+
+
+def envelop_pairs(q_starts, q_ends, t_starts, t_ends):
+    """Return all the pairs (query, target) where the target overlaps the
+    query and lies completely within it. The targets must be sorted by start.
+
+    :param q_starts: Query start positions
+    :type q_starts: numpy.ndarray
+    :param q_ends: Query end positions
+    :type q_ends: numpy.ndarray
+    :param t_starts: Target start positions (sorted)
+    :type t_starts: numpy.ndarray
+    :param t_ends: Target end positions
+    :type t_ends: numpy.ndarray
+    :return: Query indices and target indices
+    :rtype: tuple
+    """
+    if len(q_starts) == 0 or len(t_starts) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    lo = np.searchsorted(t_starts, q_starts, side="left")
+    hi = np.searchsorted(t_starts, q_ends, side="left")
+    res_q, res_t = [np.empty(0, dtype=np.int64)], [np.empty(0,
+                                                            dtype=np.int64)]
+    for qi, ti in candidate_pairs(lo, hi):
+        keep = t_ends[ti] <= q_ends[qi]
+        res_q.append(qi[keep])
+        res_t.append(ti[keep])
+    return np.concatenate(res_q), np.concatenate(res_t)
+
+
+def subtract_intervals(starts, ends, m_starts, m_ends):
+    """Remove the mask intervals from the intervals and return the
+    remaining pieces. The mask must be sorted and disjoint, for example the
+    output of merge_intervals. Zero-length intervals remain unless their
+    position lies within the mask.
+
+    :param starts: Start positions
+    :type starts: numpy.ndarray
+    :param ends: End positions
+    :type ends: numpy.ndarray
+    :param m_starts: Mask start positions (sorted, disjoint)
+    :type m_starts: numpy.ndarray
+    :param m_ends: Mask end positions
+    :type m_ends: numpy.ndarray
+    :return: Source index, start and end of every remaining piece
+    :rtype: tuple
+    """
+    # Every interval yields one gap before, between and after the mask
+    # intervals it touches; empty gaps are dropped.
+    lo = np.searchsorted(m_ends, starts, side="right")
+    hi = np.maximum(np.searchsorted(m_starts, ends, side="left"), lo)
+    counts = hi - lo + 1
+    src = np.repeat(np.arange(len(starts)), counts)
+    j = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                            counts)
+    k = lo[src] + j
+    first, last = j == 0, j == counts[src] - 1
+    m_e = m_ends[np.minimum(k, len(m_ends)) - 1] if len(m_ends) else k
+    m_s = m_starts[np.minimum(k, len(m_starts) - 1)] if len(m_starts) else k
+    p_starts = np.where(first, starts[src], np.maximum(m_e, starts[src]))
+    p_ends = np.where(last, ends[src], np.minimum(m_s, ends[src]))
+    keep = p_ends > p_starts
+    if len(m_starts):
+        covered = (lo < len(m_starts)) & \
+            (m_starts[np.minimum(lo, len(m_starts) - 1)] <= starts)
+    else:
+        covered = np.zeros(len(starts), dtype=bool)
+    keep |= first & ((starts == ends) & ~covered)[src]
+    return src[keep], p_starts[keep], p_ends[keep]
+
+
+def match_intervals(starts, ends, m_starts, m_ends):
+    """Return a mask of the intervals with exactly the start and end of a
+    mask interval. The mask must be sorted by start and end.
+
+    :param starts: Start positions
+    :type starts: numpy.ndarray
+    :param ends: End positions
+    :type ends: numpy.ndarray
+    :param m_starts: Mask start positions (sorted)
+    :type m_starts: numpy.ndarray
+    :param m_ends: Mask end positions
+    :type m_ends: numpy.ndarray
+    :return: True for the matching intervals
+    :rtype: numpy.ndarray
+    """
+    if len(m_starts) == 0 or len(starts) == 0:
+        return np.zeros(len(starts), dtype=bool)
+    span = int(max(m_ends.max(), ends.max())) + 1
+    if span > (np.iinfo(np.int64).max - span) // span:
+        loci = set(zip(m_starts.tolist(), m_ends.tolist()))
+        return np.fromiter(((s, e) in loci for s, e in
+                            zip(starts.tolist(), ends.tolist())),
+                           dtype=bool, count=len(starts))
+    # The mask is sorted by start and end, so are the packed loci
+    loci = m_starts * span + m_ends
+    keys = starts * span + ends
+    pos = np.minimum(np.searchsorted(loci, keys), len(loci) - 1)
+    return loci[pos] == keys
+
+
+def complement_intervals(lengths, codes, starts, ends):
+    """Return the gaps left by the regions on sequences of the given
+    lengths. The regions do not need to be sorted and may exceed the
+    sequence ends.
+
+    :param lengths: Sequence lengths; the codes follow their order
+    :type lengths: numpy.ndarray
+    :param codes: Sequence codes of the regions, below len(lengths)
+    :type codes: numpy.ndarray
+    :param starts: Start positions
+    :type starts: numpy.ndarray
+    :param ends: End positions
+    :type ends: numpy.ndarray
+    :return: Sequence codes, starts and ends of the gaps
+    :rtype: tuple
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    seq_codes = np.arange(len(lengths), dtype=np.int64)
+    if len(codes) == 0:
+        keep = lengths > 0
+        return seq_codes[keep], np.zeros(keep.sum(), dtype=np.int64), \
+            lengths[keep]
+    # Shift the sequences apart to cut all of them in one call
+    span = int(max(lengths.max(), ends.max())) + 1
+    codes, starts = codes.astype(np.int64), np.maximum(starts, 0)
+    order = np.lexsort((starts, codes))
+    m_starts, m_ends, _ = merge_intervals(
+        codes[order] * span + starts[order],
+        codes[order] * span + np.maximum(ends[order], starts[order]))
+    src, g_starts, g_ends = subtract_intervals(
+        seq_codes * span, seq_codes * span + lengths, m_starts, m_ends)
+    return src, g_starts - src * span, g_ends - src * span
+
+
+def _overlap_task(arrays, q_lo, q_hi, t_lo, t_hi):
+    qi, ti = overlap_pairs(arrays["q_starts"][q_lo:q_hi],
+                           arrays["q_ends"][q_lo:q_hi],
+                           arrays["t_starts"][t_lo:t_hi],
+                           arrays["t_ends"][t_lo:t_hi])
+    return qi + q_lo, ti + t_lo
+
+
+def overlap_indices(q_codes, q_starts, q_ends, t_codes, t_starts, t_ends,
+                    n_jobs: int = 1, q_sorted: bool = False,
+                    t_sorted: bool = False):
+    """Return the indices of all pairs of overlapping regions between the
+    queries and the targets, computed per sequence code. Neither side needs
+    to be sorted and neither side is modified; a side which is known to be
+    sorted (every sequence in one block sorted by start) is not sorted
+    again.
+
+    :param q_codes: Query sequence codes
+    :type q_codes: numpy.ndarray
+    :param q_starts: Query start positions
+    :type q_starts: numpy.ndarray
+    :param q_ends: Query end positions
+    :type q_ends: numpy.ndarray
+    :param t_codes: Target sequence codes in the same vocabulary
+    :type t_codes: numpy.ndarray
+    :param t_starts: Target start positions
+    :type t_starts: numpy.ndarray
+    :param t_ends: Target end positions
+    :type t_ends: numpy.ndarray
+    :param n_jobs: Number of processes sharing the sequences, defaults to 1
+    :type n_jobs: int, optional
+    :param q_sorted: The queries are sorted, defaults to False
+    :type q_sorted: bool, optional
+    :param t_sorted: The targets are sorted, defaults to False
+    :type t_sorted: bool, optional
+    :return: Query indices and target indices
+    :rtype: tuple
+    """
+    if q_sorted:
+        q_order = np.arange(len(q_codes))
+    else:
+        q_order = np.argsort(q_codes, kind="stable")
+    if t_sorted:
+        t_order = np.arange(len(t_codes))
+    else:
+        t_order = np.lexsort((t_starts, t_codes))
+    q_sorted, t_sorted = q_codes[q_order], t_codes[t_order]
+    q_bounds, t_bounds = group_bounds(q_sorted), group_bounds(t_sorted)
+    t_groups = {int(t_sorted[lo]): (lo, hi)
+                for lo, hi in zip(t_bounds[:-1], t_bounds[1:])}
+    tasks = []
+    for lo, hi in zip(q_bounds[:-1].tolist(), q_bounds[1:].tolist()):
+        t_bound = t_groups.get(int(q_sorted[lo]))
+        if t_bound is not None:
+            tasks.append((lo, hi) + t_bound)
+    results = map_sequences(_overlap_task,
+                            {"q_starts": q_starts[q_order],
+                             "q_ends": q_ends[q_order],
+                             "t_starts": t_starts[t_order],
+                             "t_ends": t_ends[t_order]},
+                            tasks, n_jobs)
+    empty = np.empty(0, dtype=np.int64)
+    qi = np.concatenate([empty] + [r[0] for r in results])
+    ti = np.concatenate([empty] + [r[1] for r in results])
+    return q_order[qi], t_order[ti]
+
+
+def closest_pairs(q_starts, q_ends, t_starts, t_ends, k: int = 1):
+    """Return the candidate pairs (query, target) for the k nearest targets
+    of every query: all the overlapping targets and the k nearest targets on
+    each side. The targets must be sorted by start.
+
+    The distances follow bedtools closest: 0 for overlapping regions,
+    otherwise the gap plus one, negative if the target lies before the query
+    on the sequence.
+
+    :param q_starts: Query start positions
+    :type q_starts: numpy.ndarray
+    :param q_ends: Query end positions
+    :type q_ends: numpy.ndarray
+    :param t_starts: Target start positions (sorted)
+    :type t_starts: numpy.ndarray
+    :param t_ends: Target end positions
+    :type t_ends: numpy.ndarray
+    :param k: Number of targets per side, defaults to 1
+    :type k: int, optional
+    :return: Query indices, target indices and distances
+    :rtype: tuple
+    """
+    if len(q_starts) == 0 or len(t_starts) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    # The pairs are returned before, overlapping and after the queries,
+    # with the targets in sorted order for equal distances.
+    steps = np.arange(k)
+    # The nearest targets before a query have the largest ends up to its
+    # start; equal ends are ordered backwards so that the walk down from
+    # the start meets them in sorted order.
+    m = len(t_starts)
+    end_order = m - 1 - np.argsort(t_ends[::-1], kind="stable")
+    last = np.searchsorted(t_ends[end_order], q_starts, side="right")
+    # Empty targets at the start of a query are overlaps or after it; the
+    # walk takes one more step for each of them, so that they do not hide
+    # the k nearest targets before it
+    empty = np.sort(t_starts[t_starts == t_ends])
+    skip = np.searchsorted(empty, q_starts, side="right") - \
+        np.searchsorted(empty, q_starts, side="left")
+    before = last[:, None] - 1 - np.arange(k + skip.max(initial=0))
+    qi, step = np.nonzero(before >= 0)
+    ti = end_order[before[qi, step]]
+    keep = t_starts[ti] < q_starts[qi]
+    qi, ti = qi[keep], ti[keep]
+    res_q, res_t = [qi], [ti]
+    res_d = [t_ends[ti] - q_starts[qi] - 1]
+    qi, ti = overlap_pairs(q_starts, q_ends, t_starts, t_ends)
+    res_q.append(qi)
+    res_t.append(ti)
+    res_d.append(np.zeros(len(qi), dtype=np.int64))
+    # The nearest targets after a query have the smallest starts from its
+    # end on.
+    first = np.searchsorted(t_starts, q_ends, side="left")
+    after = first[:, None] + steps
+    qi, step = np.nonzero(after < m)
+    ti = after[qi, step]
+    res_q.append(qi)
+    res_t.append(ti)
+    res_d.append(t_starts[ti] - q_ends[qi] + 1)
+    return np.concatenate(res_q), np.concatenate(res_t), \
+        np.concatenate(res_d)
+
+
+def _closest_task(arrays, q_lo, q_hi, t_lo, t_hi, k, ignore_overlaps,
+                  upstream_only):
+    qi, ti, dist = closest_pairs(arrays["q_starts"][q_lo:q_hi],
+                                 arrays["q_ends"][q_lo:q_hi],
+                                 arrays["t_starts"][t_lo:t_hi],
+                                 arrays["t_ends"][t_lo:t_hi], k)
+    dist = np.where(arrays["reverse"][q_lo:q_hi][qi], -dist, dist)
+    keep = np.ones(len(dist), dtype=bool)
+    if ignore_overlaps:
+        keep &= dist != 0
+    if upstream_only:
+        keep &= dist <= 0
+    qi, ti, dist = qi[keep], ti[keep], dist[keep]
+    # Keep the k nearest per query. The candidates come in a few runs
+    # sorted by query, so a stable sort on one packed key is fast and keeps
+    # the targets of equal distances in sorted order.
+    size = np.abs(dist).max(initial=0) + 1
+    if (q_hi - q_lo) < np.iinfo(np.int64).max // size:
+        order = np.argsort(qi * size + np.abs(dist), kind="stable")
+    else:
+        order = np.lexsort((ti, np.abs(dist), qi))
+    qi, ti, dist = qi[order], ti[order], dist[order]
+    bounds = group_bounds(qi)
+    rank = np.arange(len(qi)) - np.repeat(bounds[:-1], np.diff(bounds))
+    keep = rank < k
+    return qi[keep] + q_lo, ti[keep] + t_lo, dist[keep]
+
+
+def closest_indices(q_codes, q_starts, q_ends, t_codes, t_starts, t_ends,
+                    k: int = 1, reverse=None, ignore_overlaps: bool = False,
+                    upstream_only: bool = False, n_jobs: int = 1):
+    """Return the k nearest targets of every query on the same sequence code
+    with their signed distances, like bedtools closest -k -D a. Neither side
+    needs to be sorted and neither side is modified.
+
+    A negative distance means that the target is upstream of the query,
+    which is after the query on the sequence if the query is reversed. Ties
+    are broken by the positions of the targets. Queries without any target
+    on their sequence code are not reported.
+
+    :param q_codes: Query sequence codes
+    :type q_codes: numpy.ndarray
+    :param q_starts: Query start positions
+    :type q_starts: numpy.ndarray
+    :param q_ends: Query end positions
+    :type q_ends: numpy.ndarray
+    :param t_codes: Target sequence codes in the same vocabulary
+    :type t_codes: numpy.ndarray
+    :param t_starts: Target start positions
+    :type t_starts: numpy.ndarray
+    :param t_ends: Target end positions
+    :type t_ends: numpy.ndarray
+    :param k: Number of nearest targets per query, defaults to 1
+    :type k: int, optional
+    :param reverse: Mask of the queries on the "-" strand, defaults to None
+    :type reverse: numpy.ndarray, optional
+    :param ignore_overlaps: Skip the overlapping targets, defaults to False
+    :type ignore_overlaps: bool, optional
+    :param upstream_only: Only report overlapping and upstream targets,
+                          defaults to False
+    :type upstream_only: bool, optional
+    :param n_jobs: Number of processes sharing the sequences, defaults to 1
+    :type n_jobs: int, optional
+    :return: Query indices, target indices and distances, sorted by query
+             and distance
+    :rtype: tuple
+    """
+    if reverse is None:
+        reverse = np.zeros(len(q_codes), dtype=bool)
+    q_order = np.argsort(q_codes, kind="stable")
+    t_order = np.lexsort((t_ends, t_starts, t_codes))
+    q_sorted, t_sorted = q_codes[q_order], t_codes[t_order]
+    q_bounds, t_bounds = group_bounds(q_sorted), group_bounds(t_sorted)
+    t_groups = {int(t_sorted[lo]): (lo, hi)
+                for lo, hi in zip(t_bounds[:-1], t_bounds[1:])}
+    tasks = []
+    for lo, hi in zip(q_bounds[:-1].tolist(), q_bounds[1:].tolist()):
+        t_bound = t_groups.get(int(q_sorted[lo]))
+        if t_bound is not None:
+            tasks.append((lo, hi) + t_bound +
+                         (k, ignore_overlaps, upstream_only))
+    results = map_sequences(_closest_task,
+                            {"q_starts": q_starts[q_order],
+                             "q_ends": q_ends[q_order],
+                             "reverse": reverse[q_order],
+                             "t_starts": t_starts[t_order],
+                             "t_ends": t_ends[t_order]},
+                            tasks, n_jobs)
+    empty = np.empty(0, dtype=np.int64)
+    qi = q_order[np.concatenate([empty] + [r[0] for r in results])]
+    ti = t_order[np.concatenate([empty] + [r[1] for r in results])]
+    dist = np.concatenate([empty] + [r[2] for r in results])
+    # Back to the order of the queries, keeping the order per query
+    order = np.argsort(qi, kind="stable")
+    return qi[order], ti[order], dist[order]
+
+
+def unique_order(codes, starts, ends, strands, ranks=None):
+    """Return the indices which sort the regions like GRegion comparisons and
+    drop the regions repeating sequence, start, end and orientation.
+
+    :param codes: Sequence codes
+    :type codes: numpy.ndarray
+    :param starts: Start positions
+    :type starts: numpy.ndarray
+    :param ends: End positions
+    :type ends: numpy.ndarray
+    :param strands: Strand codes
+    :type strands: numpy.ndarray
+    :param ranks: Order of the sequence codes, defaults to the codes
+    :type ranks: numpy.ndarray, optional
+    :return: Sorting indices of the unique regions
+    :rtype: numpy.ndarray
+    """
+    order = sort_order(codes, starts, ends, ranks, keys=(strands,))
+    keep = ~duplicated(codes[order], starts[order], ends[order],
+                       strands[order])
+    return order[keep]
+
+
+def _merge_task(arrays, lo, hi, nkeys, distance, presorted):
+    keys = [arrays["key" + str(i)][lo:hi] for i in range(1, nkeys)]
+    return merge_groups(arrays["starts"][lo:hi], arrays["ends"][lo:hi], keys,
+                        distance, presorted=presorted)
+
+
+def merge_groups(starts, ends, keys, distance: int = 0, n_jobs: int = 1,
+                 presorted: bool = False):
+    """Merge the intervals within the groups defined by the keys (for example
+    sequence codes, strands and names). Intervals which are already grouped
+    by the keys and sorted by start and end within every group are merged
+    in one pass without sorting.
+
+    :param starts: Start positions
+    :type starts: numpy.ndarray
+    :param ends: End positions
+    :type ends: numpy.ndarray
+    :param keys: Grouping keys, the first one is the primary key
+    :type keys: list
+    :param distance: Maximal gap for joining intervals, defaults to 0
+    :type distance: int, optional
+    :param n_jobs: Number of processes sharing the groups of the primary
+                   key, defaults to 1
+    :type n_jobs: int, optional
+    :param presorted: The intervals are grouped and sorted, defaults to
+                      False
+    :type presorted: bool, optional
+    :return: Sorting indices, first sorted index of every merged region and
+             the merged ends
+    :rtype: tuple
+    """
+    if len(starts) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    if effective_jobs(n_jobs) > 1 and len(keys) > 0:
+        # Merge every group of the primary key separately
+        if presorted:
+            primary = np.arange(len(starts))
+        else:
+            primary = np.argsort(keys[0], kind="stable")
+        bounds = group_bounds(keys[0][primary])
+        arrays = {"starts": starts[primary], "ends": ends[primary]}
+        for i, key in enumerate(keys):
+            arrays["key" + str(i)] = key[primary]
+        tasks = [(lo, hi, len(keys), distance, presorted)
+                 for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+        results = map_sequences(_merge_task, arrays, tasks, n_jobs)
+        order = np.concatenate([primary[task[0] + r[0]] for task, r
+                                in zip(tasks, results)])
+        firsts = np.concatenate([task[0] + r[1] for task, r
+                                 in zip(tasks, results)])
+        return order, firsts, np.concatenate([r[2] for r in results])
+    if presorted:
+        order = np.arange(len(starts))
+    else:
+        order = np.lexsort((ends, starts) + tuple(reversed(keys)))
+    s, e = starts[order], ends[order]
+    new_group = np.zeros(len(order), dtype=bool)
+    for key in keys:
+        k = key[order]
+        new_group[1:] |= k[1:] != k[:-1]
+    # Shift every group beyond the previous one so that a single sweep
+    # never joins intervals of different groups.
+    base = min(int(s.min()), int(e.min()))
+    span = max(int(s.max()), int(e.max())) - base + distance + 1
+    offset = np.cumsum(new_group) * span - base
+    _, _, firsts = merge_intervals(s + offset, e + offset, distance)
+    return order, firsts, np.maximum.reduceat(e, firsts)
+
+
+###########################################################################
+# Binning
+###########################################################################
+def tile_sequences(lengths, size: int, step: int = None):
+    """Return fixed windows tiling sequences of the given lengths. As in
+    bedtools makewindows, a window starts every step bp and the last windows
+    of a sequence are cut at its end.
+
+    :param lengths: Sequence lengths; the codes follow their order
+    :type lengths: array-like
+    :param size: Window size
+    :type size: int
+    :param step: Distance between the window starts, defaults to size
+    :type step: int, optional
+    :return: Sequence codes, starts and ends of the windows
+    :rtype: tuple
+    """
+    step = size if step is None else step
+    if size <= 0 or step <= 0:
+        raise ValueError("size and step should be positive")
+    lengths = np.asarray(lengths, dtype=np.int64)
+    counts = -(-lengths // step)
+    codes = np.repeat(np.arange(len(lengths), dtype=np.int32), counts)
+    firsts = np.cumsum(counts) - counts
+    starts = (np.arange(counts.sum(), dtype=np.int64) - firsts[codes]) * step
+    return codes, starts, np.minimum(starts + size, lengths[codes])
+
+
+def bin_pairs(w_codes, w_starts, w_ends, codes, starts, ends,
+              center: bool = False):
+    """Return the pairs (region, window) of every region with the windows
+    it overlaps. Tilings, whose starts and ends both increase with the
+    sequence code, are digitised with two binary searches over all the
+    sequences; other windows fall back to overlap_indices.
+
+    :param w_codes: Window sequence codes
+    :type w_codes: numpy.ndarray
+    :param w_starts: Window start positions
+    :type w_starts: numpy.ndarray
+    :param w_ends: Window end positions
+    :type w_ends: numpy.ndarray
+    :param codes: Region sequence codes in the same vocabulary
+    :type codes: numpy.ndarray
+    :param starts: Region start positions
+    :type starts: numpy.ndarray
+    :param ends: Region end positions
+    :type ends: numpy.ndarray
+    :param center: Only pair every region with the windows containing its
+                   midpoint, defaults to False
+    :type center: bool, optional
+    :return: Region indices and window indices
+    :rtype: tuple
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if len(w_starts) == 0 or len(starts) == 0:
+        return empty, empty
+    if center:
+        starts = starts + (ends - starts) // 2
+        ends = starts + 1
+    else:
+        ends = np.maximum(ends, starts + 1)
+    # Lay the sequences one after another on a flat coordinate
+    span = max(int(w_ends.max()), int(ends.max())) + 1
+    w_base = w_codes.astype(np.int64) * span
+    w_lo, w_hi = w_base + w_starts, w_base + w_ends
+    order = None
+    if np.any(w_lo[1:] < w_lo[:-1]):
+        order = np.argsort(w_lo, kind="stable")
+        w_lo, w_hi = w_lo[order], w_hi[order]
+    if np.any(w_hi[1:] < w_hi[:-1]):
+        return overlap_indices(codes, starts, ends, w_codes, w_starts, w_ends)
+    # Binary searches are much faster for sorted needles
+    base = codes.astype(np.int64) * span
+    q_lo = base + starts
+    q_order = np.argsort(q_lo, kind="stable")
+    lo = np.searchsorted(w_hi, q_lo[q_order], side="right")
+    hi = np.searchsorted(w_lo, (base + ends)[q_order], side="left")
+    counts = np.maximum(hi - lo, 0)
+    ri = np.repeat(q_order, counts)
+    wi = np.repeat(lo - (np.cumsum(counts) - counts), counts) + \
+        np.arange(counts.sum())
+    return ri, (wi if order is None else order[wi])
+
+
+###########################################################################
+# Partitioning
+###########################################################################
+def partition_intervals(codes, starts, ends, labels=None,
+                        n_labels: int = 0):
+    """Cut the sequences at every start and end of the intervals and return
+    the covered segments with the number of intervals covering them, and
+    optionally their labels, as bedtools multiinter. The intervals of one
+    label must be disjoint, for example merged by merge_groups.
+
+    :param codes: Sequence codes
+    :type codes: numpy.ndarray
+    :param starts: Start positions
+    :type starts: numpy.ndarray
+    :param ends: End positions
+    :type ends: numpy.ndarray
+    :param labels: Label of every interval, below n_labels, defaults to None
+    :type labels: numpy.ndarray, optional
+    :param n_labels: Number of labels, defaults to 0
+    :type n_labels: int, optional
+    :return: Sequence codes, starts and ends of the segments, the offsets of
+             their labels (as CSR indptr) and, if labels are given, the
+             sorted labels of every segment
+    :rtype: tuple
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if len(starts) == 0:
+        return empty, empty, empty, np.zeros(1, dtype=np.int64), \
+            (None if labels is None else empty)
+    # Lay the sequences one after another on a flat coordinate
+    span = int(ends.max()) + 1
+    base = codes.astype(np.int64) * span
+    flat_starts, flat_ends = base + starts, base + ends
+    # Rank the starts and ends among the distinct cut points
+    cuts = np.concatenate((flat_starts, flat_ends))
+    order = np.argsort(cuts)
+    cuts = cuts[order]
+    new = np.concatenate(([True], cuts[1:] != cuts[:-1]))
+    points = cuts[new]
+    ranks = np.empty(len(cuts), dtype=np.int64)
+    ranks[order] = np.cumsum(new) - 1
+    lo, hi = ranks[:len(starts)], ranks[len(starts):]
+    # Depth of every elementary segment in one sweep
+    depth = np.cumsum(np.bincount(lo, minlength=len(points)) -
+                      np.bincount(hi, minlength=len(points)))[:-1]
+    covered = np.flatnonzero(depth > 0)
+    indptr = np.concatenate(([0], np.cumsum(depth[covered])))
+    seg_codes = points[covered] // span
+    res = (seg_codes, points[covered] - seg_codes * span,
+           points[covered + 1] - seg_codes * span, indptr)
+    if labels is None:
+        return res + (None,)
+    # Pair every interval with the segments it covers
+    counts = hi - lo
+    segments = np.repeat(lo - (np.cumsum(counts) - counts), counts) + \
+        np.arange(counts.sum())
+    keys = np.sort(segments * n_labels + np.repeat(labels, counts))
+    return res + (keys % n_labels,)
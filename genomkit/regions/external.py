@@ -0,0 +1,211 @@
+"""
+External sorting of BED files
+
+BED files which do not fit in memory are sorted in runs: chunks of lines are
+read up to a memory limit, sorted with a lexsort on their coordinates and
+spilled to temporary files, which are then merged with a k-way heap merge.
+The lines are never parsed into GRegion objects and are written unchanged.
+Files ending with .gz are read and written gzipped.
+
+The order is the one of GRegion comparisons (sequence, start, end), or any
+chromosome order accepted by GRegions.sort, and regions which compare equal
+keep their input order. The output can therefore be loaded as a sorted
+GRegions or streamed into the sorted fast paths.
+"""
+import heapq
+import os
+import shutil
+import tempfile
+import numpy as np
+from ..progress import progress
+from .arrays import encode_sequences, sequence_key, sequence_ranks
+from .io import HEADER_PREFIXES, open_text
+
+# Default memory budget of external_sort
+MEMORY_LIMIT = 1 << 30
+# Bytes of memory used per byte of text while sorting a chunk of lines
+MEMORY_FACTOR = 4
+# Maximal number of files merged at once
+MERGE_FAN_IN = 64
+
+
+def parse_memory(memory):
+    """Return a number of bytes from an integer or a string such as "512M"
+    or "2G".
+
+    :param memory: Number of bytes or size with a K, M or G suffix
+    :type memory: int or str
+    :return: Number of bytes
+    :rtype: int
+    """
+    if isinstance(memory, str):
+        units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+        memory = memory.strip().upper().rstrip("B")
+        if memory and memory[-1] in units:
+            return int(float(memory[:-1]) * units[memory[-1]])
+        return int(memory)
+    return int(memory)
+
+
+def line_key(order="lexicographic"):
+    """Return a function giving the sorting key of a BED line.
+
+    :param order: Chromosome order, see GRegions.sort, defaults to
+                  "lexicographic"
+    :type order: str or list, optional
+    :return: Key function
+    :rtype: function
+    """
+    seq_key = sequence_key(order)
+
+    def key(line):
+        fields = line.split(None, 3)
+        return seq_key(fields[0]), int(fields[1]), int(fields[2])
+    return key
+
+
+def sort_lines(lines, order="lexicographic"):
+    """Return BED lines sorted by sequence, start and end.
+
+    :param lines: BED lines
+    :type lines: list
+    :param order: Chromosome order, see GRegions.sort, defaults to
+                  "lexicographic"
+    :type order: str or list, optional
+    :return: Sorted lines
+    :rtype: list
+    """
+    fields = [line.split(None, 3) for line in lines]
+    codes, vocabulary = encode_sequences(f[0] for f in fields)
+    starts = np.fromiter((int(f[1]) for f in fields), dtype=np.int64,
+                         count=len(fields))
+    ends = np.fromiter((int(f[2]) for f in fields), dtype=np.int64,
+                       count=len(fields))
+    ranks = sequence_ranks(vocabulary, order)
+    indices = np.lexsort((ends, starts, ranks[codes]))
+    return [lines[i] for i in indices.tolist()]
+
+
+def _read_lines(file, hint, headers):
+    # Return the next chunk of region lines; headers are collected apart
+    lines = []
+    for line in file.readlines(hint):
+        if not line.strip():
+            continue
+        if line.startswith(HEADER_PREFIXES):
+            headers.append(line)
+            continue
+        lines.append(line if line.endswith("\n") else line + "\n")
+    return lines
+
+
+def _merge_into(filenames, output, key, headers=(), check=False):
+    """Merge sorted BED files into the output file."""
+    files = [open_text(f) for f in filenames]
+    try:
+        def lines(file, filename):
+            previous = None
+            for line in file:
+                if not line.strip() or line.startswith(HEADER_PREFIXES):
+                    continue
+                if not line.endswith("\n"):
+                    line += "\n"
+                if check:
+                    current = key(line)
+                    if previous is not None and current < previous:
+                        raise ValueError(f"'{filename}' is not sorted.")
+                    previous = current
+                yield line
+        with open_text(output, "w") as out:
+            out.writelines(headers)
+            out.writelines(heapq.merge(*[lines(f, name) for f, name
+                                         in zip(files, filenames)], key=key))
+    finally:
+        for f in files:
+            f.close()
+
+
+def _merge_runs(runs, output, key, tmp, headers=()):
+    """Merge the runs in passes of at most MERGE_FAN_IN files."""
+    level = 0
+    while len(runs) > MERGE_FAN_IN:
+        merged = []
+        for i in range(0, len(runs), MERGE_FAN_IN):
+            name = os.path.join(tmp, "merge" + str(level) + "_" +
+                                str(len(merged)) + ".bed")
+            _merge_into(runs[i:i + MERGE_FAN_IN], name, key)
+            for run in runs[i:i + MERGE_FAN_IN]:
+                os.remove(run)
+            merged.append(name)
+        runs = merged
+        level += 1
+    _merge_into(runs, output, key, headers)
+
+
+def external_sort(input: str, output: str, memory_limit=MEMORY_LIMIT,
+                  order="lexicographic", tmp_dir: str = None):
+    """Sort a BED file which may be larger than the memory. Chunks of lines
+    within the memory limit are sorted and spilled to temporary files, which
+    are merged into the output. Header lines (#, track, browser) are written
+    first.
+
+    :param input: Path to the BED file, optionally gzipped
+    :type input: str
+    :param output: Path to the sorted BED file, gzipped if it ends with .gz
+    :type output: str
+    :param memory_limit: Memory budget in bytes or as "512M", "2G",
+                         defaults to MEMORY_LIMIT (1 GB)
+    :type memory_limit: int or str, optional
+    :param order: Chromosome order, see GRegions.sort, defaults to
+                  "lexicographic"
+    :type order: str or list, optional
+    :param tmp_dir: Directory of the temporary files, defaults to the
+                    system temporary directory
+    :type tmp_dir: str, optional
+    """
+    key = line_key(order)
+    hint = max(1, parse_memory(memory_limit) // MEMORY_FACTOR)
+    headers, runs = [], []
+    tmp = tempfile.mkdtemp(prefix="genomkit_sort_", dir=tmp_dir)
+    try:
+        with open_text(input) as file, \
+                progress(desc=os.path.basename(input),
+                         unit=" lines") as bar:
+            while True:
+                lines = _read_lines(file, hint, headers)
+                if not lines:
+                    break
+                lines = sort_lines(lines, order)
+                run = os.path.join(tmp, "run" + str(len(runs)) + ".bed")
+                with open(run, "w") as f:
+                    f.writelines(lines)
+                runs.append(run)
+                bar.update(len(lines))
+                del lines
+        if len(runs) == 1:
+            with open(runs[0]) as f, open_text(output, "w") as out:
+                out.writelines(headers)
+                shutil.copyfileobj(f, out)
+        else:
+            _merge_runs(runs, output, key, tmp, headers)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def merge_sorted_files(inputs, output: str, order="lexicographic",
+                       check: bool = True):
+    """Merge sorted BED files into one sorted BED file in a single
+    streaming pass. The header lines of the inputs are dropped.
+
+    :param inputs: Paths to the sorted BED files, optionally gzipped
+    :type inputs: list
+    :param output: Path to the merged BED file, gzipped if it ends with .gz
+    :type output: str
+    :param order: Chromosome order of the inputs, see GRegions.sort,
+                  defaults to "lexicographic"
+    :type order: str or list, optional
+    :param check: Raise a ValueError if an input is not sorted, defaults to
+                  True
+    :type check: bool, optional
+    """
+    _merge_into(list(inputs), output, line_key(order), check=check)
@@ -6,8 +6,8 @@ class GRegion:
     region. It provides utilities for handling and analyzing a single genomic
     coordinate.
     """
-    __slot__ = ["sequence", "start", "end", "orientation", "name", "score",
-                "data"]
+    __slots__ = ["sequence", "start", "end", "orientation", "name", "score",
+                 "data"]
 
     def __init__(self, sequence: str, start: int, end: int,
                  orientation: str = ".",
@@ -1,12 +1,21 @@
+import copy
 import random
 from genomkit import GRegion
-import copy
 import numpy as np
-from .io import load_BED
+from .io import load_BED, is_binary, load_binary, load_BED_cached, \
+    save_binary, write_BED, BED_CHUNK_SIZE
+from .arrays import STRAND_CODES, encode_strands, encode_sequences, \
+    regions_to_arrays, sequence_ranks, sort_order, \
+    unique_order, merge_groups, overlap_indices, closest_indices, \
+    tile_sequences, bin_pairs, complement_intervals, sort_state, \
+    SEQUENCE_ORDERS
+from .interval_index import RegionMask
+from .shuffle import genome_space, draw_positions, genome_positions, \
+    union_of, overlap_statistic, permutation_statistics
+from .util import get_genome
 import os
 import sys
-from copy import deepcopy
-from tqdm import tqdm
+from ..progress import progress
 
 
 ###########################################################################
@@ -20,7 +29,7 @@ class GRegions:
     genomic regions. It provides utilities for handling and analyzing the
     interactions of many genomic coordinates.
     """
-    def __init__(self, name: str = "", load: str = ""):
+    def __init__(self, name: str = "", load: str = "", cache=False):
         """Create an empty GRegions object. If a path to a BED file is defined
         in "load", all the regions will be loaded.
 
@@ -28,12 +37,16 @@ class GRegions:
         :type name: str, optional
         :param load: Path to a BED file, defaults to ""
         :type load: str, optional
+        :param cache: Cache the loaded BED file in binary format, see
+                      load(), defaults to False
+        :type cache: bool or str, optional
         """
         self.elements = []
         self.sorted = False
+        self.sequence_order = "lexicographic"
         self.name = name
         if load:
-            self.load(load)
+            self.load(load, cache=cache)
 
     def __len__(self):
         """Return the number of regions in this GRegions.
@@ -55,44 +68,161 @@ class GRegions:
         :param region: A GRegion
         :type region: GRegion
         """
+        if self.sorted:
+            # Appending keeps the order only within the last sequence
+            last = self.elements[-1] if self.elements else None
+            self.sorted = last is not None and \
+                last.sequence == region.sequence and \
+                (last.start, last.end) <= (region.start, region.end)
         self.elements.append(region)
-        self.sorted = False
 
-    def load(self, filename: str):
-        """Load a BED file into the GRegions.
+    def load(self, filename: str, cache=False):
+        """Load a BED file, or a directory written by save_binary, into the
+        GRegions.
 
-        :param filename: Path to the BED file
+        :param filename: Path to the BED file or the binary directory
         :type filename: str
+        :param cache: Load the BED file through a binary cache which is
+                      rebuilt when the file changes. True keeps the cache
+                      next to the file, a path keeps it in that directory,
+                      defaults to False
+        :type cache: bool or str, optional
         """
-        regions = load_BED(filename=filename)
+        if is_binary(filename):
+            regions = load_binary(filename).to_GRegions()
+        elif cache:
+            regions = load_BED_cached(
+                filename, cache_dir=None if cache is True else cache
+            ).to_GRegions()
+        else:
+            regions = load_BED(filename=filename)
         self.elements = regions.elements
-        self.sorted = False
+        self.sorted = regions.sorted
+        self.sequence_order = regions.sequence_order
+
+    def save_binary(self, path: str):
+        """Save the regions in the binary columnar format, which load() reads
+        back without parsing text.
 
-    def write(self, filename: str, data: bool = False):
-        """Write a BED file.
+        :param path: Path to the output directory
+        :type path: str
+        """
+        from genomkit import GRegionsArray
+        save_binary(GRegionsArray.from_GRegions(self), path)
+
+    @classmethod
+    def iter_chunks(cls, filename: str, chunk_size: int = BED_CHUNK_SIZE):
+        """Iterate over a BED file (optionally gzipped) in GRegions of at most
+        chunk_size regions, without loading the whole file. Every chunk
+        supports the usual operations, for example::
+
+            for chunk in GRegions.iter_chunks("fragments.bed.gz"):
+                chunk.filter_by_score(larger_than=10, inplace=True)
+                chunk.write("filtered.bed", append=True)
+
+        :param filename: Path to the BED file
+        :type filename: str
+        :param chunk_size: Number of regions per chunk, defaults to
+                           BED_CHUNK_SIZE
+        :type chunk_size: int, optional
+        :return: Generator of GRegions
+        :rtype: generator
+        """
+        return load_BED(filename=filename, stream=True, chunk_size=chunk_size)
+
+    @staticmethod
+    def query_file(filename: str, region, build_index: bool = True):
+        """Return the regions of a BED or bedGraph file overlapping the given
+        windows, read through a tabix index instead of loading the file. The
+        index is built on first use, see IndexedGRegions; for many queries
+        on the same file, keep an IndexedGRegions open instead.
+
+        :param filename: Path to the BED or bedGraph file
+        :type filename: str
+        :param region: A GRegion, a string such as "chr1:100-200", a tuple
+                       (sequence, start, end) or a GRegions of windows
+        :type region: GRegion, str, tuple or GRegions
+        :param build_index: Build the missing index, defaults to True
+        :type build_index: bool, optional
+        :return: Overlapping regions
+        :rtype: GRegions
+        """
+        from .gregions_indexed import IndexedGRegions
+        with IndexedGRegions(filename, build_index=build_index) as indexed:
+            return indexed.query(region)
+
+    def write(self, filename: str, data: bool = False, append: bool = False,
+              compression="infer", n_jobs: int = 1):
+        """Write a BED file. The lines are formatted and written in large
+        blocks; files ending with .gz are compressed with bgzip.
 
         :param filename: Path to the BED file
         :type filename: str
         :param data: Export extra data or not, defaults to False
         :type data: bool
+        :param append: Append to the file instead of overwriting it, for
+                       example when writing chunks, defaults to False
+        :type append: bool
+        :param compression: "infer", "gzip", "bgzip" or None, defaults to
+                            "infer"
+        :type compression: str, optional
+        :param n_jobs: Number of compression threads, defaults to 1
+        :type n_jobs: int, optional
         """
-        with open(filename, "w") as f:
-            for region in self.elements:
-                print(region.bed_entry(data=data), file=f)
+        write_BED(self.elements, filename, data=data, append=append,
+                  compression=compression, n_jobs=n_jobs)
 
-    def sort(self, key=None, reverse: bool = False):
+    def sort(self, key=None, reverse: bool = False,
+             order="lexicographic"):
         """Sort elements by criteria defined by a GenomicRegion.
 
+        Without key, the regions are sorted by sequence, start and end with a
+        lexsort on their columns, and nothing is done if they are already
+        sorted in the chromosome order. The attributes sorted and
+        sequence_order record the result.
+
         :param key: Given the key for comparison.
         :type key: str
         :param reverse: Reverse the sorting result.
         :type reverse: bool
+        :param order: Chromosome order: "lexicographic" as GRegion
+                      comparisons, "natural" (chr2 before chr10) or a list
+                      of sequence names, defaults to "lexicographic"
+        :type order: str or list, optional
         """
         if key:
             self.elements.sort(key=key, reverse=reverse)
+            self.sorted = False
+            return
+        if self.sorted and not reverse and self.sequence_order == order:
+            return
+        codes, starts, ends, vocabulary = regions_to_arrays(self)
+        ranks = sequence_ranks(vocabulary, order)[codes]
+        if reverse:
+            indices = np.lexsort((-ends, -starts, -ranks))
         else:
-            self.elements.sort()
-            self.sorted = True
+            indices = np.lexsort((ends, starts, ranks))
+        self.elements = [self.elements[i] for i in indices.tolist()]
+        self.sorted = not reverse
+        self.sequence_order = order
+
+    def check_sorted(self, order=None):
+        """Check the order of the regions in one pass and update the
+        attributes sorted and sequence_order. Regions whose sequences form
+        blocks sorted by start and end are sorted; sequence_order is None
+        if the blocks follow no known chromosome order.
+
+        :param order: Chromosome order to test, see sort(), defaults to
+                      "lexicographic" then "natural"
+        :type order: str or list, optional
+        :return: Whether the regions are sorted
+        :rtype: bool
+        """
+        codes, starts, ends, vocabulary = regions_to_arrays(self)
+        self.sorted, self.sequence_order = sort_state(
+            codes, starts, ends, vocabulary,
+            SEQUENCE_ORDERS if order is None else (order,))
+        return self.sorted
 
     def get_sequences(self, unique: bool = False):
         """Return all chromosomes.
@@ -122,7 +252,7 @@ class GRegions:
         return names
 
     def extend(self, upstream: int = 0, downstream: int = 0,
-               strandness: bool = False, inplace: bool = True):
+               strandness: bool = False, inplace: bool = True, genome=None):
         """Perform extend step for every element. The extension length can also
         be negative values which shrinkages the regions.
 
@@ -137,6 +267,9 @@ class GRegions:
         :param inplace: Define whether this operation will be applied on the
                         same object (True) or return a new object.
         :type inplace: bool
+        :param genome: Clip the regions to the chromosome ends of this genome,
+                       see clip(), defaults to None
+        :type genome: str or dict, optional
         :return: None or a GRegions object
         """
         if inplace:
@@ -145,6 +278,9 @@ class GRegions:
                               downstream=downstream,
                               strandness=strandness,
                               inplace=True)
+            self.sorted = False
+            if genome is not None:
+                self.clip(genome)
         else:
             output = GRegions(name=self.name)
             for region in self.elements:
@@ -153,10 +289,13 @@ class GRegions:
                                   strandness=strandness,
                                   inplace=False)
                 output.add(r)
+            if genome is not None:
+                output.clip(genome)
             return output
 
     def extend_fold(self, upstream: float = 0.0, downstream: float = 0.0,
-                    strandness: bool = False, inplace: bool = True):
+                    strandness: bool = False, inplace: bool = True,
+                    genome=None):
         """Perform extend step for every element. The extension length can also
         be negative values which shrinkages the regions.
 
@@ -171,6 +310,9 @@ class GRegions:
         :param inplace: Define whether this operation will be applied on the
                         same object (True) or return a new object.
         :type inplace: bool
+        :param genome: Clip the regions to the chromosome ends of this genome,
+                       see clip(), defaults to None
+        :type genome: str or dict, optional
         :return: None
         """
         if inplace:
@@ -179,6 +321,9 @@ class GRegions:
                                    downstream=downstream,
                                    strandness=strandness,
                                    inplace=True)
+            self.sorted = False
+            if genome is not None:
+                self.clip(genome)
         else:
             output = GRegions(name=self.name)
             for region in self.elements:
@@ -187,6 +332,8 @@ class GRegions:
                                        strandness=strandness,
                                        inplace=False)
                 output.add(r)
+            if genome is not None:
+                output.clip(genome)
             return output
 
     def load_chrom_size_file(self, file_path):
@@ -208,8 +355,65 @@ class GRegions:
         else:
             print(organism + " chromosome size file does not exist")
 
+    @staticmethod
+    def make_windows(genome, size: int, step: int = None, name: str = ""):
+        """Return fixed windows tiling the genome as a GRegionsArray, so that
+        no GRegion object is created per window. As in bedtools
+        makewindows, a window starts every step bp and the last windows of
+        a chromosome are cut at its end.
+
+        :param genome: Name of an organism such as hg38, path to a
+                       chrom.sizes file or a dictionary of chromosome sizes
+        :type genome: str or dict
+        :param size: Window size
+        :type size: int
+        :param step: Distance between the window starts, defaults to size
+        :type step: int, optional
+        :param name: Name of the windows, defaults to "windows_<size>"
+        :type name: str, optional
+        :return: Windows in the chromosome order of the genome
+        :rtype: GRegionsArray
+        """
+        from genomkit import GRegionsArray
+        sizes = get_genome(genome)
+        codes, starts, ends = tile_sequences(list(sizes.values()), size,
+                                             step)
+        res = GRegionsArray.from_arrays(
+            codes, starts, ends, sequence_names=list(sizes),
+            name=name if name else "windows_" + str(size))
+        res.sorted = True
+        res.sequence_order = list(sizes)
+        return res
+
+    def bin_counts(self, windows, center: bool = False, score: bool = False):
+        """Return the number of regions overlapping every window.
+
+        :param windows: Windows such as the output of make_windows
+        :type windows: GRegionsArray or GRegions
+        :param center: Only count the regions in the windows containing
+                       their midpoints, defaults to False
+        :type center: bool, optional
+        :param score: Sum the scores of the regions instead of counting
+                      them, defaults to False
+        :type score: bool, optional
+        :return: Count (or score) per window
+        :rtype: numpy.ndarray
+        """
+        from genomkit import GRegionsArray
+        if not isinstance(windows, GRegionsArray):
+            windows = GRegionsArray.from_GRegions(windows)
+        codes, starts, ends, _ = regions_to_arrays(
+            self, list(windows.sequence_names))
+        ri, wi = bin_pairs(windows.sequences, windows.starts, windows.ends,
+                           codes, starts, ends, center=center)
+        if not score:
+            return np.bincount(wi, minlength=len(windows))
+        scores = np.fromiter((r.score for r in self), dtype=np.float64,
+                             count=len(self))
+        return np.bincount(wi, weights=scores[ri], minlength=len(windows))
+
     def resize(self, extend_upstream: int, extend_downstream: int,
-               center="mid_point", inplace=True):
+               center="mid_point", inplace=True, genome=None):
         """Resize the regions according to the defined center and
         extension.
 
@@ -223,6 +427,9 @@ class GRegions:
         :param inplace: Define whether this operation will be applied on the
                         same object (True) or return a new object.
         :type inplace: bool
+        :param genome: Clip the regions to the chromosome ends of this genome,
+                       see clip(), defaults to None
+        :type genome: str or dict, optional
         :return: A resized GRegion
         :rtype: GRegion
         """
@@ -231,14 +438,92 @@ class GRegions:
             res.add(region.resize(extend_upstream=extend_upstream,
                                   extend_downstream=extend_downstream,
                                   center=center))
+        if genome is not None:
+            res.clip(genome)
         if inplace:
             self.elements = res.elements
             self.sorted = False
         else:
             return res
 
+    def clip(self, genome, inplace: bool = True):
+        """Clip the regions to the chromosome ends of the genome. Regions
+        starting at or after the end of their chromosome are removed, and
+        regions on sequences which are not in the genome are kept unchanged.
+
+        :param genome: Name of an organism such as hg38, path to a
+                       chrom.sizes file or a dictionary of chromosome sizes
+        :type genome: str or dict
+        :param inplace: Define whether this operation will be applied on the
+                        same object (True) or return a new object.
+        :type inplace: bool
+        :return: None or a GRegions object
+        """
+        sizes = get_genome(genome)
+        codes, starts, ends, vocabulary = regions_to_arrays(self)
+        lengths = np.array([sizes.get(seq, -1) for seq in vocabulary] + [-1],
+                           dtype=np.int64)[codes]
+        known = lengths >= 0
+        new_starts = np.maximum(starts, 0)
+        new_ends = np.maximum(np.where(known, np.minimum(ends, lengths),
+                                       ends), new_starts)
+        keep = ~known | (new_starts < lengths)
+        changed = np.flatnonzero(keep & ((new_starts != starts) |
+                                         (new_ends != ends))).tolist()
+        elements = self.elements
+        if inplace:
+            for i in changed:
+                elements[i].start = int(new_starts[i])
+                elements[i].end = int(new_ends[i])
+        else:
+            elements = list(elements)
+            for i in changed:
+                r = elements[i]
+                elements[i] = GRegion(sequence=r.sequence,
+                                      start=int(new_starts[i]),
+                                      end=int(new_ends[i]),
+                                      orientation=r.orientation, name=r.name,
+                                      score=r.score, data=r.data)
+        if not keep.all():
+            elements = [elements[i] for i in np.flatnonzero(keep).tolist()]
+        if inplace:
+            self.elements = elements
+        else:
+            res = GRegions(name=self.name)
+            res.elements = elements
+            res.sorted = self.sorted
+            res.sequence_order = self.sequence_order
+            return res
+
+    def complement(self, genome, name: str = ""):
+        """Return the gaps of the genome which are not covered by any region,
+        such as the intergenic space of a set of genes. Regions on sequences
+        which are not in the genome are ignored.
+
+        :param genome: Name of an organism such as hg38, path to a
+                       chrom.sizes file or a dictionary of chromosome sizes
+        :type genome: str or dict
+        :param name: Name of the result, defaults to self.name+"_complement"
+        :type name: str, optional
+        :return: Gaps in the chromosome order of the genome
+        :rtype: GRegions
+        """
+        sizes = get_genome(genome)
+        codes, starts, ends, vocabulary = regions_to_arrays(self,
+                                                            list(sizes))
+        known = codes < len(sizes)
+        codes, starts, ends = complement_intervals(
+            list(sizes.values()), codes[known], starts[known], ends[known])
+        res = GRegions(name=name if name else self.name + "_complement")
+        res.elements = [GRegion(sequence=vocabulary[c], start=s, end=e)
+                        for c, s, e in zip(codes.tolist(), starts.tolist(),
+                                           ends.tolist())]
+        res.sorted = True
+        res.sequence_order = list(sizes)
+        return res
+
     def intersect(self, target, mode: str = "OVERLAP",
-                  rm_duplicates: bool = False):
+                  rm_duplicates: bool = False, n_jobs: int = 1):
         """Return a GRegions for the intersections between the two given
         GRegions objects. There are three modes for overlapping:
 
@@ -277,6 +562,11 @@ class GRegions:
                 target              ----------      ---------------       ----
                 Result                                ------
 
+        The overlaps are found per chromosome on sorted start/end arrays, so
+        neither input needs to be sorted and neither is copied or modified.
+        The result holds new GRegion objects, so that changing them leaves
+        self unchanged.
+
         :param target: A target GRegions for finding overlaps.
         :type target: GRegions
         :param mode: The mode should be one of the followings: "OVERLAP",
@@ -284,238 +574,133 @@ class GRegions:
         :type mode: str
         :param rm_duplicates: Define whether remove the duplicates.
         :type rm_duplicates: bool
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
         :return: A GRegions.
         :rtype: GRegions
         """
         new_regions = GRegions(self.name)
         if len(self) == 0 or len(target) == 0:
             return new_regions
+        codes, starts, ends, vocabulary = regions_to_arrays(self)
+        t_codes, t_starts, t_ends, vocabulary = regions_to_arrays(target,
+                                                                  vocabulary)
+        qi, ti = overlap_indices(codes, starts, ends,
+                                 t_codes, t_starts, t_ends, n_jobs=n_jobs,
+                                 q_sorted=self.sorted,
+                                 t_sorted=getattr(target, "sorted", False))
+        if mode == "OVERLAP":
+            starts = np.maximum(starts[qi], t_starts[ti])
+            ends = np.minimum(ends[qi], t_ends[ti])
+            codes = codes[qi]
+        elif mode == "ORIGINAL":
+            qi = np.unique(qi)
+            codes, starts, ends = codes[qi], starts[qi], ends[qi]
+        elif mode == "COMP_INCL":
+            inside = (starts[qi] >= t_starts[ti]) & (ends[qi] <= t_ends[ti])
+            qi = np.unique(qi[inside])
+            codes, starts, ends = codes[qi], starts[qi], ends[qi]
         else:
-            a = copy.deepcopy(self)
-            b = copy.deepcopy(target)
-            # if not a.sorted:
-            #     a.sort()
-            # if not b.sorted:
-            #     b.sort()
-            # if mode == "OVERLAP":
-            #     a.merge()
-            #     b.merge()
-
-            iter_a = iter(a)
-            s = next(iter_a)
-            last_j = len(b) - 1
-            j = 0
-            cont_loop = True
-            pre_inter = 0
-            cont_overlap = False
-            # OVERLAP ###############################
-            if mode == "OVERLAP":
-                with tqdm(total=len(b), desc="Calculate intersects") as pbar:
-                    while cont_loop:
-                        # When the regions overlap
-                        if s.overlap(b[j]):
-                            new_regions.add(GRegion(sequence=s.sequence,
-                                                    start=max(s.start,
-                                                              b[j].start),
-                                                    end=min(s.end, b[j].end),
-                                                    name=s.name,
-                                                    orientation=s.orientation,
-                                                    data=s.data))
-                            if not cont_overlap:
-                                pre_inter = j
-                            if j == last_j:
-                                try:
-                                    s = next(iter_a)
-                                except StopIteration:
-                                    cont_loop = False
-                            else:
-                                j += 1
-                            cont_overlap = True
-
-                        elif s < b[j]:
-                            try:
-                                s = next(iter_a)
-                                if s.sequence == b[j].sequence and \
-                                        pre_inter > 0:
-                                    j = pre_inter
-                                cont_overlap = False
-                            except StopIteration:
-                                cont_loop = False
-
-                        elif s > b[j]:
-                            if j == last_j:
-                                cont_loop = False
-                            else:
-                                j += 1
-                                cont_overlap = False
-                        else:
-                            try:
-                                s = next(iter_a)
-                            except StopIteration:
-                                cont_loop = False
-                        pbar.update(1)
-            # ORIGINAL ###############################
-            if mode == "ORIGINAL":
-                with tqdm(total=len(b), desc="Calculate intersects") as pbar:
-                    while cont_loop:
-                        # When the regions overlap
-                        if s.overlap(b[j]):
-                            new_regions.add(s)
-                            try:
-                                s = next(iter_a)
-                            except StopIteration:
-                                cont_loop = False
-                        elif s < b[j]:
-                            try:
-                                s = next(iter_a)
-                            except StopIteration:
-                                cont_loop = False
-                        elif s > b[j]:
-                            if j == last_j:
-                                cont_loop = False
-                            else:
-                                j += 1
-                        else:
-                            try:
-                                s = next(iter_a)
-                            except StopIteration:
-                                cont_loop = False
-                        pbar.update(1)
-            # COMP_INCL ###############################
-            if mode == "COMP_INCL":
-                with tqdm(total=len(b), desc="Calculate intersects") as pbar:
-                    while cont_loop:
-                        # When the regions overlap
-                        if s.overlap(b[j]):
-                            if s.start >= b[j].start and s.end <= b[j].end:
-                                new_regions.add(s)
-                            if not cont_overlap:
-                                pre_inter = j
-                            if j == last_j:
-                                try:
-                                    s = next(iter_a)
-                                except StopIteration:
-                                    cont_loop = False
-                            else:
-                                j += 1
-                            cont_overlap = True
-
-                        elif s < b[j]:
-                            try:
-                                s = next(iter_a)
-                                if s.sequence == b[j].sequence and \
-                                        pre_inter > 0:
-                                    j = pre_inter
-                                cont_overlap = False
-                            except StopIteration:
-                                cont_loop = False
-
-                        elif s > b[j]:
-                            if j == last_j:
-                                cont_loop = False
-                            else:
-                                j += 1
-                                cont_overlap = False
-                        else:
-                            try:
-                                s = next(iter_a)
-                            except StopIteration:
-                                cont_loop = False
-                        pbar.update(1)
-            # if rm_duplicates:
-            new_regions.remove_duplicates()
-            # new_regions.sort()
-            return new_regions
+            raise ValueError("mode should be OVERLAP, ORIGINAL or COMP_INCL")
+        strands = encode_strands(self.elements[i].orientation
+                                 for i in qi.tolist())
+        # Remove the duplicates and sort on the arrays
+        order = unique_order(codes, starts, ends, strands,
+                             sequence_ranks(vocabulary))
+        if mode == "OVERLAP":
+            for i, start, end in zip(qi[order].tolist(),
+                                     starts[order].tolist(),
+                                     ends[order].tolist()):
+                s = self.elements[i]
+                new_regions.elements.append(
+                    GRegion(sequence=s.sequence, start=start, end=end,
+                            name=s.name, orientation=s.orientation,
+                            data=copy.copy(s.data)))
+        else:
+            for i in qi[order].tolist():
+                s = self.elements[i]
+                new_regions.elements.append(
+                    GRegion(sequence=s.sequence, start=s.start, end=s.end,
+                            name=s.name, orientation=s.orientation,
+                            score=s.score, data=copy.copy(s.data)))
+        new_regions.sorted = True
+        return new_regions
 
     def remove_duplicates(self, sort: bool = True):
         """
         Remove any duplicate regions (sorted, by default).
         """
         self.elements = list(set(self.elements))
+        self.sorted = False
         if sort:
             self.sort()
 
-    def merge(self, by_name: bool = False, strandness: bool = False,
-              inplace: bool = False):
-        """Merge the regions within the GRegions object.
+    def _merge(self, by_name: bool = False, strandness: bool = False,
+               distance: int = 0, name: str = "", n_jobs: int = 1):
+        # Merge on the sorted arrays, grouped by chromosome, strand and name;
+        # the merged regions keep the attributes of their first region and
+        # the chromosome order of sorted input.
+        res = GRegions(name=name)
+        if len(self) == 0:
+            return res
+        codes, starts, ends, vocabulary = regions_to_arrays(self)
+        seq_order = self.sequence_order if self.sorted and \
+            self.sequence_order is not None else "lexicographic"
+        ranks = sequence_ranks(vocabulary, seq_order)
+        keys = [ranks[codes]]
+        if strandness:
+            keys.append(encode_strands(r.orientation for r in self))
+        if by_name:
+            keys.append(encode_sequences(r.name for r in self)[0])
+        presorted = self.sorted and len(keys) == 1
+        order, firsts, ends = merge_groups(starts, ends, keys,
+                                           distance=distance, n_jobs=n_jobs,
+                                           presorted=presorted)
+        firsts = order[firsts]
+        if presorted and self.sequence_order is not None:
+            order = np.arange(len(firsts))
+        else:
+            order = sort_order(codes[firsts], starts[firsts], ends, ranks)
+        for i, end in zip(firsts[order].tolist(), ends[order].tolist()):
+            r = self.elements[i]
+            res.elements.append(GRegion(sequence=r.sequence, start=r.start,
+                                        end=end, orientation=r.orientation,
+                                        name=r.name, score=r.score,
+                                        data=r.data))
+        res.sorted = True
+        res.sequence_order = seq_order
+        return res
 
-        :param name_distinct: Define whether to merge regions by name. If True,
-                              only the regions with the same name are merged.
-        :type name_distinct: bool
+    def merge(self, by_name: bool = False, strandness: bool = False,
+              inplace: bool = False, n_jobs: int = 1):
+        """Merge the overlapping regions within the GRegions object. Each
+        merged region keeps the name, orientation, score and data of its
+        first region; the input regions are not modified.
+
+        :param by_name: Define whether to merge regions by name. If True,
+                        only the regions with the same name are merged.
+        :type by_name: bool
         :param strandness: Define whether to merge the regions according to
                            strandness.
         :type strandness: bool
         :param inplace: Define whether this operation will be applied on the
                         same object (True) or return a new object.
         :type inplace: bool
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
         :return: None or a GRegions.
         :rtype: GRegions
         """
-        if not self.sorted:
-            self.sort()
-        if len(self.elements) in [0, 1]:
-            if inplace:
-                return self
-            else:
-                pass
+        res = self._merge(by_name=by_name, strandness=strandness,
+                          name=self.name, n_jobs=n_jobs)
+        if inplace:
+            self.elements = res.elements
+            self.sorted = True
+            self.sequence_order = res.sequence_order
         else:
-            res = GRegions(name=self.name)
-            prev_region = self.elements[0]
-            if not by_name and not strandness:
-                for cur_region in self.elements[1:]:
-                    if prev_region.overlap(cur_region):
-                        prev_region.start = min(prev_region.start,
-                                                cur_region.start)
-                        prev_region.end = max(prev_region.end,
-                                              cur_region.end)
-                    else:
-                        res.add(prev_region)
-                        prev_region = cur_region
-                res.add(prev_region)
-            elif by_name and not strandness:
-                for cur_region in self.elements[1:]:
-                    if (prev_region.overlap(cur_region)) and \
-                       (prev_region.name == cur_region.name):
-                        prev_region.start = min(prev_region.start,
-                                                cur_region.start)
-                        prev_region.end = max(prev_region.end,
-                                              cur_region.end)
-                    else:
-                        res.add(prev_region)
-                        prev_region = cur_region
-                res.add(prev_region)
-
-            elif not by_name and strandness:
-                for cur_region in self.elements[1:]:
-                    if (prev_region.overlap(cur_region)) and \
-                       (prev_region.orientation == cur_region.orientation):
-                        prev_region.start = min(prev_region.start,
-                                                cur_region.start)
-                        prev_region.end = max(prev_region.end,
-                                              cur_region.end)
-                    else:
-                        res.add(prev_region)
-                        prev_region = cur_region
-                res.add(prev_region)
-
-            elif by_name and strandness:
-                for cur_region in self.elements[1:]:
-                    if (prev_region.overlap(cur_region)) and \
-                       (prev_region.name == cur_region.name) and \
-                       (prev_region.orientation == cur_region.orientation):
-                        prev_region.start = min(prev_region.start,
-                                                cur_region.start)
-                        prev_region.end = max(prev_region.end,
-                                              cur_region.end)
-                    else:
-                        res.add(prev_region)
-                        prev_region = cur_region
-                res.add(prev_region)
-
-            if inplace:
-                self.elements = res.elements
-            else:
-                return res
+            return res
 
     def sampling(self, size: int, seed: int = None):
         """Return a sampling of the elements with a sampling number.
@@ -535,6 +720,143 @@ class GRegions:
             res.add(self.elements[i])
         return res
 
+    def _shuffle_space(self, genome, exclude, same_chrom: bool):
+        # Allowed space and flat bounds of every region for shuffling
+        sizes = get_genome(genome)
+        codes, starts, ends, vocabulary = regions_to_arrays(self,
+                                                            list(sizes))
+        ex_codes = ex_starts = ex_ends = None
+        if exclude is not None:
+            ex_codes, ex_starts, ex_ends, vocabulary = regions_to_arrays(
+                exclude, vocabulary)
+            known = ex_codes < len(sizes)
+            ex_codes, ex_starts, ex_ends = ex_codes[known], \
+                ex_starts[known], ex_ends[known]
+        space = genome_space(sizes, ex_codes, ex_starts, ex_ends)
+        if same_chrom:
+            if (codes >= len(sizes)).any():
+                raise ValueError("Some regions are on sequences which are "
+                                 "not in the genome.")
+            lo, hi = space["bounds"][codes], space["bounds"][codes + 1]
+        else:
+            lo = np.zeros(len(codes), dtype=np.int64)
+            hi = np.full(len(codes), space["bounds"][-1], dtype=np.int64)
+        if (lo >= hi).any():
+            raise ValueError("No space is left in the genome for some "
+                             "regions.")
+        return space, ends - starts, lo, hi, vocabulary
+
+    def shuffle(self, genome, exclude=None, same_chrom: bool = False,
+                seed: int = None):
+        """Return a GRegions with the regions placed randomly in the genome,
+        like bedtools shuffle. The regions keep their lengths and
+        attributes; all the placements which do not overlap an excluded
+        region are equally likely.
+
+        :param genome: Name of an organism such as hg38, path to a
+                       chrom.sizes file or a dictionary of chromosome sizes
+        :type genome: str or dict
+        :param exclude: Regions where no region is placed, defaults to None
+        :type exclude: GRegions, optional
+        :param same_chrom: Keep every region on its chromosome, defaults to
+                           False
+        :type same_chrom: bool, optional
+        :param seed: Seed for randomness, defaults to None
+        :type seed: int, optional
+        :return: Shuffled regions
+        :rtype: GRegions
+        """
+        res = GRegions(name=self.name + "_shuffle")
+        if len(self) == 0:
+            return res
+        space, lengths, lo, hi, vocabulary = self._shuffle_space(
+            genome, exclude, same_chrom)
+        codes, starts = draw_positions(np.random.default_rng(seed), space,
+                                       lengths, lo, hi)
+        for r, code, start, length in zip(self.elements, codes.tolist(),
+                                          starts.tolist(), lengths.tolist()):
+            res.elements.append(GRegion(sequence=vocabulary[code],
+                                        start=start, end=start + length,
+                                        orientation=r.orientation,
+                                        name=r.name, score=r.score,
+                                        data=r.data))
+        return res
+
+    def permutation_test(self, target, genome, n: int = 1000,
+                         exclude=None, same_chrom: bool = False,
+                         statistic: str = "count",
+                         alternative: str = "greater", seed: int = None,
+                         n_jobs: int = 1):
+        """Test whether the regions overlap the target more (or less) than
+        expected by chance. The regions are shuffled n times as in
+        shuffle() and the overlap statistic of every permutation is
+        computed in batch. Regions and targets outside the chromosomes of
+        the genome are ignored.
+
+        :param target: The GRegions to overlap with
+        :type target: GRegions
+        :param genome: Name of an organism such as hg38, path to a
+                       chrom.sizes file or a dictionary of chromosome sizes
+        :type genome: str or dict
+        :param n: Number of permutations, defaults to 1000
+        :type n: int, optional
+        :param exclude: Regions where no region is placed, defaults to None
+        :type exclude: GRegions, optional
+        :param same_chrom: Keep every region on its chromosome, defaults to
+                           False
+        :type same_chrom: bool, optional
+        :param statistic: "count" for the number of regions overlapping the
+                          target or "bp" for the overlapping base pairs,
+                          defaults to "count"
+        :type statistic: str, optional
+        :param alternative: "greater", "less" or "two-sided", defaults to
+                            "greater"
+        :type alternative: str, optional
+        :param seed: Seed for randomness, defaults to None
+        :type seed: int, optional
+        :param n_jobs: Number of processes sharing the permutations,
+                       defaults to 1
+        :type n_jobs: int, optional
+        :return: "observed", "expected" (mean of the permutations),
+                 "fold_change", "p_value" and the "permutations"
+        :rtype: dict
+        """
+        sizes = get_genome(genome)
+        # Neither observed nor shuffled
+        regions = GRegions(name=self.name)
+        regions.elements = [r for r in self.elements if r.sequence in sizes]
+        space, lengths, lo, hi, vocabulary = regions._shuffle_space(
+            sizes, exclude, same_chrom)
+        codes, starts, ends, vocabulary = regions_to_arrays(regions,
+                                                            vocabulary)
+        t_codes, t_starts, t_ends, vocabulary = regions_to_arrays(target,
+                                                                  vocabulary)
+        targets = union_of(*genome_positions(sizes, t_codes, t_starts,
+                                             t_ends))
+        observed = int(overlap_statistic(
+            *targets, *genome_positions(sizes, codes, starts, ends),
+            statistic=statistic).sum())
+        perms = permutation_statistics(sizes, space, lengths, lo, hi,
+                                       targets, n=n, statistic=statistic,
+                                       seed=seed, n_jobs=n_jobs)
+        greater = (1 + (perms >= observed).sum()) / (n + 1)
+        less = (1 + (perms <= observed).sum()) / (n + 1)
+        if alternative == "greater":
+            p_value = greater
+        elif alternative == "less":
+            p_value = less
+        elif alternative == "two-sided":
+            p_value = min(1.0, 2 * min(greater, less))
+        else:
+            raise ValueError("alternative should be greater, less or "
+                             "two-sided")
+        expected = float(perms.mean())
+        return {"observed": observed,
+                "expected": expected,
+                "fold_change": observed / expected if expected else np.inf,
+                "p_value": float(p_value),
+                "permutations": perms}
+
     def split(self, ratio: float, size: int = None, seed: int = None):
         """Split the elements into two GRegions with the defined sizes.
 
@@ -561,6 +883,9 @@ class GRegions:
                 a.add(self.elements[i])
             else:
                 b.add(self.elements[i])
+        for res in (a, b):
+            res.sorted = self.sorted
+            res.sequence_order = self.sequence_order
         return a, b
 
     def close_regions(self, target, max_dis=10000):
@@ -575,17 +900,68 @@ class GRegions:
         :return: Close regions
         :rtype: GRegions
         """
-        if not self.sorted:
-            self.sort()
-        if not target.sorted:
-            target.sort()
-
         extended_regions = self.extend(upstream=max_dis, downstream=max_dis,
                                        inplace=False)
         potential_targets = target.intersect(extended_regions,
                                              mode="ORIGINAL")
         return potential_targets
 
+    def closest(self, target, k: int = 1, strandness: bool = False,
+                ignore_overlaps: bool = False, upstream_only: bool = False,
+                n_jobs: int = 1):
+        """Return the k nearest target regions of every region with their
+        signed distances, like bedtools closest -k -D a.
+
+        The distance is 0 for overlapping regions, otherwise the gap plus
+        one. It is negative if the target is upstream of the region, taking
+        its orientation into account. Ties are broken by the positions of
+        the targets. Regions without any target on their chromosome are not
+        reported.
+
+        ::
+
+            self                 ------>
+            target       ----       ----           ----
+            Result(k=2)  ----       ----
+            Distance     -4         0
+
+        :param target: The GRegions to search
+        :type target: GRegions
+        :param k: Number of nearest targets per region, defaults to 1
+        :type k: int, optional
+        :param strandness: Only consider the targets on the same strand,
+                           defaults to False
+        :type strandness: bool, optional
+        :param ignore_overlaps: Skip the overlapping targets, defaults to
+                                False
+        :type ignore_overlaps: bool, optional
+        :param upstream_only: Skip the downstream targets, defaults to False
+        :type upstream_only: bool, optional
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
+        :return: Tuples (region, target region, distance) in the order of
+                 the regions and by distance
+        :rtype: list
+        """
+        if len(self) == 0 or len(target) == 0:
+            return []
+        codes, starts, ends, vocabulary = regions_to_arrays(self)
+        t_codes, t_starts, t_ends, vocabulary = regions_to_arrays(target,
+                                                                  vocabulary)
+        strands = encode_strands(r.orientation for r in self)
+        if strandness:
+            codes = codes * 3 + strands
+            t_codes = t_codes * 3 + encode_strands(r.orientation
+                                                   for r in target)
+        qi, ti, dist = closest_indices(
+            codes, starts, ends, t_codes, t_starts, t_ends, k=k,
+            reverse=strands == STRAND_CODES["-"],
+            ignore_overlaps=ignore_overlaps, upstream_only=upstream_only,
+            n_jobs=n_jobs)
+        return [(self.elements[i], target.elements[j], d) for i, j, d in
+                zip(qi.tolist(), ti.tolist(), dist.tolist())]
+
     def get_elements_by_seq(self, sequence: str, orientation: str = None):
         if orientation is None:
             regions = GRegions(name=sequence)
@@ -615,48 +991,57 @@ class GRegions:
         positions = [pos for sublist in ranges for pos in sublist]
         return set(positions)
 
-    def intersect_array(self, target, strandness: bool = False):
-        def find_intersects(orientation):
-            array_1 = self.get_array_by_seq(sequence=seq,
-                                            orientation=orientation)
-            array_2 = target.get_array_by_seq(sequence=seq,
-                                              orientation=orientation)
-            array_1, array_2 = make_array_same_length(array_1, array_2)
-            result_array = array_1 & array_2
-            # Find the indices where the value changes
-            indices = np.where(np.diff(result_array))[0] + 1
-            # Group consecutive indices into tuples
-            ranges = [(indices[i - 1], indices[i])
-                      for i in range(1, len(indices), 2)]
-            return ranges
-
-        def make_array_same_length(array_1, array_2):
-            # Find the maximum length of the two arrays
-            max_length = max(len(array_1), len(array_2))
-            # Extend the shorter array by filling it with False values
-            if len(array_1) < max_length:
-                array_1 = np.append(array_1,
-                                    [False] * (max_length - len(array_1)))
-            elif len(array_2) < max_length:
-                array_2 = np.append(array_2,
-                                    [False] * (max_length - len(array_2)))
-            return array_1, array_2
+    def intersect_array(self, target, strandness: bool = False,
+                        n_jobs: int = 1):
+        """Return the intersections between the union of self and the union of
+        target as new regions without names. With strandness, only the
+        regions on "+" and "-" strands are intersected per strand.
 
-        res = GRegions()
-        list_seq_self = self.get_sequences(unique=True)
-        list_seq_target = target.get_sequences(unique=True)
-        common_seq = [seq for seq in list_seq_self if seq in list_seq_target]
-        for seq in common_seq:
+        :param target: A target GRegions for finding overlaps.
+        :type target: GRegions
+        :param strandness: Define whether strandness is considered.
+        :type strandness: bool
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
+        :return: A GRegions.
+        :rtype: GRegions
+        """
+        def union(regions, vocabulary):
+            codes, starts, ends, vocabulary = regions_to_arrays(regions,
+                                                                vocabulary)
             if strandness:
-                # positive
-                ranges_pos = find_intersects(orientation="+")
-                ranges_neg = find_intersects(orientation="-")
-                ranges = ranges_pos + ranges_neg
-            else:
-                ranges = find_intersects(orientation=None)
-            for pair in ranges:
-                res.add(GRegion(sequence=seq, start=pair[0], end=pair[1],
-                                name=""))
+                strands = encode_strands(r.orientation for r in regions)
+                stranded = strands > 0
+                codes = codes[stranded] * 3 + strands[stranded]
+                starts, ends = starts[stranded], ends[stranded]
+            order, firsts, merged_ends = merge_groups(
+                starts, ends, [codes], n_jobs=n_jobs,
+                presorted=getattr(regions, "sorted", False) and
+                not strandness)
+            return codes[order[firsts]], starts[order[firsts]], \
+                merged_ends, vocabulary
+
+        res = GRegions()
+        codes, starts, ends, vocabulary = union(self, None)
+        t_codes, t_starts, t_ends, vocabulary = union(target, vocabulary)
+        qi, ti = overlap_indices(codes, starts, ends,
+                                 t_codes, t_starts, t_ends, n_jobs=n_jobs)
+        codes = codes[qi]
+        starts = np.maximum(starts[qi], t_starts[ti])
+        ends = np.minimum(ends[qi], t_ends[ti])
+        # Join the pieces which touch each other
+        order, firsts, ends = merge_groups(starts, ends, [codes], distance=1,
+                                           n_jobs=n_jobs)
+        codes, starts = codes[order[firsts]], starts[order[firsts]]
+        if strandness:
+            codes = codes // 3
+        order = sort_order(codes, starts, ends, sequence_ranks(vocabulary))
+        for code, start, end in zip(codes[order].tolist(),
+                                    starts[order].tolist(),
+                                    ends[order].tolist()):
+            res.add(GRegion(sequence=vocabulary[code], start=start, end=end,
+                            name=""))
         return res
 
     def overlap_count(self, target):
@@ -665,11 +1050,21 @@ class GRegions:
 
     def subtract(self, regions, whole_region: bool = False,
                  merge: bool = True, exact: bool = False,
-                 inplace: bool = True):
+                 inplace: bool = True, n_jobs: int = 1):
         """Subtract regions from the self regions.
 
-        :param regions: GRegions which to subtract by
-        :type regions: GRegions
+        The regions to subtract are indexed per chromosome and merged into
+        sorted, disjoint intervals, and every chromosome of self is cut with
+        binary searches on these arrays, in n_jobs processes. Neither self
+        nor regions is sorted or modified in the process; to subtract the
+        same regions from many GRegions, pass a RegionMask built once from
+        them. The result is sorted in the chromosome order of self if self
+        is sorted, and in lexicographic order otherwise. Zero-length regions
+        remain unless their position lies within a subtracted region.
+
+        :param regions: GRegions which to subtract by, or a RegionMask of
+                        them
+        :type regions: GRegions or RegionMask
         :param whole_region: Subtract the whole region, not partially,
                              defaults to False
         :type whole_region: bool, default to False
@@ -683,6 +1078,9 @@ class GRegions:
         :param inplace: Define whether this operation will be applied on the
                         same object (True) or return a new object.
         :type inplace: bool, default to True
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
         :return: Remaining regions of self after subtraction
         :rtype: GRegions
 
@@ -692,257 +1090,50 @@ class GRegions:
             regions         ----------                    ----
             Result   -------                 ------
         """
-        if exact:
-            if len(self.elements) > 1:
-                self.sort()
-                regions.sort()
-                small_self = GRegions("small_self")
-                counts = 0
-                finished = 0
-                last_region = self.elements[-1]
-
-                for r in self.elements:
-                    if not finished:
-                        if r != last_region:
-                            # handling of duplicates within self
-                            if r.sequence == regions.elements[counts].sequence:
-                                if r.start == regions.elements[counts].start:
-                                    if r.end == regions.elements[counts].end:
-                                        # cur y  |-----|
-                                        # region |-----|
-                                        counts = counts + 1
-                                        if counts == len(regions.elements):
-                                            finished = 1
-
-                                    elif r.end < regions.elements[counts].end:
-                                        # cur y    |------|
-                                        # region   |---|
-                                        small_self.add(r)
-                                    else:
-                                        # cur y   |----|
-                                        # region  |------|
-                                        loop = 1
-                                        while regions.elements[counts].end < r.end and loop:
-                                            if counts < len(regions.elements) - 1:
-                                                counts = counts + 1
-                                                if regions.elements[counts].sequence > r.sequence:
-                                                    small_self.add(r)
-                                                    loop = 0
-                                                else:
-                                                    # still the same chromosome as current region from self
-                                                    if regions.elements[counts].end == r.end:
-                                                        # cur y  |-----|
-                                                        # region |-----|
-                                                        counts = counts + 1
-                                                        if counts == len(regions.elements):
-                                                            loop = 0
-                                                            finished = 1
-                                                    elif regions.elements[counts].end > r.end:
-                                                        # cur y   |----|
-                                                        # region  |---|
-                                                        small_self.add(r)
-                                            else:
-                                                # reached the last region in y and this is not exactly mapping
-                                                small_self.add(r)
-                                                loop = 0
-                                elif r.start < regions.elements[counts].start:
-                                    # cur y       |---| |        |----| |     |---|     |    |---|
-                                    # region    |---|   |  |---|        |   |-----|     |   |------|
-                                    small_self.add(r)
-
-                                else:
-                                    # cur y     |---|        |  |---|      | |-----| |   |----|
-                                    # region          |---|  |     |---|   |   |--|  |     |--|
-                                    loop = 1
-                                    while regions.elements[counts].start < r.start and loop:
-                                        if counts < len(regions.elements) - 1:
-                                            counts = counts + 1
-                                            if regions.elements[counts].sequence > r.sequence:
-                                                small_self.add(r)
-                                                loop = 0
-                                            else:
-                                                if regions.elements[counts].end == r.end:
-                                                    # cur y    |-----|
-                                                    # region   |-----|
-                                                    counts = counts + 1
-                                                    if counts == len(regions.elements):
-                                                        loop = 0
-                                                        finished = 1
-                                                elif regions.elements[counts].start > r.start:
-                                                    # cur y      |---| |        |----| |     |---|     |    |---|
-                                                    # region   |---|   |  |---|        |   |-----|     |   |------|
-                                                    small_self.add(r)
-                                        else:
-                                            # reached the last region in y and this is not exactly mapping
-                                            small_self.add(r)
-                                            loop = 0
-                                            finished = 1
-
-                            elif r.sequence > regions.elements[counts].sequence:
-                                counts = counts + 1
-                                if counts == len(regions.elements):
-                                    finished = 1
-                            else:
-                                # region.sequence <
-                                # target.sequences[counts].sequence:
-                                small_self.add(r)
-                    else:
-                        # finished -> reached end of y, simply add all
-                        # remaining regions of self that are not equal
-                        # to the last subtracted or a region that has
-                        # already been added
-                        if r != last_region:
-                            small_self.add(r)
-                    last_region = r
-                return small_self
-
-            elif len(self.elements) == 1:
-                # GRS only contains 1 region, only check if this matches
-                # exactly with any region within y
-                for target_region in regions.elements:
-                    if target_region == self.elements[0]:
-                        return GRegions("small_self")  # return empty GRS
-                return self
-            else:
-                # self is empty GRS
-                return self
-        else:
-            # exact = False
-            res = GRegions(self.name + ' - ' + regions.name)
-            if len(self) == 0 or len(regions) == 0:
-                return self
-            if not self.sorted:
-                self.sort()
-            # if there is overlap within self or y, and the `merge` option
-            # is set, we merge any overlapping sequence and create two
-            # different GRegions
-            if merge:
-                a = self.merge(inplace=False)
-                b = regions.merge(inplace=False)
+        if not isinstance(regions, RegionMask):
+            regions = RegionMask(regions)
+        res = GRegions(self.name + ' - ' + regions.name)
+        source = self
+        if merge and not exact:
+            source = self._merge(name=self.name, n_jobs=n_jobs)
+        if len(source) > 0:
+            codes, starts, ends, vocabulary = regions_to_arrays(source)
+            if exact:
+                mode = "exact"
             else:
-                a = self
-                b = regions
-
-            iter_a = iter(a)
-            s = next(iter_a)
-            last_j = len(b) - 1
-            j = 0
-            cont_loop = True
-            pre_inter = 0
-            cont_overlap = False
-            while cont_loop:
-                # print("Compare: "+s.__repr__()+"\t"+b[j].__repr__())
-
-                # ----------------------
-                # -----  --    ----    -----  ----
-
-                # When the regions overlap
-                if s.overlap(b[j]):
-                    if not cont_overlap: pre_inter = j
-                    if whole_region:  # Simply jump to next region
-                        try:
-                            s = next(iter_a)
-                            j = pre_inter
-                            cont_overlap = False
-                            continue
-                        except:
-                            cont_loop = False
-
-                    # ------        -----      -------       ---        ------    -----  --
-                    #   ------        --        ---       --------  ------       -----  -----
-                    if s.start < b[j].start:
-
-                        # ------        -----      -------
-                        #   ------        --        ---
-                        if s.end > b[j].end:
-                            s1 = GRegion(sequence=s.sequence,
-                                         start=s.start,
-                                         end=b[j].start,
-                                         name=s.name,
-                                         orientation=s.orientation,
-                                         data=s.data)
-                            s2 = GRegion(sequence=s.sequence,
-                                         start=b[j].end,
-                                         end=s.end,
-                                         name=s.name,
-                                         orientation=s.orientation,
-                                         data=s.data)
-                            res.add(s1)
-                            s = s2
-                            if j < last_j:
-                                j = j + 1
-                            cont_overlap = True
-                            continue
-                        else:
-                            s1 = GRegion(sequence=s.sequence, start=s.start,
-                                         end=b[j].start, name=s.name,
-                                         orientation=s.orientation,
-                                         data=s.data)
-                            res.add(s1)
-                            try:
-                                s = next(iter_a)
-                                j = pre_inter
-                                cont_overlap = False
-                                continue
-                            except StopIteration:
-                                cont_loop = False
-
-                    elif s.end > b[j].end:
-
-                        #     ------
-                        # ------
-                        s2 = GRegion(sequence=s.sequence, start=b[j].end,
-                                     end=s.end, name=s.name,
-                                     orientation=s.orientation,
-                                     data=s.data)
-                        s = s2
-                        if j < last_j:
-                            j = j + 1
-                        cont_overlap = True
-                        continue
-                    else:
-
-                        #     ---       -----  --
-                        #   --------    -----  -----
-                        try:
-                            s = next(iter_a)
-                            j = pre_inter
-                        except StopIteration:
-                            cont_loop = False
-
-                    if j == last_j:
-                        try:
-                            s = next(iter_a)
-                            j = pre_inter
-                        except StopIteration:
-                            cont_loop = False
-                    else:
-                        j = j + 1
-                    cont_overlap = True
-
-                elif s < b[j]:
-                    res.add(s)
-                    try:
-                        s = next(iter_a)
-                        j = pre_inter
-                        cont_overlap = False
-                    except StopIteration:
-                        cont_loop = False
-
-                elif s > b[j]:
-                    if j == last_j:
-                        res.add(s)
-                        try:
-                            s = next(iter_a)
-                        except StopIteration:
-                            cont_loop = False
-                    else:
-                        j = j + 1
-                        cont_overlap = False
-            if inplace:
-                self.elements = res.elements
+                mode = "whole" if whole_region else "partial"
+            src, starts, ends = regions.apply(vocabulary, codes, starts,
+                                              ends, mode=mode, n_jobs=n_jobs,
+                                              presorted=source.sorted)
+            # Sorted input keeps its chromosome order
+            if source.sorted and source.sequence_order is not None:
+                res.sequence_order = source.sequence_order
+            ranks = sequence_ranks(vocabulary, res.sequence_order)
+            if exact:
+                strands = encode_strands(source.elements[i].orientation
+                                         for i in src.tolist())
+                order = unique_order(codes[src], starts, ends, strands,
+                                     ranks)
             else:
-                return res
+                order = sort_order(codes[src], starts, ends, ranks)
+            for i, start, end in zip(src[order].tolist(),
+                                     starts[order].tolist(),
+                                     ends[order].tolist()):
+                r = source.elements[i]
+                if start == r.start and end == r.end:
+                    res.elements.append(r)
+                else:
+                    res.elements.append(
+                        GRegion(sequence=r.sequence, start=start, end=end,
+                                name=r.name, orientation=r.orientation,
+                                score=r.score, data=r.data))
+        res.sorted = True
+        if inplace:
+            self.elements = res.elements
+            self.sorted = True
+            self.sequence_order = res.sequence_order
+        else:
+            return res
 
     def get_GSequences(self, FASTA_file):
         """Return a GSequences object according to the loci on the given
@@ -960,7 +1151,7 @@ class GRegions:
             print(FASTA_file + " is not found.")
             sys.exit()
         res = GSequences(name=self.name)
-        for region in tqdm(self.elements, desc="Get GSequences"):
+        for region in progress(self.elements, desc="Get GSequences"):
             seq = fasta.get_sequence(name=region.sequence,
                                      start=region.start,
                                      end=region.end)
@@ -972,12 +1163,15 @@ class GRegions:
                 res.add(seq)
         return res
 
-    def cluster(self, max_distance):
+    def cluster(self, max_distance, n_jobs: int = 1):
         """Cluster the regions with a certain distance and return a new
         GRegions.
 
         :param max_distance: Maximal distance for combining
         :type max_distance: int
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
         :return: Combined regions
         :rtype: GRegions
 
@@ -988,37 +1182,25 @@ class GRegions:
             Result(d=1)    -------        ---------       ----      ----
             Result(d=10)   ---------------------------------------------
         """
-        if not self.sorted:
-            self.sort()
-        if len(self) == 0:
-            return GRegions()
-        elif len(self) == 1:
-            return self
-        else:
-            z = GRegions('Clustered region set')
-            previous = deepcopy(self.elements[0])
-            for s in self.elements[1:]:
-                s_ext = s.extend(upstream=max_distance,
-                                 downstream=max_distance,
-                                 inplace=False)
-                if s_ext.overlap(previous):
-                    previous.start = min(previous.start, s.start)
-                    previous.end = max(previous.end, s.end)
-                else:
-                    z.add(previous)
-                    previous = deepcopy(s)
-            z.add(previous)
-            return z
+        return self._merge(distance=max_distance,
+                           name='Clustered region set', n_jobs=n_jobs)
 
-    def total_coverage(self):
+    def total_coverage(self, n_jobs: int = 1):
         """Return the total coverage (bp) of all the regions.
 
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
         :return: Total coverage (bp)
         :rtype: int
         """
-        merged_regions = self.merge(inplace=False)
-        cov = sum([len(r) for r in merged_regions])
-        return cov
+        if len(self) == 0:
+            return 0
+        codes, starts, ends, _ = regions_to_arrays(self)
+        order, firsts, ends = merge_groups(starts, ends, [codes],
+                                           n_jobs=n_jobs,
+                                           presorted=self.sorted)
+        return int((ends - starts[order[firsts]]).sum())
 
     def filter_by_names(self, names, inplace=False):
         """Filter the elements by the given list of names
@@ -1035,6 +1217,8 @@ class GRegions:
         for r in self.elements:
             if r.name in names:
                 res.add(r)
+        res.sorted = self.sorted
+        res.sequence_order = self.sequence_order
         if inplace:
             self.elements = res.elements
         else:
@@ -1068,6 +1252,8 @@ class GRegions:
             for r in self.elements:
                 if r.score < smaller_than:
                     res.add(r)
+        res.sorted = self.sorted
+        res.sequence_order = self.sequence_order
         if inplace:
             self.elements = res.elements
         else:
@@ -1091,6 +1277,8 @@ class GRegions:
         for r in self.elements:
             if r.name not in names:
                 res.add(r)
+        res.sorted = self.sorted
+        res.sequence_order = self.sequence_order
         if inplace:
             self.elements = res.elements
         else:
@@ -0,0 +1,594 @@
+from genomkit import GRegion
+import numpy as np
+from .arrays import STRANDS, encode_strands, encode_sequences, \
+    object_array, sequence_ranks, sort_order, unique_order, \
+    merge_groups, overlap_indices, closest_indices, STRAND_CODES
+from .io import load_BED_array, is_binary, load_binary, load_BED_cached, \
+    save_binary, write_blocks
+
+# Number of regions formatted or materialised at once
+CHUNK_SIZE = 1 << 16
+COLUMNS = ["sequences", "starts", "ends", "orientations", "scores", "names",
+           "data"]
+
+
+def _column(key):
+    # Columns are read through properties so that the regions added by add()
+    # are moved into the arrays first.
+    def getter(self):
+        self._flush()
+        return self._columns[key]
+
+    def setter(self, value):
+        self._flush()
+        self._columns[key] = value
+    return property(getter, setter)
+
+
+###########################################################################
+# GRegionsArray
+###########################################################################
+class GRegionsArray:
+    """
+    GRegionsArray module
+
+    This module contains functions and classes for working with a collection of
+    genomic regions stored as parallel typed arrays (sequence codes, starts,
+    ends, orientations, scores and names) instead of GRegion objects. GRegion
+    objects are only created on iteration or indexing.
+    """
+    sequences = _column("sequences")
+    starts = _column("starts")
+    ends = _column("ends")
+    orientations = _column("orientations")
+    scores = _column("scores")
+    names = _column("names")
+    data = _column("data")
+    sequence_names = _column("sequence_names")
+
+    def __init__(self, name: str = "", load: str = "", cache=False):
+        """Create an empty GRegionsArray object. If a path to a BED file is
+        defined in "load", all the regions will be loaded.
+
+        :param name: Name of this GRegionsArray, defaults to ""
+        :type name: str, optional
+        :param load: Path to a BED file, defaults to ""
+        :type load: str, optional
+        :param cache: Cache the loaded BED file in binary format, see
+                      load(), defaults to False
+        :type cache: bool or str, optional
+        """
+        self.name = name
+        self.sorted = False
+        self.sequence_order = "lexicographic"
+        self._columns = {"sequence_names": [],
+                         "sequences": np.empty(0, dtype=np.int32),
+                         "starts": np.empty(0, dtype=np.int64),
+                         "ends": np.empty(0, dtype=np.int64),
+                         "orientations": np.empty(0, dtype=np.int8),
+                         "scores": np.empty(0, dtype=np.float64),
+                         "names": np.empty(0, dtype=str),
+                         "data": None}
+        self._pending = []
+        if load:
+            self.load(load, cache=cache)
+
+    @classmethod
+    def from_arrays(cls, sequences, starts, ends, orientations=None,
+                    scores=None, names=None, data=None,
+                    sequence_names=None, name: str = ""):
+        """Create a GRegionsArray from columns.
+
+        :param sequences: Sequence names, or sequence codes if
+                          sequence_names is given
+        :type sequences: array-like
+        :param starts: Start positions
+        :type starts: array-like
+        :param ends: End positions
+        :type ends: array-like
+        :param orientations: Orientations as strings or strand codes,
+                             defaults to "."
+        :type orientations: array-like, optional
+        :param scores: Scores, defaults to 0
+        :type scores: array-like, optional
+        :param names: Names, defaults to ""
+        :type names: array-like, optional
+        :param data: Further data of every region, defaults to None
+        :type data: array-like, optional
+        :param sequence_names: Vocabulary of the sequence codes
+        :type sequence_names: list, optional
+        :param name: Name of this GRegionsArray, defaults to ""
+        :type name: str, optional
+        :return: A GRegionsArray
+        :rtype: GRegionsArray
+        """
+        res = cls(name=name)
+        starts = np.asarray(starts, dtype=np.int64)
+        n = len(starts)
+        if sequence_names is None:
+            codes, sequence_names = encode_sequences(sequences)
+        else:
+            codes = np.asarray(sequences, dtype=np.int32)
+        if orientations is None:
+            orientations = np.zeros(n, dtype=np.int8)
+        else:
+            orientations = np.asarray(orientations)
+            if orientations.dtype.kind in "UO":
+                orientations = encode_strands(orientations)
+            orientations = orientations.astype(np.int8, copy=False)
+        if scores is None:
+            scores = np.zeros(n, dtype=np.float64)
+        if names is None:
+            names = np.full(n, "")
+        if data is not None and not (isinstance(data, np.ndarray) and
+                                     data.dtype == object and data.ndim == 1):
+            data = object_array(data)
+        res._columns = {"sequence_names": list(sequence_names),
+                        "sequences": codes,
+                        "starts": starts,
+                        "ends": np.asarray(ends, dtype=np.int64),
+                        "orientations": orientations,
+                        "scores": np.asarray(scores, dtype=np.float64),
+                        "names": np.asarray(names, dtype=str),
+                        "data": data}
+        return res
+
+    @classmethod
+    def from_GRegions(cls, regions):
+        """Create a GRegionsArray from GRegions (or any iterable of GRegion).
+
+        :param regions: A GRegions
+        :type regions: GRegions
+        :return: A GRegionsArray
+        :rtype: GRegionsArray
+        """
+        res = cls(name=getattr(regions, "name", ""))
+        res._pending = list(regions)
+        res._flush()
+        res.sorted = getattr(regions, "sorted", False)
+        res.sequence_order = getattr(regions, "sequence_order",
+                                     "lexicographic")
+        return res
+
+    def to_GRegions(self):
+        """Return a GRegions containing GRegion objects of all regions.
+
+        :return: A GRegions
+        :rtype: GRegions
+        """
+        from genomkit import GRegions
+        res = GRegions(name=self.name)
+        res.elements = list(self)
+        res.sorted = self.sorted
+        res.sequence_order = self.sequence_order
+        return res
+
+    def _flush(self):
+        """Move the regions added by add() into the columns."""
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = []
+        new = GRegionsArray.from_arrays(
+            sequences=[r.sequence for r in pending],
+            starts=[r.start for r in pending],
+            ends=[r.end for r in pending],
+            orientations=[r.orientation for r in pending],
+            scores=[r.score for r in pending],
+            names=[r.name for r in pending])
+        if any(r.data for r in pending):
+            new._columns["data"] = object_array(list(r.data)
+                                                for r in pending)
+        self._concat(new)
+
+    def _concat(self, other):
+        """Append the columns of another GRegionsArray."""
+        codes = self._translate(other)
+        cols = self._columns
+        n, m = len(cols["starts"]), len(other._columns["starts"])
+        data = None
+        if cols["data"] is not None or other._columns["data"] is not None:
+            data = np.empty(n + m, dtype=object)
+            if cols["data"] is not None:
+                data[:n] = cols["data"]
+            if other._columns["data"] is not None:
+                data[n:] = other._columns["data"]
+        for key in COLUMNS[1:-1]:
+            cols[key] = np.concatenate((cols[key], other._columns[key]))
+        cols["sequences"] = np.concatenate((cols["sequences"], codes))
+        cols["data"] = data
+
+    def _translate(self, other):
+        """Return the sequence codes of another GRegionsArray in the
+        vocabulary of this one, which is extended when needed."""
+        vocabulary = self._columns["sequence_names"]
+        lookup = {seq: i for i, seq in enumerate(vocabulary)}
+        mapping = np.empty(len(other.sequence_names), dtype=np.int32)
+        for i, seq in enumerate(other.sequence_names):
+            if seq not in lookup:
+                lookup[seq] = len(vocabulary)
+                vocabulary.append(seq)
+            mapping[i] = lookup[seq]
+        return mapping[other._columns["sequences"]]
+
+    def _take(self, indices, name: str = None):
+        """Return a new GRegionsArray with the rows of the given indices."""
+        res = GRegionsArray(name=self.name if name is None else name)
+        res._columns = {key: (None if col is None else col[indices])
+                        for key, col in self._columns.items()
+                        if key != "sequence_names"}
+        res._columns["sequence_names"] = list(self.sequence_names)
+        return res
+
+    def _region(self, i):
+        cols = self._columns
+        data = cols["data"][i] if cols["data"] is not None else None
+        return GRegion(sequence=self.sequence_names[cols["sequences"][i]],
+                       start=int(cols["starts"][i]),
+                       end=int(cols["ends"][i]),
+                       orientation=str(STRANDS[cols["orientations"][i]]),
+                       name=str(cols["names"][i]),
+                       score=float(cols["scores"][i]),
+                       data=list(data) if data else [])
+
+    def __len__(self):
+        """Return the number of regions in this GRegionsArray.
+
+        :return: Number of regions
+        :rtype: int
+        """
+        return len(self._columns["starts"]) + len(self._pending)
+
+    def __getitem__(self, key):
+        """Return a GRegion for an integer index, otherwise a GRegionsArray
+        with the selected regions (slice, index array or boolean mask)."""
+        self._flush()
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError("GRegionsArray index out of range")
+            return self._region(key)
+        res = self._take(key)
+        res.sorted = self.sorted and isinstance(key, slice) and \
+            (key.step is None or key.step > 0)
+        res.sequence_order = self.sequence_order
+        return res
+
+    def __iter__(self):
+        self._flush()
+        seq_names = self.sequence_names
+        cols = self._columns
+        for lo in range(0, len(self), CHUNK_SIZE):
+            hi = lo + CHUNK_SIZE
+            data = cols["data"][lo:hi] if cols["data"] is not None \
+                else [None] * len(cols["starts"][lo:hi])
+            for seq, start, end, strand, name, score, extra in zip(
+                    cols["sequences"][lo:hi].tolist(),
+                    cols["starts"][lo:hi].tolist(),
+                    cols["ends"][lo:hi].tolist(),
+                    STRANDS[cols["orientations"][lo:hi]].tolist(),
+                    cols["names"][lo:hi].tolist(),
+                    cols["scores"][lo:hi].tolist(),
+                    data):
+                yield GRegion(sequence=seq_names[seq], start=start, end=end,
+                              orientation=strand, name=name, score=score,
+                              data=list(extra) if extra else [])
+
+    @property
+    def nbytes(self):
+        """Return the number of bytes used by the columns.
+
+        :return: Bytes
+        :rtype: int
+        """
+        self._flush()
+        return sum(col.nbytes for col in self._columns.values()
+                   if isinstance(col, np.ndarray))
+
+    def add(self, region):
+        """Append a GRegion at the end of the elements of GRegionsArray.
+
+        :param region: A GRegion
+        :type region: GRegion
+        """
+        self._pending.append(region)
+        self.sorted = False
+
+    def load(self, filename: str, cache=False):
+        """Load a BED file, or a directory written by save_binary, into the
+        GRegionsArray. Binary columns are memory-mapped and only copied when
+        the regions are modified.
+
+        :param filename: Path to the BED file or the binary directory
+        :type filename: str
+        :param cache: Load the BED file through a binary cache which is
+                      rebuilt when the file changes. True keeps the cache
+                      next to the file, a path keeps it in that directory,
+                      defaults to False
+        :type cache: bool or str, optional
+        """
+        if is_binary(filename):
+            regions = load_binary(filename)
+        elif cache:
+            regions = load_BED_cached(
+                filename, cache_dir=None if cache is True else cache)
+        else:
+            regions = load_BED_array(filename=filename)
+        self._columns = regions._columns
+        self._pending = []
+        self.sorted = regions.sorted
+        self.sequence_order = regions.sequence_order
+
+    def save_binary(self, path: str):
+        """Save the regions in the binary columnar format, which load() maps
+        back into memory without parsing text.
+
+        :param path: Path to the output directory
+        :type path: str
+        """
+        save_binary(self, path)
+
+    def write(self, filename: str, data: bool = False, compression="infer",
+              n_jobs: int = 1):
+        """Write a BED file in blocks of CHUNK_SIZE regions formatted from
+        the columns; files ending with .gz are compressed with bgzip.
+
+        :param filename: Path to the BED file
+        :type filename: str
+        :param data: Export extra data or not, defaults to False
+        :type data: bool
+        :param compression: "infer", "gzip", "bgzip" or None, defaults to
+                            "infer"
+        :type compression: str, optional
+        :param n_jobs: Number of compression threads, defaults to 1
+        :type n_jobs: int, optional
+        """
+        self._flush()
+        write_blocks(self._BED_blocks(data), filename,
+                     compression=compression, n_jobs=n_jobs)
+
+    def _BED_blocks(self, data):
+        seq_names = np.array(self.sequence_names, dtype=object)
+        cols = self._columns
+        for lo in range(0, len(self), CHUNK_SIZE):
+            hi = lo + CHUNK_SIZE
+            rows = zip(seq_names[cols["sequences"][lo:hi]].tolist(),
+                       cols["starts"][lo:hi].tolist(),
+                       cols["ends"][lo:hi].tolist(),
+                       cols["names"][lo:hi].tolist(),
+                       cols["scores"][lo:hi].tolist(),
+                       STRANDS[cols["orientations"][lo:hi]].tolist())
+            lines = [f"{s}\t{a}\t{b}\t{n}\t{c}\t{o}"
+                     for s, a, b, n, c, o in rows]
+            if data:
+                extra = cols["data"][lo:hi] \
+                    if cols["data"] is not None else [None] * len(lines)
+                lines = [line + "\t" + "\t".join(d if d else [])
+                         for line, d in zip(lines, extra)]
+            lines.append("")
+            yield "\n".join(lines)
+
+    def sort(self, key=None, reverse: bool = False,
+             order="lexicographic"):
+        """Sort the regions by sequence, start and end. A key function on
+        GRegion can be given, which materialises all regions. Nothing is
+        done if the regions are already sorted in the chromosome order.
+
+        :param key: Given the key for comparison.
+        :type key: function
+        :param reverse: Reverse the sorting result.
+        :type reverse: bool
+        :param order: Chromosome order, see GRegions.sort, defaults to
+                      "lexicographic"
+        :type order: str or list, optional
+        """
+        self._flush()
+        if key:
+            indices = sorted(range(len(self)),
+                             key=lambda i: key(self._region(i)),
+                             reverse=reverse)
+            indices = np.array(indices, dtype=np.int64)
+        elif self.sorted and not reverse and self.sequence_order == order:
+            return
+        else:
+            indices = sort_order(self.sequences, self.starts, self.ends,
+                                 sequence_ranks(self.sequence_names, order))
+            if reverse:
+                indices = indices[::-1]
+        self._columns = self._take(indices)._columns
+        self.sorted = not key and not reverse
+        self.sequence_order = order
+
+    def get_sequences(self, unique: bool = False):
+        """Return all chromosomes.
+
+        :param unique: Only the unique names.
+        :type unique: bool
+        :return: A list of all chromosomes.
+        :rtype: list
+        """
+        codes = self.sequences
+        if unique:
+            return sorted(self.sequence_names[c] for c in np.unique(codes))
+        seq_names = np.array(self.sequence_names, dtype=object)
+        return seq_names[codes].tolist()
+
+    def get_names(self, unique: bool = False):
+        """Return a list of all region names.
+
+        :param unique: Only the unique names.
+        :type unique: bool
+        :return: A list of all regions' names.
+        :rtype: list
+        """
+        if unique:
+            return np.unique(self.names).tolist()
+        return self.names.tolist()
+
+    def remove_duplicates(self, sort: bool = True):
+        """
+        Remove any duplicate regions (sorted, by default). Regions are
+        duplicates if sequence, start, end and orientation are the same.
+        """
+        order = unique_order(self.sequences, self.starts, self.ends,
+                             self.orientations,
+                             sequence_ranks(self.sequence_names))
+        if not sort:
+            order = np.sort(order)
+        self._columns = self._take(order)._columns
+        self.sorted = sort
+        if sort:
+            self.sequence_order = "lexicographic"
+
+    def _sequence_codes(self, target):
+        """Return the sequence codes of the target regions in the vocabulary
+        of self; unknown sequences get -1."""
+        lookup = {seq: i for i, seq in enumerate(self.sequence_names)}
+        mapping = np.array([lookup.get(seq, -1)
+                            for seq in target.sequence_names] + [-1],
+                           dtype=np.int32)
+        return mapping[target.sequences]
+
+    def overlap_indices(self, target, n_jobs: int = 1):
+        """Return the indices of all pairs of overlapping regions between self
+        and target, computed per chromosome on sorted start/end arrays.
+
+        :param target: A target GRegionsArray
+        :type target: GRegionsArray
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
+        :return: Indices in self and indices in target
+        :rtype: tuple
+        """
+        return overlap_indices(self.sequences, self.starts, self.ends,
+                               self._sequence_codes(target),
+                               target.starts, target.ends, n_jobs=n_jobs,
+                               q_sorted=self.sorted, t_sorted=target.sorted)
+
+    def closest(self, target, k: int = 1, strandness: bool = False,
+                ignore_overlaps: bool = False, upstream_only: bool = False,
+                n_jobs: int = 1):
+        """Return the indices of the k nearest target regions of every region
+        with their signed distances. The arguments and distances are the
+        same as in GRegions.closest.
+
+        :param target: A target GRegionsArray (or GRegions)
+        :type target: GRegionsArray
+        :param k: Number of nearest targets per region, defaults to 1
+        :type k: int, optional
+        :param strandness: Only consider the targets on the same strand,
+                           defaults to False
+        :type strandness: bool, optional
+        :param ignore_overlaps: Skip the overlapping targets, defaults to
+                                False
+        :type ignore_overlaps: bool, optional
+        :param upstream_only: Skip the downstream targets, defaults to False
+        :type upstream_only: bool, optional
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
+        :return: Indices in self, indices in target and distances
+        :rtype: tuple
+        """
+        if not isinstance(target, GRegionsArray):
+            target = GRegionsArray.from_GRegions(target)
+        codes = self.sequences.astype(np.int64)
+        t_codes = self._sequence_codes(target).astype(np.int64)
+        if strandness:
+            codes = codes * 3 + self.orientations
+            t_codes = np.where(t_codes < 0, -1,
+                               t_codes * 3 + target.orientations)
+        reverse = self.orientations == STRAND_CODES["-"]
+        return closest_indices(codes, self.starts, self.ends,
+                               t_codes, target.starts, target.ends, k=k,
+                               reverse=reverse,
+                               ignore_overlaps=ignore_overlaps,
+                               upstream_only=upstream_only, n_jobs=n_jobs)
+
+    def intersect(self, target, mode: str = "OVERLAP",
+                  rm_duplicates: bool = False, n_jobs: int = 1):
+        """Return a GRegionsArray for the intersections between the two given
+        region collections. The modes are the same as in GRegions.intersect:
+        "OVERLAP", "ORIGINAL" and "COMP_INCL".
+
+        :param target: A target GRegionsArray (or GRegions) for finding
+                       overlaps.
+        :type target: GRegionsArray
+        :param mode: The mode should be one of the followings: "OVERLAP",
+                     "ORIGINAL", or "COMP_INCL".
+        :type mode: str
+        :param rm_duplicates: Define whether remove the duplicates.
+        :type rm_duplicates: bool
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
+        :return: A GRegionsArray.
+        :rtype: GRegionsArray
+        """
+        if not isinstance(target, GRegionsArray):
+            target = GRegionsArray.from_GRegions(target)
+        qi, ti = self.overlap_indices(target, n_jobs=n_jobs)
+        if mode == "OVERLAP":
+            res = self._take(qi)
+            res.starts = np.maximum(self.starts[qi], target.starts[ti])
+            res.ends = np.minimum(self.ends[qi], target.ends[ti])
+            res.scores = np.zeros(len(qi))
+        elif mode == "ORIGINAL":
+            res = self._take(np.unique(qi))
+        elif mode == "COMP_INCL":
+            inside = (self.starts[qi] >= target.starts[ti]) & \
+                     (self.ends[qi] <= target.ends[ti])
+            res = self._take(np.unique(qi[inside]))
+        else:
+            raise ValueError("mode should be OVERLAP, ORIGINAL or COMP_INCL")
+        res.remove_duplicates()
+        return res
+
+    def merge(self, by_name: bool = False, strandness: bool = False,
+              inplace: bool = False, n_jobs: int = 1):
+        """Merge the overlapping regions. Each merged region keeps the name,
+        orientation, score and data of its first region.
+
+        :param by_name: Define whether to merge regions by name. If True,
+                        only the regions with the same name are merged.
+        :type by_name: bool
+        :param strandness: Define whether to merge the regions according to
+                           strandness.
+        :type strandness: bool
+        :param inplace: Define whether this operation will be applied on the
+                        same object (True) or return a new object.
+        :type inplace: bool
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
+        :return: None or a GRegionsArray.
+        :rtype: GRegionsArray
+        """
+        keys = [sequence_ranks(self.sequence_names)[self.sequences]]
+        if strandness:
+            keys.append(self.orientations)
+        if by_name:
+            keys.append(np.unique(self.names, return_inverse=True)[1])
+        order, firsts, ends = merge_groups(self.starts, self.ends, keys,
+                                           n_jobs=n_jobs)
+        res = self._take(order[firsts])
+        res.ends = ends
+        res.sort()
+        if inplace:
+            self._columns = res._columns
+            self.sorted = True
+            self.sequence_order = res.sequence_order
+        else:
+            return res
+
+    def total_coverage(self):
+        """Return the total coverage (bp) of all the regions.
+
+        :return: Total coverage (bp)
+        :rtype: int
+        """
+        order, firsts, ends = merge_groups(self.starts, self.ends,
+                                           [self.sequences])
+        return int(np.sum(ends - self.starts[order[firsts]]))
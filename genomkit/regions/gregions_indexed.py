@@ -0,0 +1,331 @@
+"""
+Indexed access to large BED and bedGraph files
+
+IndexedGRegions answers region queries on a bgzip compressed file through
+its tabix index: only the compressed blocks overlapping the queried windows
+are read and parsed, so that a query on a file of many gigabytes takes
+milliseconds and the file is never loaded. Files without an index are
+compressed with bgzip, sorted if needed and indexed once; the compressed
+copy and its index are kept next to the original and reused afterwards.
+"""
+import os
+import tempfile
+import pysam
+from genomkit import GRegion, GRegions
+from .external import external_sort, HEADER_PREFIXES
+from .io import open_text
+
+INDEX_SUFFIXES = (".tbi", ".csi")
+BEDGRAPH_SUFFIXES = (".bedgraph", ".bdg", ".bg")
+# End of the windows covering whole sequences
+WHOLE_SEQUENCE = 1 << 62
+
+
+###########################################################################
+# Index
+###########################################################################
+def is_bgzipped(filename: str):
+    """Return whether a file is compressed with bgzip (BGZF), which is
+    needed for tabix indexing. Plain gzip files are not.
+
+    :param filename: Path to the file
+    :type filename: str
+    :return: True for BGZF files
+    :rtype: bool
+    """
+    with open(filename, "rb") as f:
+        head = f.read(16)
+    # gzip magic, deflate, extra field with the "BC" subfield of BGZF
+    return len(head) == 16 and head[:4] == b"\x1f\x8b\x08\x04" and \
+        head[12:14] == b"BC"
+
+
+def index_path(filename: str):
+    """Return the path to the tabix index of a file, or None if it has no
+    index.
+
+    :param filename: Path to the bgzip compressed file
+    :type filename: str
+    :return: Path to the index or None
+    :rtype: str
+    """
+    for suffix in INDEX_SUFFIXES:
+        if os.path.exists(filename + suffix):
+            return filename + suffix
+    return None
+
+
+def bgzip_path(filename: str):
+    """Return the default path to the bgzip compressed copy of a plain or
+    gzipped file: the file name with .bgz appended, or with .gz replaced by
+    .bgz. The suffix is not the .gz of the user's own files, which are never
+    overwritten.
+
+    :param filename: Path to the file
+    :type filename: str
+    :return: Path to the compressed copy
+    :rtype: str
+    """
+    if filename.endswith(".gz"):
+        filename = filename[:-3]
+    return filename + ".bgz"
+
+
+def _header_lines(filename):
+    # Number of track and browser lines at the top; comments are skipped by
+    # tabix anyway
+    n = 0
+    with open_text(filename) as f:
+        for line in f:
+            if not line.startswith(HEADER_PREFIXES):
+                break
+            n += not line.startswith("#")
+    return n
+
+
+def _tabix_index(filename):
+    pysam.tabix_index(filename, seq_col=0, start_col=1, end_col=2,
+                      zerobased=True, force=True,
+                      line_skip=_header_lines(filename))
+
+
+def index_file(filename: str, output: str = None):
+    """Build the tabix index of a BED or bedGraph file. A bgzip compressed
+    file is indexed in place; other files, plain or gzipped, are first
+    compressed with bgzip into output. Files which are not sorted by
+    sequence and start are sorted with external_sort on the way, except
+    bgzip compressed files which cannot be rewritten. An existing output is
+    only replaced if it is a bgzip compressed file, such as the copy of an
+    earlier run.
+
+    :param filename: Path to the BED or bedGraph file
+    :type filename: str
+    :param output: Path to the bgzip compressed copy, defaults to
+                   bgzip_path(filename)
+    :type output: str, optional
+    :return: Path to the indexed bgzip compressed file
+    :rtype: str
+    """
+    if is_bgzipped(filename):
+        try:
+            _tabix_index(filename)
+        except OSError:
+            raise ValueError(f"'{filename}' could not be indexed; sort it "
+                             "by sequence and start and compress it again "
+                             "with bgzip.")
+        return filename
+    if output is None:
+        output = bgzip_path(filename)
+    if os.path.exists(output) and not is_bgzipped(output):
+        raise ValueError(f"'{output}' exists and is not a bgzip compressed "
+                         "file; give another output.")
+    if not filename.endswith(".gz"):
+        pysam.tabix_compress(filename, output,
+                             force=os.path.exists(output))
+        try:
+            _tabix_index(output)
+            return output
+        except OSError:
+            # Not sorted; sorted below
+            pass
+    with tempfile.TemporaryDirectory(
+            dir=os.path.dirname(os.path.abspath(output))) as tmp:
+        sorted_file = os.path.join(tmp, "sorted.bed")
+        external_sort(filename, sorted_file, tmp_dir=tmp)
+        # Only the copy checked or written above is replaced
+        pysam.tabix_compress(sorted_file, output,
+                             force=os.path.exists(output))
+    _tabix_index(output)
+    return output
+
+
+###########################################################################
+# IndexedGRegions
+###########################################################################
+class IndexedGRegions:
+    """
+    IndexedGRegions module
+
+    This module contains a lazy collection of the genomic regions in a large
+    BED or bedGraph file. The file is opened through its tabix index and only
+    the regions overlapping the queried windows are read, as GRegion objects.
+    """
+    def __init__(self, filename: str, name: str = "", format: str = None,
+                 build_index: bool = True):
+        """Open an indexed BED or bedGraph file. If the file is not bgzip
+        compressed or has no index, the index is built by index_file unless
+        build_index is False; an up-to-date compressed copy from an earlier
+        run is reused.
+
+        :param filename: Path to the BED or bedGraph file
+        :type filename: str
+        :param name: Name of the regions, defaults to the file name
+        :type name: str, optional
+        :param format: "bed" or "bedGraph", defaults to "bedGraph" for the
+                       files ending with .bedgraph, .bdg or .bg (optionally
+                       compressed) and "bed" otherwise
+        :type format: str, optional
+        :param build_index: Build the missing index, defaults to True
+        :type build_index: bool, optional
+        """
+        if not os.path.exists(filename):
+            raise FileNotFoundError(f"The file '{filename}' does not exist.")
+        self.name = name if name else os.path.basename(filename)
+        if format is None:
+            base = filename.lower()
+            for suffix in (".gz", ".bgz"):
+                if base.endswith(suffix):
+                    base = base[:-len(suffix)]
+            format = "bedGraph" if base.endswith(BEDGRAPH_SUFFIXES) else "bed"
+        if format not in ("bed", "bedGraph"):
+            raise ValueError("format should be bed or bedGraph")
+        self.format = format
+        self.filename = self._indexed_file(filename, build_index)
+        self._tabix = None
+
+    @staticmethod
+    def _indexed_file(filename, build_index):
+        if is_bgzipped(filename):
+            if index_path(filename) is not None:
+                return filename
+        else:
+            output = bgzip_path(filename)
+            if os.path.exists(output) and is_bgzipped(output) and \
+                    index_path(output) is not None and \
+                    os.path.getmtime(output) >= \
+                    os.path.getmtime(filename):
+                return output
+        if not build_index:
+            raise ValueError(f"'{filename}' has no tabix index.")
+        return index_file(filename)
+
+    @property
+    def tabix(self):
+        """The pysam.TabixFile of the indexed file, opened on first use."""
+        if self._tabix is None:
+            self._tabix = pysam.TabixFile(self.filename)
+        return self._tabix
+
+    def close(self):
+        """Close the indexed file."""
+        if self._tabix is not None:
+            self._tabix.close()
+            self._tabix = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        for sequence in self.get_sequences():
+            yield from self.fetch(sequence)
+
+    def get_sequences(self):
+        """Return the names of the sequences in the index.
+
+        :return: Sequence names
+        :rtype: list
+        """
+        return list(self.tabix.contigs)
+
+    def _rows(self, sequence, start, end):
+        if sequence not in self.tabix.contigs:
+            return iter(())
+        return self.tabix.fetch(sequence, start, end,
+                                parser=pysam.asTuple())
+
+    def _region(self, row):
+        # Same columns as load_BED
+        n = len(row)
+        if self.format == "bedGraph":
+            return GRegion(sequence=row[0], start=int(row[1]),
+                           end=int(row[2]),
+                           score=float(row[3]) if n > 3 else 0)
+        score = row[4] if n > 4 else "."
+        region = GRegion(sequence=row[0], start=int(row[1]), end=int(row[2]),
+                         orientation=row[5] if n > 5 and row[5] else ".",
+                         name=row[3] if n > 3 else "",
+                         score=0 if score in (".", "") else float(score))
+        if n > 6:
+            region.data = [row[i] for i in range(6, n) if row[i]]
+        return region
+
+    def fetch(self, sequence: str, start: int = None, end: int = None):
+        """Yield the regions overlapping a window in the order of the file.
+
+        :param sequence: Sequence name such as chr1
+        :type sequence: str
+        :param start: Start of the window, defaults to the sequence start
+        :type start: int, optional
+        :param end: End of the window, defaults to the sequence end
+        :type end: int, optional
+        :return: Generator of GRegion
+        :rtype: generator
+        """
+        for row in self._rows(sequence, start, end):
+            yield self._region(row)
+
+    @staticmethod
+    def _windows(regions):
+        # Disjoint sorted windows from a GRegion, a "chr1:100-200" string, a
+        # sequence name or many of them
+        if isinstance(regions, GRegion):
+            return [(regions.sequence, regions.start, regions.end)]
+        if isinstance(regions, str):
+            sequence, _, span = regions.replace(",", "").partition(":")
+            if not span:
+                return [(sequence, None, None)]
+            start, _, end = span.partition("-")
+            return [(sequence, int(start), int(end))]
+        if isinstance(regions, tuple):
+            return [regions]
+        windows = GRegions()
+        for region in regions:
+            for sequence, start, end in IndexedGRegions._windows(region):
+                if start is None:
+                    start, end = 0, WHOLE_SEQUENCE
+                windows.add(GRegion(sequence=sequence, start=start,
+                                    end=end))
+        return [(r.sequence, r.start, None if r.end == WHOLE_SEQUENCE
+                 else r.end) for r in windows.merge()]
+
+    def query(self, regions):
+        """Return the regions of the file overlapping the given windows.
+        Overlapping windows are merged first, so that every region is
+        returned once.
+
+        :param regions: A GRegion, a string such as "chr1:100-200" or
+                        "chr1", a tuple (sequence, start, end) or a GRegions
+                        or list of them
+        :type regions: GRegion, str, tuple, GRegions or list
+        :return: Overlapping regions
+        :rtype: GRegions
+        """
+        res = GRegions(name=self.name)
+        for row in self._query_rows(regions):
+            res.elements.append(self._region(row))
+        return res
+
+    def count(self, regions):
+        """Return the number of regions of the file overlapping the given
+        windows, without parsing them.
+
+        :param regions: Windows as for query
+        :type regions: GRegion, str, tuple, GRegions or list
+        :return: Number of overlapping regions
+        :rtype: int
+        """
+        return sum(1 for _ in self._query_rows(regions))
+
+    def _query_rows(self, regions):
+        previous = None
+        for sequence, start, end in self._windows(regions):
+            for row in self._rows(sequence, start, end):
+                # Rows starting in the previous window were returned for it
+                if previous is not None and previous[0] == sequence and \
+                        int(row[1]) < previous[1]:
+                    continue
+                yield row
+            previous = (sequence, end)
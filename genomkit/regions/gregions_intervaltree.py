@@ -1,13 +1,17 @@
 import random
 from genomkit import GRegion
 import numpy as np
-from .io import load_BED_intervaltree
+from .io import load_BED_index, write_BED
+from .arrays import encode_strands, encode_sequences, unique_order, \
+    merge_groups, merge_intervals, overlap_pairs, subtract_intervals
+from .interval_index import IntervalIndex, index_regions
 import os
 import sys
-from copy import deepcopy
-from tqdm import tqdm
-from intervaltree import Interval, IntervalTree
-from collections import defaultdict
+from ..progress import progress
+
+
+def _strands(index):
+    return encode_strands(r.orientation for r in index.regions)
 
 
 ###########################################################################
@@ -19,7 +23,9 @@ class GRegionsTree:
 
     This module contains functions and classes for working with a collection of
     genomic regions. It provides utilities for handling and analyzing the
-    interactions of many genomic coordinates.
+    interactions of many genomic coordinates. The regions of every sequence
+    are kept in an immutable IntervalIndex, which answers batches of queries
+    and is rebuilt in bulk when new regions are added.
     """
     def __init__(self, name: str = "", load: str = ""):
         """Create an empty GRegions object. If a path to a BED file is defined
@@ -30,42 +36,71 @@ class GRegionsTree:
         :param load: Path to a BED file, defaults to ""
         :type load: str, optional
         """
-        self.elements = defaultdict(lambda: IntervalTree())
+        self._elements = {}
+        self._pending = []
         self.name = name
         if load:
             self.load(load)
 
+    @property
+    def elements(self):
+        """Return the IntervalIndex of every sequence. The regions added by
+        add() are indexed first.
+
+        :return: Sequence name -> IntervalIndex
+        :rtype: dict
+        """
+        if self._pending:
+            for seq, index in index_regions(self._pending).items():
+                old = self._elements.get(seq)
+                if old is not None:
+                    index = IntervalIndex(
+                        np.concatenate((old.starts, index.starts)),
+                        np.concatenate((old.ends, index.ends)),
+                        np.concatenate((old.regions, index.regions)))
+                self._elements[seq] = index
+            self._pending = []
+        return self._elements
+
+    @elements.setter
+    def elements(self, value):
+        self._elements = dict(value)
+        self._pending = []
+
+    def _from_regions(self, regions, name: str = None):
+        res = GRegionsTree(name=self.name if name is None else name)
+        res.elements = index_regions(regions)
+        return res
+
     def __len__(self):
         """Return the number of regions in this GRegions.
 
         :return: Number of regions
         :rtype: int
         """
-        return sum([len(tree) for tree in self.elements.values()])
+        return sum([len(index) for index in self.elements.values()])
 
     def __getitem__(self, key):
-        rest = key + 1
-        for i, tree in self.elements.items():
-            if rest > len(tree):
-                rest -= len(tree)
-            else:
-                # print([rest, len(list(tree))])
-                return sorted(tree)[rest-1].data
+        if key < 0:
+            key += len(self)
+        for index in self.elements.values():
+            if 0 <= key < len(index):
+                return index[key]
+            key -= len(index)
+        raise IndexError("GRegionsTree index out of range")
 
     def __iter__(self):
-        for tree in self.elements.values():
-            for interval in sorted(tree):
-                yield interval.data
+        for index in self.elements.values():
+            yield from index.regions
 
     def add(self, region):
-        """Append a GRegion at the end of the elements of GRegions.
+        """Append a GRegion at the end of the elements of GRegions. The
+        index of its sequence is rebuilt on the next access.
 
         :param region: A GRegion
         :type region: GRegion
         """
-        self.elements[region.sequence].add(
-            Interval(region.start, region.end, region)
-        )
+        self._pending.append(region)
 
     def load(self, filename: str):
         """Load a BED file into the GRegions.
@@ -73,19 +108,25 @@ class GRegionsTree:
         :param filename: Path to the BED file
         :type filename: str
         """
-        self.elements = load_BED_intervaltree(filename=filename)
+        self.elements = load_BED_index(filename=filename)
 
-    def write(self, filename: str, data: bool = False):
-        """Write a BED file.
+    def write(self, filename: str, data: bool = False, compression="infer",
+              n_jobs: int = 1):
+        """Write a BED file in large blocks; files ending with .gz are
+        compressed with bgzip.
 
         :param filename: Path to the BED file
         :type filename: str
         :param data: Export extra data or not, defaults to False
         :type data: bool
+        :param compression: "infer", "gzip", "bgzip" or None, defaults to
+                            "infer"
+        :type compression: str, optional
+        :param n_jobs: Number of compression threads, defaults to 1
+        :type n_jobs: int, optional
         """
-        with open(filename, "w") as f:
-            for region in self:
-                print(region.bed_entry(data=data), file=f)
+        write_BED(self, filename, data=data, compression=compression,
+                  n_jobs=n_jobs)
 
     def get_sequences(self, unique: bool = False):
         """Return all chromosomes.
@@ -135,25 +176,15 @@ class GRegionsTree:
         :type sort: bool
         :return: None or a GRegions object
         """
-        res = defaultdict(lambda: IntervalTree())
-        for region in self:
-            # print(region)
-            r = region.extend(upstream=upstream,
-                              downstream=downstream,
-                              strandness=strandness,
-                              inplace=False)
-            res[r.sequence].add(
-                Interval(r.start,
-                         r.end,
-                         r)
-            )
-            assert isinstance(res[r.sequence], IntervalTree)
+        res = self._from_regions([region.extend(upstream=upstream,
+                                                downstream=downstream,
+                                                strandness=strandness,
+                                                inplace=False)
+                                  for region in self])
         if inplace:
-            self.elements = res
+            self.elements = res.elements
         else:
-            resGR = GRegionsTree(name=self.name)
-            resGR.elements = res
-            return resGR
+            return res
 
     def extend_fold(self, upstream: float = 0.0, downstream: float = 0.0,
                     strandness: bool = False, inplace: bool = True,
@@ -176,23 +207,15 @@ class GRegionsTree:
         :type sort: bool
         :return: None
         """
-        res = defaultdict(lambda: IntervalTree())
-        for region in self:
-            r = region.extend_fold(upstream=upstream,
-                                   downstream=downstream,
-                                   strandness=strandness,
-                                   inplace=False)
-            res[r.sequence].add(
-                Interval(r.start,
-                         r.end,
-                         r)
-            )
+        res = self._from_regions([region.extend_fold(upstream=upstream,
+                                                     downstream=downstream,
+                                                     strandness=strandness,
+                                                     inplace=False)
+                                  for region in self])
         if inplace:
-            self.elements = res
+            self.elements = res.elements
         else:
-            resGR = GRegionsTree(name=self.name)
-            resGR.elements = res
-            return resGR
+            return res
 
     def load_chrom_size_file(self, file_path):
         with open(file_path, 'r') as file:
@@ -231,11 +254,11 @@ class GRegionsTree:
         :return: A resized GRegion
         :rtype: GRegion
         """
-        res = GRegionsTree(name=self.name+"_resize")
-        for region in self.elements:
-            res.add(region.resize(extend_upstream=extend_upstream,
-                                  extend_downstream=extend_downstream,
-                                  center=center))
+        res = self._from_regions([region.resize(
+            extend_upstream=extend_upstream,
+            extend_downstream=extend_downstream,
+            center=center) for region in self],
+            name=self.name+"_resize")
         if inplace:
             self.elements = res.elements
         else:
@@ -281,6 +304,9 @@ class GRegionsTree:
                 target              ----------      ---------------       ----
                 Result                                ------
 
+        The regions of every sequence are queried in one batch against the
+        index of the target.
+
         :param target: A target GRegions for finding overlaps.
         :type target: GRegions
         :param mode: The mode should be one of the followings: "OVERLAP",
@@ -292,33 +318,33 @@ class GRegionsTree:
         :rtype: GRegions
         """
         assert isinstance(target, GRegionsTree)
-        common_seq = list(set(self.get_sequences(unique=True)) &
-                          set(target.get_sequences(unique=True)))
-        res = GRegionsTree()
-        # ORIGINAL ###############################
-        if mode == "ORIGINAL":
-            for seq in common_seq:
-                for q in target.elements[seq]:
-                    regions = self.elements[seq][q.begin:q.end]
-                    for interval in regions:
-                        res.elements[seq].add(interval)
-        # OVERLAP ###############################
-        if mode == "OVERLAP":
-            for seq in common_seq:
-                for q in target.elements[seq]:
-                    for r in self.elements[seq].overlap(q.begin, q.end):
-                        begin = max(r.begin, q.begin)
-                        end = min(r.end, q.end)
-                        gr = GRegion(sequence=seq, start=begin, end=end)
-                        res.elements[seq].add(
-                            Interval(begin, end, gr))
-        # COMP_INCL ###############################
-        if mode == "COMP_INCL":
-            for seq in common_seq:
-                for q in target.elements[seq]:
-                    regions = self.elements[seq].envelop(q.begin, q.end)
-                    for interval in regions:
-                        res.elements[seq].add(interval)
+        if mode not in ("OVERLAP", "ORIGINAL", "COMP_INCL"):
+            raise ValueError("mode should be OVERLAP, ORIGINAL or COMP_INCL")
+        regions = []
+        for seq, index in self.elements.items():
+            t_index = target.elements.get(seq)
+            if t_index is None:
+                continue
+            # OVERLAP ###############################
+            if mode == "OVERLAP":
+                si, ti = t_index.overlap(index.starts, index.ends)
+                starts = np.maximum(index.starts[si], t_index.starts[ti])
+                ends = np.minimum(index.ends[si], t_index.ends[ti])
+                for s, start, end in zip(index.regions[si], starts.tolist(),
+                                         ends.tolist()):
+                    regions.append(GRegion(sequence=seq, start=start,
+                                           end=end, name=s.name,
+                                           orientation=s.orientation,
+                                           data=s.data))
+            # ORIGINAL ###############################
+            elif mode == "ORIGINAL":
+                si, _ = t_index.overlap(index.starts, index.ends)
+                regions.extend(index.regions[np.unique(si)])
+            # COMP_INCL ###############################
+            else:
+                _, si = index.envelop(t_index.starts, t_index.ends)
+                regions.extend(index.regions[np.unique(si)])
+        res = self._from_regions(regions, name="")
         res.remove_duplicates()
         return res
 
@@ -326,11 +352,33 @@ class GRegionsTree:
         """
         Remove any duplicate regions (sorted, by default).
         """
-        for seq in self.elements.keys():
-            unique_intervals = list(set(self.elements[seq]))
-            self.elements[seq] = IntervalTree()
-            for interval in unique_intervals:
-                self.elements[seq].add(interval)
+        for seq, index in self.elements.items():
+            keep = unique_order(np.zeros(len(index), dtype=np.int32),
+                                index.starts, index.ends, _strands(index))
+            self._elements[seq] = IntervalIndex(index.starts[keep],
+                                                index.ends[keep],
+                                                index.regions[keep])
+
+    def _merge(self, by_name: bool = False, strandness: bool = False,
+               distance: int = 0, name: str = None):
+        # Merge every sequence on its sorted arrays; the merged regions keep
+        # the attributes of their first region.
+        regions = []
+        for seq, index in self.elements.items():
+            keys = []
+            if strandness:
+                keys.append(_strands(index))
+            if by_name:
+                keys.append(encode_sequences(r.name
+                                             for r in index.regions)[0])
+            order, firsts, ends = merge_groups(index.starts, index.ends,
+                                               keys, distance)
+            for r, end in zip(index.regions[order[firsts]], ends.tolist()):
+                regions.append(GRegion(sequence=seq, start=r.start, end=end,
+                                       name=r.name, score=r.score,
+                                       orientation=r.orientation,
+                                       data=r.data))
+        return self._from_regions(regions, name=name)
 
     def merge(self, by_name: bool = False, strandness: bool = False,
               inplace: bool = False):
@@ -348,65 +396,7 @@ class GRegionsTree:
         :return: None or a GRegions.
         :rtype: GRegions
         """
-        def add_merged_interval(curr_interval, r):
-            begin = min(r.begin, curr_interval.begin)
-            end = max(r.end, curr_interval.end)
-            gr = GRegion(name=r.data.name,
-                         sequence=r.data.sequence,
-                         start=begin, end=end,
-                         score=r.data.score, data=r.data.data,
-                         orientation=r.data.orientation)
-            curr_interval = Interval(begin, end, gr)
-            return curr_interval
-
-        def action_when_not_overlap(seq, curr_interval, r):
-            if curr_interval:
-                res.elements[seq].add(curr_interval)
-            return r
-
-        res = GRegionsTree(name=self.name)
-        for seq in self.elements.keys():
-            if len(self.elements[seq]) == 1:
-                res.elements[seq].add(*self.elements[seq])
-                continue
-            curr_interval = None
-            for r in self.elements[seq]:
-                if curr_interval is None or r.begin > curr_interval.end:
-                    # No overlap, add current_interval to merged_tree
-                    curr_interval = action_when_not_overlap(
-                        seq, curr_interval, r)
-                else:
-                    # Overlap, merge intervals
-                    if by_name and strandness:
-                        if r.data.name == curr_interval.data.name and \
-                            r.data.orientation == \
-                                curr_interval.data.orientation:
-                            curr_interval = add_merged_interval(
-                                curr_interval, r)
-                        else:
-                            curr_interval = action_when_not_overlap(
-                                seq, curr_interval, r)
-                    elif by_name:
-                        if r.data.name == curr_interval.data.name:
-                            curr_interval = add_merged_interval(
-                                curr_interval, r)
-                        else:
-                            curr_interval = action_when_not_overlap(
-                                seq, curr_interval, r)
-                    elif strandness:
-                        if r.data.orientation == \
-                                curr_interval.data.orientation:
-                            curr_interval = add_merged_interval(
-                                curr_interval, r)
-                        else:
-                            curr_interval = action_when_not_overlap(
-                                seq, curr_interval, r)
-                    else:
-                        curr_interval = add_merged_interval(
-                                curr_interval, r)
-            # Add the last merged interval to merged_tree
-            if curr_interval:
-                res.elements[seq].add(curr_interval)
+        res = self._merge(by_name=by_name, strandness=strandness)
         if inplace:
             self.elements = res.elements
         else:
@@ -424,11 +414,10 @@ class GRegionsTree:
         """
         if seed:
             random.seed(seed)
-        res = GRegionsTree(name="sampling")
-        sampling = random.sample(range(len(self)), size)
-        for i in sampling:
-            res.add(self[i])
-        return res
+        regions = list(self)
+        sampling = random.sample(range(len(regions)), size)
+        return self._from_regions([regions[i] for i in sampling],
+                                  name="sampling")
 
     def split(self, ratio: float, size: int = None, seed: int = None):
         """Split the elements into two GRegions with the defined sizes.
@@ -444,18 +433,16 @@ class GRegionsTree:
         """
         if seed:
             random.seed(seed)
-        if size:
-            sampling = random.sample(range(len(self)), size)
-        elif ratio and not size:
-            size = int(len(self)*ratio)
-            sampling = random.sample(range(len(self)), size)
-        a = GRegionsTree(name=self.name+"_split1")
-        b = GRegionsTree(name=self.name+"_split2")
-        for i in range(len(self)):
-            if i in sampling:
-                a.add(self.elements[i])
-            else:
-                b.add(self.elements[i])
+        regions = list(self)
+        if not size:
+            size = int(len(regions)*ratio)
+        sampling = set(random.sample(range(len(regions)), size))
+        a = self._from_regions([r for i, r in enumerate(regions)
+                                if i in sampling],
+                               name=self.name+"_split1")
+        b = self._from_regions([r for i, r in enumerate(regions)
+                                if i not in sampling],
+                               name=self.name+"_split2")
         return a, b
 
     def close_regions(self, target, max_dis=10000):
@@ -477,16 +464,14 @@ class GRegionsTree:
         return potential_targets
 
     def get_elements_by_seq(self, sequence: str, orientation: str = None):
+        index = self.elements.get(sequence)
+        regions = [] if index is None else index.regions
         if orientation is None:
-            regions = GRegionsTree(name=sequence)
-            regions.elements = [r for r in self.elements
-                                if r.sequence == sequence]
+            name = sequence
         else:
-            regions = GRegionsTree(name=sequence+" "+orientation)
-            regions.elements = [r for r in self.elements
-                                if r.sequence == sequence and
-                                r.orientation == orientation]
-        return regions
+            name = sequence+" "+orientation
+            regions = [r for r in regions if r.orientation == orientation]
+        return self._from_regions(regions, name=name)
 
     def get_array_by_seq(self, sequence: str, orientation: str = None):
         regions = self.get_elements_by_seq(sequence=sequence,
@@ -539,102 +524,49 @@ class GRegionsTree:
             Result   -------                 ------
         """
         assert isinstance(regions, GRegionsTree)
-
-        def remain_interval(seq, begin, end, interval, res):
-            gr = GRegion(sequence=seq, start=begin, end=end,
-                         name=interval.data.name, score=interval.data.score,
-                         orientation=interval.data.orientation)
-            remain = Interval(begin, end, gr)
-            res.elements[seq].add(remain)
-
-        res = GRegionsTree(name=self.name)
-        for seq in self.elements.keys():
-            for interval in self.elements[seq]:
-                # Check if exact match is required
-                if exact:
-                    # If interval not found in regions, add it to result
-                    if interval not in regions.elements[seq]:
-                        res.elements[seq].add(interval)
-                elif whole_region:
-                    if any(regions.elements[seq].overlap(
-                            interval.begin, interval.end)):
-                        continue
-                elif strandness:
-                    for r in regions.elements[seq].overlap(
-                            interval.begin, interval.end):
-                        # interval       -----
-                        # r          --------------
-                        # remain
-                        if interval.begin > r.begin and \
-                                interval.end < r.end and \
-                                interval.data.orientation ==\
-                                r.data.orientation:
-                            continue
-                        # interval   --------------
-                        # r              -----
-                        # remain     ----     -----
-                        elif interval.begin < r.begin and \
-                                interval.end > r.end and \
-                                interval.data.orientation ==\
-                                r.data.orientation:
-                            remain_interval(seq, interval.begin, r.begin,
-                                            interval, res)
-                            remain_interval(seq, r.end, interval.end,
-                                            interval, res)
-                        # interval   -------
-                        # r              -------
-                        # remain     ----
-                        elif interval.begin < r.begin and \
-                                interval.end <= r.end and \
-                                interval.data.orientation ==\
-                                r.data.orientation:
-                            remain_interval(seq, interval.begin, r.begin,
-                                            interval, res)
-                        # interval      -------
-                        # r          -------
-                        # remain            ---
-                        elif interval.begin >= r.begin and \
-                                interval.end > r.end and \
-                                interval.data.orientation ==\
-                                r.data.orientation:
-                            remain_interval(seq, r.end, interval.end,
-                                            interval, res)
-                        else:
-                            res.elements[seq].add(interval)
+        res = []
+        for seq, index in self.elements.items():
+            mask = regions.elements.get(seq)
+            if mask is None or len(mask) == 0:
+                res.extend(index.regions)
+                continue
+            if exact:
+                found = {(r.start, r.end, r.orientation)
+                         for r in mask.regions}
+                res.extend(r for r in index.regions
+                           if (r.start, r.end, r.orientation) not in found)
+                continue
+            strands, m_strands = _strands(index), _strands(mask)
+            for strand in np.unique(strands) if strandness else [None]:
+                if strand is None:
+                    ind = np.arange(len(index))
+                    m_ind = np.arange(len(mask))
                 else:
-                    for r in regions.elements[seq].overlap(
-                            interval.begin, interval.end):
-                        # interval       -----
-                        # r          --------------
-                        # remain
-                        if interval.begin > r.begin and \
-                                interval.end < r.end:
-                            continue
-                        # interval   --------------
-                        # r              -----
-                        # remain     ----     -----
-                        elif interval.begin < r.begin and \
-                                interval.end > r.end:
-                            remain_interval(seq, interval.begin, r.begin,
-                                            interval, res)
-                            remain_interval(seq, r.end, interval.end,
-                                            interval, res)
-                        # interval   -------
-                        # r              -------
-                        # remain     ----
-                        elif interval.begin < r.begin and \
-                                interval.end <= r.end:
-                            remain_interval(seq, interval.begin, r.begin,
-                                            interval, res)
-                        # interval      -------
-                        # r          -------
-                        # remain            ---
-                        elif interval.begin >= r.begin and \
-                                interval.end > r.end:
-                            remain_interval(seq, r.end, interval.end,
-                                            interval, res)
-                        else:
-                            res.elements[seq].add(interval)
+                    ind = np.flatnonzero(strands == strand)
+                    m_ind = np.flatnonzero(m_strands == strand)
+                starts, ends = index.starts[ind], index.ends[ind]
+                m_starts, m_ends = mask.starts[m_ind], mask.ends[m_ind]
+                if whole_region:
+                    qi, _ = overlap_pairs(starts, ends, m_starts, m_ends)
+                    keep = np.ones(len(ind), dtype=bool)
+                    keep[qi] = False
+                    res.extend(index.regions[ind[keep]])
+                    continue
+                m_starts, m_ends, _ = merge_intervals(m_starts, m_ends)
+                src, p_starts, p_ends = subtract_intervals(starts, ends,
+                                                           m_starts, m_ends)
+                for r, start, end in zip(index.regions[ind[src]],
+                                         p_starts.tolist(),
+                                         p_ends.tolist()):
+                    if start == r.start and end == r.end:
+                        res.append(r)
+                    else:
+                        res.append(GRegion(sequence=seq, start=start,
+                                           end=end, name=r.name,
+                                           score=r.score,
+                                           orientation=r.orientation,
+                                           data=r.data))
+        res = self._from_regions(res)
         if inplace:
             self.elements = res.elements
         else:
@@ -656,7 +588,7 @@ class GRegionsTree:
             print(FASTA_file + " is not found.")
             sys.exit()
         res = GSequences(name=self.name)
-        for region in self.elements:
+        for region in self:
             seq = fasta.get_sequence(name=region.sequence,
                                      start=region.start,
                                      end=region.end)
@@ -683,25 +615,8 @@ class GRegionsTree:
             Result(d=1)    -------        ---------       ----      ----
             Result(d=10)   ---------------------------------------------
         """
-        if len(self) == 0:
-            return GRegionsTree()
-        elif len(self) == 1:
-            return self
-        else:
-            z = GRegionsTree('Clustered region set')
-            previous = deepcopy(self.elements[0])
-            for s in self.elements[1:]:
-                s_ext = s.extend(upstream=max_distance,
-                                 downstream=max_distance,
-                                 inplace=False)
-                if s_ext.overlap(previous):
-                    previous.start = min(previous.start, s.start)
-                    previous.end = max(previous.end, s.end)
-                else:
-                    z.add(previous)
-                    previous = deepcopy(s)
-            z.add(previous)
-            return z
+        return self._merge(distance=max_distance,
+                           name='Clustered region set')
 
     def total_coverage(self):
         """Return the total coverage (bp) of all the regions.
@@ -710,7 +625,8 @@ class GRegionsTree:
         :rtype: int
         """
         merged_regions = self.merge(inplace=False)
-        cov = sum([len(r) for r in merged_regions])
+        cov = sum([int((index.ends - index.starts).sum())
+                   for index in merged_regions.elements.values()])
         return cov
 
     def filter_by_names(self, names, inplace=False):
@@ -724,10 +640,8 @@ class GRegionsTree:
         :return: A GRegions with filtered regions
         :rtype: GRegions
         """
-        res = GRegionsTree(name=self.name)
-        for r in self.elements:
-            if r.name in names:
-                res.add(r)
+        names = set(names)
+        res = self._from_regions([r for r in self if r.name in names])
         if inplace:
             self.elements = res.elements
         else:
@@ -748,14 +662,9 @@ class GRegionsTree:
         :return: A GRegions with filtered regions
         :rtype: GRegions
         """
-        res = GRegionsTree(name=self.name)
-        for r in self.elements:
-            if r.score > larger_than:
-                res.add(r)
-            elif r.score < smaller_than:
-                res.add(r)
-            else:
-                continue
+        res = self._from_regions([r for r in self
+                                  if r.score > larger_than or
+                                  r.score < smaller_than])
         if inplace:
             self.elements = res.elements
         else:
@@ -763,7 +672,9 @@ class GRegionsTree:
 
     def rename_by_GRegions(self, name_source, strandness: bool = True,
                            inplace: bool = True):
-        """Rename the regions' names by the given GRegions.
+        """Rename the regions' names by the given GRegions. Every region takes
+        the name of the first overlapping region of name_source; the regions
+        without any overlap keep their names.
 
         :param name_source: A GRegions where the names are taken as sources.
         :type name_source: GRegions
@@ -773,36 +684,27 @@ class GRegionsTree:
                         same object (True) or return a new object.
         :type inplace: bool, default to True
         """
-        def new_interval(seq, interval, r, res):
-            res.elements[seq].add(
-                Interval(interval.begin, interval.end,
-                         GRegion(sequence=interval.data.sequence,
-                                 start=interval.data.start,
-                                 end=interval.data.end,
-                                 name=r.data.name,
-                                 score=interval.data.score,
-                                 orientation=interval.data.orientation,
-                                 data=interval.data.data)))
         assert isinstance(name_source, GRegionsTree)
 
         res = GRegionsTree(name=self.name)
-        for seq in tqdm(self.elements.keys(), desc="Renaming"):
-            for interval in self.elements[seq]:
-                if any(name_source.elements[seq].overlap(
-                            interval.begin, interval.end)):
-                    for r in name_source.elements[seq].overlap(
-                            interval.begin, interval.end):
-                        if strandness:
-                            if interval.data.orientation == r.data.orientation:
-                                new_interval(seq, interval, r, res)
-                            else:
-                                res.elements[seq].add(interval)
-                        else:
-                            new_interval(seq, interval, r, res)
-                else:
-                    res.elements[seq].add(interval)
-        # names = res.get_names()
-        # print(names)
+        for seq, index in progress(self.elements.items(), desc="Renaming"):
+            source = name_source.elements.get(seq)
+            renamed = index.regions.copy()
+            if source is not None:
+                si, ti = source.overlap(index.starts, index.ends)
+                if strandness:
+                    same = _strands(index)[si] == _strands(source)[ti]
+                    si, ti = si[same], ti[same]
+                si, first = np.unique(si, return_index=True)
+                for i, r, s in zip(si.tolist(), index.regions[si],
+                                   source.regions[ti[first]]):
+                    renamed[i] = GRegion(sequence=r.sequence, start=r.start,
+                                         end=r.end, name=s.name,
+                                         score=r.score,
+                                         orientation=r.orientation,
+                                         data=r.data)
+            res._elements[seq] = IntervalIndex(index.starts, index.ends,
+                                               renamed)
         if inplace:
             self.elements = res.elements
         else:
@@ -1,4 +1,8 @@
-from genomkit import GRegions
+from genomkit import GRegion, GRegions
+from .arrays import encode_strands, regions_to_arrays, unique_order, \
+    merge_groups, merge_intervals, overlap_indices, bin_pairs, \
+    partition_intervals
+from .interval_index import RegionMask
 from collections import OrderedDict
 import numpy as np
 import pandas as pd
@@ -6,6 +10,14 @@ import glob
 import os
 
 
+def _union(codes, starts, ends, labels, n_codes, n_jobs):
+    # Merge the regions of every GRegions
+    order, firsts, merged_ends = merge_groups(
+        starts, ends, [labels * n_codes + codes], n_jobs=n_jobs)
+    firsts = order[firsts]
+    return codes[firsts], starts[firsts], merged_ends, labels[firsts]
+
+
 class GRegionsSet:
     """
     GRegionsSet module
@@ -92,7 +104,87 @@ class GRegionsSet:
             res[name] = len(regions)
         return res
 
-    def count_overlaps(self, query_set, percentage: bool = False):
+    def _arrays(self, vocabulary=None):
+        """Return the regions of all GRegions stacked into arrays with the
+        index of their GRegions as label."""
+        codes, starts, ends, strands, labels = [], [], [], [], []
+        for label, regions in enumerate(self.collection.values()):
+            c, s, e, vocabulary = regions_to_arrays(regions, vocabulary)
+            codes.append(c)
+            starts.append(s)
+            ends.append(e)
+            strands.append(encode_strands(r.orientation for r in regions))
+            labels.append(np.full(len(c), label, dtype=np.int64))
+        empty = [np.empty(0, dtype=np.int64)]
+        return np.concatenate(empty + codes), np.concatenate(empty + starts), \
+            np.concatenate(empty + ends), np.concatenate(empty + strands), \
+            np.concatenate(empty + labels), vocabulary
+
+    def overlap_matrices(self, query_set=None, n_jobs: int = 1):
+        """Return the all-vs-all overlap statistics between the GRegions of
+        this set (rows) and those of the query set (columns).
+
+        All the regions of each set are stacked into one labelled stream,
+        so that the overlaps of all the pairs of GRegions are found in a
+        single sweep per chromosome.
+
+        - **count**: number of regions of the row overlapping the column, as
+          in GRegions.overlap_count
+        - **bp**: base pairs covered by both GRegions
+        - **jaccard**: bp divided by the base pairs covered by either of
+          them, as in bedtools jaccard
+
+        :param query_set: Query GRegionsSet, defaults to this set
+        :type query_set: GRegionsSet, optional
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
+        :return: Matrices of counts, overlapping bp and Jaccard indices
+        :rtype: tuple of dataframes
+        """
+        if query_set is None:
+            query_set = self
+        n_ref, n_query = len(self), len(query_set)
+        codes, starts, ends, strands, labels, vocabulary = self._arrays()
+        q_codes, q_starts, q_ends, _, q_labels, vocabulary = \
+            query_set._arrays(vocabulary)
+        # Identical regions are counted once, as in intersect
+        keep = unique_order(labels * len(vocabulary) + codes, starts, ends,
+                            strands)
+        codes, starts, ends, labels = codes[keep], starts[keep], \
+            ends[keep], labels[keep]
+        qi, ti = overlap_indices(codes, starts, ends,
+                                 q_codes, q_starts, q_ends, n_jobs=n_jobs)
+        hits = np.unique(qi * n_query + q_labels[ti])
+        counts = np.bincount(labels[hits // n_query] * n_query +
+                             hits % n_query, minlength=n_ref * n_query)
+
+        codes, starts, ends, labels = _union(codes, starts, ends, labels,
+                                             len(vocabulary), n_jobs)
+        q_codes, q_starts, q_ends, q_labels = _union(
+            q_codes, q_starts, q_ends, q_labels, len(vocabulary), n_jobs)
+        qi, ti = overlap_indices(codes, starts, ends,
+                                 q_codes, q_starts, q_ends, n_jobs=n_jobs)
+        bp = np.bincount(labels[qi] * n_query + q_labels[ti],
+                         weights=np.minimum(ends[qi], q_ends[ti]) -
+                         np.maximum(starts[qi], q_starts[ti]),
+                         minlength=n_ref * n_query).reshape(n_ref, n_query)
+        coverage = np.bincount(labels, weights=ends - starts,
+                               minlength=n_ref)
+        q_coverage = np.bincount(q_labels, weights=q_ends - q_starts,
+                                 minlength=n_query)
+        union_bp = coverage[:, None] + q_coverage[None, :] - bp
+        jaccard = np.divide(bp, union_bp, out=np.zeros(bp.shape),
+                            where=union_bp > 0)
+        index, columns = self.get_names(), query_set.get_names()
+        return (pd.DataFrame(counts.reshape(n_ref, n_query), index=index,
+                             columns=columns),
+                pd.DataFrame(bp.astype(np.int64), index=index,
+                             columns=columns),
+                pd.DataFrame(jaccard, index=index, columns=columns))
+
+    def count_overlaps(self, query_set, percentage: bool = False,
+                       n_jobs: int = 1):
         """Return a pandas dataframe of the numbers of overlapping regions
         between the reference GRegionsSet (self) and the query GRegionsSet.
 
@@ -101,21 +193,13 @@ class GRegionsSet:
         :param percentage: Convert the contingency table into percentage. The
                            sum per row (reference) is 100%, defaults to False
         :type percentage: bool, optional
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
         :return: Matrix of numbers of overlaps
         :rtype: dataframe
         """
-        res = np.zeros((len(self), len(query_set)))
-        row_names = []
-        col_names = []
-        for i, (ref_name, ref) in enumerate(self.collection.items()):
-            row_names.append(ref_name)
-            for j, (query_name, query) in enumerate(query_set.items()):
-                col_names.append(query_name)
-                c = ref.overlap_count(target=query)
-                res[i, j] = c
-        df = pd.DataFrame(res,
-                          index=row_names,
-                          columns=col_names)
+        df, _, _ = self.overlap_matrices(query_set, n_jobs=n_jobs)
         if percentage:
             df = df.div(df.sum(axis=1), axis=0) * 100
         return df
@@ -126,8 +210,147 @@ class GRegionsSet:
         chi2_stat, p_val, _, _ = chi2_contingency(contingency_table)
         return chi2_stat, p_val
 
+    def bin_matrix(self, windows, center: bool = False, score: bool = False,
+                   sparse: bool = True):
+        """Return the matrix of the numbers of regions of every GRegions
+        (rows) overlapping every window (columns). The regions of all the
+        GRegions are digitised together in one pass.
+
+        :param windows: Windows such as the output of GRegions.make_windows
+        :type windows: GRegionsArray or GRegions
+        :param center: Only count the regions in the windows containing
+                       their midpoints, defaults to False
+        :type center: bool, optional
+        :param score: Sum the scores of the regions instead of counting
+                      them, defaults to False
+        :type score: bool, optional
+        :param sparse: Return a scipy.sparse.csr_matrix instead of a dense
+                       array, defaults to True
+        :type sparse: bool, optional
+        :return: Matrix of counts (or scores), rows follow get_names()
+        :rtype: scipy.sparse.csr_matrix or numpy.ndarray
+        """
+        from genomkit import GRegionsArray
+        from scipy.sparse import coo_matrix
+        if not isinstance(windows, GRegionsArray):
+            windows = GRegionsArray.from_GRegions(windows)
+        codes, starts, ends, _, labels, _ = self._arrays(
+            list(windows.sequence_names))
+        ri, wi = bin_pairs(windows.sequences, windows.starts, windows.ends,
+                           codes, starts, ends, center=center)
+        if score:
+            scores = np.concatenate(
+                [np.empty(0, dtype=np.float64)] +
+                [np.fromiter((r.score for r in regions), dtype=np.float64,
+                             count=len(regions))
+                 for regions in self.collection.values()])
+            values = scores[ri]
+        else:
+            values = np.ones(len(ri), dtype=np.int64)
+        # Duplicated entries are summed by the conversion
+        matrix = coo_matrix((values, (labels[ri], wi)),
+                            shape=(len(self), len(windows))).tocsr()
+        return matrix if sparse else matrix.toarray()
+
+    def _partition(self, members: bool, n_jobs: int):
+        """Return the segments covered by the merged regions of all GRegions
+        with the labels covering them and the vocabulary."""
+        codes, starts, ends, _, labels, vocabulary = self._arrays()
+        codes, starts, ends, labels = _union(codes, starts, ends, labels,
+                                             len(vocabulary), n_jobs)
+        return partition_intervals(codes, starts, ends,
+                                   labels if members else None,
+                                   len(self)) + (vocabulary,)
+
+    def multi_intersect(self, membership: bool = False, n_jobs: int = 1):
+        """Return the genome partitioned into the segments covered by the
+        GRegions, as bedtools multiinter. Every segment is named by the
+        comma-separated names of the GRegions covering it and scored by
+        their number. The segments are cut at every start and end of all
+        the regions in a single sweep, so no pair of GRegions is compared.
+
+        :param membership: Also return the boolean matrix of the GRegions
+                           (columns, following get_names()) covering every
+                           segment (rows), defaults to False
+        :type membership: bool, optional
+        :param n_jobs: Number of processes sharing the chromosomes when
+                       merging the regions, defaults to 1
+        :type n_jobs: int, optional
+        :return: Segments, and the membership as a scipy.sparse.csr_matrix if
+                 requested
+        :rtype: GRegionsArray or tuple
+        """
+        from genomkit import GRegionsArray
+        codes, starts, ends, indptr, members, vocabulary = \
+            self._partition(True, n_jobs)
+        set_names = np.array(self.get_names() + [""], dtype=object)
+        names = [",".join(set_names[members[lo:hi]])
+                 for lo, hi in zip(indptr[:-1].tolist(),
+                                   indptr[1:].tolist())]
+        res = GRegionsArray.from_arrays(
+            codes, starts, ends, scores=np.diff(indptr), names=names,
+            sequence_names=vocabulary, name="multi_intersect")
+        if not membership:
+            return res
+        from scipy.sparse import csr_matrix
+        matrix = csr_matrix((np.ones(len(members), dtype=bool), members,
+                             indptr), shape=(len(res), len(self)))
+        return res, matrix
+
+    def consensus(self, min_sets: int = 2, whole_region: bool = False,
+                  n_jobs: int = 1):
+        """Return the consensus regions covered by at least min_sets
+        GRegions. Contiguous segments are joined and every region is scored
+        by the maximal number of GRegions covering it.
+
+        ::
+
+            set 1          ------        ----
+            set 2             -------      ----
+            Result(k=2)       ---          --
+            whole_region   ----------    ------
+
+        :param min_sets: Minimal number of GRegions, defaults to 2
+        :type min_sets: int, optional
+        :param whole_region: Return the whole contiguous regions covered by
+                             any GRegions if min_sets of them overlap
+                             somewhere within, defaults to False
+        :type whole_region: bool, optional
+        :param n_jobs: Number of processes sharing the chromosomes when
+                       merging the regions, defaults to 1
+        :type n_jobs: int, optional
+        :return: Consensus regions
+        :rtype: GRegions
+        """
+        codes, starts, ends, indptr, _, vocabulary = \
+            self._partition(False, n_jobs)
+        counts = np.diff(indptr)
+        if not whole_region:
+            keep = counts >= min_sets
+            codes, starts, ends, counts = codes[keep], starts[keep], \
+                ends[keep], counts[keep]
+        res = GRegions(name="consensus")
+        if len(starts) == 0:
+            return res
+        # Join the contiguous segments on a flat coordinate
+        span = int(ends.max()) + 1
+        _, _, firsts = merge_intervals(codes * span + starts,
+                                       codes * span + ends, distance=1)
+        scores = np.maximum.reduceat(counts, firsts)
+        lasts = np.concatenate((firsts[1:], [len(starts)])) - 1
+        codes, starts, ends = codes[firsts], starts[firsts], ends[lasts]
+        if whole_region:
+            keep = scores >= min_sets
+            codes, starts, ends, scores = codes[keep], starts[keep], \
+                ends[keep], scores[keep]
+        res.elements = [GRegion(sequence=vocabulary[c], start=s, end=e,
+                                score=k)
+                        for c, s, e, k in zip(codes.tolist(), starts.tolist(),
+                                              ends.tolist(), scores.tolist())]
+        return res
+
     def subtract(self, regions, whole_region: bool = False,
-                 merge: bool = True, exact: bool = False):
+                 merge: bool = True, exact: bool = False, n_jobs: int = 1):
         """Perform inplace subtract in all GRegions.
 
         :param regions: GRegions which to subtract by
@@ -142,9 +365,15 @@ class GRegionsSet:
                       completely ignored and the returned GRegions is sorted
                       and does not contain duplicates.
         :type exact: bool, default to False
+        :param n_jobs: Number of processes sharing the chromosomes, defaults
+                       to 1
+        :type n_jobs: int, optional
         """
+        # Index the subtracted regions once for all the GRegions
+        mask = RegionMask(regions)
         for grs in self.collection.values():
-            grs.subtract(regions, whole_region, merge, exact, inplace=True)
+            grs.subtract(mask, whole_region, merge, exact, inplace=True,
+                         n_jobs=n_jobs)
 
     def resize(self, extend_upstream: int, extend_downstream: int,
                center="mid_point"):
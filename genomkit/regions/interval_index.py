@@ -0,0 +1,357 @@
+import numpy as np
+from .arrays import object_array, regions_to_arrays, sequence_slices, \
+    start_reach, overlap_pairs, envelop_pairs, merge_intervals, \
+    subtract_intervals, match_intervals, group_bounds
+from .parallel import map_sequences
+
+
+###########################################################################
+# IntervalIndex
+###########################################################################
+class IntervalIndex:
+    """
+    IntervalIndex module
+
+    This module contains an immutable index of the intervals on one sequence.
+    The intervals are stored in arrays sorted by start and end together with
+    the running maximum of the ends, so that batches of point, overlap and
+    envelop queries are answered with binary searches over contiguous memory
+    instead of walking a tree.
+    """
+    __slots__ = ("starts", "ends", "reach", "regions")
+
+    def __init__(self, starts, ends, regions=None):
+        """Build the index in one pass from the start and end positions.
+
+        :param starts: Start positions
+        :type starts: array-like
+        :param ends: End positions
+        :type ends: array-like
+        :param regions: Objects attached to the intervals (e.g. GRegion),
+                        defaults to None
+        :type regions: array-like, optional
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        order = np.lexsort((ends, starts))
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.reach = start_reach(self.starts, self.ends)
+        self.regions = None
+        if regions is not None:
+            if not isinstance(regions, np.ndarray) or \
+                    regions.dtype != object:
+                regions = object_array(regions)
+            self.regions = regions[order]
+        for array in (self.starts, self.ends, self.reach, self.regions):
+            if array is not None:
+                array.flags.writeable = False
+
+    @classmethod
+    def from_regions(cls, regions):
+        """Build the index of GRegion objects on the same sequence.
+
+        :param regions: GRegion objects
+        :type regions: iterable
+        :return: An IntervalIndex
+        :rtype: IntervalIndex
+        """
+        regions = object_array(regions)
+        _, starts, ends, _ = regions_to_arrays(regions)
+        return cls(starts, ends, regions)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, key):
+        return self.regions[key]
+
+    def __iter__(self):
+        if self.regions is not None:
+            return iter(self.regions)
+        return zip(self.starts.tolist(), self.ends.tolist())
+
+    @property
+    def nbytes(self):
+        """Return the number of bytes used by the coordinate arrays.
+
+        :return: Bytes
+        :rtype: int
+        """
+        return self.starts.nbytes + self.ends.nbytes + self.reach.nbytes
+
+    def overlap(self, starts, ends):
+        """Return the pairs (query, interval) for all the indexed intervals
+        overlapping the query intervals.
+
+        :param starts: Query start positions
+        :type starts: array-like
+        :param ends: Query end positions
+        :type ends: array-like
+        :return: Query indices and indices of the indexed intervals
+        :rtype: tuple
+        """
+        return overlap_pairs(np.asarray(starts, dtype=np.int64),
+                             np.asarray(ends, dtype=np.int64),
+                             self.starts, self.ends, self.reach)
+
+    def point(self, positions):
+        """Return the pairs (query, interval) for all the indexed intervals
+        containing the query positions.
+
+        :param positions: Query positions
+        :type positions: array-like
+        :return: Query indices and indices of the indexed intervals
+        :rtype: tuple
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        return self.overlap(positions, positions + 1)
+
+    def envelop(self, starts, ends):
+        """Return the pairs (query, interval) for all the indexed intervals
+        lying completely within the query intervals.
+
+        :param starts: Query start positions
+        :type starts: array-like
+        :param ends: Query end positions
+        :type ends: array-like
+        :return: Query indices and indices of the indexed intervals
+        :rtype: tuple
+        """
+        return envelop_pairs(np.asarray(starts, dtype=np.int64),
+                             np.asarray(ends, dtype=np.int64),
+                             self.starts, self.ends)
+
+    def count(self, starts, ends):
+        """Return the number of indexed intervals overlapping every query.
+
+        :param starts: Query start positions
+        :type starts: array-like
+        :param ends: Query end positions
+        :type ends: array-like
+        :return: Counts per query
+        :rtype: numpy.ndarray
+        """
+        qi, _ = self.overlap(starts, ends)
+        return np.bincount(qi, minlength=len(starts))
+
+
+###########################################################################
+# RegionMask
+###########################################################################
+class RegionMask:
+    """
+    RegionMask module
+
+    This module contains a set of regions prepared for subtraction. The
+    regions are indexed once per sequence; the merged intervals needed for
+    partial subtraction are derived on first use and kept, so the same mask
+    can be subtracted from many region sets.
+    """
+    __slots__ = ("name", "indexes", "_merged")
+
+    def __init__(self, regions, name: str = ""):
+        """Index the regions to subtract.
+
+        :param regions: GRegion objects, e.g. a GRegions
+        :type regions: iterable
+        :param name: Name of the mask, defaults to the name of regions
+        :type name: str, optional
+        """
+        self.name = name or getattr(regions, "name", "")
+        self.indexes = index_regions(regions)
+        self._merged = {}
+
+    def __len__(self):
+        return sum(len(index) for index in self.indexes.values())
+
+    def merged(self, sequence: str):
+        """Return the merged intervals of the mask on a sequence.
+
+        :param sequence: Sequence name
+        :type sequence: str
+        :return: Sorted and disjoint starts and ends
+        :rtype: tuple
+        """
+        res = self._merged.get(sequence)
+        if res is None:
+            index = self.indexes[sequence]
+            res = merge_intervals(index.starts, index.ends)[:2]
+            self._merged[sequence] = res
+        return res
+
+    def subtract(self, sequence: str, starts, ends):
+        """Remove the mask from intervals on a sequence.
+
+        :param sequence: Sequence name
+        :type sequence: str
+        :param starts: Start positions
+        :type starts: numpy.ndarray
+        :param ends: End positions
+        :type ends: numpy.ndarray
+        :return: Source index, start and end of every remaining piece
+        :rtype: tuple
+        """
+        if sequence not in self.indexes:
+            return np.arange(len(starts)), starts, ends
+        m_starts, m_ends = self.merged(sequence)
+        return subtract_intervals(starts, ends, m_starts, m_ends)
+
+    def overlapped(self, sequence: str, starts, ends):
+        """Return a mask of the intervals overlapping any region of the
+        mask on a sequence.
+
+        :param sequence: Sequence name
+        :type sequence: str
+        :param starts: Start positions
+        :type starts: numpy.ndarray
+        :param ends: End positions
+        :type ends: numpy.ndarray
+        :return: True for the overlapping intervals
+        :rtype: numpy.ndarray
+        """
+        res = np.zeros(len(starts), dtype=bool)
+        index = self.indexes.get(sequence)
+        if index is not None:
+            qi, _ = index.overlap(starts, ends)
+            res[qi] = True
+        return res
+
+    def matched(self, sequence: str, starts, ends):
+        """Return a mask of the intervals with exactly the start and end of
+        a region of the mask on a sequence.
+
+        :param sequence: Sequence name
+        :type sequence: str
+        :param starts: Start positions
+        :type starts: numpy.ndarray
+        :param ends: End positions
+        :type ends: numpy.ndarray
+        :return: True for the matching intervals
+        :rtype: numpy.ndarray
+        """
+        index = self.indexes.get(sequence)
+        if index is None:
+            return np.zeros(len(starts), dtype=bool)
+        return match_intervals(starts, ends, index.starts, index.ends)
+
+    def apply(self, vocabulary, codes, starts, ends, mode: str = "partial",
+              n_jobs: int = 1, presorted: bool = False):
+        """Remove the mask from intervals on all their sequences at once,
+        with n_jobs processes sharing the sequences.
+
+        :param vocabulary: Sequence names indexed by code
+        :type vocabulary: list
+        :param codes: Sequence codes
+        :type codes: numpy.ndarray
+        :param starts: Start positions
+        :type starts: numpy.ndarray
+        :param ends: End positions
+        :type ends: numpy.ndarray
+        :param mode: "partial" to cut the mask out of the intervals, "whole"
+                     to drop the intervals overlapping it or "exact" to drop
+                     the intervals matching one of its regions, defaults to
+                     "partial"
+        :type mode: str, optional
+        :param n_jobs: Number of processes sharing the sequences, defaults
+                       to 1
+        :type n_jobs: int, optional
+        :param presorted: The intervals are grouped by sequence, defaults to
+                          False
+        :type presorted: bool, optional
+        :return: Source index, start and end of every remaining piece,
+                 grouped by sequence
+        :rtype: tuple
+        """
+        if presorted:
+            order = np.arange(len(codes))
+        else:
+            order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        bounds = group_bounds(sorted_codes)
+        empty = np.empty(0, dtype=np.int64)
+        m_starts, m_ends, m_reach, tasks = [empty], [empty], [empty], []
+        offset = 0
+        for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            sequence = vocabulary[int(sorted_codes[lo])]
+            if sequence not in self.indexes:
+                tasks.append((lo, hi, offset, offset, mode))
+                continue
+            index = self.indexes[sequence]
+            if mode == "partial":
+                m_s, m_e = self.merged(sequence)
+            else:
+                m_s, m_e = index.starts, index.ends
+                m_reach.append(index.reach)
+            m_starts.append(m_s)
+            m_ends.append(m_e)
+            tasks.append((lo, hi, offset, offset + len(m_s), mode))
+            offset += len(m_s)
+        results = map_sequences(_mask_task,
+                                {"starts": starts[order],
+                                 "ends": ends[order],
+                                 "m_starts": np.concatenate(m_starts),
+                                 "m_ends": np.concatenate(m_ends),
+                                 "m_reach": np.concatenate(m_reach)},
+                                tasks, n_jobs)
+        return (order[np.concatenate([empty] + [r[0] for r in results])],
+                np.concatenate([empty] + [r[1] for r in results]),
+                np.concatenate([empty] + [r[2] for r in results]))
+
+
+def _mask_task(arrays, lo, hi, m_lo, m_hi, mode):
+    # Remove the mask intervals m_lo:m_hi from the intervals lo:hi of one
+    # sequence
+    starts, ends = arrays["starts"][lo:hi], arrays["ends"][lo:hi]
+    m_starts = arrays["m_starts"][m_lo:m_hi]
+    m_ends = arrays["m_ends"][m_lo:m_hi]
+    if m_lo == m_hi:
+        return np.arange(lo, hi), starts.copy(), ends.copy()
+    if mode == "partial":
+        i, p_starts, p_ends = subtract_intervals(starts, ends, m_starts,
+                                                 m_ends)
+        return i + lo, p_starts, p_ends
+    if mode == "exact":
+        found = match_intervals(starts, ends, m_starts, m_ends)
+    else:
+        found = np.zeros(hi - lo, dtype=bool)
+        qi, _ = overlap_pairs(starts, ends, m_starts, m_ends,
+                              arrays["m_reach"][m_lo:m_hi])
+        found[qi] = True
+    keep = np.flatnonzero(~found)
+    return keep + lo, starts[keep], ends[keep]
+
+
+def build_indexes(codes, starts, ends, regions, vocabulary):
+    """Build one IntervalIndex per sequence from parallel arrays.
+
+    :param codes: Sequence codes
+    :type codes: numpy.ndarray
+    :param starts: Start positions
+    :type starts: numpy.ndarray
+    :param ends: End positions
+    :type ends: numpy.ndarray
+    :param regions: Objects attached to the intervals
+    :type regions: numpy.ndarray
+    :param vocabulary: Sequence names indexed by code
+    :type vocabulary: list
+    :return: Sequence name -> IntervalIndex, in order of first appearance
+    :rtype: dict
+    """
+    groups = sequence_slices(codes, np.argsort(codes, kind="stable"))
+    return {vocabulary[code]: IntervalIndex(starts[ind], ends[ind],
+                                            regions[ind])
+            for code, ind in groups.items()}
+
+
+def index_regions(regions):
+    """Build one IntervalIndex per sequence from GRegion objects.
+
+    :param regions: GRegion objects
+    :type regions: iterable
+    :return: Sequence name -> IntervalIndex
+    :rtype: dict
+    """
+    regions = object_array(regions)
+    codes, starts, ends, vocabulary = regions_to_arrays(regions)
+    return build_indexes(codes, starts, ends, regions, vocabulary)
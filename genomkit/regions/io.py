@@ -1,113 +1,627 @@
 import os
-from tqdm import tqdm
-from intervaltree import Interval, IntervalTree
-from collections import defaultdict, OrderedDict
+import re
+import gzip
+import json
+import zlib
+import struct
+import shutil
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice, repeat
+import numpy as np
+import pandas as pd
+from ..progress import progress
+from .arrays import STRAND_CODES, object_array, SortCheck, sort_state
+from .parallel import effective_jobs
+
+# Number of BED lines parsed at once
+BED_CHUNK_SIZE = 1 << 17
+# Lines of BED files which are not records
+HEADER_PREFIXES = ("#", "track", "browser")
+HEADER_LINES = re.compile(r"^(?:#|track|browser).*\n?", re.MULTILINE)
+# Binary format: a directory of .npy columns and a JSON table of strings
+BINARY_SUFFIX = ".gregions"
+BINARY_VERSION = 1
+BINARY_COLUMNS = ["sequences", "starts", "ends", "orientations", "scores",
+                  "names"]
+# Number of regions formatted into one block of text when writing
+WRITE_CHUNK_SIZE = 1 << 16
+# Uncompressed bytes per BGZF block, as bgzip, and the BGZF end of file
+BGZF_BLOCK_SIZE = 0xff00
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b00030000000000"
+                         "00000000")
+COMPRESSIONS = (None, "gzip", "bgzip")
 
 
 ###########################################################################
 # IO functions
 ###########################################################################
-def load_BED(filename: str):
-    def get_score(score):
-        if score == ".":
-            score = 0
-        else:
-            score = float(score)
-        return score
-    from genomkit import GRegion, GRegions
+def load_BED(filename: str, stream: bool = False,
+             chunk_size: int = BED_CHUNK_SIZE):
+    """Load a BED file (optionally gzipped) into a GRegions. The file is
+    parsed in bulk by chunks of lines.
+
+    With stream=True, an iterator of GRegions holding at most chunk_size
+    regions each is returned instead, so that large files can be processed
+    in bounded memory.
+
+    The order of the regions is checked on the parsed columns while
+    loading, so that sorted files come with sorted set to True.
+
+    :param filename: Path to the BED file
+    :type filename: str
+    :param stream: Return an iterator of GRegions chunks, defaults to False
+    :type stream: bool, optional
+    :param chunk_size: Number of lines parsed at once, defaults to
+                       BED_CHUNK_SIZE
+    :type chunk_size: int, optional
+    :return: A GRegions or an iterator of GRegions
+    :rtype: GRegions
+    """
+    from genomkit import GRegions
     if not os.path.exists(filename):
         raise FileNotFoundError(f"The file '{filename}' does not exist.")
-    else:
+    if stream:
+        return iter_BED_chunks(filename, chunk_size)
+    ncols = None
+    while True:
         res = GRegions()
-        with open(filename, 'r') as file:
-            for line in tqdm(file,
-                             desc=os.path.basename(filename),
-                             unit=" lines"):
-                if not line.startswith("#"):
-                    infos = line.strip().split()
-                    if len(infos) == 3:
-                        res.add(GRegion(sequence=infos[0],
-                                        start=int(infos[1]),
-                                        end=int(infos[2])))
-                    elif len(infos) == 4:
-                        res.add(GRegion(sequence=infos[0],
-                                        start=int(infos[1]),
-                                        end=int(infos[2]),
-                                        name=infos[3]))
-                    elif len(infos) == 5:
-                        res.add(GRegion(sequence=infos[0],
-                                        start=int(infos[1]),
-                                        end=int(infos[2]),
-                                        name=infos[3],
-                                        score=get_score(infos[4])))
-                    elif len(infos) == 6:
-                        res.add(GRegion(sequence=infos[0],
-                                        start=int(infos[1]),
-                                        end=int(infos[2]),
-                                        name=infos[3],
-                                        score=get_score(infos[4]),
-                                        orientation=infos[5]))
-                    elif len(infos) > 6:
-                        res.add(GRegion(sequence=infos[0],
-                                        start=int(infos[1]),
-                                        end=int(infos[2]),
-                                        name=infos[3],
-                                        score=get_score(infos[4]),
-                                        orientation=infos[5],
-                                        data=infos[6:]))
+        check = SortCheck()
+        try:
+            with progress(desc=os.path.basename(filename),
+                          unit=" lines") as bar:
+                for frame in read_BED_frame(filename, chunk_size=chunk_size,
+                                            ncols=ncols):
+                    if len(frame) == 0:
+                        continue
+                    codes, vocabulary = pd.factorize(frame[0], sort=False)
+                    check.update(codes, frame[1].to_numpy(dtype=np.int64),
+                                 frame[2].to_numpy(dtype=np.int64),
+                                 vocabulary.tolist())
+                    res.elements.extend(frame_to_GRegions(frame).elements)
+                    bar.update(len(frame))
+            break
+        except pd.errors.ParserError:
+            if ncols is not None:
+                raise
+            # A record has more columns than the first one
+            ncols = count_BED_columns(filename, first=False)
+    res.sorted, res.sequence_order = check.result()
+    return res
+
+
+def iter_BED_chunks(filename: str, chunk_size: int = BED_CHUNK_SIZE):
+    """Yield the regions of a BED file as GRegions of at most chunk_size
+    regions. Only one chunk is held in memory at a time. The number of
+    columns is the one of the first record, and a ValueError is raised at
+    the first record with more columns.
+
+    :param filename: Path to the BED file
+    :type filename: str
+    :param chunk_size: Number of lines parsed at once, defaults to
+                       BED_CHUNK_SIZE
+    :type chunk_size: int, optional
+    :return: Generator of GRegions
+    :rtype: generator
+    """
+    name = os.path.basename(filename)
+    try:
+        for frame in read_BED_frame(filename, chunk_size=chunk_size):
+            if len(frame):
+                yield frame_to_GRegions(frame, name=name)
+    except pd.errors.ParserError as e:
+        raise ValueError(f"'{filename}' has records with more columns than "
+                         "the first one and cannot be streamed.") from e
+
+
+def open_text(filename: str, mode: str = "r"):
+    """Open a plain or gzipped text file; bgzip compressed files (.bgz) are
+    gzipped files as well."""
+    if filename.endswith((".gz", ".bgz")):
+        return gzip.open(filename, mode + "t")
+    else:
+        return open(filename, mode)
+
+
+def count_BED_columns(filename: str, first: bool = True):
+    """Return the number of columns in the first record of a BED file, or
+    the largest number over all records if first is False."""
+    ncols = 0
+    with open_text(filename) as file:
+        for line in file:
+            if line.strip() and not line.startswith(HEADER_PREFIXES):
+                if first:
+                    return len(line.split())
+                ncols = max(ncols, len(line.split()))
+    return ncols
+
+
+class BEDRecords:
+    """Text file wrapper which drops the header lines (#, track, browser)
+    of a BED file, so that the C parser sees only the records and a # inside
+    a field is kept."""
+    def __init__(self, file):
+        self.file = file
+        self.rest = ""
+
+    def read(self, size: int = -1):
+        while True:
+            block = self.file.read(size)
+            text = self.rest + block
+            # Keep the incomplete last line for the next block
+            cut = text.rfind("\n") + 1 if block else len(text)
+            text, self.rest = HEADER_LINES.sub("", text[:cut]), text[cut:]
+            if text or not block:
+                return text
+
+    def __iter__(self):
+        return iter(self.read().splitlines(True))
+
+
+def read_BED_frame(filename: str, chunk_size: int = None,
+                   ncols: int = None):
+    """Parse a BED file into a pandas DataFrame with the C parser. If
+    chunk_size is given, an iterator of DataFrames is returned instead.
+
+    Without ncols, the number of columns is taken from the first record; a
+    record with more columns raises a pandas ParserError if chunk_size is
+    given, otherwise the file is parsed again with the largest number of
+    columns. Shorter records are padded with empty fields.
+    """
+    first = ncols is None
+    if first:
+        ncols = count_BED_columns(filename)
+    if ncols == 0:
+        frame = pd.DataFrame(columns=range(3))
+        return iter([frame]) if chunk_size else frame
+    if chunk_size:
+        return _BED_chunks(filename, chunk_size, ncols, first)
+    try:
+        with open_text(filename) as file:
+            return _trim_BED(_parse_BED(BEDRecords(file), ncols, first),
+                             ncols, first)
+    except pd.errors.ParserError:
+        if not first:
+            raise
+        return read_BED_frame(filename,
+                              ncols=count_BED_columns(filename, first=False))
+
+
+def _BED_chunks(filename, chunk_size, ncols, first):
+    # The file is closed when the iteration ends
+    with open_text(filename) as file:
+        for frame in _parse_BED(BEDRecords(file), ncols, first, chunk_size):
+            yield _trim_BED(frame, ncols, first)
+
+
+def _parse_BED(file, ncols, first, chunk_size=None):
+    # With first, one column more than the first record is read, which is
+    # empty unless a record is longer; shorter records are padded
+    width = ncols + 1 if first else ncols
+    return pd.read_csv(file, sep=r"\s+", header=None, names=range(width),
+                       index_col=False,
+                       dtype={i: (np.int64 if i in (1, 2) else str)
+                              for i in range(width)},
+                       na_filter=False, engine="c", chunksize=chunk_size)
+
+
+def _trim_BED(frame, ncols, first):
+    # Drop the extra column read by _parse_BED
+    if not first:
+        return frame
+    if (frame[ncols] != "").any():
+        raise pd.errors.ParserError("A record has more columns than the "
+                                    "first one.")
+    return frame.drop(columns=ncols)
+
+
+def BED_scores(frame):
+    """Return the scores of a DataFrame of BED columns ("." as 0)."""
+    return pd.to_numeric(frame[4].replace({".": "0", "": "0"}),
+                         errors="coerce").fillna(0).to_numpy(
+                             dtype=np.float64)
+
+
+def frame_to_GRegions(frame, name: str = ""):
+    """Convert a DataFrame of BED columns into a GRegions."""
+    from genomkit import GRegion, GRegions
+    ncols = frame.shape[1]
+    res = GRegions(name=name)
+    if len(frame) == 0:
         return res
+    # Positional columns of GRegion: sequence, start, end, orientation,
+    # name, score and data
+    n = len(frame)
+    columns = [frame[0].tolist(), frame[1].tolist(), frame[2].tolist(),
+               frame[5].replace({"": "."}).tolist() if ncols > 5
+               else repeat(".", n),
+               frame[3].tolist() if ncols > 3 else repeat("", n),
+               [0 if v in (".", "") else float(v)
+                for v in frame[4].tolist()] if ncols > 4 else repeat(0, n)]
+    if ncols > 6:
+        columns.append([[v for v in row if v] for row in
+                        frame.iloc[:, 6:].itertuples(index=False,
+                                                     name=None)])
+    res.elements = [GRegion(*values) for values in zip(*columns)]
+    return res
 
 
-def load_BED_intervaltree(filename: str):
-    def get_score(score):
-        if score == ".":
-            score = 0
-        else:
-            score = float(score)
-        return score
-    from genomkit import GRegion
+def frame_to_GRegionsArray(frame, name: str = ""):
+    """Convert a DataFrame of BED columns into a GRegionsArray."""
+    from genomkit import GRegionsArray
+    ncols = frame.shape[1]
+    n = len(frame)
+    codes, vocabulary = pd.factorize(frame[0], sort=False)
+    if ncols > 3:
+        names = frame[3].to_numpy(dtype=str)
+    else:
+        names = np.full(n, "")
+    if ncols > 4:
+        scores = BED_scores(frame)
+    else:
+        scores = np.zeros(n)
+    if ncols > 5:
+        orientations = frame[5].map(STRAND_CODES).fillna(0).to_numpy(
+            dtype=np.int8)
+    else:
+        orientations = np.zeros(n, dtype=np.int8)
+    data = None
+    if ncols > 6:
+        data = object_array([v for v in row if v] for row in
+                            frame.iloc[:, 6:].itertuples(index=False,
+                                                         name=None))
+    return GRegionsArray.from_arrays(
+        sequences=codes.astype(np.int32),
+        sequence_names=[str(v) for v in vocabulary],
+        starts=frame[1].to_numpy(dtype=np.int64),
+        ends=frame[2].to_numpy(dtype=np.int64),
+        orientations=orientations, scores=scores, names=names,
+        data=data, name=name)
+
+
+def load_BED_array(filename: str):
+    """Load a BED file (optionally gzipped) into a GRegionsArray by parsing
+    all columns in bulk.
+
+    :param filename: Path to the BED file
+    :type filename: str
+    :return: A GRegionsArray
+    :rtype: GRegionsArray
+    """
     if not os.path.exists(filename):
         raise FileNotFoundError(f"The file '{filename}' does not exist.")
+    res = frame_to_GRegionsArray(read_BED_frame(filename),
+                                 name=os.path.basename(filename))
+    res.sorted, res.sequence_order = sort_state(
+        res.sequences, res.starts, res.ends, res.sequence_names)
+    return res
+
+
+def load_BED_index(filename: str):
+    """Load a BED file into one IntervalIndex per sequence. The file is
+    parsed in bulk and every index is built in a single pass.
+
+    :param filename: Path to the BED file
+    :type filename: str
+    :return: Sequence name -> IntervalIndex
+    :rtype: dict
+    """
+    from .interval_index import build_indexes
+    regions = load_BED_array(filename)
+    return build_indexes(regions.sequences, regions.starts, regions.ends,
+                         object_array(regions), regions.sequence_names)
+
+
+###########################################################################
+# Writing
+###########################################################################
+def infer_compression(filename: str, compression="infer"):
+    """Return the compression of an output file: "infer" gives bgzip for
+    the files ending with .gz or .bgz and no compression otherwise.
+
+    :param filename: Path to the file
+    :type filename: str
+    :param compression: "infer", "gzip", "bgzip" or None, defaults to
+                        "infer"
+    :type compression: str, optional
+    :return: "gzip", "bgzip" or None
+    :rtype: str
+    """
+    if compression == "infer":
+        return "bgzip" if filename.endswith((".gz", ".bgz")) else None
+    if compression not in COMPRESSIONS:
+        raise ValueError("compression should be infer, gzip, bgzip or None")
+    return compression
+
+
+def bgzf_compress(data: bytes, level: int = 6):
+    """Compress bytes into BGZF blocks, the gzip variant of bgzip which
+    tabix can index. The blocks are independent gzip members, so any gzip
+    reader decompresses them.
+
+    :param data: Uncompressed bytes
+    :type data: bytes
+    :param level: zlib compression level, defaults to 6
+    :type level: int, optional
+    :return: Compressed blocks without the end of file block
+    :rtype: bytes
+    """
+    blocks = []
+    for i in range(0, len(data), BGZF_BLOCK_SIZE):
+        chunk = data[i:i + BGZF_BLOCK_SIZE]
+        deflate = zlib.compressobj(level, zlib.DEFLATED, -15)
+        body = deflate.compress(chunk) + deflate.flush()
+        # gzip header with the BC extra field holding the block size - 1
+        blocks.append(struct.pack("<4BI2BH2BHH", 31, 139, 8, 4, 0, 0, 255,
+                                  6, 66, 67, 2, len(body) + 25))
+        blocks.append(body)
+        blocks.append(struct.pack("<2I", zlib.crc32(chunk), len(chunk)))
+    return b"".join(blocks)
+
+
+def write_blocks(blocks, filename: str, append: bool = False,
+                 compression="infer", compresslevel: int = 6,
+                 n_jobs: int = 1):
+    """Write blocks of text to a file, optionally compressed. Every block is
+    encoded and compressed at once; with n_jobs > 1 the compression runs in
+    a thread pool, at most two blocks per thread ahead of the writing.
+
+    :param blocks: Strings to write
+    :type blocks: iterable
+    :param filename: Path to the file
+    :type filename: str
+    :param append: Append to the file instead of overwriting it, defaults
+                   to False
+    :type append: bool, optional
+    :param compression: "infer", "gzip", "bgzip" or None, see
+                        infer_compression, defaults to "infer"
+    :type compression: str, optional
+    :param compresslevel: zlib compression level, defaults to 6
+    :type compresslevel: int, optional
+    :param n_jobs: Number of compression threads, defaults to 1
+    :type n_jobs: int, optional
+    """
+    compression = infer_compression(filename, compression)
+    if compression == "gzip":
+        compress = partial(gzip.compress, compresslevel=compresslevel,
+                           mtime=0)
+    elif compression == "bgzip":
+        compress = partial(bgzf_compress, level=compresslevel)
+    n_jobs = effective_jobs(n_jobs)
+    encoded = (block.encode() for block in blocks)
+    with open(filename, "ab" if append else "wb") as f:
+        if compression is None:
+            for data in encoded:
+                f.write(data)
+        elif n_jobs == 1:
+            for data in encoded:
+                f.write(compress(data))
+        else:
+            with ThreadPoolExecutor(n_jobs) as pool:
+                pending = deque()
+                for data in encoded:
+                    pending.append(pool.submit(compress, data))
+                    if len(pending) > 2 * n_jobs:
+                        f.write(pending.popleft().result())
+                while pending:
+                    f.write(pending.popleft().result())
+        if compression == "bgzip":
+            f.write(BGZF_EOF)
+
+
+def BED_lines(regions, data: bool = False):
+    """Return the BED lines of GRegion objects as one string, formatted
+    like GRegion.bed_entry.
+
+    :param regions: GRegion objects
+    :type regions: iterable
+    :param data: Export extra data or not, defaults to False
+    :type data: bool, optional
+    :return: Lines ending with a newline
+    :rtype: str
+    """
+    if data:
+        lines = [f"{r.sequence}\t{r.start}\t{r.end}\t{r.name}\t{r.score}"
+                 f"\t{r.orientation}\t" + "\t".join(r.data)
+                 for r in regions]
     else:
-        res = defaultdict(lambda: IntervalTree())
-        with open(filename, 'r') as file:
-            for line in tqdm(file,
-                             desc=os.path.basename(filename),
-                             unit=" lines"):
-                if not line.startswith("#"):
-                    infos = line.strip().split()
-                    if len(infos) == 3:
-                        region = GRegion(sequence=infos[0],
-                                         start=int(infos[1]),
-                                         end=int(infos[2]))
-                    elif len(infos) == 4:
-                        region = GRegion(sequence=infos[0],
-                                         start=int(infos[1]),
-                                         end=int(infos[2]),
-                                         name=infos[3])
-                    elif len(infos) == 5:
-                        region = GRegion(sequence=infos[0],
-                                         start=int(infos[1]),
-                                         end=int(infos[2]),
-                                         name=infos[3],
-                                         score=get_score(infos[4]))
-                    elif len(infos) == 6:
-                        region = GRegion(sequence=infos[0],
-                                         start=int(infos[1]),
-                                         end=int(infos[2]),
-                                         name=infos[3],
-                                         score=get_score(infos[4]),
-                                         orientation=infos[5])
-                    elif len(infos) > 6:
-                        region = GRegion(sequence=infos[0],
-                                         start=int(infos[1]),
-                                         end=int(infos[2]),
-                                         name=infos[3],
-                                         score=get_score(infos[4]),
-                                         orientation=infos[5],
-                                         data=infos[6:])
-                    res[infos[0]].add(
-                        Interval(int(infos[1]),
-                                 int(infos[2]),
-                                 region))
-        return res
+        lines = [f"{r.sequence}\t{r.start}\t{r.end}\t{r.name}\t{r.score}"
+                 f"\t{r.orientation}" for r in regions]
+    lines.append("")
+    return "\n".join(lines)
+
+
+def write_BED(regions, filename: str, data: bool = False,
+              append: bool = False, compression="infer",
+              compresslevel: int = 6, n_jobs: int = 1):
+    """Write GRegion objects to a BED file in blocks of WRITE_CHUNK_SIZE
+    regions, see write_blocks. Files ending with .gz are compressed with
+    bgzip, which gzip readers and tabix both understand.
+
+    :param regions: A list or any iterable of GRegion
+    :type regions: iterable
+    :param filename: Path to the BED file
+    :type filename: str
+    :param data: Export extra data or not, defaults to False
+    :type data: bool, optional
+    :param append: Append to the file instead of overwriting it, defaults
+                   to False
+    :type append: bool, optional
+    :param compression: "infer", "gzip", "bgzip" or None, defaults to
+                        "infer"
+    :type compression: str, optional
+    :param compresslevel: zlib compression level, defaults to 6
+    :type compresslevel: int, optional
+    :param n_jobs: Number of compression threads, defaults to 1
+    :type n_jobs: int, optional
+    """
+    if isinstance(regions, list):
+        chunks = (regions[i:i + WRITE_CHUNK_SIZE]
+                  for i in range(0, len(regions), WRITE_CHUNK_SIZE))
+    else:
+        regions = iter(regions)
+        chunks = iter(lambda: list(islice(regions, WRITE_CHUNK_SIZE)), [])
+    write_blocks((BED_lines(chunk, data) for chunk in chunks), filename,
+                 append=append, compression=compression,
+                 compresslevel=compresslevel, n_jobs=n_jobs)
+
+
+###########################################################################
+# Binary format
+###########################################################################
+def is_binary(path: str):
+    """Return whether the path is a directory written by save_binary."""
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+
+def source_stamp(filename: str):
+    """Return the size and modification time identifying a source file."""
+    stat = os.stat(filename)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def save_binary(regions, path: str, source: str = None):
+    """Save a GRegionsArray in the binary format: one .npy file per column
+    and a meta.json holding the sequence names. The directory is written
+    aside and moved into place, so that readers never see a partial copy.
+    An existing binary directory at path is replaced, but any other existing
+    file or directory is not.
+
+    :param regions: A GRegionsArray
+    :type regions: GRegionsArray
+    :param path: Path to the output directory
+    :type path: str
+    :param source: Path to the BED file the regions were loaded from, which
+                   is recorded for cache invalidation, defaults to None
+    :type source: str, optional
+    """
+    write_binary(regions, path, source_stamp(source) if source else None)
+
+
+def write_binary(regions, path: str, stamp: dict = None):
+    """Write the binary directory of save_binary with the given source
+    stamp."""
+    if os.path.exists(path) and not is_binary(path):
+        raise ValueError(f"'{path}' exists and is not a binary GRegions "
+                         "directory.")
+    tmp = path + ".tmp" + str(os.getpid())
+    os.makedirs(tmp)
+    try:
+        for key in BINARY_COLUMNS:
+            np.save(os.path.join(tmp, key + ".npy"), getattr(regions, key))
+        data = regions.data
+        if data is not None:
+            np.save(os.path.join(tmp, "data.npy"),
+                    np.array(["\t".join(d) if d else "" for d in data],
+                             dtype=str))
+        meta = {"version": BINARY_VERSION,
+                "name": regions.name,
+                "sorted": regions.sorted,
+                "sequence_order": regions.sequence_order,
+                "sequence_names": regions.sequence_names,
+                "data": data is not None,
+                "source": stamp}
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        if os.path.exists(path):
+            if not is_binary(path):
+                raise ValueError(f"'{path}' exists and is not a binary "
+                                 "GRegions directory.")
+            shutil.rmtree(path)
+        os.rename(tmp, path)
+    except BaseException as e:
+        shutil.rmtree(tmp, ignore_errors=True)
+        # Another process may have written the same cache meanwhile
+        if not isinstance(e, OSError) or not is_binary(path):
+            raise
+
+
+def read_binary_meta(path: str):
+    """Return the metadata of a binary directory or None if it is missing
+    or written by another format version."""
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != BINARY_VERSION:
+        return None
+    return meta
+
+
+def load_binary(path: str, mmap: bool = True):
+    """Load a GRegionsArray saved by save_binary. With mmap=True the
+    columns are read-only memory maps of the files, so nothing is copied
+    until the regions are modified.
+
+    :param path: Path to the binary directory
+    :type path: str
+    :param mmap: Memory-map the columns, defaults to True
+    :type mmap: bool, optional
+    :return: A GRegionsArray
+    :rtype: GRegionsArray
+    """
+    from genomkit import GRegionsArray
+    meta = read_binary_meta(path)
+    if meta is None:
+        raise ValueError(f"'{path}' is not a binary GRegions directory.")
+    mmap_mode = "r" if mmap else None
+    cols = {key: np.load(os.path.join(path, key + ".npy"),
+                         mmap_mode=mmap_mode)
+            for key in BINARY_COLUMNS}
+    data = None
+    if meta["data"]:
+        data = object_array(d.split("\t") if d else [] for d in
+                            np.load(os.path.join(path, "data.npy")).tolist())
+    res = GRegionsArray.from_arrays(
+        sequences=cols["sequences"], starts=cols["starts"],
+        ends=cols["ends"], orientations=cols["orientations"],
+        scores=cols["scores"], names=cols["names"], data=data,
+        sequence_names=meta["sequence_names"], name=meta["name"])
+    res.sorted = meta["sorted"]
+    res.sequence_order = meta.get("sequence_order", "lexicographic")
+    return res
+
+
+def cache_path(filename: str, cache_dir: str = None):
+    """Return the path of the binary cache of a BED file, either next to
+    the file or in cache_dir."""
+    if cache_dir is None:
+        return filename + BINARY_SUFFIX
+    key = hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, os.path.basename(filename) + "." + key +
+                        BINARY_SUFFIX)
+
+
+def load_BED_cached(filename: str, cache_dir: str = None):
+    """Load a BED file through its binary cache. The cache is (re)built
+    whenever it is missing or the size or modification time of the BED file
+    has changed; otherwise the regions are memory-mapped from the cache.
+
+    :param filename: Path to the BED file
+    :type filename: str
+    :param cache_dir: Directory for the cache, defaults to the directory of
+                      the BED file
+    :type cache_dir: str, optional
+    :return: A GRegionsArray
+    :rtype: GRegionsArray
+    """
+    if not os.path.exists(filename):
+        raise FileNotFoundError(f"The file '{filename}' does not exist.")
+    path = cache_path(filename, cache_dir)
+    stamp = source_stamp(filename)
+    meta = read_binary_meta(path)
+    if meta is not None and meta["source"] == stamp:
+        return load_binary(path)
+    regions = load_BED_array(filename)
+    try:
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+        write_binary(regions, path, stamp)
+    except (OSError, ValueError):
+        # A read-only location or another file at the cache path only
+        # disables the cache
+        pass
+    return regions
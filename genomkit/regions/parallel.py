@@ -0,0 +1,125 @@
+"""
+Parallel execution per sequence
+
+The array kernels are independent across sequences. These helpers copy the
+input arrays once into shared memory and run a kernel for every sequence in a
+process pool. The workers attach to the shared blocks by name, so the inputs
+are never pickled; only the per-sequence results are sent back.
+"""
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+# Below this number of rows the tasks run in the calling process, because
+# starting a pool costs more than it saves.
+PARALLEL_MIN_SIZE = 1 << 16
+# Shared blocks attached by a worker process
+_attached = {}
+
+
+def effective_jobs(n_jobs):
+    """Return the number of processes for n_jobs; None or a negative value
+    means all the CPUs.
+
+    :param n_jobs: Requested number of processes
+    :type n_jobs: int
+    :return: Number of processes
+    :rtype: int
+    """
+    if n_jobs is None or n_jobs < 0:
+        return os.cpu_count() or 1
+    return max(int(n_jobs), 1)
+
+
+class SharedArrays:
+    """
+    SharedArrays module
+
+    This module contains a set of NumPy arrays copied into shared memory
+    blocks. The blocks are released when the object is closed or leaves a
+    with statement.
+    """
+    def __init__(self, arrays: dict):
+        """Copy the arrays into shared memory.
+
+        :param arrays: Name -> array
+        :type arrays: dict
+        """
+        self.blocks = []
+        self.specs = {}
+        try:
+            for key, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                block = shared_memory.SharedMemory(
+                    create=True, size=max(array.nbytes, 1))
+                self.blocks.append(block)
+                np.ndarray(array.shape, dtype=array.dtype,
+                           buffer=block.buf)[...] = array
+                self.specs[key] = (block.name, array.shape, array.dtype.str)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def attach(specs: dict):
+    """Return the arrays described by SharedArrays.specs, attaching to their
+    shared blocks in the current process.
+
+    :param specs: Name -> (block name, shape, dtype)
+    :type specs: dict
+    :return: Name -> array
+    :rtype: dict
+    """
+    arrays = {}
+    for key, (name, shape, dtype) in specs.items():
+        block = _attached.get(name)
+        if block is None:
+            block = _attached[name] = shared_memory.SharedMemory(name=name)
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return arrays
+
+
+def _run(kernel, specs, task):
+    return kernel(attach(specs), *task)
+
+
+def map_sequences(kernel, arrays: dict, tasks: list, n_jobs: int = 1):
+    """Return [kernel(arrays, *task) for task in tasks], computed in a pool
+    of n_jobs processes on shared copies of the arrays. The kernel must be a
+    module-level function and should return new arrays, not views of its
+    inputs.
+
+    :param kernel: Function called as kernel(arrays, *task)
+    :type kernel: callable
+    :param arrays: Name -> array, read-only for the kernel
+    :type arrays: dict
+    :param tasks: Arguments of every call, usually the row bounds of one
+                  sequence
+    :type tasks: list
+    :param n_jobs: Number of processes, defaults to 1
+    :type n_jobs: int, optional
+    :return: Results in the order of the tasks
+    :rtype: list
+    """
+    n_jobs = min(effective_jobs(n_jobs), len(tasks))
+    size = max([len(a) for a in arrays.values()], default=0)
+    if n_jobs <= 1 or size < PARALLEL_MIN_SIZE:
+        return [kernel(arrays, *task) for task in tasks]
+    with SharedArrays(arrays) as shared, \
+            ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        futures = [pool.submit(_run, kernel, shared.specs, task)
+                   for task in tasks]
+        return [future.result() for future in futures]
@@ -0,0 +1,230 @@
+"""
+Random placement of regions
+
+The regions are shuffled on a flat coordinate space made of the allowed
+intervals of the genome, i.e. the chromosomes without the excluded regions.
+Every region draws a start uniformly from this space and is drawn again if
+it does not fit in one allowed interval, so that all the valid placements
+are equally likely. Many permutations are drawn at once as arrays, and their
+overlaps with a target are counted in batches, optionally in a process pool.
+"""
+import numpy as np
+from .arrays import merge_intervals, complement_intervals
+from .parallel import map_sequences
+
+# Maximal number of shuffled regions handled by one task
+PERMUTATION_BLOCK_SIZE = 1 << 21
+# Maximal number of draws for a region before giving up
+MAX_TRIES = 1000
+
+
+###########################################################################
+# Allowed space
+###########################################################################
+def genome_space(sizes: dict, ex_codes=None, ex_starts=None, ex_ends=None):
+    """Return the allowed intervals of a genome without the excluded regions,
+    laid out one after another on a flat coordinate.
+
+    :param sizes: Chromosome -> size; the codes follow its order
+    :type sizes: dict
+    :param ex_codes: Chromosome codes of the excluded regions
+    :type ex_codes: numpy.ndarray, optional
+    :param ex_starts: Start positions of the excluded regions
+    :type ex_starts: numpy.ndarray, optional
+    :param ex_ends: End positions of the excluded regions
+    :type ex_ends: numpy.ndarray, optional
+    :return: Arrays "codes", "starts", "ends" and "offsets" (flat start) of
+             the allowed intervals and "bounds", the flat range of every
+             chromosome
+    :rtype: dict
+    """
+    n = len(sizes)
+    lengths = np.fromiter(sizes.values(), dtype=np.int64, count=n)
+    if ex_codes is None:
+        ex_codes = ex_starts = ex_ends = np.empty(0, dtype=np.int64)
+    codes, starts, ends = complement_intervals(lengths, ex_codes, ex_starts,
+                                               ex_ends)
+    lengths = ends - starts
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    first = np.searchsorted(codes, np.arange(n + 1), side="left")
+    return {"codes": codes, "starts": starts, "ends": ends,
+            "offsets": offsets[:-1], "bounds": offsets[first]}
+
+
+def draw_positions(rng, space: dict, lengths, lo, hi):
+    """Draw a random placement for every region.
+
+    :param rng: Random generator
+    :type rng: numpy.random.Generator
+    :param space: Allowed space from genome_space
+    :type space: dict
+    :param lengths: Lengths of the regions
+    :type lengths: numpy.ndarray
+    :param lo: First flat position allowed for every region
+    :type lo: numpy.ndarray
+    :param hi: End of the flat positions allowed for every region
+    :type hi: numpy.ndarray
+    :return: Chromosome codes and start positions
+    :rtype: tuple
+    """
+    codes = np.empty(len(lengths), dtype=np.int64)
+    starts = np.empty(len(lengths), dtype=np.int64)
+    todo = np.arange(len(lengths))
+    for _ in range(MAX_TRIES):
+        if len(todo) == 0:
+            return codes, starts
+        flat = rng.integers(lo[todo], hi[todo])
+        k = np.searchsorted(space["offsets"], flat, side="right") - 1
+        start = space["starts"][k] + flat - space["offsets"][k]
+        fit = start + lengths[todo] <= space["ends"][k]
+        codes[todo[fit]] = space["codes"][k[fit]]
+        starts[todo[fit]] = start[fit]
+        todo = todo[~fit]
+    if len(todo) == 0:
+        return codes, starts
+    raise ValueError(str(len(todo)) + " regions could not be placed in " +
+                     str(MAX_TRIES) + " tries.")
+
+
+###########################################################################
+# Permutations
+###########################################################################
+def genome_positions(sizes: dict, codes, starts, ends):
+    """Return the regions on one flat coordinate covering the chromosomes
+    one after another. Regions on other sequences are dropped and regions
+    are clipped to their chromosomes.
+
+    :param sizes: Chromosome -> size; the codes follow its order
+    :type sizes: dict
+    :param codes: Chromosome codes
+    :type codes: numpy.ndarray
+    :param starts: Start positions
+    :type starts: numpy.ndarray
+    :param ends: End positions
+    :type ends: numpy.ndarray
+    :return: Flat starts and ends
+    :rtype: tuple
+    """
+    lengths = np.fromiter(sizes.values(), dtype=np.int64, count=len(sizes))
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    known = codes < len(sizes)
+    codes = codes[known]
+    starts = np.minimum(starts[known], lengths[codes])
+    ends = np.minimum(ends[known], lengths[codes])
+    return offsets[codes] + starts, offsets[codes] + ends
+
+
+def union_of(starts, ends):
+    """Return the merged intervals of flat regions together with the
+    covered base pairs before every merged interval, as used by
+    overlap_statistic.
+
+    :param starts: Flat start positions
+    :type starts: numpy.ndarray
+    :param ends: Flat end positions
+    :type ends: numpy.ndarray
+    :return: Merged starts, merged ends and covered bp before each
+    :rtype: tuple
+    """
+    order = np.lexsort((ends, starts))
+    m_starts, m_ends, _ = merge_intervals(starts[order], ends[order])
+    covered = np.concatenate(([0], np.cumsum(m_ends - m_starts)))
+    return m_starts, m_ends, covered[:-1]
+
+
+def overlap_statistic(m_starts, m_ends, covered, starts, ends,
+                      statistic: str = "count"):
+    """Return the overlap statistic of every region with merged targets:
+    "count" is 1 for the regions overlapping any target and "bp" the number
+    of overlapping base pairs.
+
+    :param m_starts: Merged target starts from union_of
+    :type m_starts: numpy.ndarray
+    :param m_ends: Merged target ends from union_of
+    :type m_ends: numpy.ndarray
+    :param covered: Covered bp before every merged target from union_of
+    :type covered: numpy.ndarray
+    :param starts: Flat start positions of the regions
+    :type starts: numpy.ndarray
+    :param ends: Flat end positions of the regions
+    :type ends: numpy.ndarray
+    :param statistic: "count" or "bp", defaults to "count"
+    :type statistic: str, optional
+    :return: Statistic per region
+    :rtype: numpy.ndarray
+    """
+    if len(m_starts) == 0:
+        return np.zeros(len(starts), dtype=np.int64)
+    if statistic == "count":
+        # The first target ending after the start must begin before the end
+        j = np.searchsorted(m_ends, starts, side="right")
+        hit = m_starts[np.minimum(j, len(m_starts) - 1)] < ends
+        return (hit & (j < len(m_starts))).astype(np.int64)
+    elif statistic == "bp":
+        def coverage(x):
+            # Covered bp up to every position
+            j = np.maximum(np.searchsorted(m_starts, x, side="right") - 1, 0)
+            return covered[j] + np.clip(x - m_starts[j], 0,
+                                        m_ends[j] - m_starts[j])
+        return coverage(ends) - coverage(starts)
+    raise ValueError("statistic should be count or bp")
+
+
+def _permutation_task(arrays, seed, n_perm, statistic):
+    rng = np.random.default_rng(seed)
+    space = {key: arrays[key] for key in ("codes", "starts", "ends",
+                                          "offsets")}
+    lengths = np.tile(arrays["lengths"], n_perm)
+    codes, starts = draw_positions(rng, space, lengths,
+                                   np.tile(arrays["lo"], n_perm),
+                                   np.tile(arrays["hi"], n_perm))
+    starts += arrays["genome_offsets"][codes]
+    res = overlap_statistic(arrays["m_starts"], arrays["m_ends"],
+                            arrays["covered"], starts, starts + lengths,
+                            statistic)
+    return res.reshape(n_perm, -1).sum(axis=1)
+
+
+def permutation_statistics(sizes: dict, space: dict, lengths, lo, hi,
+                           targets, n: int = 1000, statistic: str = "count",
+                           seed=None, n_jobs: int = 1):
+    """Return the overlap statistic of n random placements of the regions.
+    The permutations are drawn in blocks which run in a pool of n_jobs
+    processes; the result only depends on the seed.
+
+    :param sizes: Chromosome -> size; the codes follow its order
+    :type sizes: dict
+    :param space: Allowed space from genome_space
+    :type space: dict
+    :param lengths: Lengths of the regions
+    :type lengths: numpy.ndarray
+    :param lo: First flat position allowed for every region
+    :type lo: numpy.ndarray
+    :param hi: End of the flat positions allowed for every region
+    :type hi: numpy.ndarray
+    :param targets: Merged targets from union_of
+    :type targets: tuple
+    :param n: Number of permutations, defaults to 1000
+    :type n: int, optional
+    :param statistic: "count" or "bp", defaults to "count"
+    :type statistic: str, optional
+    :param seed: Seed for randomness, defaults to None
+    :type seed: int, optional
+    :param n_jobs: Number of processes, defaults to 1
+    :type n_jobs: int, optional
+    :return: Statistic per permutation
+    :rtype: numpy.ndarray
+    """
+    block = max(1, PERMUTATION_BLOCK_SIZE // max(len(lengths), 1))
+    blocks = [min(block, n - i) for i in range(0, n, block)]
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+    tasks = [(s, size, statistic) for s, size in zip(seeds, blocks)]
+    genome_offsets = np.concatenate(([0], np.cumsum(list(sizes.values()))))
+    m_starts, m_ends, covered = targets
+    arrays = {"codes": space["codes"], "starts": space["starts"],
+              "ends": space["ends"], "offsets": space["offsets"],
+              "genome_offsets": genome_offsets.astype(np.int64),
+              "lengths": lengths, "lo": lo, "hi": hi,
+              "m_starts": m_starts, "m_ends": m_ends, "covered": covered}
+    results = map_sequences(_permutation_task, arrays, tasks, n_jobs)
+    return np.concatenate([np.empty(0, dtype=np.int64)] + results)
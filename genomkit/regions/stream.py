@@ -0,0 +1,446 @@
+"""
+Streaming set operations on sorted regions
+
+The functions of this module take BED files (optionally gzipped) or
+iterables of GRegion, sorted by sequence, start and end, and yield their
+results lazily. Both inputs are swept once and only the target regions which
+can still reach the current region are held, so that the memory does not
+depend on the size of the inputs. The results match the GRegions methods of
+the same names and come in the same sorted order::
+
+    from genomkit.regions import stream
+
+    peaks = stream.intersect("fragments.bed.gz", "peaks.bed", mode="ORIGINAL")
+    stream.write(stream.merge(peaks), "covered.bed.gz")
+
+Unsorted files can be sorted first with external_sort. Inputs which are not
+sorted in the given chromosome order raise a ValueError when the first
+misplaced region is read.
+"""
+import heapq
+from .arrays import STRAND_CODES, sequence_key
+from .gregion import GRegion
+from .io import BED_CHUNK_SIZE, load_BED, write_BED
+
+INTERSECT_MODES = ("OVERLAP", "ORIGINAL", "COMP_INCL")
+
+
+###########################################################################
+# Reading and writing
+###########################################################################
+def read(source, order="lexicographic", chunk_size: int = BED_CHUNK_SIZE):
+    """Yield the regions of a sorted BED file or iterable of GRegion and
+    check their order on the way.
+
+    :param source: Path to a BED file or iterable of GRegion
+    :type source: str or iterable
+    :param order: Chromosome order, see GRegions.sort, defaults to
+                  "lexicographic"
+    :type order: str or list, optional
+    :param chunk_size: Number of BED lines parsed at once, defaults to
+                       BED_CHUNK_SIZE
+    :type chunk_size: int, optional
+    :return: Generator of GRegion
+    :rtype: generator
+    """
+    if isinstance(source, str):
+        name = "'" + source + "'"
+        source = (r for chunk in load_BED(source, stream=True,
+                                          chunk_size=chunk_size)
+                  for r in chunk)
+    else:
+        name = "The regions"
+    seq_key = sequence_key(order)
+    sequence, key, previous = None, None, None
+    for region in source:
+        if region.sequence != sequence:
+            new_key = seq_key(region.sequence)
+            if key is not None and new_key <= key:
+                raise ValueError(name + " are not sorted: " +
+                                 region.sequence + " is not in " +
+                                 str(order) + " order.")
+            sequence, key, previous = region.sequence, new_key, None
+        current = (region.start, region.end)
+        if previous is not None and current < previous:
+            raise ValueError(name + " are not sorted: " + str(region) +
+                             " comes after " + sequence + ":" +
+                             str(previous[0]) + "-" + str(previous[1]) + ".")
+        previous = current
+        yield region
+
+
+def write(regions, filename: str, data: bool = False, compression="infer",
+          n_jobs: int = 1):
+    """Write regions, for example a stream of results, to a BED file in
+    blocks, see write_BED. Files ending with .gz are compressed with bgzip.
+
+    :param regions: Iterable of GRegion
+    :type regions: iterable
+    :param filename: Path to the BED file
+    :type filename: str
+    :param data: Export extra data or not, defaults to False
+    :type data: bool, optional
+    :param compression: "infer", "gzip", "bgzip" or None, defaults to
+                        "infer"
+    :type compression: str, optional
+    :param n_jobs: Number of compression threads, defaults to 1
+    :type n_jobs: int, optional
+    """
+    write_BED(regions, filename, data=data, compression=compression,
+              n_jobs=n_jobs)
+
+
+class _Targets:
+    """Sorted target regions read on demand, one sequence after another."""
+    def __init__(self, source, order, chunk_size):
+        self.regions = read(source, order, chunk_size)
+        self.seq_key = sequence_key(order)
+        self.head = next(self.regions, None)
+
+    def seek(self, sequence: str):
+        # Skip the targets on the sequences before the given one
+        key = self.seq_key(sequence)
+        while self.head is not None and self.head.sequence != sequence \
+                and self.seq_key(self.head.sequence) < key:
+            self.head = next(self.regions, None)
+
+    def pull(self, sequence: str, end=None):
+        # Return the next target on the sequence starting before end
+        head = self.head
+        if head is None or head.sequence != sequence or \
+                (end is not None and head.start >= end):
+            return None
+        self.head = next(self.regions, None)
+        return head
+
+
+class _SortBuffer:
+    """Results of one sequence which are released sorted by start and end,
+    then optionally by strand, once no smaller result can come. With
+    unique=True, the results repeating start, end and orientation are
+    dropped like in GRegions.intersect.
+    """
+    def __init__(self, unique: bool = False, strand: bool = False):
+        self.heap = []
+        self.serial = 0
+        self.unique = unique
+        self.strand = strand or unique
+        self.last = None
+
+    def push(self, region):
+        strand = STRAND_CODES.get(region.orientation, 0) if self.strand \
+            else 0
+        heapq.heappush(self.heap, (region.start, region.end, strand,
+                                   self.serial, region))
+        self.serial += 1
+
+    def pop(self, bound=None):
+        # Yield the results starting before the bound, or all of them
+        heap = self.heap
+        while heap and (bound is None or heap[0][0] < bound):
+            item = heapq.heappop(heap)
+            if self.unique:
+                if item[:3] == self.last:
+                    continue
+                self.last = item[:3]
+            yield item[-1]
+        if bound is None:
+            self.last = None
+
+
+def _overlap(region, target):
+    # Same as GRegion.overlap on one sequence
+    if region.start <= target.start:
+        return region.end > target.start
+    return region.start < target.end
+
+
+def _sweep(regions, targets):
+    """Yield every region with the targets which can still overlap it or a
+    later region, and whether it begins a new sequence."""
+    active, sequence = [], None
+    for region in regions:
+        new = region.sequence != sequence
+        if new:
+            sequence, active = region.sequence, []
+            targets.seek(sequence)
+        end = max(region.end, region.start + 1)
+        while True:
+            target = targets.pull(sequence, end)
+            if target is None:
+                break
+            active.append(target)
+        # Targets ending before the region cannot reach any later region
+        start = region.start
+        if active and any(t.end <= start and t.start < start
+                          for t in active):
+            active = [t for t in active
+                      if t.end > start or t.start >= start]
+        yield region, active, new
+
+
+###########################################################################
+# Set operations
+###########################################################################
+def intersect(regions, target, mode: str = "OVERLAP",
+              order="lexicographic", chunk_size: int = BED_CHUNK_SIZE):
+    """Yield the intersections of sorted regions with sorted targets, like
+    GRegions.intersect: the overlapping parts ("OVERLAP"), the regions
+    overlapping any target ("ORIGINAL") or the regions completely included
+    in a target ("COMP_INCL"), without duplicates.
+
+    :param regions: Path to a BED file or iterable of GRegion
+    :type regions: str or iterable
+    :param target: Path to a BED file or iterable of GRegion
+    :type target: str or iterable
+    :param mode: "OVERLAP", "ORIGINAL" or "COMP_INCL", defaults to "OVERLAP"
+    :type mode: str, optional
+    :param order: Chromosome order of both inputs, see GRegions.sort,
+                  defaults to "lexicographic"
+    :type order: str or list, optional
+    :param chunk_size: Number of BED lines parsed at once, defaults to
+                       BED_CHUNK_SIZE
+    :type chunk_size: int, optional
+    :return: Generator of GRegion
+    :rtype: generator
+    """
+    if mode not in INTERSECT_MODES:
+        raise ValueError("mode should be OVERLAP, ORIGINAL or COMP_INCL")
+    buffer = _SortBuffer(unique=True)
+    for q, active, new in _sweep(read(regions, order, chunk_size),
+                                 _Targets(target, order, chunk_size)):
+        yield from buffer.pop(None if new else q.start)
+        if mode == "OVERLAP":
+            for t in active:
+                if _overlap(q, t):
+                    buffer.push(GRegion(sequence=q.sequence,
+                                        start=max(q.start, t.start),
+                                        end=min(q.end, t.end), name=q.name,
+                                        orientation=q.orientation,
+                                        data=q.data))
+        elif mode == "ORIGINAL":
+            if any(_overlap(q, t) for t in active):
+                buffer.push(q)
+        elif any(_overlap(q, t) and q.start >= t.start and q.end <= t.end
+                 for t in active):
+            buffer.push(q)
+    yield from buffer.pop()
+
+
+def _merged(first, end):
+    return GRegion(sequence=first.sequence, start=first.start, end=end,
+                   orientation=first.orientation, name=first.name,
+                   score=first.score, data=first.data)
+
+
+def _merge(regions, by_name: bool, strandness: bool):
+    # Every group keeps its open cluster [first region, end]; clusters which
+    # no later region can join are closed.
+    buffer = _SortBuffer(strand=strandness)
+    groups, sequence = {}, None
+    for r in regions:
+        if r.sequence != sequence:
+            for first, end in groups.values():
+                buffer.push(_merged(first, end))
+            yield from buffer.pop()
+            groups, sequence = {}, r.sequence
+        key = (STRAND_CODES.get(r.orientation, 0) if strandness else 0,
+               r.name if by_name else None)
+        group = groups.get(key)
+        if group is not None and r.start < group[1]:
+            if r.end > group[1]:
+                group[1] = r.end
+        else:
+            if group is not None:
+                buffer.push(_merged(*group))
+            groups[key] = [r, r.end]
+        if len(groups) > 1:
+            for key in [k for k, g in groups.items() if g[1] <= r.start]:
+                buffer.push(_merged(*groups.pop(key)))
+            yield from buffer.pop(min((g[0].start for g in groups.values()),
+                                      default=r.start))
+        else:
+            yield from buffer.pop(groups[key][0].start)
+    for first, end in groups.values():
+        buffer.push(_merged(first, end))
+    yield from buffer.pop()
+
+
+def merge(regions, by_name: bool = False, strandness: bool = False,
+          order="lexicographic", chunk_size: int = BED_CHUNK_SIZE):
+    """Yield the merged overlapping regions of sorted regions, like
+    GRegions.merge. Each merged region keeps the name, orientation, score and
+    data of its first region.
+
+    :param regions: Path to a BED file or iterable of GRegion
+    :type regions: str or iterable
+    :param by_name: Only merge the regions with the same name, defaults to
+                    False
+    :type by_name: bool, optional
+    :param strandness: Only merge the regions on the same strand, defaults
+                       to False
+    :type strandness: bool, optional
+    :param order: Chromosome order, see GRegions.sort, defaults to
+                  "lexicographic"
+    :type order: str or list, optional
+    :param chunk_size: Number of BED lines parsed at once, defaults to
+                       BED_CHUNK_SIZE
+    :type chunk_size: int, optional
+    :return: Generator of GRegion
+    :rtype: generator
+    """
+    return _merge(read(regions, order, chunk_size), by_name, strandness)
+
+
+def subtract(regions, target, whole_region: bool = False,
+             merge: bool = True, exact: bool = False,
+             order="lexicographic", chunk_size: int = BED_CHUNK_SIZE):
+    """Yield what remains of sorted regions after removing sorted targets,
+    like GRegions.subtract. Zero-length regions remain unless their position
+    lies within a target.
+
+    :param regions: Path to a BED file or iterable of GRegion
+    :type regions: str or iterable
+    :param target: Path to a BED file or iterable of GRegion
+    :type target: str or iterable
+    :param whole_region: Remove the whole regions overlapping a target
+                         instead of the overlapping parts, defaults to False
+    :type whole_region: bool, optional
+    :param merge: Merge the regions before subtracting, defaults to True
+    :type merge: bool, optional
+    :param exact: Only remove the regions with exactly the start and end of
+                  a target; whole_region and merge are ignored and the
+                  duplicates are dropped, defaults to False
+    :type exact: bool, optional
+    :param order: Chromosome order of both inputs, see GRegions.sort,
+                  defaults to "lexicographic"
+    :type order: str or list, optional
+    :param chunk_size: Number of BED lines parsed at once, defaults to
+                       BED_CHUNK_SIZE
+    :type chunk_size: int, optional
+    :return: Generator of GRegion
+    :rtype: generator
+    """
+    source = read(regions, order, chunk_size)
+    if merge and not exact:
+        source = _merge(source, False, False)
+    buffer = _SortBuffer(unique=exact)
+    for q, active, new in _sweep(source, _Targets(target, order,
+                                                  chunk_size)):
+        yield from buffer.pop(None if new else q.start)
+        if exact:
+            if not any(t.start == q.start and t.end == q.end
+                       for t in active):
+                buffer.push(q)
+        elif whole_region:
+            if not any(_overlap(q, t) for t in active):
+                buffer.push(q)
+        elif q.start == q.end:
+            # Zero-length regions remain unless a target covers them
+            if not any(t.start <= q.start < t.end for t in active):
+                buffer.push(q)
+        else:
+            # Cut the region at the targets, which come sorted by start
+            pos, pieces = q.start, []
+            for t in active:
+                if t.end > q.start and t.start < q.end:
+                    if t.start > pos:
+                        pieces.append((pos, t.start))
+                    pos = max(pos, t.end)
+            if pos < q.end:
+                pieces.append((pos, q.end))
+            for start, end in pieces:
+                if start == q.start and end == q.end:
+                    buffer.push(q)
+                else:
+                    buffer.push(GRegion(sequence=q.sequence, start=start,
+                                        end=end, name=q.name,
+                                        orientation=q.orientation,
+                                        score=q.score, data=q.data))
+    yield from buffer.pop()
+
+
+def closest(regions, target, k: int = 1, strandness: bool = False,
+            ignore_overlaps: bool = False, upstream_only: bool = False,
+            order="lexicographic", chunk_size: int = BED_CHUNK_SIZE):
+    """Yield the k nearest targets of sorted regions with their signed
+    distances, like GRegions.closest. Besides the overlapping targets, only
+    the k nearest targets ending before the current region and the targets
+    up to the k-th one after it are held.
+
+    :param regions: Path to a BED file or iterable of GRegion
+    :type regions: str or iterable
+    :param target: Path to a BED file or iterable of GRegion
+    :type target: str or iterable
+    :param k: Number of nearest targets per region, defaults to 1
+    :type k: int, optional
+    :param strandness: Only consider the targets on the same strand,
+                       defaults to False
+    :type strandness: bool, optional
+    :param ignore_overlaps: Skip the overlapping targets, defaults to
+                            False
+    :type ignore_overlaps: bool, optional
+    :param upstream_only: Skip the downstream targets, defaults to False
+    :type upstream_only: bool, optional
+    :param order: Chromosome order of both inputs, see GRegions.sort,
+                  defaults to "lexicographic"
+    :type order: str or list, optional
+    :param chunk_size: Number of BED lines parsed at once, defaults to
+                       BED_CHUNK_SIZE
+    :type chunk_size: int, optional
+    :return: Generator of tuples (region, target region, distance) in the
+             order of the regions and by distance
+    :rtype: generator
+    """
+    targets = _Targets(target, order, chunk_size)
+    sequence, serial = None, 0
+    for q in read(regions, order, chunk_size):
+        if q.sequence != sequence:
+            sequence = q.sequence
+            targets.seek(sequence)
+            # Per strand: targets in sorted order as (serial, target) and
+            # the heap of the k nearest targets before the regions
+            states = {}
+        strand = STRAND_CODES.get(q.orientation, 0) if strandness else 0
+        state = states.setdefault(strand, ([], []))
+        # Read until k targets of the strand start at or after the region
+        after = sum(t.start >= q.end for _, t in state[0])
+        while after < k:
+            t = targets.pull(sequence)
+            if t is None:
+                break
+            t_strand = STRAND_CODES.get(t.orientation, 0) if strandness \
+                else 0
+            states.setdefault(t_strand, ([], []))[0].append((serial, t))
+            serial += 1
+            if t_strand == strand and t.start >= q.end:
+                after += 1
+        for active, before in states.values():
+            if any(t.end <= q.start and t.start < q.start
+                   for _, t in active):
+                keep = []
+                for s, t in active:
+                    if t.end <= q.start and t.start < q.start:
+                        heapq.heappush(before, (t.end, -s, t))
+                        if len(before) > k:
+                            heapq.heappop(before)
+                    else:
+                        keep.append((s, t))
+                active[:] = keep
+        active, before = state
+        candidates = [(t, t.end - q.start - 1) for _, _, t in
+                      sorted(before, key=lambda x: (-x[0], -x[1]))]
+        candidates += [(t, 0) for _, t in active if _overlap(q, t)]
+        candidates += [(t, t.start - q.end + 1) for _, t in active
+                       if t.start >= q.end][:k]
+        reverse = q.orientation == "-"
+        res = []
+        for t, dist in candidates:
+            if reverse:
+                dist = -dist
+            if (ignore_overlaps and dist == 0) or \
+                    (upstream_only and dist > 0):
+                continue
+            res.append((q, t, dist))
+        res.sort(key=lambda x: abs(x[2]))
+        yield from res[:k]
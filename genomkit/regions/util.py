@@ -27,3 +27,22 @@ def get_chrom_size(organism):
     else:
         chromosome_sizes = load_chromosome_sizes(file_path)
         return chromosome_sizes
+
+
+def get_genome(genome):
+    """Return a dictionary for the chromosome sizes of a genome.
+
+    :param genome: Name of an organism such as hg38, path to a chrom.sizes
+                   file or a dictionary of chromosome sizes
+    :type genome: str or dict
+    :return: Chromosome -> size
+    :rtype: dict
+    """
+    if isinstance(genome, dict):
+        return genome
+    if os.path.exists(genome):
+        return load_chromosome_sizes(genome)
+    file_path = os.path.join(data_folder, "chrom_size/chrom.sizes."+genome)
+    if not os.path.exists(file_path):
+        raise ValueError("chrom.sizes." + genome + " is not found.")
+    return load_chromosome_sizes(file_path)
@@ -2,7 +2,7 @@ from .io import load_FASTA, load_FASTA_from_file, \
                 load_FASTQ, load_FASTQ_from_file, \
                 write_FASTA, write_FASTQ
 import gzip
-from tqdm import tqdm
+from ..progress import progress
 
 
 ###########################################################################
@@ -145,7 +145,7 @@ class GSequences:
         :type regions: GRegions
         """
         res = GSequences(name=regions.name)
-        for region in tqdm(regions.elements, desc="Get GSequences"):
+        for region in progress(regions.elements, desc="Get GSequences"):
             seq = self.get_sequence(name=region.sequence,
                                     start=region.start,
                                     end=region.end)
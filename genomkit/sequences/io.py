@@ -1,4 +1,4 @@
-from tqdm import tqdm
+from ..progress import progress, progress_enabled
 import gzip
 import re
 
@@ -19,10 +19,13 @@ def load_FASTA_from_file(file):
     res = GSequences()
     current_sequence_id = None
     current_sequence = ""
-    total_lines = sum(1 for line in file if not line.startswith("#"))
-    file.seek(0)  # Reset file pointer to the beginning
-    with tqdm(total=total_lines, desc="Load FASTA") as pbar:
-        for line in file:
+    total_lines = None
+    if progress_enabled():
+        total_lines = sum(1 for line in file)
+        file.seek(0)  # Reset file pointer to the beginning
+    with progress(file, total=total_lines, desc="Load FASTA",
+                  unit=" lines") as lines:
+        for line in lines:
             line = line.strip()
             if line.startswith("#"):
                 continue
@@ -41,7 +44,6 @@ def load_FASTA_from_file(file):
             else:  # Sequence line
                 # Append the sequence line to the current sequence
                 current_sequence += line
-            pbar.update(1)
         # Store the last sequence
         if current_sequence_id is not None:
             infos = re.split(r'[ |;,-]', current_sequence_id)
@@ -66,11 +68,14 @@ def load_FASTQ_from_file(file):
     current_sequence_id = None
     current_sequence = ""
     current_quality = ""
-    total_records = sum(1 for _ in file) // 4  # Calculate total records
-    file.seek(0)  # Reset file pointer to the beginning
-
-    with tqdm(total=total_records, desc="Load FASTQ") as pbar:
-        for line_num, line in enumerate(file):
+    total_lines = None
+    if progress_enabled():
+        total_lines = sum(1 for _ in file)
+        file.seek(0)  # Reset file pointer to the beginning
+
+    with progress(file, total=total_lines, desc="Load FASTQ",
+                  unit=" lines") as lines:
+        for line_num, line in enumerate(lines):
             line = line.strip()
             if line.startswith("#"):
                 continue
@@ -83,7 +88,6 @@ def load_FASTQ_from_file(file):
                     res.add(GSequence(sequence=current_sequence,
                                       quality=current_quality,
                                       name=current_sequence_id))
-                    pbar.update(1)  # Update progress bar
                 # Extract the sequence ID
                 current_sequence_id = line[1:]
                 # Start new sequence and quality strings
@@ -101,7 +105,6 @@ def load_FASTQ_from_file(file):
             res.add(GSequence(sequence=current_sequence,
                               quality=current_quality,
                               name=current_sequence_id))
-            pbar.update(1)  # Update progress bar
     return res
 
 
@@ -0,0 +1,33 @@
+from genomkit import GCoverages
+import os
+import pysam
+import timeit
+
+# Coverage of a BAM file: the former count of pileup columns against the
+# depth from the aligned blocks of the reads, and samtools depth.
+filename = os.path.join(os.path.dirname(__file__), "..",
+                        "test_files/bam/Col0_C1.100k.bam")
+
+
+def pileup_columns():
+    bam = pysam.AlignmentFile(filename, "rb")
+    coverage = {}
+    for pileupcolumn in bam.pileup():
+        chrom = bam.get_reference_name(pileupcolumn.reference_id)
+        if chrom not in coverage:
+            coverage[chrom] = [0] * bam.get_reference_length(chrom)
+        coverage[chrom][pileupcolumn.reference_pos] += 1
+    bam.close()
+    return coverage
+
+
+repeat_num = 1
+for name, func in [
+        ("pileup", pileup_columns),
+        ("samtools_depth", lambda: pysam.depth("-a", filename)),
+        ("read_blocks", lambda: GCoverages(load=filename)),
+        ("read_blocks_bin_100", lambda: GCoverages(bin_size=100,
+                                                   load=filename))]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+          "seconds")
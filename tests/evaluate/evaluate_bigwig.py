@@ -0,0 +1,46 @@
+from genomkit import GCoverages, GRegion, GRegions
+import numpy as np
+import os
+import pyBigWig
+import sys
+import timeit
+
+# Loading bigWig coverages: the former per window list of bin means against
+# the vectorized loader, in one and in several processes. The number of
+# windows can be given as the first argument.
+window_num = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+window_size = 2000
+bin_size = 10
+filename = os.path.join(os.path.dirname(__file__), "..",
+                        "test_files/bigwig/test.bw")
+rng = np.random.default_rng(0)
+starts = rng.integers(0, 190000000, size=window_num)
+windows = GRegions(name="random")
+windows.elements = [GRegion(sequence="1", start=s, end=s + window_size)
+                    for s in starts.tolist()]
+
+
+def load_list():
+    bw = pyBigWig.open(filename)
+    res = {}
+    for window in windows:
+        coverage = bw.values(window.sequence, window.start, window.end,
+                             numpy=True)
+        res[window] = [np.mean(coverage[i:i+bin_size])
+                       if i+bin_size <= len(coverage)
+                       else np.mean(coverage[i:])
+                       for i in range(0, len(coverage), bin_size)]
+    bw.close()
+    return res
+
+
+repeat_num = 1
+for name, func in [
+        ("list_mean", load_list),
+        ("vectorized", lambda: GCoverages(bin_size=bin_size, load=filename,
+                                          windows=windows)),
+        ("vectorized_4", lambda: GCoverages(bin_size=bin_size, load=filename,
+                                            windows=windows, n_jobs=4))]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+          "seconds")
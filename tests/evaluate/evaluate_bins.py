@@ -0,0 +1,43 @@
+from genomkit import GRegion, GRegions, GRegionsSet
+from genomkit.regions.arrays import bin_pairs
+import numpy as np
+import sys
+import timeit
+
+# 1 kb bin matrices on hg38. The digitisation kernel runs on region_num peaks,
+# the GRegionsSet on sample_num samples of a hundredth of them each. The
+# numbers of peaks and samples can be given as arguments.
+region_num = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+sample_num = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+rng = np.random.default_rng(0)
+windows = GRegions.make_windows("hg38", 1000)
+lengths = np.bincount(windows.sequences, weights=windows.ends -
+                      windows.starts).astype(np.int64)
+chroms = np.flatnonzero(lengths > 10000)
+codes = rng.choice(chroms, size=region_num).astype(np.int32)
+starts = (rng.random(region_num) * (lengths[codes] - 2000)).astype(np.int64)
+ends = starts + rng.integers(200, 2000, size=region_num)
+
+regions_set = GRegionsSet(name="samples")
+sample_size = region_num // 100
+for i in range(sample_num):
+    lo = (i * sample_size) % (region_num - sample_size)
+    regions = GRegions(name=str(i))
+    regions.elements = [
+        GRegion(sequence=windows.sequence_names[c], start=s, end=e)
+        for c, s, e in zip(codes[lo:lo + sample_size].tolist(),
+                           starts[lo:lo + sample_size].tolist(),
+                           ends[lo:lo + sample_size].tolist())]
+    regions_set.add(str(i), regions)
+print("windows:", len(windows))
+
+repeat_num = 2
+for name, func in [
+        ("make_windows", lambda: GRegions.make_windows("hg38", 1000)),
+        ("bin_kernel", lambda: bin_pairs(windows.sequences, windows.starts,
+                                         windows.ends, codes, starts, ends)),
+        ("bin_counts", lambda: regions.bin_counts(windows)),
+        ("bin_matrix", lambda: regions_set.bin_matrix(windows))]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+          "seconds")
@@ -0,0 +1,57 @@
+from genomkit import GCoverages, GRegion, GRegions
+import numpy as np
+import sys
+import timeit
+
+# Coverage of windows from the scores of a bedGraph-like GRegions: the
+# former scan of every window for every score against the indexed windows
+# with a difference array. The numbers of windows can be given as
+# arguments; the scan only runs on the smaller one.
+window_nums = [int(n) for n in sys.argv[1:]] or [2000, 1000000]
+bin_size = 10
+rng = np.random.default_rng(0)
+chroms = ["chr" + str(i) for i in range(1, 23)]
+
+
+def random_regions(num, length=None):
+    codes = rng.integers(0, len(chroms), size=num)
+    starts = rng.integers(0, 50000000, size=num)
+    lengths = rng.integers(20, 500, size=num) if length is None else \
+        np.full(num, length)
+    regions = GRegions(name="random")
+    regions.elements = [GRegion(sequence=chroms[c], start=s, end=s + n,
+                                score=float(n % 7))
+                        for c, s, n in zip(codes.tolist(), starts.tolist(),
+                                           lengths.tolist())]
+    return regions
+
+
+def scan(windows, scores):
+    coverage = {}
+    for region in windows:
+        coverage[region] = np.zeros(shape=len(region) // bin_size)
+        for target in scores:
+            if region.overlap(target):
+                start_ind = max(0, target.start - region.start) // bin_size
+                end_ind = min(len(region),
+                              target.end - region.start) // bin_size
+                for i in range(start_ind, end_ind):
+                    coverage[region][i] += target.score
+    return coverage
+
+
+repeat_num = 1
+for window_num in window_nums:
+    windows = random_regions(window_num, length=2000)
+    scores = random_regions(window_num)
+    cov = GCoverages(bin_size=bin_size)
+    funcs = [("indexed_" + str(window_num),
+              lambda: cov.calculate_coverage_GRegions(windows=windows,
+                                                      scores=scores))]
+    if window_num <= 10000:
+        funcs.insert(0, ("scan_" + str(window_num),
+                         lambda: scan(windows, scores)))
+    for name, func in funcs:
+        execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+        print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+              "seconds")
@@ -0,0 +1,47 @@
+from genomkit import GRegions
+from genomkit.regions import external_sort
+import numpy as np
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+# External sort of a shuffled BED file with a memory budget of a tenth of the
+# file, against loading and sorting the whole file as GRegions. The number of
+# regions can be given as the first argument.
+region_num = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+rng = np.random.default_rng(0)
+chroms = np.array(["chr" + str(i) for i in range(1, 23)] + ["chrX", "chrY"])
+codes = rng.integers(0, len(chroms), size=region_num)
+starts = rng.integers(0, 150000000, size=region_num)
+ends = starts + rng.integers(200, 2000, size=region_num)
+
+tmp = tempfile.mkdtemp()
+filename = os.path.join(tmp, "random.bed")
+with open(filename, "w") as f:
+    f.writelines(c + "\t" + str(s) + "\t" + str(e) + "\tpeak\t0\t+\n"
+                 for c, s, e in zip(chroms[codes].tolist(), starts.tolist(),
+                                    ends.tolist()))
+size = os.path.getsize(filename)
+
+
+def sort_GRegions():
+    regions = GRegions(load=filename)
+    regions.sort()
+    regions.write(os.path.join(tmp, "sorted_GRegions.bed"))
+
+
+repeat_num = 1
+for name, func in [
+        ("external_sort", lambda: external_sort(
+            filename, os.path.join(tmp, "sorted.bed"),
+            memory_limit=size // 10)),
+        ("external_sort_gz", lambda: external_sort(
+            filename, os.path.join(tmp, "sorted.bed.gz"),
+            memory_limit=size // 10)),
+        ("sort_GRegions", sort_GRegions)]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+          "seconds")
+shutil.rmtree(tmp)
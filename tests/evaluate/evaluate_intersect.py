@@ -1,4 +1,4 @@
-from genomkit import GRegions
+from genomkit import GRegions, GRegionsArray
 import os
 import timeit
 # import pybedtools
@@ -19,11 +19,28 @@ genes = GRegions(name="genes", load=genes_bed_file)
 # print(len(genes))
 peaks = GRegions(name="genes", load=peaks_bed_file)
 # print(len(peaks))
+genes_array = GRegionsArray(name="genes", load=genes_bed_file)
+peaks_array = GRegionsArray(name="peaks", load=peaks_bed_file)
 
 
 @profile # noqa
-def time_intersect_python():
-    intersect = peaks.intersect(genes)
+def time_intersect_overlap():
+    intersect = peaks.intersect(genes, mode="OVERLAP")
+
+
+@profile # noqa
+def time_intersect_original():
+    intersect = peaks.intersect(genes, mode="ORIGINAL")
+
+
+@profile # noqa
+def time_intersect_comp_incl():
+    intersect = peaks.intersect(genes, mode="COMP_INCL")
+
+
+@profile # noqa
+def time_intersect_columnar():
+    intersect = peaks_array.intersect(genes_array, mode="OVERLAP")
 
 
 @profile # noqa
@@ -31,10 +48,14 @@ def time_intersect_array():
     intersect = peaks.intersect_array(genes)
 
 repeat_num = 2
-execution_time = timeit.timeit(time_intersect_python, number=repeat_num)
-print('[{:<20}]'.format('intersect_python'), '{:<5.2f}'.format(execution_time), "seconds")
-execution_time = timeit.timeit(time_intersect_array, number=repeat_num)
-print('[{:<20}]'.format('intersect_array'), '{:<5.2f}'.format(execution_time), "seconds")
+for name, func in [("intersect_overlap", time_intersect_overlap),
+                   ("intersect_original", time_intersect_original),
+                   ("intersect_comp_incl", time_intersect_comp_incl),
+                   ("intersect_columnar", time_intersect_columnar),
+                   ("intersect_array", time_intersect_array)]:
+    execution_time = timeit.timeit(func, number=repeat_num)
+    print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+          "seconds")
 # print(len(intersect))
 # intersect.write("intersect_python.bed")
 # print(len(intersect))
@@ -0,0 +1,88 @@
+from genomkit.regions.interval_index import IntervalIndex
+from intervaltree import Interval, IntervalTree
+import numpy as np
+import timeit
+import tracemalloc
+
+# Compare intervaltree with the sorted-array IntervalIndex on one sequence:
+# memory, build time and throughput of overlap, point and envelop queries.
+interval_num = 500000
+query_num = 100000
+rng = np.random.default_rng(0)
+starts = rng.integers(0, 200000000, size=interval_num)
+ends = starts + rng.integers(100, 5000, size=interval_num)
+q_starts = rng.integers(0, 200000000, size=query_num)
+q_ends = q_starts + rng.integers(100, 5000, size=query_num)
+positions = rng.integers(0, 200000000, size=query_num)
+
+
+def build_tree():
+    return IntervalTree(Interval(s, e, i) for i, (s, e) in
+                        enumerate(zip(starts.tolist(), ends.tolist())))
+
+
+def build_index():
+    return IntervalIndex(starts, ends, np.arange(interval_num))
+
+
+def measure(build):
+    tracemalloc.start()
+    res = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return res, current
+
+
+tree, tree_bytes = measure(build_tree)
+index, index_bytes = measure(build_index)
+print('[{:<20}]'.format('memory_tree'),
+      '{:<8.1f}'.format(tree_bytes / interval_num), "bytes per interval")
+print('[{:<20}]'.format('memory_index'),
+      '{:<8.1f}'.format(index_bytes / interval_num), "bytes per interval")
+
+repeat_num = 1
+for name, func in [("build_tree", build_tree),
+                   ("build_index", build_index)]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name),
+          '{:<8.1f}'.format(interval_num / execution_time / 1e3),
+          "K intervals per second")
+
+
+def time_overlap_tree():
+    for s, e in zip(q_starts.tolist(), q_ends.tolist()):
+        tree.overlap(s, e)
+
+
+def time_overlap_index():
+    index.overlap(q_starts, q_ends)
+
+
+def time_point_tree():
+    for p in positions.tolist():
+        tree.at(p)
+
+
+def time_point_index():
+    index.point(positions)
+
+
+def time_envelop_tree():
+    for s, e in zip(q_starts.tolist(), q_ends.tolist()):
+        tree.envelop(s, e)
+
+
+def time_envelop_index():
+    index.envelop(q_starts, q_ends)
+
+
+for name, func in [("overlap_tree", time_overlap_tree),
+                   ("overlap_index", time_overlap_index),
+                   ("point_tree", time_point_tree),
+                   ("point_index", time_point_index),
+                   ("envelop_tree", time_envelop_tree),
+                   ("envelop_index", time_envelop_index)]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name),
+          '{:<8.1f}'.format(query_num / execution_time / 1e3),
+          "K queries per second")
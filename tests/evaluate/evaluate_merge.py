@@ -0,0 +1,40 @@
+from genomkit import GRegion, GRegions
+from genomkit.regions.arrays import merge_groups
+import numpy as np
+import sys
+import timeit
+
+# Merge, cluster and total coverage on random intervals. The merge kernel runs
+# on region_num intervals, the GRegions methods on a tenth of them because
+# every region is a Python object. The number of intervals can be given as the
+# first argument.
+region_num = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+rng = np.random.default_rng(0)
+chroms = ["chr" + str(i) for i in range(1, 23)] + ["chrX", "chrY"]
+codes = rng.integers(0, len(chroms), size=region_num)
+starts = rng.integers(0, 150000000, size=region_num)
+ends = starts + rng.integers(200, 2000, size=region_num)
+strands = rng.integers(1, 3, size=region_num)
+
+small_num = region_num // 10
+regions = GRegions(name="random")
+regions.elements = [GRegion(sequence=chroms[c], start=s, end=e,
+                            orientation="+-"[o - 1])
+                    for c, s, e, o in zip(codes[:small_num].tolist(),
+                                          starts[:small_num].tolist(),
+                                          ends[:small_num].tolist(),
+                                          strands[:small_num].tolist())]
+
+repeat_num = 2
+for name, func in [
+        ("merge_kernel", lambda: merge_groups(starts, ends, [codes])),
+        ("merge_kernel_strand",
+         lambda: merge_groups(starts, ends, [codes, strands])),
+        ("cluster_kernel",
+         lambda: merge_groups(starts, ends, [codes], distance=1000)),
+        ("merge_GRegions", lambda: regions.merge(strandness=True)),
+        ("cluster_GRegions", lambda: regions.cluster(1000)),
+        ("coverage_GRegions", lambda: regions.total_coverage())]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+          "seconds")
@@ -0,0 +1,55 @@
+from genomkit import GRegion, GRegions, GRegionsSet
+from genomkit.regions.arrays import partition_intervals
+import numpy as np
+import sys
+import timeit
+
+# Multi-way intersection and consensus of many peak sets. The kernel runs on
+# set_num sets of region_num peaks, the GRegionsSet on a tenth of the peaks
+# because every region is a Python object. The numbers of sets and peaks per
+# set can be given as arguments.
+set_num = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+region_num = int(sys.argv[2]) if len(sys.argv) > 2 else 50000
+rng = np.random.default_rng(0)
+chroms = ["chr" + str(i) for i in range(1, 23)] + ["chrX", "chrY"]
+# Peaks are drawn around a pool of shared sites so that the sets overlap
+sites = rng.integers(0, 150000000, size=10 * region_num)
+site_codes = rng.integers(0, len(chroms), size=10 * region_num)
+
+codes, starts, ends, labels = [], [], [], []
+regions_set = GRegionsSet(name="samples")
+for i in range(set_num):
+    pick = rng.choice(10 * region_num, size=region_num, replace=False)
+    s = np.sort(sites[pick] + rng.integers(-200, 200, size=region_num))
+    e = s + 500
+    c = site_codes[pick]
+    order = np.lexsort((s, c))
+    c, s, e = c[order], s[order], e[order]
+    # Keep the regions of every set disjoint
+    keep = np.concatenate(([True], (c[1:] != c[:-1]) | (s[1:] >= e[:-1])))
+    codes.append(c[keep])
+    starts.append(s[keep])
+    ends.append(e[keep])
+    labels.append(np.full(keep.sum(), i))
+    small = slice(0, region_num // 10)
+    regions = GRegions(name=str(i))
+    regions.elements = [GRegion(sequence=chroms[x], start=y, end=z)
+                        for x, y, z in zip(c[small].tolist(),
+                                           s[small].tolist(),
+                                           e[small].tolist())]
+    regions_set.add(str(i), regions)
+codes, starts, ends, labels = np.concatenate(codes), \
+    np.concatenate(starts), np.concatenate(ends), np.concatenate(labels)
+print("regions:", len(starts))
+
+repeat_num = 2
+for name, func in [
+        ("partition_kernel",
+         lambda: partition_intervals(codes, starts, ends)),
+        ("partition_members",
+         lambda: partition_intervals(codes, starts, ends, labels, set_num)),
+        ("multi_intersect", lambda: regions_set.multi_intersect()),
+        ("consensus", lambda: regions_set.consensus(set_num // 2))]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+          "seconds")
@@ -0,0 +1,47 @@
+from genomkit import GRegion, GRegions, GRegionsSet
+import numpy as np
+import sys
+import timeit
+
+# All-vs-all overlap counts between peak sets and annotation tracks: the
+# labelled single sweep against one intersect per pair. The numbers of peak
+# sets and tracks can be given as arguments.
+peak_set_num = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+track_num = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+region_num = 2000
+rng = np.random.default_rng(0)
+chroms = ["chr" + str(i) for i in range(1, 23)] + ["chrX", "chrY"]
+
+
+def random_set(set_num, prefix):
+    res = GRegionsSet(name=prefix)
+    for i in range(set_num):
+        regions = GRegions(name=prefix + str(i))
+        starts = rng.integers(0, 150000000, size=region_num)
+        ends = starts + rng.integers(200, 5000, size=region_num)
+        regions.elements = [GRegion(sequence=chroms[c], start=s, end=e)
+                            for c, s, e in zip(
+                                rng.integers(0, len(chroms),
+                                             size=region_num).tolist(),
+                                starts.tolist(), ends.tolist())]
+        res.add(name=regions.name, regions=regions)
+    return res
+
+
+peaks = random_set(peak_set_num, "peaks")
+tracks = random_set(track_num, "track")
+
+
+def pairwise():
+    for ref in peaks.collection.values():
+        for query in tracks.collection.values():
+            ref.overlap_count(query)
+
+
+repeat_num = 1
+for name, func in [("overlap_matrices",
+                    lambda: peaks.overlap_matrices(tracks)),
+                   ("pairwise_intersect", pairwise)]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+          "seconds")
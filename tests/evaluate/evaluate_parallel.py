@@ -0,0 +1,45 @@
+from genomkit import GRegionsArray
+import numpy as np
+import os
+import sys
+import timeit
+
+# Scaling of the per-chromosome parallel set operations on whole-genome peak
+# sets. The number of peaks per set can be given as the first argument.
+region_num = int(sys.argv[1]) if len(sys.argv) > 1 else 5000000
+rng = np.random.default_rng(0)
+chroms = ["chr" + str(i) for i in range(1, 23)] + ["chrX", "chrY"]
+
+
+def random_peaks(name):
+    sequences = rng.choice(chroms, size=region_num)
+    starts = rng.integers(0, 150000000, size=region_num)
+    ends = starts + rng.integers(200, 2000, size=region_num)
+    strands = rng.choice(["+", "-"], size=region_num)
+    return GRegionsArray.from_arrays(sequences=sequences, starts=starts,
+                                     ends=ends, orientations=strands,
+                                     name=name)
+
+
+peaks1 = random_peaks("peaks1")
+peaks2 = random_peaks("peaks2")
+small1 = peaks1[:region_num // 10].to_GRegions()
+small2 = peaks2[:region_num // 10].to_GRegions()
+print("CPUs available:", os.cpu_count())
+
+repeat_num = 2
+for n_jobs in [1, 4, 16]:
+    for name, func in [
+            ("intersect_columnar",
+             lambda: peaks1.intersect(peaks2, mode="ORIGINAL",
+                                      n_jobs=n_jobs)),
+            ("merge_columnar",
+             lambda: peaks1.merge(strandness=True, n_jobs=n_jobs)),
+            ("intersect_GRegions",
+             lambda: small1.intersect(small2, mode="OVERLAP",
+                                      n_jobs=n_jobs)),
+            ("intersect_array",
+             lambda: small1.intersect_array(small2, n_jobs=n_jobs))]:
+        execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+        print('[{:<20}]'.format(name), '{:>3} jobs'.format(n_jobs),
+              '{:<5.2f}'.format(execution_time), "seconds")
@@ -0,0 +1,40 @@
+from genomkit import GRegion, GRegions
+from genomkit.regions.util import get_genome
+import numpy as np
+import sys
+import timeit
+
+# Permutation test of random peaks against random annotation regions on hg38.
+# The numbers of permutations, peaks and processes can be given as arguments.
+permutation_num = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+region_num = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+n_jobs = int(sys.argv[3]) if len(sys.argv) > 3 else -1
+rng = np.random.default_rng(0)
+genome = get_genome("hg38")
+chroms = ["chr" + str(i) for i in range(1, 23)] + ["chrX", "chrY"]
+
+
+def random_regions(name, max_length):
+    sequences = rng.choice(chroms, size=region_num)
+    lengths = rng.integers(200, max_length, size=region_num)
+    starts = [int(rng.integers(0, genome[s] - length))
+              for s, length in zip(sequences.tolist(), lengths.tolist())]
+    res = GRegions(name=name)
+    res.elements = [GRegion(sequence=s, start=start, end=start + length)
+                    for s, start, length in zip(sequences.tolist(), starts,
+                                                lengths.tolist())]
+    return res
+
+
+peaks = random_regions("peaks", 2000)
+genes = random_regions("genes", 50000)
+
+repeat_num = 1
+for statistic in ["count", "bp"]:
+    execution_time = timeit.timeit(
+        lambda: peaks.permutation_test(genes, genome, n=permutation_num,
+                                       statistic=statistic, seed=0,
+                                       n_jobs=n_jobs),
+        number=repeat_num) / repeat_num
+    print('[{:<20}]'.format("permutation_" + statistic),
+          '{:<5.2f}'.format(execution_time), "seconds")
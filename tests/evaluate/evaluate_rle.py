@@ -0,0 +1,30 @@
+from genomkit import GCoverages
+import os
+import timeit
+
+# Whole genome coverages as dense arrays against run-length encoded ones:
+# loading time and memory of the values.
+test_files = os.path.join(os.path.dirname(__file__), "..", "test_files")
+
+
+def nbytes(cov):
+    total = 0
+    for values in cov.coverage.values():
+        if hasattr(values, "ends"):
+            total += values.ends.nbytes + values.values.nbytes
+        else:
+            total += values.nbytes
+    return total
+
+
+repeat_num = 1
+for filename in ("bigwig/test.bw", "bam/Col0_C1.100k.bam"):
+    filename = os.path.join(test_files, filename)
+    for name, rle in [("dense", False), ("rle", True)]:
+        name = os.path.basename(filename) + "_" + name
+        execution_time = timeit.timeit(
+            lambda: GCoverages(load=filename, rle=rle),
+            number=repeat_num) / repeat_num
+        cov = GCoverages(load=filename, rle=rle)
+        print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+              "seconds", '{:>12,}'.format(nbytes(cov)), "bytes")
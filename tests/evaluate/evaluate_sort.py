@@ -0,0 +1,51 @@
+from genomkit import GRegion, GRegions
+import numpy as np
+import os
+import sys
+import tempfile
+import timeit
+
+# Sorting, sortedness detection and the sorted fast paths on random regions.
+# The number of regions can be given as the first argument.
+region_num = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+rng = np.random.default_rng(0)
+chroms = ["chr" + str(i) for i in range(1, 23)] + ["chrX", "chrY"]
+sequences = rng.choice(chroms, size=region_num).tolist()
+starts = rng.integers(0, 150000000, size=region_num).tolist()
+regions = GRegions(name="random")
+regions.elements = [GRegion(sequence=c, start=s, end=s + 1000)
+                    for c, s in zip(sequences, starts)]
+sorted_regions = GRegions(name="sorted")
+sorted_regions.elements = sorted(regions.elements)
+tmp = tempfile.mkdtemp()
+bed = os.path.join(tmp, "sorted.bed")
+sorted_regions.write(bed)
+# Reload so that the objects lie in memory in their order
+sorted_regions = GRegions(load=bed)
+
+
+def python_sort():
+    elements = list(regions.elements)
+    elements.sort()
+
+
+def lexsort():
+    res = GRegions()
+    res.elements = list(regions.elements)
+    res.sort()
+
+
+repeat_num = 2
+for name, func in [
+        ("sort_python", python_sort),
+        ("sort_lexsort", lexsort),
+        ("check_sorted", lambda: sorted_regions.check_sorted()),
+        ("load_BED_sorted", lambda: GRegions(load=bed)),
+        ("merge_unsorted", lambda: regions.merge()),
+        ("merge_sorted", lambda: sorted_regions.merge()),
+        ("intersect_unsorted", lambda: regions.intersect(regions)),
+        ("intersect_sorted",
+         lambda: sorted_regions.intersect(sorted_regions))]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+          "seconds")
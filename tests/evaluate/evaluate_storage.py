@@ -0,0 +1,76 @@
+from genomkit import GRegions, GRegion, GRegionsArray
+import numpy as np
+import timeit
+import tracemalloc
+
+# Compare the object-list store (GRegions) with the columnar store
+# (GRegionsArray): memory per region and sort/merge throughput.
+region_num = 1000000
+rng = np.random.default_rng(0)
+chroms = ["chr" + str(i) for i in range(1, 20)]
+sequences = rng.choice(chroms, size=region_num)
+starts = rng.integers(0, 100000000, size=region_num)
+ends = starts + rng.integers(100, 2000, size=region_num)
+strands = rng.choice(["+", "-", "."], size=region_num)
+names = np.array(["peak_" + str(i) for i in range(region_num)])
+
+
+def build_list():
+    regions = GRegions(name="list")
+    for s, a, b, o, n in zip(sequences.tolist(), starts.tolist(),
+                             ends.tolist(), strands.tolist(), names.tolist()):
+        regions.add(GRegion(sequence=s, start=a, end=b, orientation=o,
+                            name=n))
+    return regions
+
+
+def build_array():
+    return GRegionsArray.from_arrays(sequences=sequences, starts=starts,
+                                     ends=ends, orientations=strands,
+                                     names=names, name="array")
+
+
+def measure(build):
+    tracemalloc.start()
+    regions = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return regions, current
+
+
+list_regions, list_bytes = measure(build_list)
+array_regions = build_array()
+array_bytes = array_regions.nbytes
+print('[{:<20}]'.format('memory_list'),
+      '{:<8.1f}'.format(list_bytes / region_num), "bytes per region")
+print('[{:<20}]'.format('memory_array'),
+      '{:<8.1f}'.format(array_bytes / region_num), "bytes per region")
+
+
+def time_sort_list():
+    list_regions.elements = list_regions.elements[::-1]
+    list_regions.sort()
+
+
+def time_sort_array():
+    array_regions.sort(reverse=True)
+    array_regions.sort()
+
+
+def time_merge_list():
+    list_regions.merge(inplace=False)
+
+
+def time_merge_array():
+    array_regions.merge(inplace=False)
+
+
+repeat_num = 2
+for name, func in [("sort_list", time_sort_list),
+                   ("sort_array", time_sort_array),
+                   ("merge_list", time_merge_list),
+                   ("merge_array", time_merge_array)]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name),
+          '{:<8.2f}'.format(region_num / execution_time / 1e6),
+          "M regions per second")
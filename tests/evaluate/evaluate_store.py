@@ -0,0 +1,47 @@
+from genomkit import GCoverages, GCoveragesSet, GRegion, GRegions
+import numpy as np
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+# Coverages of many samples on random windows: loading the windows from the
+# bigWig files of every sample against querying a memory-mapped coverage
+# store built once. The number of windows can be given as the first
+# argument.
+window_num = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+bin_size = 10
+filename = os.path.join(os.path.dirname(__file__), "..",
+                        "test_files/bigwig/test.bw")
+load_dict = {"sample" + str(i): filename for i in range(4)}
+rng = np.random.default_rng(0)
+starts = rng.integers(0, 190000000, size=window_num)
+windows = GRegions(name="random")
+windows.elements = [GRegion(sequence="1", start=s, end=s + 2000)
+                    for s in starts.tolist()]
+tmp = tempfile.mkdtemp()
+path = os.path.join(tmp, "store")
+
+
+def load_bigwig():
+    return [GCoverages(bin_size=bin_size, load=filename, windows=windows)
+            for filename in load_dict.values()]
+
+
+def query_store():
+    covs = GCoveragesSet(load_dict=load_dict, store=path, bin_size=bin_size)
+    return [np.array(covs.query(window)) for window in windows]
+
+
+repeat_num = 1
+for name, func in [
+        ("bigwig_windows", load_bigwig),
+        ("store_build", lambda: GCoveragesSet(load_dict=load_dict,
+                                              store=path,
+                                              bin_size=bin_size)),
+        ("store_query", query_store)]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+          "seconds")
+shutil.rmtree(tmp)
@@ -0,0 +1,55 @@
+from genomkit import GRegions
+from genomkit.regions import stream
+import numpy as np
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+# Streaming intersect, merge, subtract and closest on two sorted BED files
+# against loading them as GRegions. The number of regions per file can be
+# given as the first argument.
+region_num = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+rng = np.random.default_rng(0)
+chroms = np.array(sorted(["chr" + str(i) for i in range(1, 23)] +
+                         ["chrX", "chrY"]))
+tmp = tempfile.mkdtemp()
+files = []
+for name in ["a", "b"]:
+    codes = np.sort(rng.integers(0, len(chroms), size=region_num))
+    starts = rng.integers(0, 150000000, size=region_num)
+    ends = starts + rng.integers(200, 2000, size=region_num)
+    order = np.lexsort((ends, starts, codes))
+    codes, starts, ends = codes[order], starts[order], ends[order]
+    files.append(os.path.join(tmp, name + ".bed"))
+    with open(files[-1], "w") as f:
+        f.writelines(c + "\t" + str(s) + "\t" + str(e) + "\n"
+                     for c, s, e in zip(chroms[codes].tolist(),
+                                        starts.tolist(), ends.tolist()))
+a, b = files
+
+
+def count(regions):
+    return sum(1 for _ in regions)
+
+
+def load(filename):
+    return GRegions(load=filename)
+
+
+repeat_num = 1
+for name, func in [
+        ("stream_intersect", lambda: count(stream.intersect(a, b))),
+        ("GRegions_intersect", lambda: load(a).intersect(load(b))),
+        ("stream_merge", lambda: count(stream.merge(a))),
+        ("GRegions_merge", lambda: load(a).merge()),
+        ("stream_subtract", lambda: count(stream.subtract(a, b))),
+        ("GRegions_subtract",
+         lambda: load(a).subtract(load(b), inplace=False)),
+        ("stream_closest", lambda: count(stream.closest(a, b))),
+        ("GRegions_closest", lambda: load(a).closest(load(b)))]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+          "seconds")
+shutil.rmtree(tmp)
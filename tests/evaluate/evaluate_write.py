@@ -0,0 +1,46 @@
+from genomkit import GRegion, GRegions
+import numpy as np
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+# Writing BED files: the former line by line print of bed_entry against the
+# block writer, plain and compressed. The number of regions can be given as
+# the first argument.
+region_num = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+rng = np.random.default_rng(0)
+chroms = ["chr" + str(i) for i in range(1, 23)] + ["chrX", "chrY"]
+codes = rng.integers(0, len(chroms), size=region_num)
+starts = rng.integers(0, 150000000, size=region_num)
+ends = starts + rng.integers(200, 2000, size=region_num)
+regions = GRegions(name="random")
+regions.elements = [GRegion(sequence=chroms[c], start=s, end=e,
+                            name="peak" + str(i), orientation="+")
+                    for i, (c, s, e) in enumerate(zip(codes.tolist(),
+                                                      starts.tolist(),
+                                                      ends.tolist()))]
+tmp = tempfile.mkdtemp()
+
+
+def write_print(filename):
+    with open(filename, "w") as f:
+        for region in regions:
+            print(region.bed_entry(), file=f)
+
+
+repeat_num = 1
+for name, func in [
+        ("print", lambda: write_print(os.path.join(tmp, "print.bed"))),
+        ("write", lambda: regions.write(os.path.join(tmp, "out.bed"))),
+        ("write_bgzip", lambda: regions.write(os.path.join(tmp, "out.gz"))),
+        ("write_bgzip_4", lambda: regions.write(os.path.join(tmp, "out.gz"),
+                                                n_jobs=4)),
+        ("write_gzip_4", lambda: regions.write(os.path.join(tmp, "out.gz"),
+                                               compression="gzip",
+                                               n_jobs=4))]:
+    execution_time = timeit.timeit(func, number=repeat_num) / repeat_num
+    print('[{:<20}]'.format(name), '{:<5.2f}'.format(execution_time),
+          "seconds")
+shutil.rmtree(tmp)
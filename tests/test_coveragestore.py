@@ -0,0 +1,100 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+from genomkit import GCoverages, GCoveragesSet, GRegion, GRegions, \
+    CoverageStore
+from genomkit.coverages.store import build_store, store_is_current
+
+script_path = os.path.dirname(__file__)
+
+
+class TestCoverageStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "store")
+        self.load_dict = {
+            "bigwig": os.path.join(script_path, "test_files/bigwig/test.bw"),
+            "bam": os.path.join(script_path,
+                                "test_files/bam/Col0_C1.100k.bam")}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_build_store(self):
+        store = build_store(self.path, self.load_dict, bin_size=1000)
+        self.assertEqual(store.samples, ["bigwig", "bam"])
+        self.assertEqual(store.get_sequences(), ["1", "10"])
+        self.assertEqual(store.array("1").shape, (2, 195472))
+        self.assertFalse(os.path.exists(self.path + ".tmp" +
+                                        str(os.getpid())))
+        for row, filename in enumerate(self.load_dict.values()):
+            cov = GCoverages(bin_size=1000, load=filename)
+            for region, values in cov.coverage.items():
+                np.testing.assert_allclose(
+                    store.array(region.sequence)[row, :len(values)], values,
+                    rtol=1e-5)
+        # The BAM file has no reads on 10
+        self.assertTrue(np.isnan(store.array("10")[1]).all())
+        self.assertTrue(np.isnan(store.array("1")[1, 30428:]).all())
+        with self.assertRaises(ValueError):
+            store.array("2")
+
+    def test_build_store_existing_path(self):
+        os.makedirs(self.path)
+        keep = os.path.join(self.path, "keep.txt")
+        with open(keep, "w") as f:
+            f.write("keep")
+        with self.assertRaises(ValueError):
+            GCoveragesSet(load_dict=self.load_dict, store=self.path,
+                          bin_size=1000)
+        with open(keep) as f:
+            self.assertEqual(f.read(), "keep")
+        self.assertEqual(os.listdir(self.tmp), ["store"])
+
+    def test_query(self):
+        build_store(self.path, self.load_dict, bin_size=10)
+        store = CoverageStore(self.path)
+        res = store.query(GRegion(sequence="1", start=95, end=1005))
+        self.assertIsInstance(res, np.memmap)
+        self.assertEqual(res.shape, (2, 92))
+        self.assertAlmostEqual(float(res[0, 1]), 1.4, places=5)
+        np.testing.assert_array_equal(store.query("1:95-1,005"), res)
+        np.testing.assert_array_equal(store.query(("1", 95, 1005)), res)
+        np.testing.assert_array_equal(
+            store.get_sample("bam", "1:95-1005"), res[1])
+        self.assertEqual(store.query("10").shape, (2, 13069500))
+        with self.assertRaises(ValueError):
+            CoverageStore(self.tmp)
+
+    def test_gcoveragesset_store(self):
+        covs = GCoveragesSet(load_dict=self.load_dict, store=self.path,
+                             bin_size=1000)
+        self.assertEqual(len(covs), 0)
+        self.assertEqual(covs.query("1:0-5000").shape, (2, 5))
+        self.assertTrue(store_is_current(self.path, self.load_dict, 1000))
+        self.assertFalse(store_is_current(self.path, self.load_dict, 100))
+        # An up-to-date store is reused
+        stamp = os.stat(os.path.join(self.path, "meta.json")).st_mtime_ns
+        covs = GCoveragesSet(load_dict=self.load_dict, store=self.path,
+                             bin_size=1000)
+        self.assertEqual(
+            os.stat(os.path.join(self.path, "meta.json")).st_mtime_ns, stamp)
+        covs = GCoveragesSet(store=self.path)
+        self.assertEqual(covs.store.samples, ["bigwig", "bam"])
+        with self.assertRaises(ValueError):
+            GCoveragesSet().query("1:0-5000")
+        with self.assertRaises(ValueError):
+            GCoveragesSet(store=self.path, windows=GRegions(name="w"))
+        # Without a store, the files are loaded with the bins
+        windows = GRegions(name="windows")
+        windows.add(GRegion(sequence="1", start=0, end=1000))
+        covs = GCoveragesSet(load_dict=self.load_dict, windows=windows,
+                             bin_size=10)
+        self.assertEqual(len(covs["bam"].coverage[windows[0]]), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,8 @@
 import unittest
-from genomkit import GCoverages, GRegions, GRegion
+import numpy as np
+import pyBigWig
+import pysam
+from genomkit import GCoverages, GRegions, GRegion, RLECoverage
 # from genomkit.sequences.io import load_FASTA, load_FASTQ
 import os
 
@@ -43,6 +46,30 @@ class TestGCoverages(unittest.TestCase):
             )
         self.assertEqual(len(cov.coverage.keys()), 2)
 
+    def test_load_coverage_from_bigwig_binned(self):
+        filename = os.path.join(script_path, "test_files/bigwig/test.bw")
+        windows = GRegions(name="windows")
+        for start in (0, 50, 90, 1000):
+            windows.add(GRegion(sequence="1", start=start, end=start + 20))
+        cov = GCoverages(bin_size=3, load=filename, windows=windows)
+        self.assertEqual(cov.matrix.shape, (4, 7))
+        self.assertEqual(cov.matrix.dtype, np.float32)
+        bw = pyBigWig.open(filename)
+        for window in windows:
+            values = bw.values(window.sequence, window.start, window.end)
+            expected = [np.mean(values[i:i + 3]) for i in range(0, 20, 3)]
+            np.testing.assert_allclose(cov.coverage[window], expected,
+                                       rtol=1e-6)
+        bw.close()
+        pooled = GCoverages(bin_size=3, load=filename, windows=windows,
+                            n_jobs=2)
+        np.testing.assert_array_equal(pooled.matrix, cov.matrix)
+        # Windows of different lengths are not stacked
+        windows.add(GRegion(sequence="10", start=0, end=10))
+        cov = GCoverages(bin_size=3, load=filename, windows=windows)
+        self.assertIsNone(cov.matrix)
+        self.assertEqual(len(cov.coverage[windows[-1]]), 4)
+
     def test_calculate_coverage_from_bam(self):
         cov = GCoverages()
         cov.calculate_coverage_from_bam(
@@ -67,6 +94,71 @@ class TestGCoverages(unittest.TestCase):
         self.assertEqual(len(cov.coverage.keys()), 1)
         self.assertEqual(len(cov.coverage[windows[0]]), 500)
 
+    def test_calculate_coverage_from_bam_depth(self):
+        filename = os.path.join(script_path,
+                                "test_files/bam/Col0_C1.100k.bam")
+
+        def samtools_depth(*args):
+            return np.array([int(line.split("\t")[2]) for line in
+                             pysam.depth("-a", *args, filename).splitlines()])
+        cov = GCoverages(load=filename)
+        chrom = list(cov.coverage.keys())[0]
+        self.assertEqual(cov.coverage[chrom].dtype, np.int32)
+        np.testing.assert_array_equal(cov.coverage[chrom],
+                                      samtools_depth("-r", "1"))
+        windows = GRegions(name="windows")
+        windows.add(GRegion(sequence="1", start=5000, end=25000))
+        windows.add(GRegion(sequence="1", start=40000, end=60000))
+        cov = GCoverages()
+        cov.calculate_coverage_from_bam(filename, windows=windows,
+                                        min_mapq=40, strand="+")
+        self.assertEqual(cov.matrix.shape, (2, 20000))
+        np.testing.assert_array_equal(
+            cov.coverage[windows[0]],
+            samtools_depth("-r", "1:5001-25000", "-Q", "40", "-G", "0x10"))
+        pooled = GCoverages()
+        pooled.calculate_coverage_from_bam(filename, windows=windows,
+                                           min_mapq=40, strand="+",
+                                           n_jobs=2)
+        np.testing.assert_array_equal(pooled.matrix, cov.matrix)
+        # Extended reads and fragments cover at least the reads
+        for options in ({"extend": 300}, {"paired": True}):
+            extended = GCoverages()
+            extended.calculate_coverage_from_bam(filename, windows=windows,
+                                                 **options)
+            self.assertGreater(extended.matrix.sum(), cov.matrix.sum())
+        with self.assertRaises(ValueError):
+            cov.calculate_coverage_from_bam(filename, windows=windows,
+                                            strand="x")
+
+    def test_rle_coverage(self):
+        for filename in ("test_files/bigwig/test.bw",
+                         "test_files/bam/Col0_C1.100k.bam"):
+            filename = os.path.join(script_path, filename)
+            for bin_size in (1, 7):
+                dense = GCoverages(bin_size=bin_size, load=filename)
+                cov = GCoverages(bin_size=bin_size, load=filename, rle=True)
+                self.assertEqual(dense.coverage.keys(), cov.coverage.keys())
+                for region, values in cov.coverage.items():
+                    self.assertIsInstance(values, RLECoverage)
+                    np.testing.assert_allclose(np.asarray(values),
+                                               dense.coverage[region],
+                                               rtol=1e-5)
+                self.assertAlmostEqual(cov.total_sequencing_depth(),
+                                       dense.total_sequencing_depth(),
+                                       places=2)
+                # Dense values of the bins overlapping a window
+                chrom = list(dense.coverage.keys())[0]
+                np.testing.assert_allclose(
+                    cov.get_coverage(GRegion(sequence="1", start=95,
+                                             end=130)),
+                    dense.coverage[chrom][95 // bin_size:
+                                          -(-130 // bin_size)],
+                    rtol=1e-5)
+        cov.scale_coverage(0.5)
+        self.assertAlmostEqual(cov.total_sequencing_depth(),
+                               dense.total_sequencing_depth() / 2, places=2)
+
     def test_calculate_coverage_GRegions(self):
         regions = GRegions(name="test",
                            load=os.path.join(script_path,
@@ -79,6 +171,59 @@ class TestGCoverages(unittest.TestCase):
         self.assertEqual(cov.coverage[regions[2]][0], 30)
         self.assertEqual(cov.coverage[regions[3]][0], 40)
 
+    def test_calculate_coverage_GRegions_bins(self):
+        windows = GRegions(name="windows")
+        windows.add(GRegion(sequence="chr1", start=100, end=120,
+                            orientation="+"))
+        windows.add(GRegion(sequence="chr1", start=110, end=130,
+                            orientation="-"))
+        windows.add(GRegion(sequence="chr2", start=0, end=20,
+                            orientation="+"))
+        scores = GRegions(name="scores")
+        scores.add(GRegion(sequence="chr1", start=95, end=105, score=2,
+                           orientation="+"))
+        scores.add(GRegion(sequence="chr1", start=112, end=118, score=1,
+                           orientation="-"))
+        scores.add(GRegion(sequence="chr3", start=0, end=20, score=5))
+        cov = GCoverages(bin_size=2)
+        cov.calculate_coverage_GRegions(windows=windows, scores=scores)
+        self.assertEqual(cov.matrix.shape, (3, 10))
+        np.testing.assert_array_equal(
+            cov.coverage[windows[0]], [2, 2, 0, 0, 0, 0, 1, 1, 1, 0])
+        np.testing.assert_array_equal(
+            cov.coverage[windows[1]], [0, 1, 1, 1, 0, 0, 0, 0, 0, 0])
+        np.testing.assert_array_equal(cov.coverage[windows[2]], np.zeros(10))
+        cov.calculate_coverage_GRegions(windows=windows, scores=scores,
+                                        strandness=True)
+        np.testing.assert_array_equal(
+            cov.coverage[windows[0]], [2, 2, 0, 0, 0, 0, 0, 0, 0, 0])
+        np.testing.assert_array_equal(
+            cov.coverage[windows[1]], [0, 1, 1, 1, 0, 0, 0, 0, 0, 0])
+        # Scaling and flipping keep the coverages the rows of the matrix
+        cov.scale_coverage(10)
+        cov.flip_negative_regions()
+        np.testing.assert_array_equal(
+            cov.matrix, [[20, 20, 0, 0, 0, 0, 0, 0, 0, 0],
+                         [0, 0, 0, 0, 0, 0, 10, 10, 10, 0],
+                         np.zeros(10)])
+        for i, region in enumerate(windows):
+            self.assertTrue(np.shares_memory(cov.coverage[region],
+                                             cov.matrix[i]))
+            np.testing.assert_array_equal(cov.coverage[region],
+                                          cov.matrix[i])
+        # Windows of different lengths are not stacked
+        windows.add(GRegion(sequence="chr1", start=0, end=5))
+        cov.calculate_coverage_GRegions(windows=windows, scores=scores)
+        self.assertIsNone(cov.matrix)
+        self.assertEqual(len(cov.coverage[windows[3]]), 2)
+        res = cov.filter_regions_coverage(
+            [GRegion(sequence="chr1", start=104, end=114),
+             GRegion(sequence="chr2", start=30, end=40)])
+        self.assertEqual(list(res.keys()),
+                         [GRegion(sequence="chr1", start=104, end=114)])
+        # The last overlapping window is used
+        np.testing.assert_array_equal(list(res.values())[0], [0, 1])
+
     def test_get_coverage(self):
         cov = GCoverages()
         cov.load_coverage_from_bigwig(
@@ -1,7 +1,14 @@
 import unittest
-from genomkit import GRegions
-from genomkit.regions.io import load_BED
+from genomkit import GRegions, GRegion
+from genomkit.regions import external_sort, merge_sorted_files
+from genomkit.regions.io import load_BED, bgzf_compress
+from genomkit.regions.gregions_indexed import is_bgzipped
+import gzip
 import os
+import random
+import tempfile
+import tracemalloc
+from unittest.mock import patch
 
 script_path = os.path.dirname(__file__)
 
@@ -30,6 +37,12 @@ class TestGRegions(unittest.TestCase):
                                         inplace=False)[1].start, 3000)
         self.assertEqual(regions.extend(downstream=100, strandness=True,
                                         inplace=False)[1].start, 2900)
+        genome = {"chr1": 3500, "chr2": 7500}
+        self.assertEqual([r.end for r in regions.extend(
+            downstream=1000, inplace=False, genome=genome)],
+            [3000, 3500, 7000, 7500])
+        self.assertEqual([r.end for r in regions.resize(
+            500, 500, inplace=False, genome=genome)], [2000, 3500, 6000, 7500])
 
     def test_extend_fold(self):
         regions = GRegions(name="test")
@@ -44,6 +57,40 @@ class TestGRegions(unittest.TestCase):
         self.assertEqual(regions.extend_fold(downstream=0.1, strandness=True,
                                              inplace=False)[1].start, 2900)
 
+    def test_clip(self):
+        regions = GRegions(name="test")
+        regions.load(filename=os.path.join(script_path,
+                                           "test_files/bed/example.bed"))
+        regions.add(GRegion(sequence="chr3", start=2000, end=3000))
+        regions.add(GRegion(sequence="chrX", start=10, end=20))
+        genome = {"chr1": 3500, "chr2": 7500, "chr3": 1000}
+        res = regions.clip(genome, inplace=False)
+        self.assertEqual([(r.sequence, r.start, r.end) for r in res],
+                         [("chr1", 1000, 2000), ("chr1", 3000, 3500),
+                          ("chr2", 5000, 6000), ("chr2", 7000, 7500),
+                          ("chrX", 10, 20)])
+        self.assertEqual(res[1].name, "Feature2")
+        self.assertEqual(len(regions), 6)
+        self.assertEqual(regions[1].end, 4000)
+        regions.clip(genome)
+        self.assertEqual([r.end for r in regions],
+                         [2000, 3500, 6000, 7500, 20])
+
+    def test_complement(self):
+        regions = GRegions(name="test")
+        regions.load(filename=os.path.join(script_path,
+                                           "test_files/bed/example.bed"))
+        regions.add(GRegion(sequence="chr1", start=1500, end=2500))
+        regions.add(GRegion(sequence="chrX", start=10, end=20))
+        genome = {"chr1": 3500, "chr2": 7500, "chr3": 1000}
+        res = regions.complement(genome)
+        self.assertEqual([(r.sequence, r.start, r.end) for r in res],
+                         [("chr1", 0, 1000), ("chr1", 2500, 3000),
+                          ("chr2", 0, 5000), ("chr2", 6000, 7000),
+                          ("chr3", 0, 1000)])
+        self.assertEqual(res.total_coverage() + regions.clip(
+            genome, inplace=False).total_coverage() - 10, sum(genome.values()))
+
     def test_get_sequences(self):
         regions = GRegions(name="test")
         regions.load(filename=os.path.join(script_path,
@@ -83,6 +130,41 @@ class TestGRegions(unittest.TestCase):
         self.assertEqual(len(intersect[3]), 1000)
         intersect = regions1.intersect(regions2, mode='COMP_INCL')
         self.assertEqual(len(intersect), 0)
+        # The results are copies: changing them leaves self unchanged
+        before = [(r.start, r.end, list(r.data)) for r in regions1]
+        for mode in ("OVERLAP", "ORIGINAL"):
+            intersect = regions1.intersect(regions2, mode=mode)
+            intersect.extend(upstream=50, downstream=50)
+            for r in intersect:
+                r.data.append("x")
+            self.assertEqual([(r.start, r.end, list(r.data))
+                              for r in regions1], before)
+
+    def test_intersect_reference(self):
+        genes = GRegions(name="genes", load=os.path.join(
+            script_path, "test_files/bed/genes_Gencode_mm10.bed"))
+        peaks = GRegions(name="peaks", load=os.path.join(
+            script_path, "test_files/bed/consensus_peaks.bed"))
+        expected = {"OVERLAP": 17664, "ORIGINAL": 17241, "COMP_INCL": 16184}
+        for mode, count in expected.items():
+            self.assertEqual(len(peaks.intersect(genes, mode=mode)), count)
+        # Compare with pairwise GRegion.overlap on one chromosome
+        genes = genes.get_elements_by_seq("chr19")
+        peaks = peaks.get_elements_by_seq("chr19")
+        pairs = [(p, g) for p in peaks for g in genes if p.overlap(g)]
+        self.assertGreater(len(pairs), 0)
+        overlap = {(p.sequence, max(p.start, g.start), min(p.end, g.end))
+                   for p, g in pairs}
+        original = {(p.sequence, p.start, p.end) for p, g in pairs}
+        comp_incl = {(p.sequence, p.start, p.end) for p, g in pairs
+                     if p.start >= g.start and p.end <= g.end}
+        for mode, reference in [("OVERLAP", overlap),
+                                ("ORIGINAL", original),
+                                ("COMP_INCL", comp_incl)]:
+            intersect = peaks.intersect(genes, mode=mode)
+            self.assertEqual({(r.sequence, r.start, r.end)
+                              for r in intersect}, reference)
+            self.assertEqual(intersect.elements, sorted(intersect.elements))
 
     def test_intersect_array(self):
         regions1 = GRegions(name="test")
@@ -105,10 +187,33 @@ class TestGRegions(unittest.TestCase):
         merged = regions.merge(strandness=True)
         self.assertEqual(len(merged), 3)
         self.assertEqual(len(merged[0]), 1000)
+        # The input regions are not modified
+        self.assertEqual([len(r) for r in regions], [1000, 400, 1000, 100])
         regions.merge(inplace=True)
         self.assertEqual(len(regions), 2)
         self.assertEqual(len(regions[0]), 1000)
         self.assertEqual(len(regions[1]), 1000)
+        # Regions of other strands in between do not stop a merge
+        regions = GRegions(name="test")
+        regions.add(GRegion(sequence="chr1", start=0, end=100,
+                            orientation="+"))
+        regions.add(GRegion(sequence="chr1", start=50, end=60,
+                            orientation="-"))
+        regions.add(GRegion(sequence="chr1", start=80, end=200,
+                            orientation="+"))
+        merged = regions.merge(strandness=True)
+        self.assertEqual([(r.start, r.end, r.orientation) for r in merged],
+                         [(0, 200, "+"), (50, 60, "-")])
+
+    def test_cluster(self):
+        regions = GRegions(name="test")
+        regions.load(filename=os.path.join(script_path,
+                                           "test_files/bed/example.bed"))
+        self.assertEqual(len(regions.cluster(1000)), 4)
+        clustered = regions.cluster(1001)
+        self.assertEqual([(r.start, r.end) for r in clustered],
+                         [(1000, 4000), (5000, 8000)])
+        self.assertEqual(len(regions[0]), 1000)
 
     def test_remove_duplicates(self):
         regions = GRegions(name="test")
@@ -121,16 +226,234 @@ class TestGRegions(unittest.TestCase):
         regions = GRegions(name="test")
         regions.load(filename=os.path.join(script_path,
                                            "test_files/bed/example4.bed"))
+        self.assertFalse(regions.sorted)
         regions.sort()
         self.assertEqual(len(regions), 6)
         self.assertEqual(regions.get_sequences(),
                          ["chr1", "chr1", "chr1", "chr2", "chr2", "chr2"])
+        self.assertEqual([(r.start, r.end) for r in regions],
+                         [(500, 900), (500, 900), (500, 1500),
+                          (4500, 5500), (4500, 5500), (5000, 5100)])
+        self.assertTrue(regions.sorted)
+
+    def test_sort_order(self):
+        regions = GRegions(name="test")
+        for seq in ["chr10", "chr2", "chrX", "chr1"]:
+            regions.add(GRegion(sequence=seq, start=0, end=10))
+        regions.sort()
+        self.assertEqual(regions.get_sequences(),
+                         ["chr1", "chr10", "chr2", "chrX"])
+        self.assertEqual(regions.sequence_order, "lexicographic")
+        regions.sort(order="natural")
+        self.assertEqual(regions.get_sequences(),
+                         ["chr1", "chr2", "chr10", "chrX"])
+        regions.sort(order=["chrX", "chr2"])
+        self.assertEqual(regions.get_sequences(),
+                         ["chrX", "chr2", "chr1", "chr10"])
+        regions.sort(reverse=True)
+        self.assertEqual(regions.get_sequences(),
+                         ["chrX", "chr2", "chr10", "chr1"])
+        self.assertFalse(regions.sorted)
+        with self.assertRaises(ValueError):
+            regions.sort(order="random")
+
+    def test_sorted_tracking(self):
+        regions = GRegions(name="test")
+        regions.load(filename=os.path.join(script_path,
+                                           "test_files/bed/example.bed"))
+        # Sorted files are detected while loading
+        self.assertTrue(regions.sorted)
+        self.assertEqual(regions.sequence_order, "lexicographic")
+        regions.add(GRegion(sequence="chr2", start=9000, end=9100))
+        self.assertTrue(regions.sorted)
+        self.assertTrue(regions.filter_by_names(["Feature1"]).sorted)
+        regions.add(GRegion(sequence="chr2", start=0, end=100))
+        self.assertFalse(regions.sorted)
+        self.assertFalse(regions.check_sorted())
+        regions.sort()
+        regions.extend(upstream=10)
+        self.assertFalse(regions.sorted)
+        self.assertTrue(regions.check_sorted())
+        # Blocks of sequences in another order are sorted per chromosome
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "regions.bed")
+            with open(filename, "w") as f:
+                for seq in ["chr2", "chr10", "chr1"]:
+                    f.write(seq + "\t100\t200\n" + seq + "\t150\t300\n")
+            for chunk_size, order in [(3, None), (100, None)]:
+                loaded = load_BED(filename, chunk_size=chunk_size)
+                self.assertTrue(loaded.sorted)
+                self.assertEqual(loaded.sequence_order, order)
+            # Sorted regions keep their chromosome order when merged
+            merged = loaded.merge()
+            self.assertEqual(merged.get_sequences(), ["chr1", "chr10", "chr2"])
+            loaded.sort(order="natural")
+            merged = loaded.merge()
+            self.assertEqual(merged.get_sequences(), ["chr1", "chr2", "chr10"])
+            self.assertEqual(merged.sequence_order, "natural")
+            # and when subtracted, in place or not
+            mask = GRegions()
+            mask.add(GRegion("chr1", 120, 130))
+            for merge in [True, False]:
+                res = loaded.subtract(mask, merge=merge, inplace=False)
+                self.assertEqual(list(dict.fromkeys(res.get_sequences())),
+                                 ["chr1", "chr2", "chr10"])
+                self.assertEqual(res.sequence_order, "natural")
+            loaded.subtract(mask)
+            self.assertEqual(loaded.sequence_order, "natural")
+            self.assertTrue(loaded.check_sorted("natural"))
+            loaded.elements.reverse()
+            loaded.sorted = False
+            loaded.subtract(mask, merge=False)
+            self.assertEqual(loaded.sequence_order, "lexicographic")
+            self.assertTrue(loaded.check_sorted())
+            self.assertTrue(load_BED(filename).check_sorted(["chr2", "chr10",
+                                                             "chr1"]))
+
+    def test_external_sort(self):
+        filename = os.path.join(script_path,
+                                "test_files/bed/genes_Gencode_hg38_chr22.bed")
+        with open(filename) as f:
+            lines = f.readlines()
+        random.Random(0).shuffle(lines)
+        expected = GRegions(load=filename)
+        expected.sort()
+        with tempfile.TemporaryDirectory() as tmp:
+            shuffled = os.path.join(tmp, "shuffled.bed.gz")
+            output = os.path.join(tmp, "sorted.bed.gz")
+            with gzip.open(shuffled, "wt") as f:
+                f.write("# genes\n")
+                f.writelines(lines)
+            # Small runs merged in several passes
+            with patch("genomkit.regions.external.MERGE_FAN_IN", 3):
+                external_sort(shuffled, output, memory_limit="20K",
+                              tmp_dir=tmp)
+            self.assertEqual(sorted(os.listdir(tmp)),
+                             ["shuffled.bed.gz", "sorted.bed.gz"])
+            with gzip.open(output, "rt") as f:
+                self.assertEqual(f.readline(), "# genes\n")
+            regions = load_BED(output)
+            self.assertTrue(regions.sorted)
+            self.assertEqual([str(r) for r in regions],
+                             [str(r) for r in expected])
+            # Sorted halves merged back into one file
+            halves = []
+            for i in range(2):
+                halves.append(os.path.join(tmp, "half" + str(i) + ".bed"))
+                external_sort(shuffled, halves[-1], order="natural")
+            merged = os.path.join(tmp, "merged.bed")
+            merge_sorted_files(halves, merged, order="natural")
+            regions = load_BED(merged)
+            self.assertEqual(len(regions), 2 * len(expected))
+            self.assertTrue(regions.check_sorted("natural"))
+            with self.assertRaises(ValueError):
+                merge_sorted_files([filename, shuffled], merged)
 
     def test_load_BED(self):
         regions = load_BED(filename=os.path.join(script_path,
                            "test_files/bed/example4.bed"))
         self.assertEqual(len(regions), 6)
 
+    def test_load_BED_columns(self):
+        # Only header lines are skipped, and every record keeps its columns
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "peaks.bed")
+            with open(filename, "w") as f:
+                f.write("track name=peaks\n# comment\n"
+                        "chr1\t10\t20\n"
+                        "chr1\t30\t40\tpeak#1\t5\t-\textra\n"
+                        "chr1\t50\t60\tpeak2\n")
+            for regions in (load_BED(filename), load_BED(filename,
+                                                         chunk_size=1)):
+                self.assertEqual(
+                    [(r.name, r.score, r.orientation, r.data)
+                     for r in regions],
+                    [("", 0, ".", []), ("peak#1", 5, "-", ["extra"]),
+                     ("peak2", 0, ".", [])])
+            with self.assertRaises(ValueError):
+                list(load_BED(filename, stream=True))
+
+    def test_intersect_n_jobs(self):
+        genes = GRegions(load=os.path.join(
+            script_path, "test_files/bed/genes_Gencode_hg38_chr22.bed"))
+        peaks = genes.extend(upstream=1000, inplace=False)
+        peaks.add(GRegion(sequence="chr1", start=100, end=200))
+        with patch("genomkit.regions.parallel.PARALLEL_MIN_SIZE", 0):
+            for mode in ["OVERLAP", "ORIGINAL", "COMP_INCL"]:
+                self.assertEqual(
+                    [str(r) for r in genes.intersect(peaks, mode=mode,
+                                                     n_jobs=2)],
+                    [str(r) for r in genes.intersect(peaks, mode=mode)])
+            self.assertEqual(
+                [str(r) for r in genes.intersect_array(peaks, n_jobs=2)],
+                [str(r) for r in genes.intersect_array(peaks)])
+            # Two chromosomes for two processes
+            genes.add(GRegion(sequence="chr1", start=100, end=300))
+            sample = genes.sampling(300, seed=1)
+            mask = sample.extend(upstream=5000, inplace=False)
+            for kwargs in [{}, {"merge": False}, {"whole_region": True},
+                           {"exact": True}]:
+                res = genes.subtract(sample if kwargs.get("exact") else mask,
+                                     inplace=False, **kwargs)
+                self.assertGreater(len(res), 0)
+                self.assertEqual(
+                    [str(r) for r in genes.subtract(
+                        sample if kwargs.get("exact") else mask,
+                        inplace=False, n_jobs=2, **kwargs)],
+                    [str(r) for r in res])
+
+    def test_iter_chunks(self):
+        filename = os.path.join(script_path, "test_files/bed/example4.bed")
+        chunks = list(GRegions.iter_chunks(filename, chunk_size=4))
+        self.assertEqual([len(c) for c in chunks], [4, 2])
+        self.assertEqual(chunks[1][0].name, "Feature1")
+        self.assertEqual(chunks[0][0].orientation, "-")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "extended.bed.gz")
+            for chunk in load_BED(filename, stream=True, chunk_size=4):
+                chunk.extend(upstream=100, inplace=True)
+                chunk.write(output, append=True)
+            regions = GRegions(load=output)
+        self.assertEqual(len(regions), 6)
+        self.assertEqual(regions[2].start, 400)
+
+    def test_write(self):
+        regions = GRegions(load=os.path.join(
+            script_path, "test_files/bed/genes_Gencode_hg38_chr22.bed"))
+        regions[0].data = ["a", "b"]
+        expected = "".join(r.bed_entry(data=True) + "\n" for r in regions)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name, compression, n_jobs in [
+                    ("plain.bed", "infer", 1), ("bgzip.bed.gz", "infer", 2),
+                    ("gzip.bed.gz", "gzip", 2), ("bgzip.bgz", "bgzip", 1)]:
+                filename = os.path.join(tmpdir, name)
+                with patch("genomkit.regions.io.WRITE_CHUNK_SIZE", 100):
+                    regions.write(filename, data=True,
+                                  compression=compression, n_jobs=n_jobs)
+                opener = open if name.endswith(".bed") else gzip.open
+                with opener(filename, "rt") as f:
+                    self.assertEqual(f.read(), expected)
+            # bgzip output is indexed by tabix
+            self.assertTrue(is_bgzipped(os.path.join(tmpdir,
+                                                     "bgzip.bed.gz")))
+            self.assertFalse(is_bgzipped(os.path.join(tmpdir,
+                                                      "gzip.bed.gz")))
+            data = os.urandom(200000)
+            self.assertEqual(gzip.decompress(bgzf_compress(data)), data)
+            with self.assertRaises(ValueError):
+                regions.write(filename, compression="zip")
+
+    def test_save_binary(self):
+        regions = GRegions(load=os.path.join(script_path,
+                                             "test_files/bed/example4.bed"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "example4.gregions")
+            regions.save_binary(path)
+            reloaded = GRegions(load=path)
+        self.assertEqual(len(reloaded), 6)
+        self.assertEqual([str(r) for r in reloaded],
+                         [str(r) for r in regions])
+
     def test_sampling(self):
         regions = load_BED(filename=os.path.join(script_path,
                            "test_files/bed/example4.bed"))
@@ -150,15 +473,21 @@ class TestGRegions(unittest.TestCase):
         self.assertEqual(len(regions1[1]), 500)
         self.assertEqual(len(regions1[2]), 500)
         self.assertEqual(len(regions1[3]), 500)
+        # The subtracted regions are neither sorted nor modified
+        self.assertEqual([len(r) for r in regions2], [1000] * 4)
 
-        # regions1 = GRegions(name="test")
-        # regions1.load(filename=os.path.join(script_path,
-        #                                     "test_files/bed/example.bed"))
-        # regions2 = GRegions(name="test")
-        # regions2.load(filename=os.path.join(script_path,
-        #                                     "test_files/bed/example2.bed"))
-        # regions1.subtract(regions2, whole_region=True)
-        # self.assertEqual(len(regions1[0]), 0)
+        regions1 = GRegions(name="test")
+        regions1.load(filename=os.path.join(script_path,
+                                            "test_files/bed/example.bed"))
+        res = regions1.subtract(regions2, whole_region=True, inplace=False)
+        self.assertEqual(len(res), 0)
+        self.assertEqual(len(regions1), 4)
+        res = regions1.subtract(regions1[1:3], exact=True, inplace=False)
+        self.assertEqual([r.name for r in res], ["Feature1", "Feature4"])
+        regions1.add(GRegion(sequence="chr1", start=1000, end=2000,
+                             orientation="+"))
+        res = regions1.subtract(GRegions(), exact=True, inplace=False)
+        self.assertEqual(len(res), 4)
 
     def test_total_coverage(self):
         regions1 = GRegions(name="test")
@@ -166,6 +495,169 @@ class TestGRegions(unittest.TestCase):
                                             "test_files/bed/example.bed"))
         self.assertEqual(regions1.total_coverage(), 4000)
 
+    def test_closest(self):
+        regions1 = GRegions(name="test", load=os.path.join(
+            script_path, "test_files/bed/example.bed"))
+        regions2 = GRegions(name="test", load=os.path.join(
+            script_path, "test_files/bed/example2.bed"))
+        res = regions1.closest(regions2)
+        self.assertEqual([(r.name, t.name, d) for r, t, d in res],
+                         [("Feature1", "Feature1x", 0),
+                          ("Feature2", "Feature2x", 0),
+                          ("Feature3", "Feature3x", 0),
+                          ("Feature4", "Feature4x", 0)])
+        res = regions1.closest(regions2, k=2)
+        self.assertEqual([(t.name, d) for _, t, d in res[:2]],
+                         [("Feature1x", 0), ("Feature2x", 1501)])
+        # Distances follow the orientation of the query
+        res = regions1.closest(regions2, ignore_overlaps=True)
+        self.assertEqual([(r.name, t.name, d) for r, t, d in res],
+                         [("Feature1", "Feature2x", 1501),
+                          ("Feature2", "Feature1x", 1501),
+                          ("Feature3", "Feature4x", 1501),
+                          ("Feature4", "Feature3x", 1501)])
+        res = regions1.closest(regions2, ignore_overlaps=True,
+                               upstream_only=True)
+        self.assertEqual(len(res), 0)
+        res = regions1.closest(regions2, strandness=True)
+        self.assertEqual([r.name for r, _, _ in res],
+                         ["Feature1", "Feature3"])
+        # An empty target at the query start does not hide the nearest
+        # target before it
+        query, targets = GRegions(), GRegions()
+        query.add(GRegion("c", 144, 147))
+        for start, end in [(141, 142), (144, 144), (186, 198)]:
+            targets.add(GRegion("c", start, end))
+        for kwargs in [{}, {"upstream_only": True}]:
+            res = query.closest(targets, ignore_overlaps=True, **kwargs)
+            self.assertEqual([(t.start, t.end, d) for _, t, d in res],
+                             [(141, 142, -3)])
+
+    def test_shuffle(self):
+        regions = GRegions(name="test")
+        regions.load(filename=os.path.join(script_path,
+                                           "test_files/bed/example.bed"))
+        genome = {"chr1": 10000, "chr2": 20000}
+        exclude = GRegions(name="exclude")
+        exclude.add(GRegion(sequence="chr2", start=0, end=15000))
+        shuffled = regions.shuffle(genome, exclude=exclude, seed=1)
+        self.assertEqual([len(r) for r in shuffled], [1000] * 4)
+        self.assertEqual([r.name for r in shuffled],
+                         [r.name for r in regions])
+        self.assertEqual(len(shuffled.intersect(exclude)), 0)
+        for r in shuffled:
+            self.assertLessEqual(r.end, genome[r.sequence])
+        self.assertEqual([str(r) for r in shuffled],
+                         [str(r) for r in regions.shuffle(genome,
+                                                          exclude=exclude,
+                                                          seed=1)])
+        shuffled = regions.shuffle(genome, same_chrom=True, seed=2)
+        self.assertEqual([r.sequence for r in shuffled],
+                         [r.sequence for r in regions])
+        with self.assertRaises(ValueError):
+            regions.shuffle({"chr1": 500})
+
+    def test_permutation_test(self):
+        regions1 = GRegions(name="test")
+        regions1.load(filename=os.path.join(script_path,
+                                            "test_files/bed/example.bed"))
+        regions2 = GRegions(name="test")
+        regions2.load(filename=os.path.join(script_path,
+                                            "test_files/bed/example2.bed"))
+        genome = {"chr1": 1000000, "chr2": 1000000}
+        res = regions1.permutation_test(regions2, genome, n=200, seed=0)
+        count = res["permutations"]
+        self.assertEqual(res["observed"], 4)
+        self.assertEqual(len(res["permutations"]), 200)
+        self.assertLess(res["expected"], 1)
+        self.assertLess(res["p_value"], 0.01)
+        res = regions1.permutation_test(regions2, genome, n=200, seed=0,
+                                        statistic="bp", alternative="less")
+        self.assertEqual(res["observed"], 2000)
+        self.assertGreater(res["p_value"], 0.99)
+        # The permutations do not depend on the number of processes
+        with patch("genomkit.regions.parallel.PARALLEL_MIN_SIZE", 0), \
+                patch("genomkit.regions.shuffle.PERMUTATION_BLOCK_SIZE", 100):
+            serial, parallel = [regions1.permutation_test(
+                regions2, genome, n=200, seed=0, n_jobs=n_jobs)
+                for n_jobs in [1, 2]]
+        self.assertEqual(parallel["permutations"].tolist(),
+                         serial["permutations"].tolist())
+        # Regions outside the genome are ignored
+        regions1.add(GRegion("chrX", 0, 1000))
+        res = regions1.permutation_test(regions2, genome, n=200, seed=0)
+        self.assertEqual(res["observed"], 4)
+        self.assertEqual(res["permutations"].tolist(), count.tolist())
+        res = regions1.permutation_test(regions2, genome, n=200, seed=0,
+                                        same_chrom=True)
+        self.assertEqual(res["observed"], 4)
+
+    def test_make_windows(self):
+        genome = {"chr1": 10000, "chr2": 9500}
+        windows = GRegions.make_windows(genome, 2000)
+        self.assertEqual(len(windows), 10)
+        self.assertEqual(str(windows[9]), str(GRegion("chr2", 8000, 9500)))
+        windows = GRegions.make_windows(genome, 2000, step=1000)
+        self.assertEqual(len(windows), 20)
+        self.assertEqual(windows.ends[:10].tolist()[-3:],
+                         [9000, 10000, 10000])
+        with self.assertRaises(ValueError):
+            GRegions.make_windows(genome, 0)
+
+    def test_bin_counts(self):
+        regions = GRegions(name="test")
+        regions.load(filename=os.path.join(script_path,
+                                           "test_files/bed/example2.bed"))
+        genome = {"chr1": 10000, "chr2": 9500}
+        windows = GRegions.make_windows(genome, 2000)
+        self.assertEqual(regions.bin_counts(windows).tolist(),
+                         [1, 1, 1, 0, 0, 0, 0, 1, 1, 1])
+        self.assertEqual(regions.bin_counts(windows, center=True).tolist(),
+                         [1, 0, 1, 0, 0, 0, 0, 1, 0, 1])
+        self.assertEqual(regions.bin_counts(windows, score=True).tolist(),
+                         [10, 20, 20, 0, 0, 0, 0, 30, 40, 40])
+        # Overlapping and unsorted windows give the same counts as overlap()
+        windows = GRegions.make_windows(genome, 2000, step=700)
+        for shuffle in [False, True]:
+            if shuffle:
+                windows = windows.to_GRegions()
+                random.Random(0).shuffle(windows.elements)
+            expected = [sum(w.overlap(r) for r in regions) for w in windows]
+            self.assertEqual(regions.bin_counts(windows).tolist(), expected)
+
+    def test_allocations(self):
+        # Regression guard for the hot loops: no copies of the inputs and a
+        # bounded number of allocations per region.
+        random.seed(0)
+        region_num = 20000
+        regions = []
+        for _ in range(2):
+            res = GRegions(name="random")
+            for i in range(region_num):
+                start = random.randrange(0, 10000000)
+                res.add(GRegion(sequence="chr" + str(i % 3), start=start,
+                                end=start + random.randrange(100, 1000),
+                                name="r" + str(i)))
+            regions.append(res)
+        regions1, regions2 = regions
+        before = [str(r) for r in regions1]
+        for func in [lambda: regions1.intersect(regions2, mode="OVERLAP"),
+                     lambda: regions1.intersect(regions2, mode="ORIGINAL"),
+                     lambda: regions1.cluster(100)]:
+            tracemalloc.start()
+            snapshot = tracemalloc.take_snapshot()
+            res = func()
+            blocks = sum(stat.count_diff for stat in
+                         tracemalloc.take_snapshot().compare_to(snapshot,
+                                                                "filename"))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.assertGreater(len(res), 0)
+            self.assertLess(blocks / region_num, 8)
+            self.assertLess(peak / region_num, 1024)
+        self.assertEqual([str(r) for r in regions1], before)
+        self.assertFalse(regions1.sorted)
+
 
 if __name__ == '__main__':
     unittest.main()
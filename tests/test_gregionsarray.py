@@ -0,0 +1,191 @@
+import unittest
+from genomkit import GRegionsArray, GRegions, GRegion
+import os
+import shutil
+import tempfile
+import numpy as np
+
+script_path = os.path.dirname(__file__)
+
+
+class TestGRegionsArray(unittest.TestCase):
+
+    def test_len(self):
+        regions = GRegionsArray(name="test")
+        regions.load(filename=os.path.join(script_path,
+                                           "test_files/bed/example.bed"))
+        self.assertEqual(len(regions), 4)
+        regions = GRegionsArray(name="test")
+        regions.load(filename=os.path.join(script_path,
+                     "test_files/bed/genes_Gencode_hg38_chr22.bed"))
+        self.assertEqual(len(regions), 1372)
+
+    def test_getitem(self):
+        regions = GRegionsArray(load=os.path.join(
+            script_path, "test_files/bed/example.bed"))
+        self.assertIsInstance(regions[0], GRegion)
+        self.assertEqual(regions[0].start, 1000)
+        self.assertEqual(regions[1].orientation, "-")
+        self.assertEqual(regions[-1].name, "Feature4")
+        self.assertEqual(len(regions[1:3]), 2)
+        self.assertEqual(regions[1:3][0].start, 3000)
+
+    def test_add(self):
+        regions = GRegionsArray(name="test")
+        regions.add(GRegion(sequence="chr2", start=10, end=20, name="b"))
+        regions.add(GRegion(sequence="chr1", start=5, end=15, name="a",
+                            data=["x"]))
+        self.assertEqual(len(regions), 2)
+        self.assertEqual(regions.get_sequences(), ["chr2", "chr1"])
+        self.assertEqual(regions[1].data, ["x"])
+        regions.sort()
+        self.assertEqual(regions.get_names(), ["a", "b"])
+
+    def test_sort(self):
+        regions = GRegionsArray(name="test")
+        regions.load(filename=os.path.join(script_path,
+                                           "test_files/bed/example4.bed"))
+        self.assertFalse(regions.sorted)
+        regions.sort()
+        self.assertEqual(len(regions), 6)
+        self.assertEqual(regions.get_sequences(),
+                         ["chr1", "chr1", "chr1", "chr2", "chr2", "chr2"])
+        self.assertTrue(regions.sorted)
+        regions.sort(order=["chr2"])
+        self.assertEqual(regions.get_sequences()[0], "chr2")
+        regions = GRegionsArray(load=os.path.join(
+            script_path, "test_files/bed/example.bed"))
+        self.assertTrue(regions.sorted)
+
+    def test_intersect(self):
+        regions1 = GRegionsArray(load=os.path.join(
+            script_path, "test_files/bed/example.bed"))
+        regions2 = GRegionsArray(load=os.path.join(
+            script_path, "test_files/bed/example2.bed"))
+        intersect = regions1.intersect(regions2, mode='OVERLAP')
+        self.assertEqual(len(intersect), 4)
+        self.assertEqual([len(r) for r in intersect], [500] * 4)
+        intersect = regions1.intersect(regions2, mode='ORIGINAL')
+        self.assertEqual(len(intersect), 4)
+        self.assertEqual([len(r) for r in intersect], [1000] * 4)
+        intersect = regions1.intersect(regions2, mode='COMP_INCL')
+        self.assertEqual(len(intersect), 0)
+
+    def test_intersect_GRegions(self):
+        genes = os.path.join(script_path,
+                             "test_files/bed/genes_Gencode_mm10.bed")
+        peaks = os.path.join(script_path,
+                             "test_files/bed/consensus_peaks.bed")
+        regions1 = GRegionsArray(load=peaks)
+        regions2 = GRegions(load=genes)
+        intersect = regions1.intersect(regions2, mode='ORIGINAL')
+        self.assertEqual(len(intersect), 17241)
+
+    def test_closest(self):
+        genes = os.path.join(script_path,
+                             "test_files/bed/genes_Gencode_mm10.bed")
+        peaks = os.path.join(script_path,
+                             "test_files/bed/consensus_peaks.bed")
+        regions1 = GRegionsArray(load=peaks)
+        regions2 = GRegionsArray(load=genes)
+        qi, ti, dist = regions1.closest(regions2, k=2, strandness=True)
+        res = regions1.to_GRegions().closest(regions2.to_GRegions(), k=2,
+                                             strandness=True)
+        self.assertEqual(len(qi), len(res))
+        self.assertEqual(dist.tolist(), [d for _, _, d in res])
+        self.assertTrue((qi[1:] >= qi[:-1]).all())
+
+    def test_merge(self):
+        regions = GRegionsArray(load=os.path.join(
+            script_path, "test_files/bed/example3.bed"))
+        merged = regions.merge()
+        self.assertEqual(len(merged), 2)
+        self.assertEqual(len(merged[0]), 1000)
+        self.assertEqual(len(merged[1]), 1000)
+        merged = regions.merge(strandness=True)
+        self.assertEqual(len(merged), 3)
+        self.assertEqual(len(merged[0]), 1000)
+        merged = regions.merge(by_name=True)
+        self.assertEqual(len(merged), 4)
+        regions.merge(inplace=True)
+        self.assertEqual(len(regions), 2)
+        self.assertEqual(len(regions[0]), 1000)
+        self.assertEqual(len(regions[1]), 1000)
+
+    def test_remove_duplicates(self):
+        regions = GRegionsArray(load=os.path.join(
+            script_path, "test_files/bed/example4.bed"))
+        regions.remove_duplicates()
+        self.assertEqual(len(regions), 4)
+
+    def test_total_coverage(self):
+        regions = GRegionsArray(load=os.path.join(
+            script_path, "test_files/bed/example.bed"))
+        self.assertEqual(regions.total_coverage(), 4000)
+
+    def test_write(self):
+        regions = GRegionsArray(load=os.path.join(
+            script_path, "test_files/bed/example.bed"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "out.bed")
+            regions.write(filename)
+            reloaded = GRegionsArray(load=filename)
+        self.assertEqual([str(r) for r in reloaded],
+                         [str(r) for r in regions])
+
+    def test_binary(self):
+        regions = GRegionsArray(load=os.path.join(
+            script_path, "test_files/bed/genes_Gencode_hg38_chr22.bed"))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "genes.gregions")
+            regions.save_binary(path)
+            reloaded = GRegionsArray(load=path)
+            self.assertIsInstance(reloaded.starts.base, np.memmap)
+            self.assertEqual([str(r) for r in reloaded],
+                             [str(r) for r in regions])
+            reloaded.sort()
+            self.assertTrue(reloaded.sorted)
+            # A binary directory is replaced, any other directory is not
+            regions.save_binary(path)
+            other = os.path.join(tmpdir, "other")
+            os.makedirs(other)
+            with open(os.path.join(other, "important.txt"), "w") as f:
+                f.write("keep")
+            with self.assertRaises(ValueError):
+                regions.save_binary(other)
+            with self.assertRaises(ValueError):
+                GRegions(load=os.path.join(
+                    script_path, "test_files/bed/example.bed")).save_binary(
+                        other)
+            self.assertEqual(os.listdir(other), ["important.txt"])
+            self.assertEqual(sorted(os.listdir(tmpdir)),
+                             ["genes.gregions", "other"])
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "example.bed")
+            shutil.copy(os.path.join(script_path,
+                                     "test_files/bed/example.bed"), filename)
+            regions = GRegionsArray(load=filename, cache=True)
+            self.assertTrue(os.path.isdir(filename + ".gregions"))
+            cached = GRegionsArray(load=filename, cache=True)
+            self.assertIsInstance(cached.starts.base, np.memmap)
+            self.assertEqual(list(cached), list(regions))
+            with open(filename, "a") as f:
+                f.write("\nchr3\t10\t20\tFeature5\t0\t+\n")
+            self.assertEqual(len(GRegionsArray(load=filename, cache=True)),
+                             5)
+
+    def test_GRegions_conversion(self):
+        regions = GRegions(load=os.path.join(
+            script_path, "test_files/bed/example.bed"))
+        array = GRegionsArray.from_GRegions(regions)
+        self.assertEqual(len(array), 4)
+        self.assertEqual(list(array), regions.elements)
+        back = array.to_GRegions()
+        self.assertIsInstance(back, GRegions)
+        self.assertEqual(back.get_names(), regions.get_names())
+
+
+if __name__ == '__main__':
+    unittest.main()
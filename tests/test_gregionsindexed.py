@@ -0,0 +1,122 @@
+import unittest
+from genomkit import GRegions, GRegion, IndexedGRegions
+from genomkit.regions.gregions_indexed import is_bgzipped
+import gzip
+import os
+import random
+import shutil
+import tempfile
+
+script_path = os.path.dirname(__file__)
+
+
+class TestIndexedGRegions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp, "genes.bed")
+        shutil.copy(os.path.join(
+            script_path, "test_files/bed/genes_Gencode_mm10.bed"),
+            self.filename)
+        self.genes = GRegions(load=self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_query(self):
+        with IndexedGRegions(self.filename) as indexed:
+            self.assertTrue(is_bgzipped(indexed.filename))
+            self.assertTrue(os.path.exists(indexed.filename + ".tbi"))
+            self.assertIn("chr19", indexed.get_sequences())
+            windows = GRegions()
+            windows.add(GRegion("chr19", 3000000, 3500000))
+            windows.add(GRegion("chr19", 3400000, 4000000))
+            windows.add(GRegion("chr1", 10000000, 12000000))
+            windows.add(GRegion("chrUn", 0, 100))
+            res = indexed.query(windows)
+            expected = self.genes.intersect(windows, mode="ORIGINAL")
+            self.assertEqual(sorted(str(r) for r in res),
+                             sorted(str(r) for r in expected))
+            self.assertEqual(indexed.count(windows), len(expected))
+            res = indexed.query("chr19:3,000,000-3,500,000")
+            self.assertEqual(res[0].orientation,
+                             expected.get_elements_by_seq(
+                                 "chr19")[0].orientation)
+            self.assertEqual(len(indexed.query("chrM")),
+                             len(self.genes.get_elements_by_seq("chrM")))
+            self.assertEqual(len(indexed.query(("chr2", 0, 10))), 0)
+        # The compressed copy and its index are reused
+        mtime = os.path.getmtime(indexed.filename + ".tbi")
+        IndexedGRegions(self.filename)
+        self.assertEqual(os.path.getmtime(indexed.filename + ".tbi"), mtime)
+        res = GRegions.query_file(indexed.filename, "chr1:0-4000000")
+        self.assertEqual(len(res), len(self.genes.intersect(
+            self._window("chr1", 0, 4000000), mode="ORIGINAL")))
+
+    def test_existing_gzip(self):
+        # An unrelated gzip file next to the BED file is kept
+        other = self.filename + ".gz"
+        with gzip.open(other, "wt") as f:
+            f.write("unrelated\n")
+        indexed = IndexedGRegions(self.filename)
+        self.assertEqual(indexed.filename, self.filename + ".bgz")
+        indexed.close()
+        with gzip.open(other, "rt") as f:
+            self.assertEqual(f.read(), "unrelated\n")
+        # A file which is not bgzip compressed is not overwritten
+        os.remove(indexed.filename)
+        shutil.copy(other, indexed.filename)
+        os.utime(self.filename, (0, 0))
+        with self.assertRaises(ValueError):
+            IndexedGRegions(self.filename)
+        with gzip.open(indexed.filename, "rt") as f:
+            self.assertEqual(f.read(), "unrelated\n")
+        # The copy of a gzipped file ends with .bgz instead of .gz
+        gzipped = os.path.join(self.tmp, "genes2.bed.gz")
+        with open(self.filename, "rb") as f, gzip.open(gzipped, "wb") as g:
+            g.write(f.read())
+        with IndexedGRegions(gzipped) as indexed:
+            self.assertEqual(indexed.filename,
+                             os.path.join(self.tmp, "genes2.bed.bgz"))
+            self.assertEqual(indexed.count("chr19"),
+                             len(self.genes.get_elements_by_seq("chr19")))
+
+    def _window(self, sequence, start, end):
+        window = GRegions()
+        window.add(GRegion(sequence, start, end))
+        return window
+
+    def test_unsorted(self):
+        with open(self.filename) as f:
+            lines = f.readlines()
+        random.Random(0).shuffle(lines)
+        with open(self.filename, "w") as f:
+            f.write("track name=genes\n")
+            f.writelines(lines)
+        with self.assertRaises(ValueError):
+            IndexedGRegions(self.filename, build_index=False)
+        indexed = IndexedGRegions(self.filename)
+        window = self._window("chr5", 20000000, 30000000)
+        self.assertEqual(sorted(str(r) for r in indexed.query(window)),
+                         sorted(str(r) for r in self.genes.intersect(
+                             window, mode="ORIGINAL")))
+        indexed.close()
+
+    def test_bedgraph(self):
+        filename = os.path.join(self.tmp, "signal.bedGraph")
+        with open(filename, "w") as f:
+            f.write("track type=bedGraph\n")
+            for i in range(100):
+                f.write("chr1\t" + str(i * 10) + "\t" + str(i * 10 + 10) +
+                        "\t" + str(i / 2) + "\n")
+        indexed = IndexedGRegions(filename)
+        self.assertEqual(indexed.format, "bedGraph")
+        res = indexed.query("chr1:95-120")
+        self.assertEqual([(r.start, r.score) for r in res],
+                         [(90, 4.5), (100, 5.0), (110, 5.5)])
+        self.assertEqual(len(list(indexed)), 100)
+        indexed.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
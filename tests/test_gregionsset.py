@@ -0,0 +1,105 @@
+import unittest
+from genomkit import GRegionsSet, GRegions, GRegion
+import os
+
+script_path = os.path.dirname(__file__)
+
+
+class TestGRegionsSet(unittest.TestCase):
+
+    def setUp(self):
+        self.regions_set = GRegionsSet(name="test", load_dict={
+            "example": os.path.join(script_path,
+                                    "test_files/bed/example.bed"),
+            "example2": os.path.join(script_path,
+                                     "test_files/bed/example2.bed"),
+            "example3": os.path.join(script_path,
+                                     "test_files/bed/example3.bed")})
+
+    def test_count_overlaps(self):
+        counts = self.regions_set.count_overlaps(self.regions_set)
+        self.assertEqual(counts.index.tolist(),
+                         ["example", "example2", "example3"])
+        self.assertEqual(counts.columns.tolist(),
+                         ["example", "example2", "example3"])
+        self.assertEqual(counts.values.tolist(), [[4, 4, 2],
+                                                  [4, 4, 2],
+                                                  [3, 4, 4]])
+        counts = self.regions_set.count_overlaps(self.regions_set,
+                                                 percentage=True)
+        self.assertAlmostEqual(counts.loc["example3", "example3"],
+                               100 * 4 / 11)
+
+    def test_overlap_matrices(self):
+        counts, bp, jaccard = self.regions_set.overlap_matrices()
+        self.assertEqual(bp.loc["example", "example"], 4000)
+        self.assertEqual(bp.loc["example", "example2"], 2000)
+        self.assertEqual(bp.loc["example2", "example3"], 2000)
+        self.assertAlmostEqual(jaccard.loc["example", "example2"],
+                               2000 / 6000)
+        self.assertEqual(jaccard.loc["example3", "example3"], 1)
+        self.assertTrue((bp.values == bp.values.T).all())
+        # Disjoint and empty GRegions
+        disjoint = GRegionsSet(name="disjoint")
+        far = GRegions()
+        far.add(GRegion("chr9", 0, 100))
+        disjoint.add(name="far", regions=far)
+        disjoint.add(name="empty", regions=GRegions())
+        counts, bp, jaccard = self.regions_set.overlap_matrices(disjoint)
+        self.assertEqual(counts.shape, (3, 2))
+        self.assertEqual(counts.values.sum(), 0)
+        self.assertEqual(bp.values.sum(), 0)
+        self.assertEqual(jaccard.values.sum(), 0)
+        counts, bp, jaccard = disjoint.overlap_matrices()
+        self.assertEqual(counts.values.tolist(), [[1, 0], [0, 0]])
+        self.assertEqual(jaccard.values.tolist(), [[1, 0], [0, 0]])
+
+    def test_bin_matrix(self):
+        windows = GRegions.make_windows({"chr1": 10000, "chr2": 9500}, 2000)
+        matrix = self.regions_set.bin_matrix(windows)
+        self.assertEqual(matrix.shape, (3, 10))
+        self.assertEqual(matrix.toarray().tolist(),
+                         [[1, 1, 0, 0, 0, 0, 0, 1, 1, 0],
+                          [1, 1, 1, 0, 0, 0, 0, 1, 1, 1],
+                          [2, 0, 0, 0, 0, 0, 0, 2, 0, 0]])
+        for regions, row in zip(self.regions_set.collection.values(),
+                                self.regions_set.bin_matrix(
+                                    windows, center=True, score=True,
+                                    sparse=False)):
+            self.assertEqual(row.tolist(),
+                             regions.bin_counts(windows, center=True,
+                                                score=True).tolist())
+
+    def test_multi_intersect(self):
+        segments, membership = self.regions_set.multi_intersect(
+            membership=True)
+        self.assertEqual(len(segments), 12)
+        self.assertEqual([(r.sequence, r.start, r.end) for r in segments][:3],
+                         [("chr1", 500, 1000), ("chr1", 1000, 1500),
+                          ("chr1", 1500, 2000)])
+        self.assertEqual(segments.names[:2].tolist(),
+                         ["example2,example3", "example,example2,example3"])
+        self.assertEqual(segments.scores.tolist(),
+                         [2, 3, 1, 1, 2, 1, 2, 3, 1, 1, 2, 1])
+        self.assertEqual(membership.shape, (12, 3))
+        self.assertEqual(membership.sum(axis=1).A1.tolist(),
+                         segments.scores.tolist())
+        self.assertEqual(membership[4].toarray().tolist(),
+                         [[True, True, False]])
+
+    def test_consensus(self):
+        def coordinates(regions):
+            return [(r.sequence, r.start, r.end, r.score) for r in regions]
+        self.assertEqual(coordinates(self.regions_set.consensus()),
+                         [("chr1", 500, 1500, 3), ("chr1", 3500, 4000, 2),
+                          ("chr2", 4500, 5500, 3), ("chr2", 7500, 8000, 2)])
+        self.assertEqual(coordinates(self.regions_set.consensus(3)),
+                         [("chr1", 1000, 1500, 3), ("chr2", 5000, 5500, 3)])
+        self.assertEqual(coordinates(self.regions_set.consensus(
+            3, whole_region=True)),
+                         [("chr1", 500, 2000, 3), ("chr2", 4500, 6000, 3)])
+        self.assertEqual(len(self.regions_set.consensus(4)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
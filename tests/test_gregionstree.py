@@ -1,5 +1,5 @@
 import unittest
-from genomkit import GRegionsTree
+from genomkit import GRegionsTree, GRegion
 import os
 
 script_path = os.path.dirname(__file__)
@@ -164,11 +164,21 @@ class TestGRegionsTree(unittest.TestCase):
         # regions1.subtract(regions2, whole_region=True)
         # self.assertEqual(len(regions1[0]), 0)
 
-    # def test_total_coverage(self):
-    #     regions1 = GRegionsTree(name="test")
-    #     regions1.load(filename=os.path.join(script_path,
-    #                                         "test_files/bed/example.bed"))
-    #     self.assertEqual(regions1.total_coverage(), 4000)
+    def test_total_coverage(self):
+        regions1 = GRegionsTree(name="test")
+        regions1.load(filename=os.path.join(script_path,
+                                            "test_files/bed/example.bed"))
+        self.assertEqual(regions1.total_coverage(), 4000)
+
+    def test_add(self):
+        regions = GRegionsTree(name="test")
+        regions.load(filename=os.path.join(script_path,
+                                           "test_files/bed/example.bed"))
+        regions.add(GRegion(sequence="chr1", start=100, end=200))
+        regions.add(GRegion(sequence="chr3", start=100, end=200))
+        self.assertEqual(len(regions), 6)
+        self.assertEqual(regions[0].start, 100)
+        self.assertEqual(regions[-1].sequence, "chr3")
 
     def test_rename_by_GRegions(self):
         regions1 = GRegionsTree(name="test")
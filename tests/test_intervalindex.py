@@ -0,0 +1,72 @@
+import unittest
+from genomkit import GRegion
+from genomkit.regions.interval_index import IntervalIndex, RegionMask, \
+    index_regions
+import numpy as np
+
+
+class TestIntervalIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = IntervalIndex(starts=[500, 100, 300, 100],
+                                   ends=[600, 400, 350, 200],
+                                   regions=["d", "b", "c", "a"])
+
+    def test_build(self):
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.index.starts.tolist(), [100, 100, 300, 500])
+        self.assertEqual(list(self.index), ["a", "b", "c", "d"])
+        self.assertFalse(self.index.starts.flags.writeable)
+
+    def test_overlap(self):
+        qi, ti = self.index.overlap([150, 350, 450], [320, 360, 500])
+        self.assertEqual(list(zip(qi.tolist(), self.index[ti])),
+                         [(0, "a"), (0, "b"), (0, "c"), (1, "b")])
+        self.assertEqual(self.index.count([150, 350, 450],
+                                          [320, 360, 500]).tolist(),
+                         [3, 1, 0])
+
+    def test_point(self):
+        qi, ti = self.index.point([100, 200, 599, 600])
+        self.assertEqual(list(zip(qi.tolist(), self.index[ti])),
+                         [(0, "a"), (0, "b"), (1, "b"), (2, "d")])
+
+    def test_envelop(self):
+        qi, ti = self.index.envelop([0, 300], [400, 1000])
+        self.assertEqual(list(zip(qi.tolist(), self.index[ti])),
+                         [(0, "a"), (0, "b"), (0, "c"), (1, "c"),
+                          (1, "d")])
+
+    def test_index_regions(self):
+        indexes = index_regions([GRegion("chr2", 10, 20),
+                                 GRegion("chr1", 30, 40),
+                                 GRegion("chr2", 0, 5)])
+        self.assertEqual(list(indexes), ["chr2", "chr1"])
+        self.assertEqual(indexes["chr2"][0].start, 0)
+        qi, ti = indexes["chr2"].overlap(np.array([4]), np.array([15]))
+        self.assertEqual(len(qi), 2)
+
+    def test_region_mask(self):
+        mask = RegionMask([GRegion("chr1", 10, 20), GRegion("chr1", 15, 30),
+                           GRegion("chr2", 0, 5),
+                           GRegion("chr2", 2 ** 40, 2 ** 40 + 10)])
+        self.assertEqual(len(mask), 4)
+        src, starts, ends = mask.subtract("chr1", np.array([0, 25]),
+                                          np.array([40, 28]))
+        self.assertEqual(list(zip(src.tolist(), starts.tolist(),
+                                  ends.tolist())), [(0, 0, 10), (0, 30, 40)])
+        self.assertEqual(mask.overlapped("chr1", np.array([5, 30]),
+                                         np.array([11, 40])).tolist(),
+                         [True, False])
+        self.assertEqual(mask.matched("chr1", np.array([10, 10]),
+                                      np.array([20, 30])).tolist(),
+                         [True, False])
+        self.assertEqual(mask.matched("chr2", np.array([2 ** 40, 0]),
+                                      np.array([2 ** 40 + 10, 4])).tolist(),
+                         [True, False])
+        self.assertEqual(mask.overlapped("chrX", np.array([0]),
+                                         np.array([10])).tolist(), [False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import numpy as np
+from genomkit import RLECoverage
+
+
+class TestRLECoverage(unittest.TestCase):
+
+    def setUp(self):
+        self.dense = np.array([0, 0, 0, 2, 2, 5, 0, 0, 1, 1], dtype=np.int32)
+        self.cov = RLECoverage.from_array(self.dense)
+
+    def test_from_array(self):
+        self.assertEqual(len(self.cov), 10)
+        np.testing.assert_array_equal(self.cov.ends, [3, 5, 6, 8, 10])
+        np.testing.assert_array_equal(self.cov.values, [0, 2, 5, 0, 1])
+        np.testing.assert_array_equal(np.asarray(self.cov), self.dense)
+        nan = RLECoverage.from_array([np.nan, np.nan, 1.0, 1.0])
+        self.assertEqual(len(nan.ends), 2)
+        self.assertEqual(len(RLECoverage.from_array([])), 0)
+
+    def test_from_intervals(self):
+        cov = RLECoverage.from_intervals([2, 5, 6], [4, 6, 8],
+                                         np.array([1, 2, 2], np.float32), 10)
+        np.testing.assert_array_equal(
+            cov.to_array(),
+            [np.nan, np.nan, 1, 1, np.nan, 2, 2, 2, np.nan, np.nan])
+        self.assertEqual(len(cov.ends), 5)
+        cov = RLECoverage.from_intervals([0], [10], [3], 10, fill=0)
+        np.testing.assert_array_equal(cov.values, [3])
+        with self.assertRaises(ValueError):
+            RLECoverage.from_intervals([0, 2], [3, 4], [1, 1], 10)
+
+    def test_getitem(self):
+        for key in (slice(None), slice(2, 7), slice(4, 5), slice(7, 2),
+                    slice(1, 9, 3), slice(None, None, -1),
+                    slice(8, 1, -2)):
+            np.testing.assert_array_equal(self.cov[key], self.dense[key])
+        self.assertEqual(self.cov[5], 5)
+        self.assertEqual(self.cov[-1], 1)
+        with self.assertRaises(IndexError):
+            self.cov[10]
+        np.testing.assert_array_equal(self.cov.to_array(4, 20),
+                                      self.dense[4:])
+
+    def test_sum(self):
+        self.assertEqual(self.cov.sum(), self.dense.sum())
+        cov = RLECoverage.from_array([np.nan, 1.0, 1.0, 2.0])
+        self.assertTrue(np.isnan(cov.sum()))
+        self.assertEqual(cov.nansum(), 4)
+        np.testing.assert_array_equal(cov.fillna(0).to_array(), [0, 1, 1, 2])
+
+    def test_binned(self):
+        for bin_size in (1, 3, 4, 10, 20):
+            binned = self.cov.binned(bin_size)
+            expected = [self.dense[i:i + bin_size].mean()
+                        for i in range(0, 10, bin_size)]
+            np.testing.assert_allclose(np.asarray(binned), expected)
+        cov = RLECoverage.from_array([np.nan, 1.0, 1.0, 2.0, 2.0])
+        np.testing.assert_array_equal(cov.binned(2).to_array(),
+                                      [np.nan, 1.5, 2])
+
+    def test_arithmetic(self):
+        other_dense = np.array([1, 1, 1, 1, 1, 1, 1, 3, 3, 3], np.int32)
+        other = RLECoverage.from_array(other_dense)
+        for res, expected in [(self.cov + other, self.dense + other_dense),
+                              (self.cov - other, self.dense - other_dense),
+                              (self.cov * other, self.dense * other_dense),
+                              (self.cov / other, self.dense / other_dense),
+                              (self.cov * 0.5, self.dense * 0.5),
+                              (2 * self.cov, 2 * self.dense),
+                              (1 - self.cov, 1 - self.dense),
+                              (-self.cov, -self.dense)]:
+            np.testing.assert_array_equal(np.asarray(res), expected)
+        # Equal neighbouring runs are joined
+        self.assertEqual(len((self.cov * 0).ends), 1)
+        with self.assertRaises(ValueError):
+            self.cov + RLECoverage.from_array([1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
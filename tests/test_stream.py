@@ -0,0 +1,106 @@
+import unittest
+from genomkit import GRegions, GRegion
+from genomkit.regions import stream
+import os
+import tempfile
+
+script_path = os.path.dirname(__file__)
+
+
+def coordinates(regions):
+    return [(r.sequence, r.start, r.end, r.orientation, r.name)
+            for r in regions]
+
+
+class TestStream(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.genes = GRegions(load=os.path.join(
+            script_path, "test_files/bed/genes_Gencode_mm10.bed"))
+        cls.genes.sort()
+        cls.peaks = GRegions(load=os.path.join(
+            script_path, "test_files/bed/consensus_peaks.bed"))
+        cls.peaks.sort()
+
+    def test_intersect(self):
+        for mode in ["OVERLAP", "ORIGINAL", "COMP_INCL"]:
+            self.assertEqual(
+                coordinates(stream.intersect(self.peaks, self.genes,
+                                             mode=mode)),
+                coordinates(self.peaks.intersect(self.genes, mode=mode)))
+        with self.assertRaises(ValueError):
+            list(stream.intersect(self.peaks, self.genes, mode="ANY"))
+
+    def test_merge(self):
+        for by_name in [False, True]:
+            for strandness in [False, True]:
+                self.assertEqual(
+                    coordinates(stream.merge(self.genes, by_name=by_name,
+                                             strandness=strandness)),
+                    coordinates(self.genes.merge(by_name=by_name,
+                                                 strandness=strandness)))
+
+    def test_subtract(self):
+        for kwargs in [{}, {"whole_region": True}, {"merge": False},
+                       {"exact": True}]:
+            self.assertEqual(
+                coordinates(stream.subtract(self.genes, self.peaks,
+                                            **kwargs)),
+                coordinates(self.genes.subtract(self.peaks, inplace=False,
+                                                **kwargs)))
+        # Zero-length regions remain unless a target covers them
+        regions, targets = GRegions(), GRegions()
+        for sequence, start, end in [("chr1", 50, 50), ("chr1", 100, 200),
+                                     ("chr1", 155, 155), ("chr1", 300, 300),
+                                     ("chr1", 310, 310), ("chr2", 10, 10)]:
+            regions.add(GRegion(sequence, start, end))
+        targets.add(GRegion("chr1", 150, 160))
+        targets.add(GRegion("chr1", 300, 310))
+        expected = [("chr1", 50, 50), ("chr1", 100, 150), ("chr1", 160, 200),
+                    ("chr1", 310, 310), ("chr2", 10, 10)]
+        for merge in [True, False]:
+            res = regions.subtract(targets, merge=merge, inplace=False)
+            self.assertEqual([(r.sequence, r.start, r.end) for r in res],
+                             expected)
+            self.assertEqual(
+                coordinates(stream.subtract(regions, targets, merge=merge)),
+                coordinates(res))
+
+    def test_closest(self):
+        for kwargs in [{"k": 3}, {"k": 2, "strandness": True},
+                       {"ignore_overlaps": True}, {"upstream_only": True}]:
+            res = stream.closest(self.peaks, self.genes, **kwargs)
+            expected = self.peaks.closest(self.genes, **kwargs)
+            self.assertEqual([(str(r), str(t), d) for r, t, d in res],
+                             [(str(r), str(t), d) for r, t, d in expected])
+
+    def test_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            genes = os.path.join(tmp, "genes.bed.gz")
+            peaks = os.path.join(tmp, "peaks.bed")
+            stream.write(self.genes, genes)
+            stream.write(self.peaks, peaks)
+            res = os.path.join(tmp, "res.bed")
+            stream.write(stream.intersect(peaks, genes, mode="ORIGINAL",
+                                          chunk_size=1000), res)
+            self.assertEqual(
+                coordinates(GRegions(load=res)),
+                coordinates(self.peaks.intersect(self.genes,
+                                                 mode="ORIGINAL")))
+            # Unsorted input is reported while reading
+            unsorted = [GRegion("chr1", 100, 200), GRegion("chr1", 50, 80)]
+            with self.assertRaises(ValueError):
+                list(stream.merge(unsorted))
+            with self.assertRaises(ValueError):
+                list(stream.merge(genes, order="natural"))
+        regions = [GRegion("chr2", 0, 100), GRegion("chr10", 50, 150),
+                   GRegion("chr10", 100, 200)]
+        self.assertEqual(coordinates(stream.merge(regions,
+                                                  order="natural")),
+                         [("chr2", 0, 100, ".", ""),
+                          ("chr10", 50, 200, ".", "")])
+
+
+if __name__ == '__main__':
+    unittest.main()